@@ -19,6 +19,8 @@ from ccmlib.node import Node
 from cqlsh_tests.cqlsh_tools import assert_resultset_contains
 from dtest import Tester, create_ks, logger
 from tools.assertions import assert_length_equal
+from tools.benchmark import record_benchmark
+from tools.cdc import CDCFollower
 from tools.data import rows_to_list
 from tools.files import size_of_files_in_dir
 from tools.funcutils import get_rate_limited_function
@@ -127,6 +129,30 @@ def _write_to_cdc_write_failure(session, insert_stmt):
     return rows_loaded
 
 
+def _write_through_cdc_consumer(session, insert_stmt, follower, target_bytes, time_limit=600):
+    """
+    Writes to a CDC table in batches of 1000 rows until the follower of the node's
+    cdc_raw has seen target_bytes synced, counting the writes rejected because cdc_raw
+    was full. Returns the number of rows written and rejected, and the seconds it took.
+    """
+    prepared = session.prepare(insert_stmt)
+    start, rows_loaded, rows_rejected = time.time(), 0, 0
+    rate_limited_debug = get_rate_limited_function(logger.debug, 5)
+    while follower.stats()['synced_bytes'] < target_bytes:
+        assert time.time() - start <= time_limit, (
+            "It's taken more than {s}s to push {b} bytes through cdc_raw; {stats}".format(
+                s=time_limit, b=target_bytes, stats=follower.format_stats()))
+        rate_limited_debug('  loaded {r} rows, {f} rejected; {stats}'.format(
+            r=rows_loaded, f=rows_rejected, stats=follower.format_stats()))
+        batch_results = list(execute_concurrent(session, ((prepared, ()) for _ in range(1000)),
+                                                concurrency=500, raise_on_first_error=False))
+        rows_loaded += len([br for br in batch_results if br[0]])
+        assert ([] == [result for (success, result) in batch_results
+                       if not success and not isinstance(result, WriteFailure)])
+        rows_rejected += len([br for br in batch_results if not br[0]])
+    return rows_loaded, rows_rejected, time.time() - start
+
+
 _TableInfoNamedtuple = namedtuple('TableInfoNamedtuple', [
     # required
     'ks_name', 'table_name', 'column_spec',
@@ -523,6 +549,90 @@ class TestCDC(Tester):
                 self._fail_and_print_sets(before_cdc_state, after_cdc_state,
                                           'Found orphaned index file in after CDC state not in former.')
 
+    @since('4.0')
+    def test_cdc_consumer_relieves_back_pressure(self):
+        """
+        Test that a CDC consumer deleting the segments it has read from cdc_raw frees the
+        space cdc_total_space_in_mb limits, so that sustained writes to a CDC table go
+        through while many times that space flows through cdc_raw, and that writes are
+        rejected again once the consumer stops.
+        """
+        ks_name = 'ks'
+        cdc_table_info = TableInfo(
+            ks_name=ks_name, table_name='cdc_tab',
+            column_spec=_16_uuid_column_spec,
+            insert_stmt=_get_16_uuid_insert_stmt(ks_name, 'cdc_tab'),
+            options={'cdc': 'true'}
+        )
+        node, session = self.prepare(
+            ks_name=ks_name,
+            configuration_overrides={'cdc_total_space_in_mb': 4,
+                                     'cdc_free_space_check_interval_ms': 100}
+        )
+        session.execute(cdc_table_info.create_stmt)
+
+        cdc_total_space = 4 * 1024 * 1024
+        with CDCFollower(os.path.join(node.get_path(), 'cdc_raw'), delete_consumed=True) as follower:
+            rows_loaded, rows_rejected, seconds = _write_through_cdc_consumer(
+                session, cdc_table_info.insert_stmt, follower, target_bytes=3 * cdc_total_space)
+            follower.wait_until_consumed(timeout=60, completed_only=True)
+        logger.debug('{r} rows written, {f} rejected in {s:.2f}s; {stats}'.format(
+            r=rows_loaded, f=rows_rejected, s=seconds, stats=follower.format_stats()))
+
+        stats = follower.stats()
+        assert stats['consumed_bytes'] >= 3 * cdc_total_space
+        # segments are 2MB, so more than 2 of them went through the 4MB of cdc_raw
+        assert stats['deleted_segments'] > 2
+        # with a consumer freeing cdc_raw, most writes succeed; some are still rejected while it catches up
+        assert rows_loaded > rows_rejected
+
+        # without a consumer, cdc_raw fills up again
+        assert 0 < _write_to_cdc_write_failure(session, cdc_table_info.insert_stmt)
+
+    @since('4.0')
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('consume_rate', [None, 4 * 1024 * 1024, 1024 * 1024])
+    def test_cdc_back_pressure_benchmark(self, consume_rate):
+        """
+        Measure the write throughput to a CDC table, and the writes rejected by
+        cdc_total_space_in_mb back-pressure, while a simulated consumer reads cdc_raw at
+        consume_rate bytes per second (as fast as segments are synced if None) and deletes
+        the segments it has read, for 64MB of CDC data.
+        """
+        ks_name = 'ks'
+        cdc_table_info = TableInfo(
+            ks_name=ks_name, table_name='cdc_tab',
+            column_spec=_16_uuid_column_spec,
+            insert_stmt=_get_16_uuid_insert_stmt(ks_name, 'cdc_tab'),
+            options={'cdc': 'true'}
+        )
+        node, session = self.prepare(
+            ks_name=ks_name,
+            configuration_overrides={'cdc_total_space_in_mb': 16,
+                                     'cdc_free_space_check_interval_ms': 100}
+        )
+        session.execute(cdc_table_info.create_stmt)
+
+        with CDCFollower(os.path.join(node.get_path(), 'cdc_raw'), consume_rate=consume_rate,
+                         delete_consumed=True) as follower:
+            rows_loaded, rows_rejected, seconds = _write_through_cdc_consumer(
+                session, cdc_table_info.insert_stmt, follower, target_bytes=64 * 1024 * 1024, time_limit=1200)
+        stats = follower.stats()
+        logger.info('{r} rows written, {f} rejected in {s:.2f}s; {stats}'.format(
+            r=rows_loaded, f=rows_rejected, s=seconds, stats=follower.format_stats()))
+
+        metrics = {'rows_per_second': rows_loaded / seconds,
+                   'rejected_rows': rows_rejected,
+                   'consumed_bytes_per_second': stats['consumed_bytes_per_second'],
+                   'max_lag_bytes': stats['max_lag_bytes'],
+                   'max_lag_seconds': stats['max_lag_seconds']}
+        regressions = record_benchmark(self.dtest_config, 'cdc_back_pressure',
+                                       {'consume_rate': consume_rate, 'cdc_total_space_in_mb': 16},
+                                       metrics, version=self.cluster.version(),
+                                       higher_is_better=('rows_per_second',),
+                                       lower_is_better=('rejected_rows', 'max_lag_seconds'))
+        assert not regressions, 'CDC back-pressure benchmark regressed against baseline:\n' + '\n'.join(regressions)
+
     def _fail_and_print_sets(self, rd_one, rd_two, msg):
         print('Set One:')
         for idx in rd_one:
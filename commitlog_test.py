@@ -1,8 +1,6 @@
-import binascii
 import glob
 import os
 import stat
-import struct
 import time
 from distutils.version import LooseVersion
 import pytest
@@ -16,6 +14,7 @@ from parse import parse
 
 from dtest import Tester, create_ks
 from tools.assertions import (assert_almost_equal, assert_none, assert_one, assert_lists_equal_ignoring_order)
+from tools.commitlog import CommitLogSegment, segment_files
 from tools.data import rows_to_list
 
 since = pytest.mark.since
@@ -473,30 +472,28 @@ class TestCommitLog(Tester):
             sstables = len([f for f in os.listdir(os.path.join(ks_dir, db_dir)) if f.endswith('.db')])
             assert sstables == 0
 
-        # modify the commit log crc values
+        # the inserts are in the commit log, intact
         cl_dir = os.path.join(path, 'commitlogs')
-        assert len(os.listdir(cl_dir)) > 0
-        for cl in os.listdir(cl_dir):
-            # locate the CRC location
-            with open(os.path.join(cl_dir, cl), 'rb') as f:
-                f.seek(0)
-                version = struct.unpack('>i', f.read(4))[0]
-                crc_pos = 12
-                if version >= 5:
-                    f.seek(crc_pos)
-                    psize = struct.unpack('>h', f.read(2))[0] & 0xFFFF
-                    crc_pos += 2 + psize
-
-            # rewrite it with crap
-            with open(os.path.join(cl_dir, cl), 'wb') as f:
-                f.seek(crc_pos)
-                f.write(struct.pack('>i', 123456))
+        segments = segment_files(cl_dir)
+        assert len(segments) > 0
+        summaries = []
+        for cl in segments:
+            with CommitLogSegment(cl) as segment:
+                summaries.append(segment.summary())
+        logger.debug("Commit log segments: {}".format(summaries))
+        assert all(summary['header_crc_valid'] for summary in summaries)
+        assert sum(summary['entries'] for summary in summaries) >= 10
+        assert sum(summary['invalid_entries'] for summary in summaries) == 0
+
+        # modify the commit log crc values
+        for cl in segments:
+            with CommitLogSegment(cl, writable=True) as segment:
+                segment.write_header_crc(123456)
 
             # verify said crap
-            with open(os.path.join(cl_dir, cl), 'rb') as f:
-                f.seek(crc_pos)
-                crc = struct.unpack('>i', f.read(4))[0]
-                assert crc == 123456
+            with CommitLogSegment(cl) as segment:
+                assert segment.descriptor.crc == 123456
+                assert not segment.descriptor.crc_valid
 
         mark = node.mark_log()
         node.start()
@@ -547,78 +544,30 @@ class TestCommitLog(Tester):
             sstables = sstables + len([f for f in os.listdir(os.path.join(ks_dir, db_dir)) if f.endswith('.db')])
         assert sstables == 0
 
-        def get_header_crc(header):
-            """
-            When calculating the header crc, C* splits up the 8b id, first adding the 4 least significant
-            bytes to the crc, then the 5 most significant bytes, so this splits them and calculates the same way
-            """
-            new_header = bytearray(header[:4])
-            # C* evaluates most and least significant 4 bytes out of order
-            new_header.extend(header[8:12])
-            new_header.extend(header[4:8])
-            # C* evaluates the short parameter length as an int
-            new_header.extend(b'\x00\x00')
-            new_header.extend(header[12:14])  # the
-            new_header.extend(header[14:])
-
-            # https://docs.python.org/2/library/binascii.html
-            # "Changed in version 2.6: The return value is in the range [-2**31, 2**31-1] regardless
-            # of platform. In the past the value would be signed on some platforms and unsigned on
-            # others. Use & 0xffffffff on the value if you want it to match Python 3 behavior."
-            return binascii.crc32(new_header) & 0xffffffff
-
         # modify the compression parameters to look for a compressor that isn't there
         # while this scenario is pretty unlikely, if a jar or lib got moved or something,
         # you'd have a similar situation, which would be fixable by the user
         path = node.get_path()
         cl_dir = os.path.join(path, 'commitlogs')
-        assert len(os.listdir(cl_dir)) > 0
-        for cl in os.listdir(cl_dir):
-            # read the header and find the crc location
-            with open(os.path.join(cl_dir, cl), 'rb') as f:
-                f.seek(0)
-                crc_pos = 12
-                f.seek(crc_pos)
-                psize = struct.unpack('>h', f.read(2))[0] & 0xFFFF
-                crc_pos += 2 + psize
-
-                header_length = crc_pos
-                f.seek(crc_pos)
-                crc = struct.unpack('>i', f.read(4))[0]
-
-                # check that we're going this right
-                f.seek(0)
-                header_bytes = f.read(header_length)
-
-                # https://docs.python.org/2/library/binascii.html
-                # "Changed in version 2.6: The return value is in the range [-2**31, 2**31-1] regardless
-                # of platform. In the past the value would be signed on some platforms and unsigned on
-                # others. Use & 0xffffffff on the value if you want it to match Python 3 behavior."
-                assert get_header_crc(header_bytes) == (crc & 0xffffffff)
-
-            # rewrite it with imaginary compressor
-            assert 'LZ4Compressor'.encode("ascii") in header_bytes
-            header_bytes = header_bytes.replace('LZ4Compressor'.encode("ascii"), 'LZ5Compressor'.encode("ascii"))
-            assert 'LZ4Compressor'.encode("ascii") not in header_bytes
-            assert 'LZ5Compressor'.encode("ascii") in header_bytes
-            with open(os.path.join(cl_dir, cl), 'wb') as f:
-                f.seek(0)
-                f.write(header_bytes)
-                f.seek(crc_pos)
-                f.write(struct.pack('>I', get_header_crc(header_bytes)))
+        segments = segment_files(cl_dir)
+        assert len(segments) > 0
+        for cl in segments:
+            with CommitLogSegment(cl, writable=True) as segment:
+                # check that we're reading this right
+                descriptor = segment.descriptor
+                assert descriptor.crc_valid
+                assert descriptor.compression.endswith('LZ4Compressor')
+                with open(cl, 'rb') as f:
+                    f.seek(descriptor.params_offset)
+                    params = f.read(descriptor.params_length)
+
+                # rewrite it with imaginary compressor
+                segment.replace_header_params(params.replace(b'LZ4Compressor', b'LZ5Compressor'))
 
             # verify we wrote everything correctly
-            with open(os.path.join(cl_dir, cl), 'rb') as f:
-                f.seek(0)
-                assert f.read(header_length) == header_bytes
-                f.seek(crc_pos)
-                crc = struct.unpack('>i', f.read(4))[0]
-
-                # https://docs.python.org/2/library/binascii.html
-                # "Changed in version 2.6: The return value is in the range [-2**31, 2**31-1] regardless
-                # of platform. In the past the value would be signed on some platforms and unsigned on
-                # others. Use & 0xffffffff on the value if you want it to match Python 3 behavior."
-                assert (crc & 0xffffffff)  == get_header_crc(header_bytes)
+            with CommitLogSegment(cl) as segment:
+                assert segment.descriptor.crc_valid
+                assert segment.descriptor.compression.endswith('LZ5Compressor')
 
         mark = node.mark_log()
         node.start()
@@ -2,7 +2,6 @@ import os
 import random
 import re
 import string
-import tempfile
 import time
 from distutils.version import LooseVersion
 import pytest
@@ -11,6 +10,8 @@ import logging
 
 from dtest import Tester, create_ks
 from tools.assertions import assert_length_equal, assert_none, assert_one
+from tools.compaction_log import analyze_node_compaction_log
+from tools.sstable_json import dump_partitions
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -52,17 +53,10 @@ class TestCompaction(Tester):
         for x in range(0, 10):
             assert_none(session, 'select * from cf where key = ' + str(x))
 
-        json_path = tempfile.mkstemp(suffix='.json')
-        jname = json_path[1]
-        with open(jname, 'w') as f:
-            node1.run_sstable2json(f)
+        deleted = [partition.key for partition, _ in dump_partitions(node1, 'ks', 'cf', tombstones_only=True)
+                   if partition.deletion_info is not None]
 
-        with open(jname, 'r') as g:
-            jsoninfo = g.read()
-
-        numfound = jsoninfo.count("markedForDeleteAt")
-
-        assert numfound == 10
+        assert len(deleted) == 10
 
     def test_data_size(self):
         """
@@ -566,6 +560,53 @@ class TestCompaction(Tester):
         assert 5 * len(node1.data_directories()) == int(m.group(1))
         assert 25 * len(node1.data_directories()) == int(m.group(2))
 
+    @pytest.mark.parametrize("strategy", ['LeveledCompactionStrategy', 'SizeTieredCompactionStrategy'])
+    @since('3.10')
+    def test_compaction_log_efficiency(self, strategy):
+        """
+        Write a table in 10 flushes of distinct keys with log_all enabled and check its
+        compaction log: every flush is logged, compactions never write more than they read,
+        the write amplification stays within the strategy's bound and the live sstables and,
+        for LCS, their levels match the ones of the node.
+        """
+        cluster = self.cluster
+        cluster.populate(1).start(wait_for_binary_proto=True)
+        [node1] = cluster.nodelist()
+
+        stress_write(node1, keycount=1)
+        session = self.patient_cql_connection(node1)
+        options = "'sstable_size_in_mb': 1" if strategy == 'LeveledCompactionStrategy' else "'min_threshold': 4"
+        session.execute("ALTER TABLE keyspace1.standard1 WITH compaction = "
+                        "{{'class': '{}', 'log_all': 'true', {}}};".format(strategy, options))
+
+        flushes = 10
+        keys_per_flush = 20000
+        for i in range(flushes):
+            node1.stress(['write', 'n={}'.format(keys_per_flush), 'no-warmup',
+                          '-pop', 'seq={}..{}'.format(i * keys_per_flush + 1, (i + 1) * keys_per_flush)])
+            node1.nodetool('flush keyspace1 standard1')
+        node1.wait_for_compactions()
+
+        analyzer = analyze_node_compaction_log(node1)
+        logger.debug(analyzer.format_summary())
+        stats = analyzer.table('keyspace1', 'standard1')
+        assert stats.flushes >= flushes
+        assert stats.compactions > 0 and stats.throughput > 0
+        assert len(stats.sstables) == len(node1.get_sstables('keyspace1', 'standard1'))
+
+        if strategy == 'LeveledCompactionStrategy':
+            levels = stats.level_distribution()
+            # [0, 10/10, 18, 0, 0, 0, 0, 0, 0]
+            output = grep_sstables_in_each_level(node1, 'standard1')
+            counts = [int(count.split('/')[0]) for count in output.strip('[]').split(', ')]
+            assert {level: count for level, count in enumerate(counts) if count} == levels
+            # each byte is rewritten about fanout times in every level it goes through
+            max_amplification = 1 + max(levels) * 11
+        else:
+            # each byte is rewritten once in every tier it goes through, at most log4(10) rounded up
+            max_amplification = 3
+        assert 1 < stats.write_amplification <= max_amplification
+
     def skip_if_no_major_compaction(self, strategy):
         if self.cluster.version() < '2.2' and strategy == 'LeveledCompactionStrategy':
             pytest.skip(msg='major compaction not implemented for LCS in this version of Cassandra')
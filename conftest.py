@@ -7,6 +7,7 @@ import re
 import platform
 import copy
 import inspect
+import json
 import subprocess
 from itertools import zip_longest
 
@@ -23,6 +24,9 @@ from ccmlib.common import validate_install_dir, get_version_from_build, is_win
 
 from dtest_setup import DTestSetup
 from dtest_setup_overrides import DTestSetupOverrides
+from tools.compaction_log import summarize_cluster_compaction_logs
+from tools.gc_log import summarize_cluster_gc_logs
+from tools.node_footprint import NodeFootprintSampler
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +46,13 @@ class DTestConfig:
         self.disable_active_log_watching = False
         self.keep_test_dir = False
         self.enable_jacoco_code_coverage = False
+        self.execute_benchmarks = False
+        self.benchmark_results = None
+        self.benchmark_baseline = None
+        self.benchmark_tolerance = 0.2
+        self.upgrade_artifact_cache = None
+        self.max_gc_pause_ms = None
+        self.footprint_interval = 1.0
         self.jemalloc_path = find_libjemalloc()
 
     def setup(self, request):
@@ -59,6 +70,14 @@ class DTestConfig:
         self.disable_active_log_watching = request.config.getoption("--disable-active-log-watching")
         self.keep_test_dir = request.config.getoption("--keep-test-dir")
         self.enable_jacoco_code_coverage = request.config.getoption("--enable-jacoco-code-coverage")
+        self.execute_benchmarks = request.config.getoption("--execute-benchmarks")
+        self.benchmark_results = request.config.getoption("--benchmark-results")
+        self.benchmark_baseline = request.config.getoption("--benchmark-baseline")
+        self.benchmark_tolerance = float(request.config.getoption("--benchmark-tolerance"))
+        self.upgrade_artifact_cache = request.config.getoption("--upgrade-artifact-cache")
+        if request.config.getoption("--max-gc-pause-ms") is not None:
+            self.max_gc_pause_ms = float(request.config.getoption("--max-gc-pause-ms"))
+        self.footprint_interval = float(request.config.getoption("--footprint-interval"))
 
 
 def check_required_loopback_interfaces_available():
@@ -111,6 +130,26 @@ def pytest_addoption(parser):
                           "after the test completes")
     parser.addoption("--enable-jacoco-code-coverage", action="store_true", default=False,
                      help="Enable JaCoCo Code Coverage Support")
+    parser.addoption("--execute-benchmarks", action="store_true", default=False,
+                     help="Execute benchmark tests (e.g. tests annotated with the benchmark mark)")
+    parser.addoption("--benchmark-results", action="store", default=os.path.join("logs", "benchmark_results.jsonl"),
+                     help="File benchmark tests append their measurements to, one JSON object per line. "
+                          "Defaults to benchmark_results.jsonl in the directory test logs are saved to")
+    parser.addoption("--benchmark-baseline", action="store", default=None,
+                     help="Results file of an earlier benchmark run. Benchmark tests fail if a measurement "
+                          "is worse than its baseline by more than --benchmark-tolerance")
+    parser.addoption("--benchmark-tolerance", action="store", default=0.2,
+                     help="Fraction by which a benchmark measurement may be worse than its baseline "
+                          "before it is reported as a regression")
+    parser.addoption("--upgrade-artifact-cache", action="store", default=None,
+                     help="Directory of prebuilt C* versions (see run_dtests.py --dtest-prebuild-upgrade-versions). "
+                          "Upgrade tests install versions from it only, instead of having ccm fetch and build them")
+    parser.addoption("--max-gc-pause-ms", action="store", default=None,
+                     help="Fail the tests marked gc_pause_budget if a node's GC log has a pause longer than this "
+                          "many milliseconds")
+    parser.addoption("--footprint-interval", action="store", default=1.0,
+                     help="Seconds between samples of the RSS, CPU time, open fds, threads and disk IO of the "
+                          "nodes' JVMs, summarized in the junit report of every test. 0 disables the sampling")
 
 
 def sufficient_system_resources_for_resource_intensive_tests():
@@ -295,6 +334,61 @@ def copy_logs(request, cluster, directory=None, name=None):
             os.symlink(basedir, name)
 
 
+def record_compaction_summary(request, cluster):
+    """Attach the summary of the nodes' compaction logs to the junit report, if any node wrote one"""
+    try:
+        summaries = summarize_cluster_compaction_logs(cluster)
+    except Exception as e:
+        logger.warning("Error reading compaction logs: {}".format(e))
+        return
+    if summaries:
+        logger.info("Compaction summary: {}".format(json.dumps(summaries, sort_keys=True)))
+        request.node.user_properties.append(('compaction_summary', json.dumps(summaries, sort_keys=True)))
+
+
+def record_gc_summary(request, cluster):
+    """
+    Attach the pauses and allocation rates of the nodes' GC logs to the junit report
+    @return dict of node name to the summary of its GC logs, see summarize_cluster_gc_logs()
+    """
+    try:
+        summaries = summarize_cluster_gc_logs(cluster)
+    except Exception as e:
+        logger.warning("Error reading GC logs: {}".format(e))
+        return {}
+    if summaries:
+        logger.info("GC summary: {}".format(json.dumps(summaries, sort_keys=True)))
+        request.node.user_properties.append(('gc_summary', json.dumps(summaries, sort_keys=True)))
+    return summaries
+
+
+def check_gc_pause_budget(request, dtest_config, gc_summaries):
+    """
+    Check the longest GC pause of every node against --max-gc-pause-ms, for the tests marked
+    gc_pause_budget
+    @return A list of the nodes over budget, empty if none are or the test isn't checked
+    """
+    if dtest_config.max_gc_pause_ms is None or not request.node.get_marker('gc_pause_budget'):
+        return []
+    return ["{} paused for {:.1f}ms".format(node, summary['max_pause_ms'])
+            for node, summary in sorted(gc_summaries.items())
+            if summary['max_pause_ms'] > dtest_config.max_gc_pause_ms]
+
+
+def record_footprint_summary(request, sampler):
+    """Stop sampling the nodes' processes and attach the summary of their footprint to the junit report"""
+    if sampler is None:
+        return
+    try:
+        summaries = sampler.stop().summary()
+    except Exception as e:
+        logger.warning("Error sampling node footprints: {}".format(e))
+        return
+    if summaries:
+        logger.info("Node footprint summary: {}".format(json.dumps(summaries, sort_keys=True)))
+        request.node.user_properties.append(('footprint_summary', json.dumps(summaries, sort_keys=True)))
+
+
 def reset_environment_vars(initial_environment):
     pytest_current_test = os.environ.get('PYTEST_CURRENT_TEST')
     os.environ.clear()
@@ -319,6 +413,11 @@ def fixture_dtest_setup(request, parse_dtest_config, fixture_dtest_setup_overrid
     if not parse_dtest_config.disable_active_log_watching:
         dtest_setup.log_watch_thread = dtest_setup.begin_active_log_watch()
 
+    if parse_dtest_config.footprint_interval > 0:
+        # the test may replace its cluster, see DTestSetup.cleanup_and_replace_cluster
+        dtest_setup.footprint_sampler = NodeFootprintSampler(lambda: dtest_setup.cluster,
+                                                             interval=parse_dtest_config.footprint_interval).start()
+
     # at this point we're done with our setup operations in this fixture
     # yield to allow the actual test to run
     yield dtest_setup
@@ -332,8 +431,10 @@ def fixture_dtest_setup(request, parse_dtest_config, fixture_dtest_setup_overrid
     for con in dtest_setup.connections:
         con.cluster.shutdown()
     dtest_setup.connections = []
+    dtest_setup.cqlsh_sessions.close()
 
     failed = False
+    gc_pause_errors = []
     try:
         if not dtest_setup.allow_log_errors:
             errors = check_logs_for_errors(dtest_setup)
@@ -342,15 +443,23 @@ def fixture_dtest_setup(request, parse_dtest_config, fixture_dtest_setup_overrid
                 pytest.fail(msg='Unexpected error found in node logs (see stdout for full details). Errors: [{errors}]'
                                      .format(errors=str.join(", ", errors)), pytrace=False)
     finally:
+        record_footprint_summary(request, dtest_setup.footprint_sampler)
+        record_compaction_summary(request, dtest_setup.cluster)
+        gc_pause_errors = check_gc_pause_budget(request, parse_dtest_config,
+                                                record_gc_summary(request, dtest_setup.cluster))
         try:
             # save the logs for inspection
-            if failed or not parse_dtest_config.delete_logs:
+            if failed or gc_pause_errors or not parse_dtest_config.delete_logs:
                 copy_logs(request, dtest_setup.cluster)
         except Exception as e:
             logger.error("Error saving log:", str(e))
         finally:
             dtest_setup.cleanup_cluster()
 
+    if gc_pause_errors:
+        pytest.fail(msg='GC pauses over the budget of {}ms: [{}]'.format(
+            parse_dtest_config.max_gc_pause_ms, ", ".join(gc_pause_errors)), pytrace=False)
+
 
 #Based on https://bugs.python.org/file25808/14894.patch
 def loose_version_compare(a, b):
@@ -481,6 +590,12 @@ def pytest_collection_modifyitems(items, config):
             if not config.getoption("--execute-upgrade-tests"):
                 deselect_test = True
 
+        if item.get_marker("benchmark"):
+            if not config.getoption("--execute-benchmarks"):
+                deselect_test = True
+                logger.info("SKIP: Deselecting benchmark test %s. To run this test, re-run with the "
+                            "--execute-benchmarks command line argument" % item.name)
+
         # todo kjkj: deal with no_offheap_memtables mark
 
         if deselect_test:
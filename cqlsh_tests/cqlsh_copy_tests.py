@@ -17,24 +17,30 @@ from functools import partial
 from tempfile import NamedTemporaryFile, gettempdir, template
 from uuid import uuid1, uuid4
 
-from cassandra.cluster import ConsistencyLevel, SimpleStatement
+from cassandra.cluster import ConsistencyLevel
 from cassandra.concurrent import execute_concurrent_with_args
 from cassandra.cqltypes import EMPTY
 from cassandra.murmur3 import murmur3
 from cassandra.util import SortedSet
 from ccmlib.common import is_win
 
-from .cqlsh_tools import (DummyColorMap, assert_csvs_items_equal, csv_rows,
-                         monkeypatch_driver, random_list, unmonkeypatch_driver,
-                         write_rows_to_csv)
+from .cqlsh_tools import (CopyCsvDialect, CopyMeasurement, DummyColorMap, assert_csvs_items_equal,
+                          count_csv_rows, csv_rows, monkeypatch_driver, random_list, unmonkeypatch_driver,
+                          write_rows_to_csv)
 from dtest import (Tester, create_ks)
+from tools.benchmark import ProcessTreeSampler, record_benchmark
+from tools.cqlsh_session import supports_cqlsh_sessions
+from tools.csvgen import CsvGenerator
 from tools.data import rows_to_list
+from tools.scanner import count_rows
 from tools.metadata_wrapper import (UpdatingClusterMetadataWrapper,
                                     UpdatingTableMetadataWrapper)
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
 
+CqlshOutput = namedtuple('CqlshOutput', ('stdout', 'stderr'))
+
 PARTITIONERS = {
     "murmur3": "org.apache.cassandra.dht.Murmur3Partitioner",
     "random": "org.apache.cassandra.dht.RandomPartitioner",
@@ -42,6 +48,31 @@ PARTITIONERS = {
     "order": "org.apache.cassandra.dht.OrderPreservingPartitioner"
 }
 
+# COPY FROM options of the benchmark's reference point; COPY TO only takes NUMPROCESSES
+COPY_BENCHMARK_OPTIONS = {'NUMPROCESSES': 4, 'CHUNKSIZE': 5000, 'MAXBATCHSIZE': 20,
+                          'INGESTRATE': 100000, 'PREPAREDSTATEMENTS': True}
+COPY_BENCHMARK_SWEEPS = [('NUMPROCESSES', [1, 2, 8]), ('CHUNKSIZE', [1000, 20000]), ('MAXBATCHSIZE', [5, 50]),
+                         ('INGESTRATE', [20000]), ('PREPAREDSTATEMENTS', [False])]
+
+
+def copy_benchmark_scenarios():
+    """
+    Returns (nodes, partitioner, options) tuples for the COPY benchmark: the reference
+    point (3 nodes, murmur3, COPY_BENCHMARK_OPTIONS), then each COPY option, node count
+    and partitioner varied on its own.
+    """
+    scenarios = [(3, 'murmur3', {})]
+    for option, values in COPY_BENCHMARK_SWEEPS:
+        scenarios.extend((3, 'murmur3', {option: value}) for value in values)
+    scenarios.extend([(1, 'murmur3', {}), (5, 'murmur3', {}), (3, 'random', {})])
+    return scenarios
+
+
+def copy_benchmark_id(scenario):
+    nodes, partitioner, options = scenario
+    labels = ['{}={}'.format(option.lower(), value) for option, value in sorted(options.items())]
+    return '-'.join(['{}nodes'.format(nodes), partitioner] + labels)
+
 
 class UTC(datetime.tzinfo):
     """
@@ -161,7 +192,11 @@ class TestCqlshCopy(Tester):
                   auth_enabled=False, show_output=True, retry_on_request_timeout=True):
         """
         Run cqlsh on node1 adding the debug and cqlshrc to the clqsh options, unless the caller
-        has specified its own options.
+        has specified its own options, and return its (stdout, stderr). The commands go through
+        the test's pooled interactive cqlsh session for these options, see tools.cqlsh_session,
+        unless cqlsh runs a --file. There is no exit status: cqlsh only fails on a statement
+        error with --file or --execute, which still run in a process of their own and raise
+        ToolError then.
         """
         if cqlsh_options is None:
             cqlsh_options = []
@@ -176,17 +211,24 @@ class TestCqlshCopy(Tester):
             cqlsh_options.append('--username=cassandra')
             cqlsh_options.append('--password=cassandra')
 
+        def run():
+            if supports_cqlsh_sessions() and not any(option.startswith(('--file', '-f')) for option in cqlsh_options):
+                # large imports and exports run for much longer than the session's default timeout
+                return CqlshOutput(*self.cqlsh_sessions.run(self.node1, cmds, cqlsh_options, timeout=3600))
+            ret = self.node1.run_cqlsh(cmds=cmds, cqlsh_options=cqlsh_options)
+            return CqlshOutput(ret.stdout, ret.stderr)
+
         if retry_on_request_timeout:
             num_attempts = 0
             while num_attempts < 5:
-                ret = self.node1.run_cqlsh(cmds=cmds, cqlsh_options=cqlsh_options)
+                ret = run()
 
                 if not re.search(r"Client request timeout", ret[0]):
                     break
 
                 num_attempts += 1
         else:
-            ret = self.node1.run_cqlsh(cmds=cmds, cqlsh_options=cqlsh_options)
+            ret = run()
 
         if show_output:
             logger.debug('Output:\n{}'.format(ret[0]))  # show stdout of copy cmd
@@ -626,7 +668,7 @@ class TestCqlshCopy(Tester):
         if indicator:
             cmds += " WITH NULL = '{d}'".format(d=indicator)
         logger.debug(cmds)
-        out, _, _ = self.run_cqlsh(cmds=cmds)
+        out, _ = self.run_cqlsh(cmds=cmds)
         logger.debug(out)
 
         results = list(self.session.execute("SELECT * FROM ks.testnullindicator"))
@@ -707,7 +749,7 @@ class TestCqlshCopy(Tester):
 
         logger.debug('Importing from csv file: {name}'.format(name=tempfile.name))
         cmds = "COPY ks.testnullvalsincollections FROM '{name}'".format(name=tempfile.name)
-        out, err, _ = self.run_cqlsh(cmds=cmds)
+        out, err = self.run_cqlsh(cmds=cmds)
         logger.debug(out)
         logger.debug(err)
         assert "ParseError - Failed to parse [1,,3] : Empty values are not allowed" in err
@@ -1016,8 +1058,8 @@ class TestCqlshCopy(Tester):
         def do_test(skip_cols, expected_results):
             self.session.execute('TRUNCATE ks.testskipcols')
             logger.debug("Importing csv file {} with skipcols '{}'".format(tempfile, skip_cols))
-            out, err, _ = self.run_cqlsh(cmds="COPY ks.testskipcols FROM '{}' WITH SKIPCOLS = '{}'"
-                                         .format(tempfile.name, skip_cols))
+            out, err = self.run_cqlsh(cmds="COPY ks.testskipcols FROM '{}' WITH SKIPCOLS = '{}'"
+                                      .format(tempfile.name, skip_cols))
             logger.debug(out)
             assert expected_results == rows_to_list(self.session.execute("SELECT * FROM ks.testskipcols"))
 
@@ -1064,8 +1106,8 @@ class TestCqlshCopy(Tester):
 
         def do_test(skip_cols, expected_results):
             logger.debug("Importing csv file {} with skipcols '{}'".format(tempfile, skip_cols))
-            out, err, _ = self.run_cqlsh(cmds="COPY ks.testskipcols FROM '{}' WITH SKIPCOLS = '{}'"
-                                         .format(tempfile.name, skip_cols))
+            out, err = self.run_cqlsh(cmds="COPY ks.testskipcols FROM '{}' WITH SKIPCOLS = '{}'"
+                                      .format(tempfile.name, skip_cols))
             logger.debug(out)
             assert expected_results == rows_to_list(self.session.execute("SELECT * FROM ks.testskipcols"))
 
@@ -1113,7 +1155,7 @@ class TestCqlshCopy(Tester):
             cmds += "WITH ENDTOKEN = '{}'".format(end_token)
 
         logger.debug(cmds)
-        out, err, _ = self.run_cqlsh(cmds=cmds)
+        out, err = self.run_cqlsh(cmds=cmds)
         logger.debug(err)
         logger.debug(out)
 
@@ -1166,8 +1208,8 @@ class TestCqlshCopy(Tester):
                     writer.writerow({'a': i, 'b': 0, 'c': 2.0})  # valid
 
         logger.debug("Importing csv file {} with {} max parse errors".format(tempfile.name, max_parse_errors))
-        out, err, _ = self.run_cqlsh(cmds="COPY ks.testmaxparseerrors FROM '{}' WITH MAXPARSEERRORS='{}'"
-                                     .format(tempfile.name, max_parse_errors))
+        out, err = self.run_cqlsh(cmds="COPY ks.testmaxparseerrors FROM '{}' WITH MAXPARSEERRORS='{}'"
+                                  .format(tempfile.name, max_parse_errors))
 
         assert 'Exceeded maximum number of parse errors {}'.format(max_parse_errors) in err
         num_rows_imported = rows_to_list(self.session.execute("SELECT COUNT(*) FROM ks.testmaxparseerrors"))[0][0]
@@ -1217,9 +1259,9 @@ class TestCqlshCopy(Tester):
             logger.debug("Importing csv file {} with {} max insert errors and chunk size {}"
                   .format(tempfile.name, max_insert_errors, chunk_size))
             # Note: we use one attempt because each attempt counts as a failure
-            out, err, _ = self.run_cqlsh(cmds="COPY ks.testmaxinserterrors FROM '{}' WITH MAXINSERTERRORS='{}' "
-                                         "AND CHUNKSIZE='{}' AND MAXATTEMPTS='1'"
-                                         .format(tempfile.name, max_insert_errors, chunk_size))
+            out, err = self.run_cqlsh(cmds="COPY ks.testmaxinserterrors FROM '{}' WITH MAXINSERTERRORS='{}' "
+                                      "AND CHUNKSIZE='{}' AND MAXATTEMPTS='1'"
+                                      .format(tempfile.name, max_insert_errors, chunk_size))
 
             num_rows_imported = rows_to_list(self.session.execute("SELECT COUNT(*) FROM ks.testmaxinserterrors"))[0][0]
             logger.debug("Imported {}".format(num_rows_imported))
@@ -1476,7 +1518,7 @@ class TestCqlshCopy(Tester):
         self.run_cqlsh("COPY ks.testorder (a, c, b) TO '{name}'".format(name=tempfile.name))
 
         reference_file = self.get_temp_file()
-        with open(reference_file.name, 'wb') as csvfile:
+        with open(reference_file.name, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile)
             for a, b, c in data:
                 writer.writerow([a, c, b])
@@ -1513,7 +1555,7 @@ class TestCqlshCopy(Tester):
 
         results = list(self.session.execute("SELECT * FROM testorder"))
         reference_file = self.get_temp_file()
-        with open(reference_file.name, 'wb') as csvfile:
+        with open(reference_file.name, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile)
             for a, b, c in data:
                 writer.writerow([a, c, b])
@@ -1668,7 +1710,7 @@ class TestCqlshCopy(Tester):
             cmd = """COPY ks.testvalidate (a, b, c) FROM '{name}'""".format(name=tempfile.name)
             # We want to assert that there is no error when we don't expect one but cqlsh prints
             # some debug messages to stderr, hence we must turn debug off
-            out, err, _ = self.run_cqlsh(cmd, use_debug=False)
+            out, err = self.run_cqlsh(cmd, use_debug=False)
             results = list(self.session.execute("SELECT * FROM testvalidate"))
 
             if expected_err:
@@ -1704,7 +1746,7 @@ class TestCqlshCopy(Tester):
         write_rows_to_csv(tempfile.name, [[1, 1, 1]])
 
         cmd = """COPY ks.testwrongcolumns (a, b, d) FROM '{}'""".format(tempfile.name)
-        out, err, _ = self.run_cqlsh(cmd)
+        out, err = self.run_cqlsh(cmd)
         logger.debug(out)
         logger.debug(err)
         results = list(self.session.execute("SELECT * FROM testwrongcolumns"))
@@ -1819,6 +1861,25 @@ class TestCqlshCopy(Tester):
         _test(True)
         _test(False)
 
+    def test_bulk_import_generated_all_datatypes(self):
+        """
+        Test importing CSV files generated directly from the table metadata into a table
+        containing all CQL datatypes by:
+
+        - creating a table containing every datatype,
+        - writing 4 CSV shards with 10000 rows in total with tools.csvgen,
+        - COPYing all shards into the table with a single COPY FROM, and
+        - asserting that every row was imported.
+        """
+        self.all_datatypes_prepare()
+
+        generator = CsvGenerator.from_table(self.session, 'ks', 'testdatatype', seed=1, null_fraction=0.1)
+        filenames = generator.write(os.path.join(self.test_path, 'testdatatype'), num_rows=10000, shards=4)
+
+        out, err = self.run_cqlsh(cmds="COPY ks.testdatatype FROM '{}'".format(','.join(filenames)))
+        assert 'Failed to import' not in err
+        assert 10000 == count_rows(self.session, 'ks.testdatatype')
+
     def test_boolstyle_round_trip(self):
         """
         Test that a CSV file with booleans in a different style successfully round-trips
@@ -1836,8 +1897,8 @@ class TestCqlshCopy(Tester):
         """
         def do_round_trip(trueval, falseval, invalid=False):
             logger.debug('Exporting to csv file: {} with bool style {},{}'.format(tempfile.name, trueval, falseval))
-            _, err, _ = self.run_cqlsh(cmds="COPY ks.testbooleans TO '{}' WITH BOOLSTYLE='{}, {}'"
-                                       .format(tempfile.name, trueval, falseval))
+            _, err = self.run_cqlsh(cmds="COPY ks.testbooleans TO '{}' WITH BOOLSTYLE='{}, {}'"
+                                    .format(tempfile.name, trueval, falseval))
             if invalid:
                 expected_err = "Invalid boolean styles [{}, {}]".format(
                     ', '.join(["'{}'".format(s.strip()) for s in trueval.split(',')]),
@@ -2132,16 +2193,16 @@ class TestCqlshCopy(Tester):
 
         tempfile = self.get_temp_file()
         logger.debug('Exporting to csv file: {}'.format(tempfile.name))
-        out, _, _ = self.run_cqlsh(cmds="COPY {} TO '{}' WITH NUMPROCESSES='{}'"
-                                   .format(stress_table, tempfile.name, num_processes))
+        out, _ = self.run_cqlsh(cmds="COPY {} TO '{}' WITH NUMPROCESSES='{}'"
+                                .format(stress_table, tempfile.name, num_processes))
         logger.debug(out)
         assert 'Using {} child processes'.format(num_processes) in out
         assert num_records == len(open(tempfile.name).readlines())
 
         self.session.execute("TRUNCATE {}".format(stress_table))
         logger.debug('Importing from csv file: {}'.format(tempfile.name))
-        out, _, _ = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH NUMPROCESSES='{}'"
-                                   .format(stress_table, tempfile.name, num_processes))
+        out, _ = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH NUMPROCESSES='{}'"
+                                .format(stress_table, tempfile.name, num_processes))
         logger.debug(out)
         assert 'Using {} child processes'.format(num_processes) in out
         assert [[num_records]] == rows_to_list(self.session.execute("SELECT COUNT(* FROM {}"
@@ -2217,7 +2278,7 @@ class TestCqlshCopy(Tester):
             config_file = self.get_temp_file()
             logger.debug('Creating config file {}'.format(config_file.name))
 
-            with open(config_file.name, 'wb') as config:
+            with open(config_file.name, 'w') as config:
                 for line in config_lines:
                     config.write(line + os.linesep)
                 config.close()
@@ -2250,7 +2311,7 @@ class TestCqlshCopy(Tester):
                 cqlsh_options.append('--cqlshrc={}'.format(config_file))
 
             logger.debug('{} with options {}'.format(cmd, cqlsh_options))
-            out, _, _ = self.run_cqlsh(cmds=cmd, cqlsh_options=cqlsh_options, skip_cqlshrc=True)
+            out, _ = self.run_cqlsh(cmds=cmd, cqlsh_options=cqlsh_options, skip_cqlshrc=True)
             logger.debug(out)
             check_options(out, expected_options)
 
@@ -2306,7 +2367,7 @@ class TestCqlshCopy(Tester):
         write_rows_to_csv(tempfile.name, data)
 
         logger.debug('Importing from csv file: {name}'.format(name=tempfile.name))
-        out, err, _ = self.run_cqlsh("COPY ks.testcolumns FROM '{name}'".format(name=tempfile.name))
+        out, err = self.run_cqlsh("COPY ks.testcolumns FROM '{name}'".format(name=tempfile.name))
 
         assert not self.session.execute("SELECT * FROM testcolumns")
         assert 'Failed to import' in err
@@ -2341,7 +2402,7 @@ class TestCqlshCopy(Tester):
 
         tempfile = self.get_temp_file()
         logger.debug('Exporting to csv file: {}'.format(tempfile.name))
-        out, err, _ = self.run_cqlsh(cmds="COPY ks.testcopyto TO '{}'".format(tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY ks.testcopyto TO '{}'".format(tempfile.name))
         logger.debug(out)
 
         # check all records were exported
@@ -2350,7 +2411,7 @@ class TestCqlshCopy(Tester):
         # import the CSV file with COPY FROM
         self.session.execute("TRUNCATE ks.testcopyto")
         logger.debug('Importing from csv file: {}'.format(tempfile.name))
-        out, err, _ = self.run_cqlsh(cmds="COPY ks.testcopyto FROM '{}'".format(tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY ks.testcopyto FROM '{}'".format(tempfile.name))
         logger.debug(out)
 
         new_results = list(self.session.execute("SELECT * FROM testcopyto"))
@@ -2419,23 +2480,25 @@ class TestCqlshCopy(Tester):
                               configuration_options=None,
                               skip_count_checks=False,
                               copy_to_options=None,
-                              copy_from_options=None):
+                              copy_from_options=None,
+                              measurements=None):
         """
         Test exporting a large number of rows into a csv file.
 
-        If skip_count_checks is True then it means we cannot use "SELECT COUNT(*)" as it may time out but
-        it also means that we can be sure that one cassandra-stress operation is one record and hence
-        num_records=num_operations.
+        If skip_count_checks is True then the records are not counted after running cassandra-stress, as even a
+        token range parallel count is a full table scan, but it also means that we can be sure that one
+        cassandra-stress operation is one record and hence num_records=num_operations.
 
         Perform the following:
         - create the records with cassandra-stress
         - export the records to a csv file
         - truncate the table and import the csv file
         - export the records to another csv file
-        - check that the length of the two csv files is the same
+        - check that the two csv files hold the same records, in any order
 
         Therefore, 3 COPY operations are run in total. Return a list of tuples, containing stdout and stderr
-        for all 3 copy operations.
+        for all 3 copy operations. If measurements is a list, a CopyMeasurement of every copy operation
+        is appended to it.
         """
         if configuration_options is None:
             configuration_options = {}
@@ -2463,33 +2526,36 @@ class TestCqlshCopy(Tester):
             if skip_count_checks:
                 return num_operations
             else:
-                count_statement = SimpleStatement("SELECT COUNT(*) FROM {}".format(stress_table), consistency_level=ConsistencyLevel.ALL)
-                ret = rows_to_list(self.session.execute(count_statement))[0][0]
+                ret = count_rows(self.session, stress_table, consistency_level=ConsistencyLevel.ALL)
                 logger.debug('Generated {} records'.format(ret))
                 assert ret >= num_operations, 'cassandra-stress did not import enough records'
                 return ret
 
+        def run_copy(operation, cmd, filename):
+            logger.debug('Running {}'.format(cmd))
+            start = time.time()
+            with ProcessTreeSampler(match='cqlsh') as sampler:
+                result = self.run_cqlsh(cmds=cmd)
+            ret.append(result)
+            measurement = CopyMeasurement(operation, result, time.time() - start, os.path.getsize(filename.name),
+                                          sampler.peak_rss, expected_rows=num_records)
+            logger.debug(measurement)
+            if measurements is not None:
+                measurements.append(measurement)
+
         def run_copy_to(filename):
             logger.debug('Exporting to csv file: {}'.format(filename.name))
-            start = datetime.datetime.now()
             copy_to_cmd = "CONSISTENCY ALL; COPY {} TO '{}'".format(stress_table, filename.name)
             if copy_to_options:
                 copy_to_cmd += ' WITH ' + ' AND '.join('{} = {}'.format(k, v) for k, v in copy_to_options.items())
-            logger.debug('Running {}'.format(copy_to_cmd))
-            result = self.run_cqlsh(cmds=copy_to_cmd)
-            ret.append(result)
-            logger.debug("COPY TO took {} to export {} records".format(datetime.datetime.now() - start, num_records))
+            run_copy('COPY TO', copy_to_cmd, filename)
 
         def run_copy_from(filename):
             logger.debug('Importing from csv file: {}'.format(filename.name))
-            start = datetime.datetime.now()
             copy_from_cmd = "COPY {} FROM '{}'".format(stress_table, filename.name)
             if copy_from_options:
                 copy_from_cmd += ' WITH ' + ' AND '.join('{} = {}'.format(k, v) for k, v in copy_from_options.items())
-            logger.debug('Running {}'.format(copy_from_cmd))
-            result = self.run_cqlsh(cmds=copy_from_cmd)
-            ret.append(result)
-            logger.debug("COPY FROM took {} to import {} records".format(datetime.datetime.now() - start, num_records))
+            run_copy('COPY FROM', copy_from_cmd, filename)
 
         num_records = create_records()
 
@@ -2498,7 +2564,7 @@ class TestCqlshCopy(Tester):
         run_copy_to(tempfile1)
 
         # check all records generated were exported
-        assert num_records == sum(1 for _ in open(tempfile1.name))
+        assert num_records == count_csv_rows(tempfile1.name, CopyCsvDialect(copy_to_options))
 
         # import records from the first csv file
         logger.debug('Truncating {}...'.format(stress_table))
@@ -2509,9 +2575,8 @@ class TestCqlshCopy(Tester):
         tempfile2 = self.get_temp_file()
         run_copy_to(tempfile2)
 
-        # check the length of both files is the same to ensure all exported records were imported
-        self.assertEqual(sum(1 for _ in open(tempfile1.name)),
-                         sum(1 for _ in open(tempfile2.name)))
+        # check both files hold the same records to ensure all exported records were imported
+        assert_csvs_items_equal(tempfile2.name, tempfile1.name, ordered=False, options=copy_to_options)
 
         return ret
 
@@ -2600,6 +2665,35 @@ class TestCqlshCopy(Tester):
             for out in ret:
                 assert "Detected 1 core" in out[0]
 
+    @pytest.mark.benchmark
+    @pytest.mark.resource_intensive
+    @pytest.mark.parametrize('nodes,partitioner,options', copy_benchmark_scenarios(),
+                             ids=[copy_benchmark_id(scenario) for scenario in copy_benchmark_scenarios()])
+    def test_copy_benchmark(self, nodes, partitioner, options):
+        """
+        Measure the throughput of a bulk round trip for one point of the COPY parameter sweep,
+        see copy_benchmark_scenarios(). Rows/s, MB/s, peak RSS of the cqlsh processes and
+        retry/error counts of each COPY operation are recorded to --benchmark-results, and the
+        test fails if any of them is worse than in --benchmark-baseline.
+        """
+        copy_from_options = dict(COPY_BENCHMARK_OPTIONS, **options)
+        copy_to_options = {'NUMPROCESSES': copy_from_options['NUMPROCESSES']}
+        num_operations = 100000
+        measurements = []
+        self._test_bulk_round_trip(nodes=nodes, partitioner=partitioner, num_operations=num_operations,
+                                   skip_count_checks=True, copy_to_options=copy_to_options,
+                                   copy_from_options=copy_from_options, measurements=measurements)
+
+        params = {'nodes': nodes, 'partitioner': partitioner, 'num_operations': num_operations,
+                  'vnodes': self.dtest_config.use_vnodes, 'options': copy_from_options}
+        regressions = []
+        for name, measurement in zip(['cqlsh_copy_to', 'cqlsh_copy_from', 'cqlsh_copy_to_imported'], measurements):
+            regressions.extend('{}: {}'.format(name, regression) for regression in record_benchmark(
+                self.dtest_config, name, params, measurement.metrics(), version=self.cluster.version(),
+                higher_is_better=['rows_per_second', 'mb_per_second'],
+                lower_is_better=['peak_rss_mb', 'retries', 'errors']))
+        assert not regressions, 'COPY benchmark regressed against baseline:\n' + '\n'.join(regressions)
+
     @since('3.0.5')
     def test_bulk_round_trip_with_backoff(self):
         """
@@ -2662,8 +2756,8 @@ class TestCqlshCopy(Tester):
 
         logger.debug('Exporting to csv file: {} with {} and 3 max attempts'
               .format(tempfile.name, os.environ['CQLSH_COPY_TEST_FAILURES']))
-        out, err, _ = self.run_cqlsh(cmds="COPY {} TO '{}' WITH MAXATTEMPTS='3'"
-                                     .format(stress_table, tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY {} TO '{}' WITH MAXATTEMPTS='3'"
+                                  .format(stress_table, tempfile.name))
         logger.debug(out)
         logger.debug(err)
 
@@ -2691,8 +2785,8 @@ class TestCqlshCopy(Tester):
         os.environ['CQLSH_COPY_TEST_FAILURES'] = json.dumps(failures)
         logger.debug('Exporting to csv file: {} with {} and 5 max attemps'
               .format(tempfile.name, os.environ['CQLSH_COPY_TEST_FAILURES']))
-        out, err, _ = self.run_cqlsh(cmds="COPY {} TO '{}' WITH MAXATTEMPTS='5'"
-                                     .format(stress_table, tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY {} TO '{}' WITH MAXATTEMPTS='5'"
+                                  .format(stress_table, tempfile.name))
         logger.debug(out)
         logger.debug(err)
 
@@ -2721,7 +2815,7 @@ class TestCqlshCopy(Tester):
 
         logger.debug('Exporting to csv file: {} with {}'
               .format(tempfile.name, os.environ['CQLSH_COPY_TEST_FAILURES']))
-        out, err, _ = self.run_cqlsh(cmds="COPY {} TO '{}'".format(stress_table, tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY {} TO '{}'".format(stress_table, tempfile.name))
         logger.debug(out)
         logger.debug(err)
 
@@ -2755,8 +2849,8 @@ class TestCqlshCopy(Tester):
         failures = {'failing_batch': {'id': 30, 'failures': 5}}
         os.environ['CQLSH_COPY_TEST_FAILURES'] = json.dumps(failures)
         logger.debug('Importing from csv file {} with {}'.format(tempfile.name, os.environ['CQLSH_COPY_TEST_FAILURES']))
-        out, err, _ = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE='1' AND MAXATTEMPTS='3'"
-                                     .format(stress_table, tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE='1' AND MAXATTEMPTS='3'"
+                                  .format(stress_table, tempfile.name))
         logger.debug(out)
         logger.debug(err)
 
@@ -2794,8 +2888,8 @@ class TestCqlshCopy(Tester):
         failures = {'failing_batch': {'id': 3, 'failures': 3}}
         os.environ['CQLSH_COPY_TEST_FAILURES'] = json.dumps(failures)
         logger.debug('Importing from csv file {} with {}'.format(tempfile.name, os.environ['CQLSH_COPY_TEST_FAILURES']))
-        out, err, _ = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE=100 AND MAXATTEMPTS=5 AND INGESTRATE=101"
-                                     .format(stress_table, tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE=100 AND MAXATTEMPTS=5 AND INGESTRATE=101"
+                                  .format(stress_table, tempfile.name))
         logger.debug(out)
         logger.debug(err)
 
@@ -2829,8 +2923,8 @@ class TestCqlshCopy(Tester):
         failures = {'exit_batch': {'id': 30}}
         os.environ['CQLSH_COPY_TEST_FAILURES'] = json.dumps(failures)
         logger.debug('Importing from csv file {} with {}'.format(tempfile.name, os.environ['CQLSH_COPY_TEST_FAILURES']))
-        out, err, _ = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE='1'"
-                                     .format(stress_table, tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE='1'"
+                                  .format(stress_table, tempfile.name))
         logger.debug(out)
         logger.debug(err)
 
@@ -2867,8 +2961,8 @@ class TestCqlshCopy(Tester):
         failures = {'unsent_batch': {'id': 30}}
         os.environ['CQLSH_COPY_TEST_FAILURES'] = json.dumps(failures)
         logger.debug('Importing from csv file {} with {}'.format(tempfile.name, os.environ['CQLSH_COPY_TEST_FAILURES']))
-        out, err, _ = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE=1 AND CHILDTIMEOUT=30 AND REQUESTTIMEOUT=15"
-                                     .format(stress_table, tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY {} FROM '{}' WITH CHUNKSIZE=1 AND CHILDTIMEOUT=30 AND REQUESTTIMEOUT=15"
+                                  .format(stress_table, tempfile.name))
         logger.debug(out)
         logger.debug(err)
 
@@ -3283,7 +3377,7 @@ class TestCqlshCopy(Tester):
 
         tempfile = self.get_temp_file()
         logger.debug('Exporting to csv file: {}'.format(tempfile.name))
-        out, err, _ = self.run_cqlsh(cmds="COPY ks.testunusualdates TO '{}'".format(tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY ks.testunusualdates TO '{}'".format(tempfile.name))
         logger.debug(out)
 
         # check all records were exported
@@ -3292,7 +3386,7 @@ class TestCqlshCopy(Tester):
         # import the CSV file with COPY FROM
         self.session.execute("TRUNCATE ks.testunusualdates")
         logger.debug('Importing from csv file: {}'.format(tempfile.name))
-        out, err, _ = self.run_cqlsh(cmds="COPY ks.testunusualdates FROM '{}'".format(tempfile.name))
+        out, err = self.run_cqlsh(cmds="COPY ks.testunusualdates FROM '{}'".format(tempfile.name))
         logger.debug(out)
 
         new_results = list(self.session.execute("SELECT * FROM testunusualdates"))
@@ -3310,7 +3404,7 @@ class TestCqlshCopy(Tester):
         def _check(file_name, table_name, expected_results):
             # import the CSV file with COPY FROM
             logger.debug('Importing from csv file: {}'.format(file_name))
-            out, err, _ = self.run_cqlsh(cmds="COPY ks.{} FROM '{}'".format(table_name, file_name))
+            out, err = self.run_cqlsh(cmds="COPY ks.{} FROM '{}'".format(table_name, file_name))
             logger.debug(out)
 
             assert 'ParseError - Failed to parse' in err
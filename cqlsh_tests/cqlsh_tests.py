@@ -21,6 +21,7 @@ from ccmlib import common
 from .cqlsh_tools import monkeypatch_driver, unmonkeypatch_driver
 from dtest import Tester, create_ks, create_cf
 from tools.assertions import assert_all, assert_none
+from tools.cqlsh_session import supports_cqlsh_sessions
 from tools.data import create_c1c2_table, insert_c1c2, rows_to_list
 
 since = pytest.mark.since
@@ -1053,7 +1054,7 @@ VALUES (4, blobAsInt(0x), '', blobAsBigint(0x), 0x, blobAsBoolean(0x), blobAsDec
 
         if err:
             if expected_err:
-                err = err[10:]  # strip <stdin>:2:
+                err = re.sub(r'^<stdin>:\d+:', '', err)  # only piped input has the line prefix
                 self.check_response(err, expected_err)
                 return
             else:
@@ -1649,10 +1650,17 @@ Tracing session:""")
         assert 0 == len(stdout), stdout
 
     def run_cqlsh(self, node, cmds, cqlsh_options=None, env_vars=None):
+        """
+        Runs cmds with cqlsh on node and returns (stdout, stderr). Without env_vars the
+        commands go through the test's pooled interactive cqlsh session for these options,
+        see tools.cqlsh_session, instead of starting a new cqlsh process every time.
+        """
         if env_vars is None:
             env_vars = {}
         if cqlsh_options is None:
             cqlsh_options = []
+        if not env_vars and supports_cqlsh_sessions():
+            return self.cqlsh_sessions.run(node, cmds, cqlsh_options)
         cdir = node.get_install_dir()
         cli = os.path.join(cdir, 'bin', common.platform_binary('cqlsh'))
         env = common.make_cassandra_env(cdir, node.get_path())
@@ -1666,7 +1674,8 @@ Tracing session:""")
             port = node.network_interfaces['thrift'][1]
         args = cqlsh_options + [host, str(port)]
         sys.stdout.flush()
-        p = subprocess.Popen([cli] + args, env=env, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+        p = subprocess.Popen([cli] + args, env=env, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE,
+                             universal_newlines=True)
         for cmd in cmds.split(';'):
             p.stdin.write(cmd + ';\n')
         p.stdin.write("quit;\n")
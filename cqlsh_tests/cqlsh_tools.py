@@ -1,11 +1,19 @@
 import csv
+import heapq
+import itertools
+import json
 import random
+import re
+import tempfile
 
 import cassandra
 
 from cassandra.cluster import ResultSet
 from typing import List
 
+from tools.result_compare import ComparisonResult, RowDifference
+from tools.scanner import RowDigest
+
 
 class DummyColorMap(object):
 
@@ -20,14 +28,167 @@ def csv_rows(filename, delimiter=None):
     reader_opts = {}
     if delimiter is not None:
         reader_opts['delimiter'] = delimiter
-    with open(filename, 'rb') as csvfile:
+    with open(filename, 'r', newline='') as csvfile:
         for row in csv.reader(csvfile, **reader_opts):
             yield row
 
 
-def assert_csvs_items_equal(filename1, filename2):
-    with open(filename1, 'r') as x, open(filename2, 'r') as y:
-        assert list(x.readlines()) == list(y.readlines())
+def _unquote_option(value):
+    value = str(value)
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1]
+    return value
+
+
+class CopyCsvDialect(object):
+    """
+    The CSV format of a COPY TO/FROM command, built from its WITH options (a dict such
+    as copy_to_options, keys are case-insensitive): DELIMITER, QUOTE, ESCAPE, NULL and
+    HEADER, with the same defaults as cqlsh.
+    """
+
+    def __init__(self, options=None):
+        options = {key.upper(): _unquote_option(value) for key, value in (options or {}).items()}
+        self.delimiter = options.get('DELIMITER', ',')
+        self.quote = options.get('QUOTE', '"')
+        self.escape = options.get('ESCAPE', '\\')
+        self.null = options.get('NULL', '')
+        self.header = options.get('HEADER', 'false').lower() == 'true'
+
+    def rows(self, filename):
+        """
+        Yields the records of a CSV file as tuples, with fields equal to the NULL
+        indicator replaced by None and the header, if any, skipped.
+        """
+        with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile, delimiter=self.delimiter, quotechar=self.quote,
+                                escapechar=self.escape if self.escape != self.quote else None)
+            if self.header:
+                next(reader, None)
+            for row in reader:
+                yield tuple(None if field == self.null else field for field in row)
+
+
+def csv_digest(filename, dialect=None):
+    """
+    Returns a RowDigest (record count and order-independent digest) of a CSV file, in
+    one streaming pass.
+    """
+    digest = RowDigest()
+    dialect = dialect or CopyCsvDialect()
+    batch = []
+    for row in dialect.rows(filename):
+        batch.append(row)
+        if len(batch) >= 10000:
+            digest.consume(None, batch)
+            batch = []
+    digest.consume(None, batch)
+    return digest
+
+
+def count_csv_rows(filename, dialect=None):
+    """Returns the number of records, not lines, in a CSV file"""
+    return sum(1 for _ in (dialect or CopyCsvDialect()).rows(filename))
+
+
+def _write_sorted_run(entries, directory):
+    entries.sort()
+    with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as run:
+        for key, row_number in entries:
+            run.write('{}\t{}\n'.format(key, row_number))
+    return run.name
+
+
+def _read_sorted_run(filename):
+    with open(filename) as run:
+        for line in run:
+            key, row_number = line.rstrip('\n').rsplit('\t', 1)
+            yield key, int(row_number)
+
+
+def _sorted_csv_rows(filename, dialect, directory, max_rows_in_memory):
+    """
+    Yields (key, row_number) for every record of a CSV file in key order, where key is
+    the JSON encoding of the record. At most max_rows_in_memory records are sorted in
+    memory at once; larger files are sorted in runs spilled to `directory` and merged.
+    """
+    runs, entries = [], []
+    for row_number, row in enumerate(dialect.rows(filename)):
+        entries.append((json.dumps(row), row_number))
+        if len(entries) >= max_rows_in_memory:
+            runs.append(_write_sorted_run(entries, directory))
+            entries = []
+    entries.sort()
+    return heapq.merge(iter(entries), *[_read_sorted_run(run) for run in runs])
+
+
+def compare_csvs(filename1, filename2, options=None, expected_options=None,
+                 max_differences=10, max_rows_in_memory=100000):
+    """
+    Compares the records of two CSV files regardless of their order, as produced by
+    COPY TO with several worker processes, and returns a tools.result_compare.ComparisonResult
+    with filename1 as the actual rows and filename2 as the expected rows.
+
+    Both files are first reduced to an order-independent digest in a single pass. Only
+    if the digests differ are the files sorted, with a bounded-memory external sort, and
+    merged to locate up to max_differences records found in only one of them; positions
+    are the 0-based record numbers in the respective file.
+
+    @param options COPY options of filename1, see CopyCsvDialect
+    @param expected_options COPY options of filename2, the same as options by default
+    """
+    dialect = CopyCsvDialect(options)
+    expected_dialect = CopyCsvDialect(expected_options if expected_options is not None else options)
+    actual_digest = csv_digest(filename1, dialect)
+    expected_digest = csv_digest(filename2, expected_dialect)
+
+    result = ComparisonResult()
+    result.actual_count = actual_digest.count
+    result.expected_count = expected_digest.count
+    if (actual_digest.count, actual_digest.digest) == (expected_digest.count, expected_digest.digest):
+        return result
+
+    with tempfile.TemporaryDirectory() as directory:
+        actual = _sorted_csv_rows(filename1, dialect, directory, max_rows_in_memory)
+        expected = _sorted_csv_rows(filename2, expected_dialect, directory, max_rows_in_memory)
+        actual_row, expected_row = next(actual, None), next(expected, None)
+        while actual_row is not None or expected_row is not None:
+            if expected_row is None or (actual_row is not None and actual_row[0] < expected_row[0]):
+                result.differences.append(RowDifference('unexpected', actual_row[1], actual=json.loads(actual_row[0])))
+                actual_row = next(actual, None)
+            elif actual_row is None or expected_row[0] < actual_row[0]:
+                result.differences.append(RowDifference('missing', expected_row[1],
+                                                        expected=json.loads(expected_row[0])))
+                expected_row = next(expected, None)
+            else:
+                actual_row, expected_row = next(actual, None), next(expected, None)
+                continue
+            if len(result.differences) >= max_differences:
+                result.truncated = actual_row is not None or expected_row is not None
+                break
+    return result
+
+
+def assert_csvs_items_equal(filename1, filename2, ordered=True, options=None, expected_options=None,
+                            max_differences=10):
+    """
+    Asserts that two CSV files are the same. By default they must have the same lines in the
+    same order; with ordered=False they must hold the same records in any order, as written
+    by COPY TO with several worker processes, see compare_csvs.
+
+    @param options COPY options of filename1, used when ordered is False
+    @param expected_options COPY options of filename2, used when ordered is False
+    """
+    if ordered:
+        with open(filename1, 'r') as x, open(filename2, 'r') as y:
+            for line_number, (line, expected) in enumerate(itertools.zip_longest(x, y), 1):
+                assert line == expected, "{} differs from {} at line {}: {!r} (expected {!r})".format(
+                    filename1, filename2, line_number, line, expected)
+        return
+
+    result = compare_csvs(filename1, filename2, options=options, expected_options=expected_options,
+                          max_differences=max_differences)
+    assert result.equal, result.describe('{} (expected {})'.format(filename1, filename2))
 
 
 def random_list(gen=None, n=None):
@@ -45,11 +206,53 @@ def random_list(gen=None, n=None):
 
 
 def write_rows_to_csv(filename, data):
-    with open(filename, 'wb') as csvfile:
+    with open(filename, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
         for row in data:
             writer.writerow(row)
-        csvfile.close
+
+
+COPY_SUMMARY_PATTERN = re.compile(r'(\d+) rows (?:exported to|imported from) \d+ files?')
+COPY_RETRY_PATTERN = re.compile(r'will retry later|will try again later')
+COPY_FAILURE_PATTERN = re.compile(r'given up after')
+
+
+class CopyMeasurement(object):
+    """
+    Throughput and resource usage of one cqlsh COPY TO or COPY FROM run. The number of
+    rows is taken from the summary cqlsh prints at the end, falling back to
+    expected_rows, and retries and failed batches/ranges are counted from its output.
+    """
+
+    def __init__(self, operation, output, seconds, csv_bytes, peak_rss, expected_rows=None):
+        self.operation = operation
+        self.seconds = seconds
+        self.csv_bytes = csv_bytes
+        self.peak_rss = peak_rss
+        text = '\n'.join(part for part in output if isinstance(part, str))  # (stdout, stderr[, returncode])
+        summary = COPY_SUMMARY_PATTERN.search(text)
+        self.rows = int(summary.group(1)) if summary else expected_rows
+        self.retries = len(COPY_RETRY_PATTERN.findall(text))
+        self.errors = len(COPY_FAILURE_PATTERN.findall(text))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.rows is not None and self.seconds else None
+
+    @property
+    def mb_per_second(self):
+        return self.csv_bytes / (1024.0 * 1024.0) / self.seconds if self.seconds else None
+
+    def metrics(self):
+        return {'rows': self.rows, 'seconds': self.seconds, 'rows_per_second': self.rows_per_second,
+                'mb_per_second': self.mb_per_second, 'peak_rss_mb': self.peak_rss / (1024.0 * 1024.0),
+                'retries': self.retries, 'errors': self.errors}
+
+    def __repr__(self):
+        return '{} of {} rows took {:.2f} seconds ({:.0f} rows/s, {:.2f} MB/s, peak cqlsh RSS {:.0f} MB, ' \
+               '{} retries, {} errors)'.format(self.operation, self.rows, self.seconds, self.rows_per_second or 0,
+                                               self.mb_per_second or 0, self.peak_rss / (1024.0 * 1024.0),
+                                               self.retries, self.errors)
 
 
 def deserialize_date_fallback_int(byts, protocol_version):
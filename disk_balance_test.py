@@ -8,6 +8,7 @@ import logging
 from ccmlib.node import Node
 from dtest import Tester, create_ks
 from tools.assertions import assert_almost_equal
+from tools.compaction_log import analyze_node_compaction_log
 from tools.data import create_c1c2_table, insert_c1c2, query_c1c2
 from tools.jmxutils import (JolokiaAgent, make_mbean,
                             remove_perf_disable_shared_mem)
@@ -220,7 +221,7 @@ class TestDiskBalance(Tester):
             logger.debug("Writing keys {}..{} and flushing".format(start_key, end_key))
             node1.stress(['write', 'n={}'.format(keys_per_flush), "no-warmup", "cl=ALL", "-pop",
                           "seq={}..{}".format(start_key, end_key), "-rate", "threads=1", "-schema", "replication(factor=1)",
-                          "compaction(strategy={},enabled=false)".format(compaction_opts)])
+                          "compaction(strategy={},enabled=false,log_all=true)".format(compaction_opts)])
             node1.nodetool('flush keyspace1 standard1')
             current_keys = end_key
 
@@ -288,7 +289,7 @@ class TestDiskBalance(Tester):
             logger.debug("Writing keys {}..{} and flushing".format(start_key, end_key))
             node1.stress(['write', 'n={}'.format(keys_per_flush), "no-warmup", "cl=ALL", "-pop",
                           "seq={}..{}".format(start_key, end_key), "-rate", "threads=1", "-schema", "replication(factor=1)",
-                          "compaction(strategy={},enabled=false)".format(compaction_opts)])
+                          "compaction(strategy={},enabled=false,log_all=true)".format(compaction_opts)])
             node1.nodetool('flush keyspace1 standard1')
             current_keys = end_key
 
@@ -324,6 +325,11 @@ class TestDiskBalance(Tester):
         node.wait_for_compactions()
         self.assert_balanced(node)
 
+        # the sstables were moved to their new disks by compactions
+        stats = analyze_node_compaction_log(node).table('keyspace1', 'standard1')
+        logger.debug("Compactions of {}: {}".format(node.name, stats.as_dict()))
+        assert stats.compactions > 0
+
         logger.debug("Reading data back ({} keys)".format(total_keys))
         node.stress(['read', 'n={}'.format(total_keys), "no-warmup", "cl=ALL", "-pop", "seq=1...{}".format(total_keys), "-rate", "threads=1"])
 
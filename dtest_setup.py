@@ -24,6 +24,7 @@ from dtest import (get_ip_from_node, make_execution_profile, get_auth_provider,
 from distutils.version import LooseVersion
 
 from tools.context import log_filter
+from tools.cqlsh_session import CqlshSessionPool
 from tools.funcutils import merge_dicts
 
 logger = logging.getLogger(__name__)
@@ -55,6 +56,7 @@ class DTestSetup:
         self.replacement_node = None
         self.allow_log_errors = False
         self.connections = []
+        self.cqlsh_sessions = CqlshSessionPool()
 
         self.log_saved_dir = "logs"
         try:
@@ -67,6 +69,7 @@ class DTestSetup:
         self.enable_for_jolokia = False
         self.subprocs = []
         self.log_watch_thread = None
+        self.footprint_sampler = None
         self.last_test_dir = "last_test_dir"
         self.jvm_args = []
 
@@ -379,6 +382,7 @@ class DTestSetup:
         for con in self.connections:
             con.cluster.shutdown()
         self.connections = []
+        self.cqlsh_sessions.close()
 
         self.cleanup_cluster()
         self.test_path = self.get_test_path()
@@ -6,7 +6,10 @@ import logging
 from cassandra import ConsistencyLevel
 
 from dtest import Tester, create_ks
+from tools.benchmark import record_benchmark
 from tools.data import create_c1c2_table, insert_c1c2, query_c1c2
+from tools.hints import HintsMonitor, hints_per_host, read_hint_metrics, read_hints_directory
+from tools.jmxutils import JolokiaAgent, remove_perf_disable_shared_mem
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -59,6 +62,21 @@ class TestHintedHandoffConfig(Tester):
 
         insert_c1c2(session, n=100, consistency=ConsistencyLevel.ONE)
 
+        # node1 buffers hints and flushes them to files every hints_flush_period_in_ms
+        hints_directory = os.path.join(node1.get_path(), 'hints')
+        with HintsMonitor(hints_directory, interval=0.5) as monitor:
+            if enabled:
+                monitor.wait_for_hints(100, timeout=60)
+            else:
+                # wait past a flush period (10s by default) for hints that shouldn't come
+                with pytest.raises(RuntimeError, match="didn't reach 1"):
+                    monitor.wait_for_hints(1, timeout=15)
+        summaries = read_hints_directory(hints_directory)
+        logger.debug('Hints of node1: {}'.format(hints_per_host(summaries)))
+        assert all(not summary.invalid_hints for summary in summaries)
+        if not enabled:
+            assert sum(summary.hints or 0 for summary in summaries) == 0
+
         log_mark = node1.mark_log()
         node2.start(wait_other_notice=True)
 
@@ -198,3 +216,49 @@ class TestHintedHandoff(Tester):
         time.sleep(5)
         for x in range(0, 100):
             query_c1c2(session, x, ConsistencyLevel.ONE)
+
+    @since('3.0')
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('rows', [100000, 1000000])
+    def test_hint_accumulation_and_delivery_benchmark(self, rows):
+        """
+        Measure how fast node1 writes hints for node2 while node2 is down for the writes of
+        `rows` rows, the size of those hints on disk, and how fast they are delivered once
+        node2 is back, as after a long node outage.
+        """
+        cluster = self.cluster
+        cluster.set_configuration_options(values={'hinted_handoff_enabled': True,
+                                                  'max_hint_window_in_ms': 24 * 60 * 60 * 1000})
+        cluster.populate(2)
+        for node in cluster.nodelist():
+            remove_perf_disable_shared_mem(node)
+        cluster.start(wait_for_binary_proto=True)
+        node1, node2 = cluster.nodelist()
+        node1.stress(['write', 'n=1', 'no-warmup', '-schema', 'replication(factor=2)'])
+        node2.stop(wait_other_notice=True)
+
+        hints_directory = os.path.join(node1.get_path(), 'hints')
+        with JolokiaAgent(node1) as jmx:
+            with HintsMonitor(hints_directory, metrics=lambda: read_hint_metrics(jmx)) as monitor:
+                node1.stress(['write', 'n={}'.format(rows), 'cl=ONE', 'no-warmup', '-rate', 'threads=50'])
+                monitor.wait_for_hints(rows, timeout=300)
+                logger.info('Hints of node1: {}'.format(hints_per_host(read_hints_directory(hints_directory))))
+                node2.start(wait_for_binary_proto=True, wait_other_notice=True)
+                monitor.wait_until_drained(timeout=3600)
+        stats = monitor.stats()
+        logger.info('{} rows hinted: {}'.format(rows, monitor.format_stats()))
+
+        metrics = {'written_per_second': stats['written_per_second'],
+                   'bytes_per_hint': stats['bytes_per_hint'],
+                   'peak_bytes': stats['peak_bytes'],
+                   'delivered_per_second': stats['delivered_per_second'],
+                   'delivery_seconds': stats['delivery_seconds']}
+        first, last = monitor.samples[0].metrics, monitor.samples[-1].metrics
+        for metric in ('succeeded', 'failed', 'timed_out'):
+            if first[metric] is not None and last[metric] is not None:
+                metrics['hints_' + metric] = last[metric] - first[metric]
+        regressions = record_benchmark(self.dtest_config, 'hinted_handoff', {'rows': rows}, metrics,
+                                       version=cluster.version(),
+                                       higher_is_better=('written_per_second', 'delivered_per_second'),
+                                       lower_is_better=('bytes_per_hint', 'delivery_seconds', 'hints_failed'))
+        assert not regressions, 'Hinted handoff benchmark regressed against baseline:\n' + '\n'.join(regressions)
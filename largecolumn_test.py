@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 
 @since('2.2')
+@pytest.mark.gc_pause_budget
 class TestLargeColumn(Tester):
     """
     Check that inserting and reading large columns to the database doesn't cause off heap memory usage
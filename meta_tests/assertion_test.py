@@ -4,7 +4,7 @@ from unittest import TestCase
 from cassandra import AlreadyExists, InvalidRequest, Unauthorized, Unavailable
 from mock import Mock
 
-from tools.assertions import (assert_all, assert_almost_equal, assert_exception,
+from tools.assertions import (assert_all, assert_all_paged, assert_almost_equal, assert_exception,
                               assert_invalid, assert_length_equal, assert_none,
                               assert_one, assert_row_count, assert_stderr_clean,
                               assert_unauthorized, assert_unavailable)
@@ -95,6 +95,11 @@ class TestAssertionMethods(TestCase):
         mock_session.execute = Mock(return_value=[[i, i] for i in range(0, 10)])
         assert_all(mock_session, "SELECT k, v FROM test", [[i, i] for i in range(0, 10)], ignore_order=True)
 
+        # assert_all_paged_test
+        mock_session = Mock()
+        mock_session.execute = Mock(return_value=iter([[i, i] for i in range(0, 10)]))
+        assert_all_paged(mock_session, "SELECT k, v FROM test", ([i, i] for i in range(0, 10)))
+
         # assert_almost_equal_test
         assert_almost_equal(1, 1.1, 1.2, 1.9, error=1.0)
 
@@ -107,6 +112,16 @@ class TestAssertionMethods(TestCase):
         check = [1, 2, 3, 4]
         assert_length_equal(check, 4)
 
+    def test_all_paged_reports_only_first_differences(self):
+        mock_session = Mock()
+        mock_session.execute = Mock(return_value=iter([[i, i] for i in range(0, 1000)]))
+        with pytest.raises(AssertionError) as exc_info:
+            assert_all_paged(mock_session, "SELECT k, v FROM test", ([i, -i] for i in range(0, 1000)), max_differences=3)
+        message = str(exc_info.value)
+        assert 'row 1: expected [1, -1] but got [1, 1]' in message
+        assert 'row 3:' in message
+        assert 'row 4:' not in message
+
     def test_almost_equal_expect_pass(self):
         assert_almost_equal(1, 1.1, 1.3, error=.31)
 
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+
+import pytest
+
+from tools.artifact_cache import ArtifactCache, install_dir_kwargs, repository_and_ref
+
+# stands in for 'ant jar', recording which commit was built
+FAKE_BUILD = ('sh', '-c', 'cat version.txt > built.txt')
+
+
+def _git(cwd, *args):
+    return subprocess.check_output(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args),
+                                   cwd=cwd).decode('utf-8').strip()
+
+
+class TestArtifactCache(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        source = os.path.join(self.dir, 'source')
+        os.mkdir(source)
+        _git(source, 'init', '-q')
+        for version in ('3.0.12', '3.11'):
+            with open(os.path.join(source, 'version.txt'), 'w') as f:
+                f.write(version)
+            _git(source, 'add', 'version.txt')
+            _git(source, 'commit', '-q', '-m', version)
+            if version == '3.0.12':
+                _git(source, 'tag', 'cassandra-3.0.12')
+        _git(source, 'branch', 'cassandra-3.11')
+        self.shas = {'3.0.12': _git(source, 'rev-parse', 'cassandra-3.0.12'),
+                     '3.11': _git(source, 'rev-parse', 'cassandra-3.11')}
+
+        self.mirrors = os.path.join(self.dir, 'mirrors')
+        os.mkdir(self.mirrors)
+        _git(self.mirrors, 'clone', '-q', '--mirror', source, '_git_cache_apache')
+        self.cache = ArtifactCache(os.path.join(self.dir, 'cache'))
+
+    def test_repository_and_ref(self):
+        apache = os.path.join('/m', '_git_cache_apache')
+        assert repository_and_ref('3.0.12', '/m') == (apache, 'cassandra-3.0.12')
+        assert repository_and_ref('git:trunk', '/m') == (apache, 'trunk')
+        assert repository_and_ref('github:apache/cassandra-3.11', '/m') == (apache, 'cassandra-3.11')
+        assert repository_and_ref('github:someone/fix', '/m') == (os.path.join('/m', '_git_cache_someone'), 'fix')
+        assert repository_and_ref('local:/src/cassandra:my-branch', '/m') == ('/src/cassandra', 'my-branch')
+        with pytest.raises(ValueError):
+            repository_and_ref('alias:mine/trunk', '/m')
+
+    def test_prebuild_by_sha(self):
+        versions = {'3.0.12': 8, 'github:apache/cassandra-3.11': 8, 'git:cassandra-3.11': 8}
+        failures = self.cache.prebuild(versions, mirror_dir=self.mirrors, jobs=2, build_command=FAKE_BUILD)
+        assert failures == {}
+
+        # two names of the same commit share one build
+        assert sorted(os.listdir(self.cache.builds_dir)) == sorted(self.shas.values())
+        with open(self.cache.index_path) as f:
+            index = json.load(f)
+        assert index['git:cassandra-3.11']['sha'] == self.shas['3.11']
+        assert index['3.0.12']['ref'] == 'cassandra-3.0.12'
+
+        for version, built in (('3.0.12', '3.0.12'), ('git:cassandra-3.11', '3.11'), (self.shas['3.11'], '3.11')):
+            install_dir = install_dir_kwargs(self.cache.root, version)['install_dir']
+            with open(os.path.join(install_dir, 'built.txt')) as f:
+                assert f.read() == built
+            assert not os.path.exists(os.path.join(install_dir, '.git'))
+
+    def test_prebuild_skips_cached_and_reports_failures(self):
+        self.cache.prebuild({'3.0.12': None}, mirror_dir=self.mirrors, build_command=FAKE_BUILD)
+        built = os.path.join(self.cache.build_dir(self.shas['3.0.12']), 'built.txt')
+        os.remove(built)
+
+        failures = self.cache.prebuild({'3.0.12': None, 'git:no-such-branch': None, '3.11': None},
+                                       mirror_dir=self.mirrors, build_command=('false',))
+        assert sorted(failures) == ['3.11', 'git:no-such-branch']
+        assert not os.path.exists(built)  # already cached, not rebuilt
+        assert not os.path.exists(self.cache.build_dir(self.shas['3.11']))
+        assert os.listdir(self.cache.builds_dir) == [self.shas['3.0.12']]
+
+    def test_install_dir_kwargs(self):
+        assert install_dir_kwargs(None, '3.0.12') == {'version': '3.0.12'}
+        with pytest.raises(RuntimeError, match='not in the artifact cache'):
+            install_dir_kwargs(self.cache.root, '3.0.12')
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from tools.benchmark import (ProcessTreeSampler, find_regressions, format_scaling_curve, load_results,
+                             record_benchmark, scaling_curve, scaling_exponent)
+
+
+class BenchmarkConfig(object):
+
+    def __init__(self, results=None, baseline=None, tolerance=0.2):
+        self.benchmark_results = results
+        self.benchmark_baseline = baseline
+        self.benchmark_tolerance = tolerance
+
+
+class TestBenchmark(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.results = os.path.join(self.dir, 'results.jsonl')
+
+    def test_find_regressions(self):
+        baseline = {'rows_per_second': 1000.0, 'errors': 0, 'peak_rss_mb': 100.0}
+        assert find_regressions(baseline, {'rows_per_second': 900.0, 'errors': 0, 'peak_rss_mb': 110.0},
+                                higher_is_better=['rows_per_second'],
+                                lower_is_better=['errors', 'peak_rss_mb']) == []
+        regressions = find_regressions(baseline, {'rows_per_second': 700.0, 'errors': 2, 'peak_rss_mb': 130.0},
+                                       higher_is_better=['rows_per_second', 'mb_per_second'],
+                                       lower_is_better=['errors', 'peak_rss_mb'])
+        assert regressions == ['rows_per_second dropped from 1000.00 to 700.00',
+                               'peak_rss_mb rose from 100.00 to 130.00']
+
+    def test_zero_baseline_uses_floor(self):
+        baseline = {'hints_failed': 0, 'retries': 0, 'peak_rss_mb': 100.0}
+        assert find_regressions(baseline, {'hints_failed': 3, 'retries': 1000}, lower_is_better=['hints_failed']) == []
+        assert find_regressions(baseline, {'hints_failed': 3, 'retries': 5, 'peak_rss_mb': 125.0},
+                                lower_is_better=['hints_failed', 'retries', 'peak_rss_mb'],
+                                floors={'hints_failed': 5, 'retries': 2, 'peak_rss_mb': 200}) == \
+            ['retries rose from 0.00 to 5.00']
+
+    def test_record_against_baseline(self):
+        params = {'nodes': 3, 'options': {'NUMPROCESSES': 4}}
+        first = BenchmarkConfig(results=os.path.join(self.dir, 'logs', 'results.jsonl'))
+        self.results = first.benchmark_results
+        assert record_benchmark(first, 'copy', params, {'rows_per_second': 1000.0}, version='3.11') == []
+        assert record_benchmark(first, 'copy', {'nodes': 1}, {'rows_per_second': 10.0}) == []
+        assert len(load_results(self.results)) == 2
+
+        second = BenchmarkConfig(results=os.path.join(self.dir, 'new.jsonl'), baseline=self.results)
+        assert record_benchmark(second, 'copy', {'options': {'NUMPROCESSES': 4}, 'nodes': 3},
+                                {'rows_per_second': 500.0}, higher_is_better=['rows_per_second']) == \
+            ['rows_per_second dropped from 1000.00 to 500.00']
+        assert record_benchmark(second, 'copy', {'nodes': 5}, {'rows_per_second': 1.0},
+                                higher_is_better=['rows_per_second']) == []
+
+    def test_process_tree_sampler(self):
+        with ProcessTreeSampler(match='import time', interval=0.05) as sampler:
+            subprocess.check_call([sys.executable, '-c', 'import time; x = bytearray(32 * 1024 * 1024); time.sleep(1)'])
+        assert sampler.peak_processes == 1
+        assert sampler.peak_rss > 32 * 1024 * 1024
+
+        with ProcessTreeSampler(match='no such process', interval=0.05) as sampler:
+            subprocess.check_call([sys.executable, '-c', 'import time; time.sleep(0.3)'])
+        assert sampler.peak_rss == 0
+
+    def test_scaling_exponent(self):
+        assert abs(scaling_exponent([(10, 5.0), (100, 50.0), (1000, 500.0)]) - 1.0) < 1e-9
+        assert abs(scaling_exponent([(10, 1.0), (100, 100.0), (1000, 10000.0)]) - 2.0) < 1e-9
+        assert scaling_exponent([(10, 0), (100, None), (1000, 3.0)]) is None
+        assert scaling_exponent([(10, 1.0), (10, 2.0)]) is None
+
+    def test_scaling_curve(self):
+        measurements = [({'rows': rows, 'type': 'full'}, {'wall_seconds': rows ** 1.5, 'bytes_streamed': None})
+                        for rows in (1000, 10, 100)]
+        curve = scaling_curve(measurements, 'rows', ['wall_seconds', 'bytes_streamed'])
+        assert [point['rows'] for point in curve['points']] == [10, 100, 1000]
+        assert abs(curve['exponents']['wall_seconds'] - 1.5) < 1e-9
+        assert curve['exponents']['bytes_streamed'] is None
+
+        table = format_scaling_curve('full repair', curve, 'rows').splitlines()
+        assert table[0] == 'full repair'
+        assert len(table) == 3 + 3 + 1
+        assert table[-1].split() == ['exponent', '-', '1.500']
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pytest
+from mock import patch
+
+from tools.cdc import CDCFollower, read_cdc_index
+
+
+class TestCDCFollower(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _segment(self, segment_id, size=4096):
+        with open(os.path.join(self.dir, 'CommitLog-7-{}.log'.format(segment_id)), 'wb') as f:
+            f.write(b'\x01' * size)
+
+    def _sync(self, segment_id, offset, completed=False):
+        with open(os.path.join(self.dir, 'CommitLog-7-{}_cdc.idx'.format(segment_id)), 'w') as f:
+            f.write(str(offset) + ('\nCOMPLETED' if completed else ''))
+
+    def test_read_cdc_index(self):
+        self._sync(1, 1234, completed=True)
+        index = read_cdc_index(os.path.join(self.dir, 'CommitLog-7-1_cdc.idx'))
+        assert (index.offset, index.completed, index.segment) == (1234, True, 'CommitLog-7-1.log')
+        self._sync(1, '')
+        assert read_cdc_index(os.path.join(self.dir, 'CommitLog-7-1_cdc.idx')) is None
+        assert read_cdc_index(os.path.join(self.dir, 'CommitLog-7-2_cdc.idx')) is None
+
+    def _follow_and_consume(self, follower):
+        self._segment(1)
+        self._sync(1, 100)
+        with follower:
+            follower.wait_until_consumed(timeout=5)
+            self._sync(1, 4096, completed=True)
+            self._segment(2)
+            self._sync(2, 50)
+            follower.wait_until_consumed(timeout=5)
+
+        assert sorted(os.listdir(self.dir)) == ['CommitLog-7-2.log', 'CommitLog-7-2_cdc.idx']
+        kinds = [(event.kind, event.segment) for event in follower.events]
+        assert kinds.index(('deleted', 'CommitLog-7-1.log')) > kinds.index(('synced', 'CommitLog-7-1.log'))
+        consumed = [event for event in follower.events if event.kind == 'consumed']
+        assert sum(event.consumed for event in consumed if event.segment == 'CommitLog-7-1.log') >= 4096
+        stats = follower.stats()
+        assert (stats['synced_bytes'], stats['consumed_bytes'], stats['lag_bytes']) == (4146, 4146, 0)
+        assert (stats['segments'], stats['completed_segments'], stats['deleted_segments']) == (2, 1, 1)
+
+    def test_follows_and_deletes_consumed_segments(self):
+        self._follow_and_consume(CDCFollower(self.dir, delete_consumed=True, interval=0.05))
+
+    def test_polls_without_inotify(self):
+        with patch('tools.cdc._Inotify', side_effect=OSError('no inotify')):
+            self._follow_and_consume(CDCFollower(self.dir, delete_consumed=True, interval=0.05))
+
+    def test_rate_limited_consumer_lags(self):
+        self._segment(1, size=20000)
+        self._sync(1, 20000, completed=True)
+        with CDCFollower(self.dir, consume_rate=10000, interval=0.05) as follower:
+            with pytest.raises(RuntimeError, match='lags'):
+                follower.wait_until_consumed(timeout=0.5)
+            follower.wait_until_consumed(timeout=5)
+        assert follower.stats()['max_lag_bytes'] == 20000
+        assert follower.stats()['max_lag_seconds'] >= 0.5
+        assert 'CommitLog-7-1.log' in os.listdir(self.dir)
+
+    def test_unindexed_segments_are_complete(self):
+        self._segment(3, size=300)
+        with CDCFollower(self.dir, indexed=False, delete_consumed=True, interval=0.05) as follower:
+            follower.wait_until_consumed(timeout=5)
+        assert os.listdir(self.dir) == []
+        assert follower.stats()['consumed_bytes'] == 300
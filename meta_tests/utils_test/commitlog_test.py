@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from unittest import TestCase
+
+import pytest
+
+from tools.commitlog import CommitLogSegment, header_crc, segment_files
+
+SEGMENT_ID = 1546300800000 + 2 ** 32 + 7
+
+
+def _crc_ints(*values):
+    return zlib.crc32(struct.pack('>{}i'.format(len(values)), *values)) & 0xffffffff
+
+
+def _entry(mutation):
+    size = struct.pack('>i', len(mutation))
+    size_crc = zlib.crc32(size) & 0xffffffff
+    return size + struct.pack('>I', size_crc) + mutation + struct.pack('>I', zlib.crc32(mutation, size_crc) & 0xffffffff)
+
+
+def _segment(sections, params=None, version=7, size=None, compress=None):
+    """
+    A segment as CommitLogSegment and its subclasses write it: the descriptor header, then
+    one sync section for each list of mutations, then zeros up to size
+    """
+    encoded_params = json.dumps(params).encode('utf-8') if params else b''
+    data = struct.pack('>iqH', version, SEGMENT_ID, len(encoded_params)) + encoded_params
+    data += struct.pack('>I', header_crc(version, SEGMENT_ID, encoded_params))
+    low, high = SEGMENT_ID & 0xffffffff, SEGMENT_ID >> 32
+    for mutations in sections:
+        content = b''.join(_entry(mutation) for mutation in mutations)
+        if compress is not None:
+            content = struct.pack('>i', len(content)) + compress(content)
+        end = len(data) + 8 + len(content)
+        data += struct.pack('>iI', end, _crc_ints(low, high, len(data))) + content
+    return data + b'\x00' * ((size or len(data) + 64) - len(data))
+
+
+class TestCommitLogSegment(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _write(self, data, name='CommitLog-7-{}.log'.format(SEGMENT_ID)):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_uncompressed_segment(self):
+        path = self._write(_segment([[b'm' * 20, b'n' * 30], [b'o' * 40]], size=4096))
+        with CommitLogSegment(path) as segment:
+            assert segment.descriptor.version == 7
+            assert segment.descriptor.id == SEGMENT_ID
+            assert segment.descriptor.crc_valid
+            assert segment.descriptor.compression is None and segment.descriptor.encryption is None
+
+            sections = list(segment.sections())
+            assert [section.crc_valid for section in sections] == [True, True]
+            assert sections[0].end == sections[1].offset
+
+            entries = list(segment.entries())
+            assert [entry.size for entry in entries] == [20, 30, 40]
+            assert all(entry.valid for entry in entries)
+            with open(path, 'rb') as f:
+                data = f.read()
+            assert data[entries[2].mutation_offset:entries[2].mutation_offset + 40] == b'o' * 40
+
+            assert segment.summary() == {
+                'version': 7, 'id': SEGMENT_ID, 'compression': None, 'encrypted': False, 'header_crc_valid': True,
+                'sections': 2, 'invalid_sections': 0, 'used_bytes': sections[1].end, 'size': 4096,
+                'entries': 3, 'invalid_entries': 0, 'mutation_bytes': 90}
+
+    def test_corrupt_entry_and_marker(self):
+        data = bytearray(_segment([[b'm' * 20, b'n' * 30], [b'o' * 40]]))
+        with CommitLogSegment(self._write(bytes(data))) as segment:
+            first, second = list(segment.sections())
+            mutation = list(segment.entries(first))[1].mutation_offset
+        data[mutation + 3] ^= 0xff
+        data[second.offset + 6] ^= 0xff
+        with CommitLogSegment(self._write(bytes(data))) as segment:
+            summary = segment.summary()
+            assert summary['invalid_sections'] == 1
+            assert summary['used_bytes'] == second.offset
+            assert summary['entries'] == 2
+            assert [entry.crc_valid for entry in segment.entries()] == [True, False]
+
+    def test_deflate_compressed_segment(self):
+        params = {'compressionClass': 'org.apache.cassandra.io.compress.DeflateCompressor',
+                  'compressionParameters': {}}
+        path = self._write(_segment([[b'a' * 100] * 5, [b'b' * 50]], params=params, compress=zlib.compress))
+        with CommitLogSegment(path) as segment:
+            assert segment.descriptor.compression.endswith('DeflateCompressor')
+            assert segment.can_decode
+            sections = list(segment.sections())
+            assert sections[0].uncompressed_length == 5 * (100 + 12)
+            assert sections[0].data_length < sections[0].uncompressed_length
+            summary = segment.summary()
+            assert (summary['sections'], summary['entries'], summary['mutation_bytes']) == (2, 6, 550)
+
+    def test_encrypted_segment_sections_only(self):
+        params = {'encCipher': 'AES/CBC/PKCS5Padding', 'encKeyAlias': 'testing:1', 'encIV': 'aXY='}
+        path = self._write(_segment([[b'a' * 100]], params=params, compress=lambda data: b'\x01' * 64))
+        with CommitLogSegment(path) as segment:
+            assert segment.descriptor.encryption == params
+            assert not segment.can_decode
+            summary = segment.summary()
+            assert summary['encrypted'] and summary['sections'] == 1 and summary['entries'] is None
+            with pytest.raises(ValueError, match='Cannot decode'):
+                list(segment.entries())
+
+    def test_patch_header(self):
+        params = {'compressionClass': 'LZ4Compressor', 'compressionParameters': {}}
+        path = self._write(_segment([[b'a' * 10]], params=params, compress=lambda data: b'\x00' * 8))
+        with CommitLogSegment(path, writable=True) as segment:
+            segment.write_header_crc(123456)
+            assert not segment.descriptor.crc_valid
+        with CommitLogSegment(path, writable=True) as segment:
+            assert segment.descriptor.crc == 123456
+            segment.replace_header_params(json.dumps(dict(params, compressionClass='LZ5Compressor')).encode('utf-8'))
+            with pytest.raises(ValueError, match='same length'):
+                segment.replace_header_params(b'{}')
+        with CommitLogSegment(path) as segment:
+            assert segment.descriptor.crc_valid
+            assert segment.descriptor.compression == 'LZ5Compressor'
+            assert len(list(segment.sections())) == 1
+
+    def test_segment_files(self):
+        for segment_id in (30, 4, 100):
+            self._write(b'', name='CommitLog-7-{}.log'.format(segment_id))
+        self._write(b'', name='CommitLog-7-5_cdc.idx')
+        assert [os.path.basename(path) for path in segment_files(self.dir)] == \
+            ['CommitLog-7-4.log', 'CommitLog-7-30.log', 'CommitLog-7-100.log']
+        assert segment_files(os.path.join(self.dir, 'missing')) == []
+        with pytest.raises(ValueError, match='empty'):
+            CommitLogSegment(os.path.join(self.dir, 'CommitLog-7-4.log'))
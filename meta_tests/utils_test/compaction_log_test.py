@@ -0,0 +1,106 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tools.compaction_log import (CompactionLogAnalyzer, analyze_node_compaction_log, iter_compaction_log,
+                                  node_compaction_logs)
+
+
+def _sstable(strategy_id, generation, size, level=None):
+    table = {'generation': generation, 'version': 'mc', 'size': size}
+    if level is not None:
+        table['details'] = {'level': level, 'min_token': '-1', 'max_token': '1'}
+    return {'strategyId': strategy_id, 'table': table}
+
+
+def _event(kind, time, table='cf', **fields):
+    fields.update({'type': kind, 'keyspace': 'ks', 'table': table, 'time': time})
+    return json.dumps(fields)
+
+
+LOG = '\n'.join([
+    _event('enable', 1000, strategies=[
+        {'strategyId': '0', 'type': 'LeveledCompactionStrategy', 'tables': [_sstable('0', 1, 100, level=1)],
+         'repaired': False, 'folders': ['/data']},
+        {'strategyId': '1', 'type': 'LeveledCompactionStrategy', 'tables': [], 'repaired': True}]),
+    _event('flush', 2000, tables=[_sstable('0', 2, 100, level=0)]),
+    _event('flush', 3000, tables=[_sstable('0', 3, 100, level=0)]),
+    _event('pending', 3000, strategyId='0', pending=2),
+    _event('flush', 4000, tables=[_sstable('0', 4, 100, level=0)]),
+    _event('compaction', 6000, start='4000', end='6000',
+           input=[_sstable('0', generation, 100, level=0 if generation > 1 else 1) for generation in (1, 2, 3, 4)],
+           output=[_sstable('0', 5, 180, level=1), _sstable('0', 6, 170, level=1)]),
+    _event('enable', 1000, table='stcs', strategies=[{'strategyId': '0', 'type': 'SizeTieredCompactionStrategy',
+                                                      'tables': []}]),
+    _event('flush', 2000, table='stcs', tables=[_sstable('0', 1, 50)]),
+    _event('disable', 7000),
+    '{"type": "flush", "keyspace": "ks", "table": "cf", "time": 8000, "tables": [{"strat',
+])
+
+
+class TestCompactionLog(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_analyzer(self):
+        analyzer = CompactionLogAnalyzer().add_log(io.StringIO(LOG))
+        assert analyzer.events == 8
+        stats = analyzer.table('ks', 'cf')
+        assert (stats.flushes, stats.flushed_bytes, stats.compactions) == (3, 300, 1)
+        assert (stats.input_bytes, stats.output_bytes, stats.input_sstables, stats.output_sstables) == (400, 350, 4, 2)
+        assert stats.compaction_seconds == 2.0 and stats.throughput == 200
+        assert stats.write_amplification == 650 / 300
+        assert stats.sstable_counts == [(1.0, 1), (2.0, 2), (3.0, 3), (4.0, 4), (6.0, 2)]
+        assert stats.max_sstables == 4 and stats.max_pending == 2
+        assert stats.level_distribution() == {1: 2} and stats.level_bytes() == {1: 350}
+        assert list(stats.strategies) == ['LeveledCompactionStrategy']
+
+        summary = analyzer.summary()
+        assert sorted(summary) == ['ks.cf', 'ks.stcs']
+        assert summary['ks.cf']['levels'] == {'1': 2}
+        assert summary['ks.stcs']['strategies']['SizeTieredCompactionStrategy']['flushed_bytes'] == 50
+        assert summary['ks.stcs']['write_amplification'] == 1.0 and summary['ks.stcs']['throughput'] is None
+        assert 'levels' not in summary['ks.stcs']
+        json.dumps(summary)
+        assert 'ks.cf: 3 flushes of 300 bytes, 1 compactions of 400 into 350 bytes' in analyzer.format_summary()
+
+    def test_strategy_change(self):
+        log = '\n'.join([
+            _event('enable', 1000, strategies=[{'strategyId': '0', 'type': 'SizeTieredCompactionStrategy'}]),
+            _event('flush', 2000, tables=[_sstable('0', 1, 100)]),
+            _event('flush', 2000, tables=[_sstable('0', 2, 100)]),
+            _event('enable', 3000, strategies=[{'strategyId': '1', 'type': 'LeveledCompactionStrategy',
+                                                'tables': [_sstable('1', 1, 100, 0), _sstable('1', 2, 100, 0)]}]),
+            _event('compaction', 5000, start='4000', end='5000', input=[_sstable('1', 1, 100, 0),
+                                                                        _sstable('1', 2, 100, 0)],
+                   output=[_sstable('1', 3, 200, 1)]),
+        ])
+        stats = CompactionLogAnalyzer().add_log(io.StringIO(log)).table('ks', 'cf')
+        assert stats.strategies['SizeTieredCompactionStrategy'].flushes == 2
+        assert stats.strategies['SizeTieredCompactionStrategy'].compactions == 0
+        assert stats.strategies['LeveledCompactionStrategy'].compactions == 1
+        assert stats.level_distribution() == {1: 1} and stats.write_amplification == 2.0
+
+    def test_node_logs(self):
+        class FakeNode(object):
+            def compactionlogfilename(node):
+                return os.path.join(self.dir, 'compaction.log')
+
+        node = FakeNode()
+        assert node_compaction_logs(node) == []
+        assert analyze_node_compaction_log(node).summary() == {}
+
+        lines = LOG.splitlines()
+        for name, part in (('compaction-2.log', lines[4:6]), ('compaction-1.log', lines[:4]),
+                           ('compaction.log', lines[6:])):
+            with open(os.path.join(self.dir, name), 'w') as f:
+                f.write('\n'.join(part) + '\n')
+        assert [os.path.basename(path) for path in node_compaction_logs(node)] == \
+            ['compaction-1.log', 'compaction-2.log', 'compaction.log']
+        assert len(list(iter_compaction_log(os.path.join(self.dir, 'compaction-1.log')))) == 4
+        assert analyze_node_compaction_log(node).summary() == CompactionLogAnalyzer().add_log(io.StringIO(LOG)).summary()
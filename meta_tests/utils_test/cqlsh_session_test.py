@@ -0,0 +1,111 @@
+import os
+import stat
+import sys
+import tempfile
+from unittest import TestCase
+
+import pytest
+
+from tools.cqlsh_session import CqlshSession, CqlshSessionPool, split_statements, supports_cqlsh_sessions
+
+FAKE_CQLSH = """#!{python}
+import sys
+print('Connected to fake at {{}}:{{}}.'.format(*sys.argv[-2:]))
+print('Use HELP for help.')
+if '--debug' in sys.argv:
+    print('Using connect timeout: 5 seconds', file=sys.stderr)
+keyspace, statement = None, ''
+while True:
+    try:
+        line = input('   ... ' if statement else 'cqlsh:{{}}> '.format(keyspace) if keyspace else 'cqlsh> ')
+    except EOFError:
+        break
+    statement += line + '\\n'
+    if not statement.rstrip().endswith(';'):
+        continue
+    if statement.lstrip().startswith('BEGIN BATCH') and not statement.rstrip().rstrip(';').endswith('APPLY BATCH'):
+        continue
+    command, statement = statement.strip().rstrip(';'), ''
+    if command == 'quit':
+        break
+    elif command.startswith('USE '):
+        keyspace = command[4:]
+    elif command.startswith('ERROR'):
+        print('SyntaxException: ' + command, file=sys.stderr)
+    elif command == 'PAGING OFF':
+        print('Disabled Query paging.')
+    elif command.startswith('ECHO'):
+        print(command[5:])
+    elif command.startswith('BEGIN BATCH'):
+        print('batch of {{}}'.format(command.count(';') - 1))
+"""
+
+
+class FakeNode(object):
+
+    def __init__(self, cqlsh):
+        self.name = 'node1'
+        self.cqlsh = cqlsh
+        self.pid = 1234
+        self.network_interfaces = {'binary': ('127.0.0.1', 9042)}
+
+    def get_env(self):
+        return dict(os.environ)
+
+    def get_tool(self, tool):
+        return self.cqlsh
+
+
+@pytest.mark.skipif(not supports_cqlsh_sessions(), reason='needs pseudo-terminals')
+class TestCqlshSession(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        cqlsh = os.path.join(directory, 'cqlsh')
+        with open(cqlsh, 'w') as f:
+            f.write(FAKE_CQLSH.format(python=sys.executable))
+        os.chmod(cqlsh, os.stat(cqlsh).st_mode | stat.S_IEXEC)
+        self.node = FakeNode(cqlsh)
+
+    def test_split_statements(self):
+        assert split_statements('USE ks; SELECT * FROM t;\n ; ') == ['USE ks', 'SELECT * FROM t']
+        assert split_statements('BEGIN BATCH; INSERT a; INSERT b; APPLY BATCH; SELECT c') == \
+            ['BEGIN BATCH;\nINSERT a;\nINSERT b;\nAPPLY BATCH', 'SELECT c']
+        assert split_statements('begin unlogged batch insert a; apply batch') == ['begin unlogged batch insert a;\napply batch']
+
+    def test_run_returns_output_per_command(self):
+        session = CqlshSession(self.node, timeout=10)
+        try:
+            assert session.run('ECHO one; ECHO two') == ('one\ntwo\n', '')
+            out, err = session.run('ECHO three; ERROR here')
+            assert out == 'three\n'
+            assert err == 'SyntaxException: ERROR here\n'
+            assert session.run("ECHO multi\nline\nstatement") == ('multi\nline\nstatement\n', '')
+            assert session.run('BEGIN BATCH; ECHO a; ECHO b; APPLY BATCH; ECHO five') == ('batch of 2\nfive\n', '')
+            assert session.run('USE ks; ECHO four') == ('four\n', '')
+            assert session.stateful
+        finally:
+            session.close()
+        assert not session.alive
+
+    def test_pool_reuses_sessions(self):
+        pool = CqlshSessionPool()
+        try:
+            first = pool.get(self.node)
+            assert pool.run(self.node, 'ECHO hello') == ('hello\n', '')
+            assert pool.get(self.node) is first
+            assert pool.run(self.node, 'ECHO debug', ['--debug']) == ('debug\n', 'Using connect timeout: 5 seconds\n')
+            assert pool.run(self.node, 'ECHO debug', ['--debug']) == ('debug\n', '')
+            assert pool.get(self.node, ['--debug']) is not first
+
+            pool.run(self.node, 'USE ks')
+            assert pool.get(self.node) is not first
+            assert not first.alive
+
+            # the node was restarted
+            second = pool.get(self.node)
+            self.node.pid = 5678
+            assert pool.get(self.node) is not second
+            assert not second.alive
+        finally:
+            pool.close()
@@ -0,0 +1,68 @@
+import csv
+import os
+import tempfile
+from unittest import TestCase
+
+from cqlsh_tests.cqlsh_tools import (CopyCsvDialect, assert_csvs_items_equal, compare_csvs,
+                                     count_csv_rows, csv_digest)
+
+
+class TestCsvCompare(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def write_csv(self, name, rows, **fmtparams):
+        filename = os.path.join(self.dir, name)
+        with open(filename, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile, **fmtparams)
+            for row in rows:
+                writer.writerow(row)
+        return filename
+
+    def test_order_insensitive(self):
+        rows = [[i, 'value {}'.format(i), 'multi\nline' if i % 7 == 0 else ''] for i in range(100)]
+        first = self.write_csv('first.csv', rows)
+        second = self.write_csv('second.csv', reversed(rows))
+        assert count_csv_rows(first) == 100
+        assert csv_digest(first).digest == csv_digest(second).digest
+        assert_csvs_items_equal(first, second, ordered=False)
+        assert_csvs_items_equal(first, first)
+        with self.assertRaisesRegex(AssertionError, r"second.csv at line 1: '0,value 0,.* \(expected '99,value 99,"):
+            assert_csvs_items_equal(first, second)
+        with self.assertRaisesRegex(AssertionError, 'at line 3: None'):
+            assert_csvs_items_equal(self.write_csv('short.csv', [[1], [2]]), self.write_csv('long.csv', [[1], [2], [3]]))
+
+    def test_duplicates_count(self):
+        first = self.write_csv('first.csv', [[1, 'a'], [1, 'a'], [2, 'b']])
+        second = self.write_csv('second.csv', [[1, 'a'], [2, 'b'], [2, 'b']])
+        result = compare_csvs(first, second)
+        assert not result.equal
+        assert [(d.kind, d.position) for d in result.differences] == [('unexpected', 1), ('missing', 2)]
+
+    def test_locates_differences_with_external_sort(self):
+        rows = [[i, 'x' * (i % 5)] for i in range(1000)]
+        changed = list(rows)
+        changed[10] = [10, 'changed']
+        del changed[500]
+        first = self.write_csv('first.csv', changed)
+        second = self.write_csv('second.csv', reversed(rows))
+        result = compare_csvs(first, second, max_rows_in_memory=64)
+        assert result.actual_count == 999
+        assert result.expected_count == 1000
+        assert sorted((d.kind, d.actual or d.expected) for d in result.differences) == [
+            ('missing', ['10', None]), ('missing', ['500', None]), ('unexpected', ['10', 'changed'])]
+        with self.assertRaisesRegex(AssertionError, 'unexpected'):
+            assert_csvs_items_equal(first, second, ordered=False)
+
+        truncated = compare_csvs(first, second, max_differences=1, max_rows_in_memory=64)
+        assert len(truncated.differences) == 1 and truncated.truncated
+
+    def test_copy_dialect(self):
+        options = {'DELIMITER': "'|'", 'QUOTE': "'", 'NULL': 'NULL', 'HEADER': True}
+        dialect = CopyCsvDialect(options)
+        first = self.write_csv('first.csv', [['a', 'b'], [1, "it's|here"], [2, 'NULL']], delimiter='|', quotechar="'")
+        assert list(dialect.rows(first)) == [('1', "it's|here"), ('2', None)]
+
+        second = self.write_csv('second.csv', [[2, ''], [1, "it's|here"]])
+        assert_csvs_items_equal(first, second, ordered=False, options=options, expected_options={})
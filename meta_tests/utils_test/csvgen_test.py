@@ -0,0 +1,73 @@
+import csv
+import os
+import re
+import tempfile
+from unittest import TestCase
+
+from tools.csvgen import CsvGenerator, parse_type
+
+USER_TYPES = {'name_type': [('firstname', 'text'), ('lastname', 'text')],
+              'address_type': [('name', 'frozen<name_type>'), ('number', 'int'), ('street', 'text'),
+                               ('phones', 'set<text>')]}
+
+# the columns of TestCqlshCopy.all_datatypes_prepare, plus the types added since
+COLUMNS = [('a', 'ascii'), ('b', 'bigint'), ('c', 'blob'), ('d', 'boolean'), ('e', 'decimal'), ('f', 'double'),
+           ('g', 'float'), ('h', 'inet'), ('i', 'int'), ('j', 'text'), ('k', 'timestamp'), ('l', 'timeuuid'),
+           ('m', 'uuid'), ('n', 'varchar'), ('o', 'varint'), ('p', 'list<int>'), ('q', 'set<text>'),
+           ('r', 'map<timestamp, text>'), ('s', 'tuple<int, text, boolean>'), ('t', 'frozen<address_type>'),
+           ('u', 'frozen<list<frozen<list<frozen<address_type>>>>>'), ('v', 'frozen<map<frozen<map<int, int>>, frozen<set<text>>>>'),
+           ('w', 'frozen<set<frozen<set<inet>>>>'), ('x', 'map<text, frozen<list<text>>>'),
+           ('y', 'duration'), ('z', 'date'), ('za', 'time'), ('zb', 'smallint'), ('zc', 'tinyint')]
+
+
+class TestCsvGenerator(TestCase):
+
+    def test_parse_type(self):
+        assert parse_type('map<text, frozen<list<int>>>') == ('map', ('scalar', 'text'), ('list', ('scalar', 'int')))
+        assert parse_type('tuple<int, map<int, text>>') == \
+            ('tuple', [('scalar', 'int'), ('map', ('scalar', 'int'), ('scalar', 'text'))])
+        assert parse_type('frozen<name_type>', USER_TYPES) == \
+            ('udt', 'name_type', [('firstname', ('scalar', 'text')), ('lastname', ('scalar', 'text'))])
+        with self.assertRaises(ValueError):
+            parse_type('unknown_type')
+
+    def test_values(self):
+        generator = CsvGenerator(COLUMNS, ['a'], USER_TYPES, seed=1)
+        row = list(generator.rows(0, 1))[0]
+        assert len(row) == len(COLUMNS)
+        assert row[0] == 'k0'
+        assert row[2].startswith('0x')
+        assert row[19].startswith('{name: {firstname: ')
+        assert row[18].startswith('(') and row[18].endswith('True)') or row[18].endswith('False)')
+        assert 'mo' in row[24]
+
+    def test_nested_text_is_quoted(self):
+        quoted_list = re.compile(r"^\[('([^']|'')*'(, '([^']|'')*')*)?\]$")
+        generator = CsvGenerator([('k', 'int'), ('l', 'list<text>')], ['k'], collection_size=10)
+        for _, value in generator.rows(0, 50):
+            assert quoted_list.match(value), value
+
+    def test_narrow_key_types_dont_wrap(self):
+        generator = CsvGenerator([('k', 'tinyint'), ('v', 'text')], ['k'])
+        assert [row[0] for row in generator.rows(126, 128)] == ['126', '127']
+        with self.assertRaisesRegex(ValueError, "129 rows don't fit in the tinyint key column k"):
+            list(generator.rows(0, 129))
+        with self.assertRaisesRegex(ValueError, 'smallint key column zb'):
+            CsvGenerator(COLUMNS, ['zb'], USER_TYPES).write(os.path.join(tempfile.gettempdir(), 'unused'), num_rows=40000)
+
+    def test_sharded_write_is_deterministic(self):
+        directory = tempfile.mkdtemp()
+        generator = CsvGenerator(COLUMNS, ['a', 'b'], USER_TYPES, seed=7, null_fraction=0.1)
+        first = generator.write(os.path.join(directory, 'first'), num_rows=1000, shards=4, processes=2)
+        second = generator.write(os.path.join(directory, 'second'), num_rows=1000, shards=4, processes=1)
+        assert len(first) == 4
+        rows = []
+        for first_shard, second_shard in zip(first, second):
+            with open(first_shard, newline='', encoding='utf-8') as f, open(second_shard, newline='', encoding='utf-8') as g:
+                assert f.read() == g.read()
+            with open(first_shard, newline='', encoding='utf-8') as f:
+                rows.extend(csv.reader(f))
+        assert len(rows) == 1000
+        assert len({row[0] for row in rows}) == 1000
+        assert [row[1] for row in rows] == [str(i) for i in range(1000)]
+        assert any(value == '' for row in rows for value in row)
@@ -0,0 +1,72 @@
+from unittest import TestCase
+
+from mock import Mock
+from meta_tests.utils_test.fake_session import FakeSession
+from tools.data import ConcurrentLoader, bulk_load
+
+
+def _statement():
+    statement = Mock(name='statement')
+    statement.bind.side_effect = lambda params: tuple(params)
+    return statement
+
+
+class TestConcurrentLoader(TestCase):
+
+    def test_loads_every_item(self):
+        session = FakeSession()
+        stats = bulk_load(session, _statement(), ((i,) for i in range(500)), concurrency=10, group_by_replica=False)
+        assert stats.rows == 500
+        assert stats.errors == 0
+        assert sorted(session.executed) == [(i,) for i in range(500)]
+
+    def test_concurrency_is_bounded(self):
+        session = FakeSession()
+        bulk_load(session, _statement(), ((i,) for i in range(200)), concurrency=7, group_by_replica=False)
+        assert 0 < session.max_in_flight <= 7
+
+    def test_parameters_consumed_lazily(self):
+        """
+        The loader must pull an item only once the request of the previous one
+        was executed, never reading the parameters ahead.
+        """
+        session = FakeSession()
+        # the number of requests executed when each item was pulled
+        executed_when_pulled = []
+
+        def parameters():
+            for i in range(100):
+                executed_when_pulled.append(len(session.executed))
+                yield (i,)
+
+        loader = ConcurrentLoader(session, _statement(), concurrency=5, group_by_replica=False)
+        assert session.executed == [] and executed_when_pulled == []
+        loader.load(parameters())
+        assert len(executed_when_pulled) == 100
+        assert executed_when_pulled[0] == 0
+        # an eager loader would pull every item before executing any of them
+        assert all(executed == i for i, executed in enumerate(executed_when_pulled))
+
+    def test_errors_counted_when_not_raising(self):
+        session = FakeSession(failing={(3,), (4,)})
+        stats = bulk_load(session, _statement(), ((i,) for i in range(10)), concurrency=2,
+                          raise_on_first_error=False, group_by_replica=False)
+        assert stats.rows == 8
+        assert stats.errors == 2
+
+    def test_raise_on_first_error(self):
+        session = FakeSession(failing={(3,)})
+        with self.assertRaises(RuntimeError):
+            bulk_load(session, _statement(), ((i,) for i in range(1000)), concurrency=2, group_by_replica=False)
+        assert len(session.executed) < 1000
+
+    def test_groups_window_by_replica(self):
+        session = FakeSession()
+        session.cluster = Mock(name='cluster')
+        session.cluster.metadata.get_replicas.side_effect = lambda ks, key: ['host{}'.format(key % 2)]
+        statement = Mock(name='statement')
+        statement.bind.side_effect = lambda params: Mock(keyspace='ks', routing_key=params[0], params=params)
+
+        loader = ConcurrentLoader(session, statement, concurrency=1, group_by_replica=True, window_size=4)
+        loader.load((i,) for i in range(8))
+        assert [bound.params[0] for bound in session.executed] == [0, 2, 1, 3, 4, 6, 5, 7]
@@ -0,0 +1,92 @@
+from unittest import TestCase
+
+from tools.datagen import DataGenerator, DataVerifier, column_type
+
+
+COLUMNS = [('key', 'int'), ('t', 'text'), ('u', 'uuid'), ('b', 'blob'), ('d', 'double'),
+           ('l', 'list<int>'), ('s', 'set<text>'), ('m', 'map<text, frozen<list<bigint>>>')]
+
+
+class TestDataGenerator(TestCase):
+
+    def test_rows_are_deterministic(self):
+        """
+        The same (seed, index) always produces the same row, regardless of which
+        batch it was generated in.
+        """
+        first = DataGenerator(COLUMNS, seed=3)
+        second = DataGenerator(COLUMNS, seed=3)
+        assert first.row(17) == second.row(17)
+        assert first.batch_rows(range(10, 20))[7] == first.row(17)
+        assert list(first.rows(0, 50, batch_size=7)) == first.batch_rows(range(50))
+
+    def test_seed_changes_values(self):
+        assert DataGenerator(COLUMNS, seed=1).row(5)[1:] != DataGenerator(COLUMNS, seed=2).row(5)[1:]
+
+    def test_key_column_maps_back_to_index(self):
+        for key_type in ('int', 'bigint', 'text'):
+            gen = DataGenerator([('key', key_type), ('v', 'int')])
+            for index in (0, 1, 123456):
+                assert gen.key_index(gen.row(index)[0]) == index
+
+    def test_value_types(self):
+        row = DataGenerator(COLUMNS).row(0)
+        assert isinstance(row[0], int)
+        assert len(row[1]) == 16
+        assert row[2].version == 4
+        assert isinstance(row[3], bytes) and len(row[3]) == 16
+        assert isinstance(row[4], float)
+        assert isinstance(row[5], list) and len(row[5]) <= 5
+        assert isinstance(row[6], set)
+        assert isinstance(row[7], dict)
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            column_type('duration')
+        with self.assertRaises(ValueError):
+            DataGenerator([('key', 'uuid'), ('v', 'int')])
+
+    def test_narrow_key_types_dont_wrap(self):
+        gen = DataGenerator([('key', 'tinyint'), ('v', 'int')])
+        assert gen.key_index(gen.row(127)[0]) == 127
+        with self.assertRaisesRegex(ValueError, 'out of range for a tinyint'):
+            gen.row(128)
+        with self.assertRaisesRegex(ValueError, 'out of range for a smallint'):
+            DataGenerator([('key', 'smallint')]).batch_rows(range(32760, 32770))
+
+    def test_queries(self):
+        gen = DataGenerator([('key', 'int'), ('v', 'text')])
+        assert gen.create_table_query('ks.cf') == 'CREATE TABLE ks.cf (key int, v text, PRIMARY KEY (key))'
+        assert gen.insert_query('ks.cf') == 'INSERT INTO ks.cf (key, v) VALUES (?, ?)'
+        assert gen.select_query('ks.cf') == 'SELECT key, v FROM ks.cf'
+
+
+class TestDataVerifier(TestCase):
+
+    def test_matching_rows(self):
+        gen = DataGenerator(COLUMNS)
+        verifier = DataVerifier(gen, key_range=(0, 100))
+        rows = gen.batch_rows(range(100))
+        verifier.check_rows(reversed(rows), batch_size=30)
+        verifier.assert_ok()
+        assert verifier.checked == 100
+
+    def test_empty_collections_read_as_null(self):
+        gen = DataGenerator(COLUMNS)
+        verifier = DataVerifier(gen)
+        rows = [tuple(None if value in ([], set(), {}) else value for value in row) for row in gen.batch_rows(range(50))]
+        verifier.check_rows(rows)
+        verifier.assert_ok()
+
+    def test_reports_mismatches_and_missing_keys(self):
+        gen = DataGenerator(COLUMNS)
+        verifier = DataVerifier(gen, key_range=(0, 20), max_mismatches=1)
+        rows = gen.batch_rows(range(18))
+        rows[3] = (rows[3][0], 'wrong') + rows[3][2:]
+        rows[4] = rows[4][:4] + (0.5,) + rows[4][5:]
+        verifier.check_rows(rows)
+        assert verifier.mismatch_count == 2
+        assert verifier.mismatches == [(3, 't', gen.row(3)[1], 'wrong')]
+        assert verifier.missing == 2
+        with self.assertRaises(AssertionError):
+            verifier.assert_ok()
@@ -0,0 +1,45 @@
+import threading
+
+
+class FakeFuture(object):
+    """
+    Stands in for a driver ResponseFuture, completing from a separate thread so the
+    backpressure of the callers is exercised. Its rows are the single request it ran.
+    """
+
+    def __init__(self, session, request):
+        self.session = session
+        self.request = request
+
+    def add_callbacks(self, callback, errback, callback_args=()):
+        def complete():
+            with self.session.lock:
+                self.session.in_flight -= 1
+            if self.request in self.session.failing:
+                errback(RuntimeError('failed {}'.format(self.request)))
+            else:
+                callback([self.request], *callback_args)
+        threading.Timer(0.001, complete).start()
+
+
+class FakeSession(object):
+    """
+    Stands in for a driver Session running requests with execute_async(), recording the
+    most requests ever in flight. A request is the parameters, or the bound statement when
+    there are none, and those in `failing` fail.
+    """
+
+    def __init__(self, failing=()):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.executed = []
+        self.failing = set(failing)
+
+    def execute_async(self, statement, parameters=None):
+        request = statement if parameters is None else parameters
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.executed.append(request)
+        return FakeFuture(self, request)
@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tools.gc_log import GCLogStats, analyze_node_gc_logs, node_gc_logs, parse_gc_log
+
+K = 1024
+M = 1024 * 1024
+
+CMS_LOG = (
+    """\
+Java HotSpot(TM) 64-Bit Server VM (25.161-b12) for linux-amd64 JRE (1.8.0_161-b12), built on Dec 19 2017
+CommandLine flags: -XX:+PrintGCDetails -XX:+PrintGCDateStamps -XX:+UseConcMarkSweepGC
+{Heap before GC invocations=0 (full 0):
+ par new generation   total 377472K, used 335744K [0x0000000080000000, 0x0000000099990000)
+2018-06-01T10:00:01.000+0000: 1.000: [GC (Allocation Failure) 2018-06-01T10:00:01.000+0000: 1.000: [ParNew
+Desired survivor size 41943040 bytes, new threshold 1 (max 1)
+- age   1:   12345678 bytes,   12345678 total
+: 300000K->20000K(377472K), 0.0200000 secs] 300000K->20000K(2055168K), 0.0210000 secs] [Times: user=0.05 sys=0.01, real=0.02 secs]
+Heap after GC invocations=1 (full 0):
+ par new generation   total 377472K, used 20000K [0x0000000080000000, 0x0000000099990000)
+}
+2018-06-01T10:00:01.021+0000: 1.021: Total time for which application threads were stopped: 0.0215000 seconds, Stopping threads took: 0.0000341 seconds
+"""
+    "2018-06-01T10:00:03.000+0000: 3.000: [GC (Allocation Failure) 2018-06-01T10:00:03.000+0000: 3.000: "
+    "[ParNew: 320000K->30000K(377472K), 0.0500000 secs] 340000K->60000K(2055168K), 0.0510000 secs] [Times: user=0.10 sys=0.00, real=0.05 secs]\n"
+    """\
+2018-06-01T10:00:03.100+0000: 3.100: [GC (CMS Initial Mark) [1 CMS-initial-mark: 30000K(1677696K)] 70000K(2055168K), 0.0030000 secs] [Times: user=0.01 sys=0.00, real=0.00 secs]
+2018-06-01T10:00:03.103+0000: 3.103: [CMS-concurrent-mark-start]
+2018-06-01T10:00:03.200+0000: 3.200: [CMS-concurrent-mark: 0.097/0.097 secs] [Times: user=0.30 sys=0.01, real=0.10 secs]
+"""
+    "2018-06-01T10:00:05.000+0000: 5.000: [Full GC (System.gc()) 2018-06-01T10:00:05.000+0000: 5.000: [CMS: 40000K->10000K(1677696K), 0.2000000 secs] 100000K->10000K(2055168K), "
+    "[Metaspace: 30000K->30000K(1077248K)], 0.2010000 secs] [Times: user=0.20 sys=0.00, real=0.20 secs]\n"
+    """\
+2018-06-01T10:00:06.000+0000: 6.000: [GC (Allocation Fail
+""")
+
+G1_LOG = """\
+Java HotSpot(TM) 64-Bit Server VM (25.161-b12) for linux-amd64 JRE (1.8.0_161-b12), built on Dec 19 2017
+2.000: [GC pause (G1 Evacuation Pause) (young), 0.0100000 secs]
+   [Parallel Time: 9.5 ms, GC Workers: 4]
+   [Eden: 24.0M(24.0M)->0.0B(21.0M) Survivors: 0.0B->3072.0K Heap: 24.0M(256.0M)->4096.0K(256.0M)]
+ [Times: user=0.03 sys=0.00, real=0.01 secs]
+4.000: [GC pause (G1 Evacuation Pause) (young), 0.0200000 secs]
+   [Eden: 21.0M(21.0M)->0.0B(20.0M) Survivors: 3072.0K->4096.0K Heap: 26.0M(256.0M)->6144.0K(256.0M)]
+ [Times: user=0.05 sys=0.00, real=0.02 secs]
+4.100: [GC concurrent-root-region-scan-start]
+4.200: [GC remark, 0.0040000 secs]
+"""
+
+UNIFIED_LOG = """\
+[2019-02-05T14:47:31.084+0000][0.008s][1234][1235][info ] Using G1
+[2019-02-05T14:47:31.084+0000][0.008s][1234][1235][info ] Heap region size: 1M
+[2019-02-05T14:47:33.000+0000][2.000s][1234][1240][info ] GC(0) Eden regions: 24->0(21)
+[2019-02-05T14:47:33.000+0000][2.000s][1234][1240][info ] GC(0) Survivor regions: 0->3(3)
+[2019-02-05T14:47:33.000+0000][2.000s][1234][1240][info ] GC(0) Pause Young (Normal) (G1 Evacuation Pause) 24M->4M(256M) 10.000ms
+[2019-02-05T14:47:33.010+0000][2.010s][1234][1240][info ] Total time for which application threads were stopped: 0.0105 seconds, Stopping threads took: 0.0001 seconds
+[2019-02-05T14:47:35.000+0000][4.000s][1234][1240][info ] GC(1) Pause Young (Concurrent Start) (G1 Humongous Allocation) 44M->14M(256M) 30.000ms
+[2019-02-05T14:47:35.050+0000][4.050s][1234][1241][info ] GC(2) Concurrent Cycle
+[2019-02-05T14:47:35.100+0000][4.100s][1234][1241][info ] GC(2) Pause Remark 20M->20M(256M) 2.500ms
+[2019-02-05T14:47:36.000+0000][5.000s][1234][1241][info ] Safepoint "G1CollectFull", Time since last: 1000 ns, Reaching safepoint: 1000 ns, At safepoint: 100000000 ns, Total: 100001000 ns
+[2019-02-05T14:47:36.000+0000][5.000s][1234][1240][info ] GC(3) Pause Full (System.gc()) 30M->10M(256M) 100.000ms
+[2019-02-05T14:47:37.000+0000][6.000s][1234][1240][info ] GC(4) Pause Young (Normal) (G1
+"""
+
+
+class TestGCLog(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_jdk8_cms(self):
+        pauses = list(parse_gc_log(io.StringIO(CMS_LOG)))
+        assert [(p.uptime, p.kind, p.cause, p.seconds) for p in pauses] == \
+            [(1.0, 'young', 'Allocation Failure', 0.021), (3.0, 'young', 'Allocation Failure', 0.051),
+             (3.1, 'other', 'CMS Initial Mark', 0.003), (5.0, 'full', 'System.gc()', 0.201)]
+        assert (pauses[1].heap_before, pauses[1].heap_after, pauses[1].heap_capacity) == \
+            (340000 * K, 60000 * K, 2055168 * K)
+        assert (pauses[1].young_before, pauses[1].young_after, pauses[1].promoted) == \
+            (320000 * K, 30000 * K, 10000 * K)
+        # the metaspace isn't the heap
+        assert (pauses[3].heap_before, pauses[3].heap_after, pauses[3].promoted) == (100000 * K, 10000 * K, None)
+
+        stats = GCLogStats().add_log(io.StringIO(CMS_LOG))
+        assert (stats.pauses, stats.young_pauses, stats.full_pauses) == (4, 2, 1)
+        assert round(stats.pause_seconds, 6) == 0.276 and stats.max_pause == 0.201
+        assert stats.stopped_seconds == 0.0215
+        # 320000K allocated from 1s to 3s and 40000K from 3s to 5s
+        assert stats.allocated_bytes == 360000 * K and stats.elapsed == 4.0
+        assert stats.allocation_rate == 90000 * K and stats.promotion_rate == 2500 * K
+
+    def test_jdk8_g1(self):
+        pauses = list(parse_gc_log(io.StringIO(G1_LOG)))
+        assert [(p.uptime, p.kind, p.seconds) for p in pauses] == \
+            [(2.0, 'young', 0.01), (4.0, 'young', 0.02), (4.2, 'other', 0.004)]
+        assert (pauses[0].young_before, pauses[0].young_after) == (24 * M, 3 * M)
+        assert (pauses[0].heap_before, pauses[0].heap_after, pauses[0].promoted) == (24 * M, 4 * M, 1 * M)
+        stats = GCLogStats().add_log(io.StringIO(G1_LOG))
+        assert stats.allocation_rate == 11 * M and stats.promotion_rate == 0
+
+    def test_unified(self):
+        pauses = list(parse_gc_log(io.StringIO(UNIFIED_LOG)))
+        assert [(p.uptime, p.kind, p.cause, p.seconds) for p in pauses] == \
+            [(2.0, 'young', 'G1 Evacuation Pause', 0.01), (4.0, 'young', 'G1 Humongous Allocation', 0.03),
+             (4.1, 'other', 'Remark', 0.0025), (5.0, 'full', 'System.gc()', 0.1)]
+        assert (pauses[0].young_before, pauses[0].young_after, pauses[0].promoted) == (24 * M, 3 * M, 1 * M)
+        assert pauses[1].young_before is None and pauses[2].heap_before == 20 * M
+
+        stats = GCLogStats().add_log(io.StringIO(UNIFIED_LOG))
+        assert (stats.pauses, stats.young_pauses, stats.full_pauses) == (4, 2, 1)
+        assert round(stats.stopped_seconds, 6) == 0.110501
+        assert stats.allocated_bytes == 56 * M and stats.elapsed == 3.0
+        summary = stats.as_dict()
+        assert summary['max_pause_ms'] == 100 and round(summary['total_pause_ms'], 6) == 142.5
+        json.dumps(summary)
+        assert '4 pauses (2 young, 1 full), 142.5ms in total, longest 100.0ms' in stats.format_summary()
+
+    def test_node_logs(self):
+        class FakeNode(object):
+            def gclogfilename(node):
+                return os.path.join(self.dir, 'gc.log.0.current')
+
+        node = FakeNode()
+        assert node_gc_logs(node) == [] and analyze_node_gc_logs(node).pauses == 0
+        assert GCLogStats().add_log(io.StringIO('')).pauses == 0
+
+        for name, log in (('gc.log.0.current', CMS_LOG), ('gc.log.1', G1_LOG), ('system.log', UNIFIED_LOG)):
+            with open(os.path.join(self.dir, name), 'w') as f:
+                f.write(log)
+        assert [os.path.basename(path) for path in node_gc_logs(node)] == ['gc.log.0.current', 'gc.log.1']
+        stats = analyze_node_gc_logs(node)
+        # the heap isn't followed from one log to the other
+        assert (stats.logs, stats.pauses, stats.elapsed) == (2, 7, 6.0)
@@ -0,0 +1,134 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+from unittest import TestCase
+
+import pytest
+
+from tools.hints import (HintsFile, HintsMonitor, hints_files, hints_per_host, read_hints_descriptor,
+                         read_hints_directory)
+
+HOST = uuid.UUID('1b2f1d5e-4a0c-4d8e-9f5a-0123456789ab')
+OTHER_HOST = uuid.UUID('fe000000-0000-4000-8000-000000000001')
+
+
+def _ints(value):
+    """The low and high ints of a long, as signed Java ints"""
+    return [half - (1 << 32) if half >= 1 << 31 else half for half in (value & 0xffffffff, (value >> 32) & 0xffffffff)]
+
+
+def _descriptor(host_id, timestamp, params=None, version=2):
+    params = json.dumps(params or {}).encode('utf-8')
+    msb, lsb = struct.unpack('>qq', host_id.bytes)
+    header = struct.pack('>iqqqi', version, timestamp, msb, lsb, len(params))
+    # HintsDescriptor.serialize checksums every long as its low int, then its high int
+    ints = _ints(timestamp) + _ints(msb) + _ints(lsb)
+    crc = zlib.crc32(struct.pack('>8i', version, *ints, len(params)))
+    return header + struct.pack('>I', crc) + params + struct.pack('>I', zlib.crc32(params, crc))
+
+
+def _hint(creation_time, mutation=b'mutation', gc_grace_seconds=864000):
+    # gc_grace_seconds as a 3 byte unsigned vint
+    hint = struct.pack('>q', creation_time) + bytes([0xc0 | gc_grace_seconds >> 16]) + \
+        struct.pack('>H', gc_grace_seconds & 0xffff) + mutation
+    size = struct.pack('>i', len(hint))
+    crc = zlib.crc32(size)
+    return size + struct.pack('>I', crc) + hint + struct.pack('>I', zlib.crc32(hint, crc))
+
+
+class TestHints(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _write(self, host_id, timestamp, data, checksum=False, mode='wb'):
+        path = os.path.join(self.dir, '{}-{}-2.hints'.format(host_id, timestamp))
+        with open(path, mode) as f:
+            f.write(data)
+        if checksum:
+            with open(path, 'rb') as f:
+                crc = zlib.crc32(f.read())
+            with open(path[:-len('.hints')] + '.crc32', 'w') as f:
+                f.write('{}\n'.format(crc))
+        return path
+
+    def test_hints_file(self):
+        hints = b''.join(_hint(1000 + i) for i in range(5))
+        path = self._write(HOST, 1500000000000, _descriptor(HOST, 1500000000000) + hints + _hint(9)[:10],
+                           checksum=True)
+        with HintsFile(path) as hints_file:
+            assert hints_file.host_id == HOST and hints_file.descriptor.host_id == HOST
+            assert hints_file.descriptor.crc_valid and hints_file.descriptor.entries_readable
+            entries = list(hints_file.entries())
+            # the partial hint at the end isn't one yet
+            assert [entry.creation_time for entry in entries] == [1000, 1001, 1002, 1003, 1004]
+            assert all(entry.crc_valid and entry.gc_grace_seconds == 864000 and entry.size == 19 for entry in entries)
+            assert hints_file.checksum_valid()
+            summary = hints_file.summary()
+        assert (summary.hints, summary.hint_bytes, summary.invalid_hints) == (5, 95, 0)
+
+        # the header checksummed as the big-endian longs it holds isn't what Cassandra writes
+        descriptor = bytearray(_descriptor(HOST, 1500000000000))
+        descriptor[32:36] = struct.pack('>I', zlib.crc32(bytes(descriptor[:32])))
+        assert not read_hints_descriptor(bytes(descriptor)).crc_valid
+
+        corrupted = bytearray(_hint(7))
+        corrupted[12] ^= 0xff
+        path = self._write(OTHER_HOST, 1, _descriptor(OTHER_HOST, 1) + _hint(6) + bytes(corrupted) + _hint(8))
+        with HintsFile(path) as hints_file:
+            assert [entry.crc_valid for entry in hints_file.entries()] == [True, False, True]
+            assert hints_file.checksum_valid() is None
+
+    def test_compressed_and_invalid_files(self):
+        params = {'compression': {'class_name': 'LZ4Compressor'}}
+        path = self._write(HOST, 1, _descriptor(HOST, 1, params) + b'\x00' * 100)
+        with HintsFile(path) as hints_file:
+            assert hints_file.descriptor.compression == params['compression']
+            with pytest.raises(ValueError, match='compressed or encrypted'):
+                list(hints_file.entries())
+            assert hints_file.summary().hints is None
+
+        self._write(HOST, 2, b'')
+        self._write(HOST, 3, _descriptor(HOST, 3)[:20])
+        bad_size = bytearray(_hint(1))
+        bad_size[4] ^= 0x01
+        self._write(OTHER_HOST, 1, _descriptor(OTHER_HOST, 1) + bytes(bad_size) + _hint(2))
+        with pytest.raises(ValueError, match='is not a hints file'):
+            HintsFile(os.path.join(self.dir, 'foo.hints'))
+
+        summaries = read_hints_directory(self.dir)
+        assert [(s.host_id, s.timestamp, s.hints, s.invalid_hints) for s in summaries] == \
+            [(HOST, 1, None, None), (OTHER_HOST, 1, 1, 1)]
+        assert hints_per_host(summaries) == {HOST: {'files': 1, 'bytes': summaries[0].bytes, 'hints': 0},
+                                             OTHER_HOST: {'files': 1, 'bytes': summaries[1].bytes, 'hints': 1}}
+        assert len(hints_files(self.dir)) == 4 and hints_files(os.path.join(self.dir, 'missing')) == []
+
+    def test_monitor(self):
+        with HintsMonitor(self.dir, interval=0.05) as monitor:
+            first = self._write(HOST, 1, _descriptor(HOST, 1) + _hint(1))
+            monitor.wait_for_hints(1, timeout=10)
+            self._write(HOST, 1, _hint(2) + _hint(3)[:15], mode='ab')
+            self._write(HOST, 1, _hint(3)[15:], mode='ab')
+            self._write(OTHER_HOST, 2, _descriptor(OTHER_HOST, 2) + _hint(4))
+            monitor.wait_for_hints(4, timeout=10)
+            assert monitor.samples[-1].files == 2
+            with pytest.raises(RuntimeError, match="didn't reach 5"):
+                monitor.wait_for_hints(5, timeout=0.2)
+
+            time.sleep(0.1)
+            os.remove(first)
+            os.remove(os.path.join(self.dir, '{}-2-2.hints'.format(OTHER_HOST)))
+            monitor.wait_until_drained(timeout=10)
+
+        stats = monitor.stats()
+        assert (stats['written_hints'], stats['delivered_hints'], stats['peak_hints']) == (4, 4, 4)
+        assert stats['bytes_per_hint'] == 19
+        assert stats['written_per_second'] > 0 and stats['delivered_per_second'] > 0
+        assert stats['write_seconds'] >= 0 and stats['delivery_seconds'] >= 0
+        assert 'written_hints=4' in monitor.format_stats()
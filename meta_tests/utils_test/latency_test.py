@@ -0,0 +1,120 @@
+import multiprocessing
+from unittest import TestCase
+
+from cassandra import OperationTimedOut, ReadTimeout, Unavailable
+from cassandra.cluster import NoHostAvailable
+
+from tools.latency import (HistogramBuckets, LatencyPhases, LatencyRecorder, classify_error,
+                           format_phase_report)
+
+
+def _record(recorder, seconds):
+    for value in seconds:
+        recorder.record(value)
+    recorder.record_error(Unavailable('not enough replicas'))
+    recorder.flush()
+
+
+class TestHistogramBuckets(TestCase):
+
+    def test_values_within_precision(self):
+        buckets = HistogramBuckets(60 * 1000000, precision_bits=7)
+        previous = -1
+        for value in list(range(0, 300)) + [1000, 12345, 999999, 59999999]:
+            index = buckets.index(value)
+            assert index >= previous
+            previous = index
+            highest = buckets.highest_value(index)
+            assert value <= highest <= value + value / 64.0
+        assert buckets.index(10 ** 12) == buckets.size - 1
+        assert buckets.index(-5) == 0
+
+    def test_percentile(self):
+        buckets = HistogramBuckets(1000000)
+        counts = [0] * buckets.size
+        for value in range(1, 101):
+            counts[buckets.index(value * 1000)] += 1
+        assert abs(buckets.percentile(counts, 0.5) - 50000) <= 50000 / 64.0
+        assert abs(buckets.percentile(counts, 0.99) - 99000) <= 99000 / 64.0
+        assert buckets.percentile([0] * buckets.size, 0.5) is None
+
+
+class TestLatencyRecorder(TestCase):
+
+    def test_classify_error(self):
+        assert classify_error(OperationTimedOut()) == 'timeouts'
+        assert classify_error(ReadTimeout('timed out')) == 'timeouts'
+        assert classify_error(Unavailable('not enough replicas')) == 'unavailables'
+        assert classify_error(NoHostAvailable('no host', {})) == 'unavailables'
+        assert classify_error(RuntimeError()) == 'errors'
+
+    def test_records_only_once_flushed(self):
+        recorder = LatencyRecorder(max_seconds=10)
+        recorder.record(0.002)
+        recorder.record_error(OperationTimedOut())
+        counts, stats = recorder.snapshot()
+        assert sum(counts) == 0
+        recorder.flush()
+        counts, stats = recorder.snapshot()
+        assert sum(counts) == 1
+        assert stats == [1, 0, 0, 2000]
+
+    def test_shared_with_worker_process(self):
+        recorder = LatencyRecorder(max_seconds=10)
+        worker = multiprocessing.Process(target=_record, args=(recorder, [0.001, 0.002, 0.003]))
+        worker.start()
+        worker.join(10)
+        assert worker.exitcode == 0
+        counts, stats = recorder.snapshot()
+        assert sum(counts) == 3
+        assert stats[1] == 1
+
+    def test_spawned_copy_starts_without_local_state(self):
+        recorder = LatencyRecorder(max_seconds=1)
+        recorder.record(0.5)
+        state = recorder.__getstate__()
+        assert '_local_lock' not in state
+        copy = LatencyRecorder.__new__(LatencyRecorder)
+        copy.__setstate__(state)
+        copy.flush()
+        assert sum(recorder.snapshot()[0]) == 0
+        recorder.flush()
+        assert sum(copy.snapshot()[0]) == 1
+
+
+class TestLatencyPhases(TestCase):
+
+    def test_splits_measurements_by_phase(self):
+        writes, reads = LatencyRecorder(), LatencyRecorder()
+        phases = LatencyPhases({'writes': writes, 'reads': reads})
+        phases.enter('before')
+        for _ in range(99):
+            writes.record(0.001)
+        writes.record(0.100)
+        reads.record(0.002)
+        writes.flush()
+        reads.flush()
+        phases.enter('node1 down')
+        writes.record_error(ReadTimeout('timed out'))
+        writes.record_error(Unavailable('not enough replicas'))
+        writes.record(0.010)
+        writes.flush()
+        report = phases.finish()
+
+        assert [phase['phase'] for phase in report] == ['before', 'node1 down']
+        before, down = report[0]['writes'], report[1]['writes']
+        assert before['requests'] == 100
+        assert abs(before['p50_ms'] - 1.0) < 0.05
+        assert abs(before['max_ms'] - 100.0) < 2
+        assert before['timeouts'] == before['unavailables'] == 0
+        assert report[0]['reads']['requests'] == 1
+        assert down['requests'] == 1
+        assert abs(down['p99_ms'] - 10.0) < 0.2
+        assert down['timeouts'] == 1
+        assert down['unavailables'] == 1
+        assert report[1]['reads'] == {'requests': 0, 'p50_ms': None, 'p99_ms': None, 'max_ms': None,
+                                      'timeouts': 0, 'unavailables': 0, 'errors': 0}
+
+        table = format_phase_report(report)
+        assert 'node1 down' in table
+        assert len(table.splitlines()) == 2 + 4
@@ -0,0 +1,80 @@
+import subprocess
+import sys
+import time
+from unittest import TestCase
+
+from tools.node_footprint import FootprintSample, NodeFootprint, NodeFootprintSampler
+
+
+class FakeNode(object):
+    def __init__(self, name, pid=None):
+        self.name = name
+        self.pid = pid
+
+
+class FakeCluster(object):
+    def __init__(self, *nodes):
+        self.nodes = list(nodes)
+
+    def nodelist(self):
+        return self.nodes
+
+
+def _sample(pid, rss, cpu, fds, threads, io=None):
+    return FootprintSample(time=time.time(), pid=pid, rss=rss, cpu_seconds=cpu, fds=fds, threads=threads,
+                           read_bytes=io, write_bytes=io)
+
+
+class TestNodeFootprint(TestCase):
+
+    def _process(self):
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        return process
+
+    def test_footprint(self):
+        footprint = NodeFootprint('node1')
+        for sample in (_sample(1, 100, 1.0, 10, 50, 0), _sample(1, 300, 2.0, 30, 80, 1000),
+                       _sample(2, 150, 0.5, 12, 40, 10), _sample(2, 200, 1.5, 15, 45, 510)):
+            footprint.add(sample)
+        assert footprint.pids == [1, 2] and footprint.restarts == 1
+        assert (footprint.peak_rss, footprint.peak_fds, footprint.peak_threads) == (300, 30, 80)
+        # the gauges of the JVM running now, the counters of both
+        assert (footprint.rss_delta, footprint.fds_delta, footprint.threads_delta) == (50, 3, 5)
+        assert (footprint.cpu_seconds, footprint.read_bytes, footprint.write_bytes) == (2.0, 1500, 1500)
+
+        footprint.add(_sample(2, 200, 2.5, None, 45))
+        assert footprint.fds_delta is None and footprint.peak_fds == 30 and footprint.read_bytes is None
+        assert NodeFootprint('node2').as_dict()['peak_rss'] is None
+
+    def test_sampler(self):
+        first, second = self._process(), self._process()
+        node1, node2 = FakeNode('node1', first.pid), FakeNode('node2')
+        with NodeFootprintSampler(FakeCluster(node1, node2), interval=0.05) as sampler:
+            time.sleep(0.3)
+            # node1 restarts, node2 is never started
+            first.kill()
+            first.wait()
+            node1.pid = second.pid
+            time.sleep(0.3)
+
+        footprint = sampler.footprint(node1)
+        assert footprint.pids == [first.pid, second.pid] and footprint.restarts == 1
+        assert footprint.peak_rss > 0 and footprint.peak_threads >= 1 and footprint.cpu_seconds >= 0
+        assert sampler.footprint('node2').samples == []
+        assert list(sampler.summary()) == ['node1']
+        samples = len(footprint.samples)
+        time.sleep(0.1)
+        assert len(footprint.samples) == samples
+        assert 'node1: peak rss' in sampler.format_summary()
+
+    def test_sampler_follows_replaced_cluster(self):
+        first, second = self._process(), self._process()
+        clusters = [FakeCluster(FakeNode('node1', first.pid))]
+        sampler = NodeFootprintSampler(lambda: clusters[-1])
+        sampler.sample()
+        clusters.append(FakeCluster(FakeNode('node1', second.pid), FakeNode('node2', second.pid)))
+        sampler.sample()
+        assert sampler.footprint('node1').pids == [first.pid, second.pid]
+        assert sampler.footprint('node2').pids == [second.pid]
@@ -0,0 +1,119 @@
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+import pytest
+from ccmlib.node import ToolError
+from mock import patch
+
+from tools.offline_tools import OfflineToolRunner, _ToolJVM
+
+# speaks the protocol of the java harness: the exit status is the number of arguments,
+# stdout the arguments, and the 'crash' class takes the JVM down
+FAKE_HARNESS = '''
+import base64, sys, time
+print('READY', flush=True)
+for line in sys.stdin:
+    if not line.strip():
+        break
+    fields = [base64.b64decode(field).decode('utf-8') for field in line.rstrip('\\n').split(' ')]
+    if fields[0] == 'crash':
+        sys.exit(3)
+    if fields[0] == 'slow':
+        time.sleep(5)
+    out = base64.b64encode(' '.join(fields[1:]).encode('utf-8')).decode('ascii')
+    err = base64.b64encode(fields[0].encode('utf-8')).decode('ascii')
+    print(len(fields) - 1, out, err, 12, flush=True)
+'''
+
+TOOL_SCRIPT = '''#!/bin/sh
+echo "$(basename "$0") $@"
+echo "on $CASSANDRA_CONF" >&2
+exit $#
+'''
+
+
+class FakeNode(object):
+
+    def __init__(self, root):
+        self.name = 'node1'
+        self.root = root
+
+    def get_install_cassandra_root(self):
+        return os.path.join(self.root, 'install')
+
+    def get_node_cassandra_root(self):
+        return os.path.join(self.root, 'node1')
+
+
+class TestOfflineToolRunner(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        for directory in ('install/bin', 'install/tools/bin', 'node1/bin'):
+            os.makedirs(os.path.join(self.dir, directory))
+        with open(os.path.join(self.dir, 'install', 'bin', 'cassandra.in.sh'), 'w') as f:
+            f.write('CASSANDRA_HOME=\nCASSANDRA_CONF=\nCLASSPATH=/nowhere/cassandra.jar\nJAVA=/nowhere/bin/java\n')
+        for tool in ('bin/sstableutil', 'tools/bin/sstablelevelreset', 'bin/sstableloader'):
+            path = os.path.join(self.dir, 'install', tool)
+            with open(path, 'w') as f:
+                f.write(TOOL_SCRIPT)
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        self.fake_harness = os.path.join(self.dir, 'harness.py')
+        with open(self.fake_harness, 'w') as f:
+            f.write(FAKE_HARNESS)
+        self.node = FakeNode(self.dir)
+
+    def test_tool_jvm_protocol(self):
+        jvm = _ToolJVM([sys.executable, self.fake_harness], env=os.environ.copy())
+        try:
+            assert jvm.run('org.example.Tool', ['ks', 'a b', ''], timeout=5) == (3, 'ks a b ', 'org.example.Tool', 0.012)
+            assert jvm.run('org.example.Tool', [], timeout=5)[0] == 0
+            with pytest.raises(RuntimeError, match='exited with status 3'):
+                jvm.run('crash', [], timeout=5)
+        finally:
+            jvm.close()
+
+        jvm = _ToolJVM([sys.executable, self.fake_harness], env=os.environ.copy())
+        with pytest.raises(subprocess.TimeoutExpired):
+            jvm.run('slow', [], timeout=0.2)
+        assert not jvm.alive()
+        jvm.close()
+
+        with pytest.raises(RuntimeError, match='failed to start'):
+            _ToolJVM([sys.executable, '-c', 'import sys; sys.stderr.write("no jdk"); sys.exit(1)'], env=os.environ.copy())
+
+    def test_falls_back_to_subprocesses_without_jdk(self):
+        with OfflineToolRunner(self.node) as runner:
+            util, reset = runner.run_all([('sstableutil', ['--type', 'tmp', 'ks', 'cf']),
+                                          ('sstablelevelreset', ['--really-reset', 'ks', 'cf'])])
+        assert (util.stdout, util.rc, util.in_jvm) == ('sstableutil --type tmp ks cf\n', 4, False)
+        assert util.stderr.strip() == 'on ' + os.path.join(self.dir, 'node1', 'conf')
+        assert reset.stdout.startswith('sstablelevelreset')
+        assert 'nowhere' in runner._jvm_unavailable
+        with pytest.raises(ToolError):
+            reset.check()
+        with pytest.raises(ValueError, match='No sstablefoo tool'):
+            runner.run('sstablefoo')
+
+    def test_shared_jvm(self):
+        with patch.object(OfflineToolRunner, '_jvm_command', return_value=[sys.executable, self.fake_harness]):
+            with OfflineToolRunner(self.node, invocations_per_jvm=2) as runner:
+                results = runner.run_all([('sstableutil', ['ks', 'cf']),
+                                          ('sstablelevelreset', ['--really-reset', 'ks', 'cf']),
+                                          ('sstableloader', ['-d', '127.0.0.1', 'ks']),
+                                          ('sstableutil', ['ks'], True),
+                                          ('sstableutil', [])])
+                # the first JVM was replaced after two invocations
+                assert runner._jvm.invocations == 1
+
+        assert [result.in_jvm for result in results] == [True, True, False, False, True]
+        assert results[0].stdout == 'ks cf' and results[0].stderr == 'org.apache.cassandra.tools.StandaloneSSTableUtil'
+        assert results[4].check() is results[4] and results[0].seconds == 0.012
+        assert results[2].stdout == 'sstableloader -d 127.0.0.1 ks\n'
+        assert len(runner.results) == 5
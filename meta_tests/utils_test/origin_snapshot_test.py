@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pytest
+
+from tools.origin_snapshot import OriginSnapshots
+
+
+class FakeNode(object):
+
+    def __init__(self, cluster, name):
+        self.cluster = cluster
+        self.name = name
+
+    def get_path(self):
+        return os.path.join(self.cluster.get_path(), self.name)
+
+
+class FakeCluster(object):
+    """The parts of a ccm Cluster OriginSnapshots uses, with nodes populated under path"""
+
+    def __init__(self, path, nodes=2, data_dir_count=1):
+        self.path = path
+        self._config_options = {'num_tokens': None}
+        self.partitioner = None
+        self.data_dir_count = data_dir_count
+        self.nodes = [FakeNode(self, 'node{}'.format(i)) for i in range(1, nodes + 1)]
+        for node in self.nodes:
+            for name in ('conf', 'logs', 'commitlogs') + tuple('data{}'.format(x) for x in range(data_dir_count)):
+                os.makedirs(os.path.join(node.get_path(), name))
+
+    def get_path(self):
+        return self.path
+
+    def nodelist(self):
+        return self.nodes
+
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+class TestOriginSnapshots(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.snapshots = OriginSnapshots(os.path.join(self.dir, 'snapshots'))
+
+    def test_key_follows_configuration(self):
+        cluster = FakeCluster(os.path.join(self.dir, 'first'))
+        key = self.snapshots.key(cluster, nodes=2, rf=1)
+        assert key == self.snapshots.key(FakeCluster(os.path.join(self.dir, 'second')), nodes=2, rf=1)
+        assert key != self.snapshots.key(cluster, nodes=3, rf=1)
+        cluster._config_options['row_cache_size_in_mb'] = 100
+        assert key != self.snapshots.key(cluster, nodes=2, rf=1)
+        cluster._config_options.pop('row_cache_size_in_mb')
+        cluster.partitioner = 'org.apache.cassandra.dht.ByteOrderedPartitioner'
+        assert key != self.snapshots.key(cluster, nodes=2, rf=1)
+
+    def test_restores_state_but_not_configuration(self):
+        prepared = FakeCluster(os.path.join(self.dir, 'prepared'), data_dir_count=2)
+        for node in prepared.nodelist():
+            _write(os.path.join(node.get_path(), 'data1', 'sstable'), node.name)
+            _write(os.path.join(node.get_path(), 'commitlogs', 'segment'), node.name)
+            _write(os.path.join(node.get_path(), 'conf', 'cassandra.yaml'), 'prepared')
+        key = self.snapshots.key(prepared)
+        assert not self.snapshots.has(key)
+        self.snapshots.save(key, prepared)
+        assert self.snapshots.has(key)
+
+        fresh = FakeCluster(os.path.join(self.dir, 'fresh'), data_dir_count=2)
+        for node in fresh.nodelist():
+            _write(os.path.join(node.get_path(), 'conf', 'cassandra.yaml'), 'fresh')
+            _write(os.path.join(node.get_path(), 'data0', 'leftover'), 'fresh')
+        self.snapshots.restore(key, fresh)
+
+        for node in fresh.nodelist():
+            assert _read(os.path.join(node.get_path(), 'data1', 'sstable')) == node.name
+            assert _read(os.path.join(node.get_path(), 'commitlogs', 'segment')) == node.name
+            assert _read(os.path.join(node.get_path(), 'conf', 'cassandra.yaml')) == 'fresh'
+            assert os.listdir(os.path.join(node.get_path(), 'data0')) == []
+
+    def test_cleanup(self):
+        cluster = FakeCluster(os.path.join(self.dir, 'cluster'))
+        key = self.snapshots.key(cluster)
+        self.snapshots.save(key, cluster)
+        self.snapshots.cleanup()
+        assert not os.path.exists(self.snapshots.root)
+        with pytest.raises(KeyError):
+            self.snapshots.restore(key, cluster)
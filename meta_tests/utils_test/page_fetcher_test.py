@@ -0,0 +1,110 @@
+import threading
+import time
+from unittest import TestCase
+
+from tools.paging import PageFetcher, rows_digest
+
+
+class FakePagedFuture(object):
+    """
+    Stands in for a driver ResponseFuture serving the given pages, each delivered
+    from a separate thread after `delay` seconds.
+    """
+
+    def __init__(self, pages, delay=0.01):
+        self.pages = list(pages)
+        self.delay = delay
+        self.served = 0
+        self.callback = None
+
+    def add_callbacks(self, callback, errback):
+        self.callback = callback
+        self._serve()
+
+    def _serve(self):
+        page = self.pages[self.served]
+        self.served += 1
+        threading.Timer(self.delay, self.callback, args=(page,)).start()
+
+    @property
+    def has_more_pages(self):
+        return self.served < len(self.pages)
+
+    def start_fetching_next_page(self):
+        self._serve()
+
+
+PAGES = [[[i, j] for j in range(3)] for i in range(20)]
+
+
+class TestPageFetcher(TestCase):
+
+    def test_request_all(self):
+        pf = PageFetcher(FakePagedFuture(PAGES)).request_all()
+        assert pf.pagecount() == 20
+        assert pf.num_results_all() == [3] * 20
+        assert pf.page_data(2) == PAGES[1]
+        assert pf.all_data() == [row for page in PAGES for row in page]
+
+    def test_request_one(self):
+        pf = PageFetcher(FakePagedFuture(PAGES))
+        assert pf.pagecount() == 1
+        pf.request_one()
+        assert pf.pagecount() == 2
+        assert pf.has_more_pages
+
+    def test_wait_does_not_poll(self):
+        """
+        Page arrival wakes the waiting thread right away instead of at the next
+        polling interval.
+        """
+        start = time.time()
+        PageFetcher(FakePagedFuture(PAGES, delay=0.001)).request_all()
+        assert time.time() - start < 20 * 0.1 / 2
+
+    def test_empty_final_page(self):
+        pf = PageFetcher(FakePagedFuture(PAGES[:2] + [[]])).request_all()
+        assert pf.pagecount() == 2
+        assert pf.retrieved_empty_pages == 1
+
+    def test_streaming_to_consumer(self):
+        received = []
+        pf = PageFetcher(FakePagedFuture(PAGES), consumer=lambda page_num, rows: received.append((page_num, rows)))
+        pf.request_all()
+        assert [page_num for page_num, _ in received] == list(range(1, 21))
+        assert pf.pages == []
+        assert pf.row_count == 60
+        with self.assertRaises(RuntimeError):
+            pf.all_data()
+
+        shuffled = PageFetcher(FakePagedFuture(reversed(PAGES)), consumer=lambda page_num, rows: None).request_all()
+        assert shuffled.digest == pf.digest == rows_digest(row for page in PAGES for row in page)
+
+    def test_consumer_error_is_raised_by_the_waiting_thread(self):
+        def consumer(page_num, rows):
+            if page_num == 3:
+                raise ValueError("bad page {}".format(page_num))
+
+        pf = PageFetcher(FakePagedFuture(PAGES), consumer=consumer)
+        start = time.time()
+        with self.assertRaisesRegex(ValueError, 'bad page 3'):
+            pf.request_all(timeout=10)
+        assert time.time() - start < 5
+        assert pf.retrieved_pages == 2
+
+    def test_digest_of_dict_rows(self):
+        assert rows_digest([{'k': 0, 'v': 'a'}, {'k': 1, 'v': 'b'}]) == rows_digest([{'v': 'b', 'k': 1}, {'k': 0, 'v': 'a'}])
+        assert rows_digest([{'k': 0, 'v': 'a'}]) != rows_digest([{'k': 0, 'v': 'b'}])
+
+    def test_latency_stats(self):
+        pf = PageFetcher(FakePagedFuture(PAGES, delay=0.01)).request_all()
+        summary = pf.latency_summary()
+        assert summary['pages'] == 20
+        assert 0.01 <= summary['min'] <= summary['p50'] <= summary['p99'] <= summary['max']
+
+    def test_timeout(self):
+        future = FakePagedFuture(PAGES)
+        pf = PageFetcher(future)
+        future.start_fetching_next_page = lambda: None
+        with self.assertRaisesRegex(RuntimeError, 'Requested pages were not delivered before timeout'):
+            pf.request_one(timeout=0.1)
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+from mock import MagicMock, Mock
+from tools.replica_digest import differing_ranges, replica_token_ranges
+from tools.scanner import RowDigest
+
+
+def _session_with_ring(tokens, owners):
+    """
+    Builds a mock session whose token map has the given ring tokens; owners maps
+    each token to the addresses replicating the range ending at it.
+    """
+    session = MagicMock(name='session')
+    ring = [Mock(value=token) for token in tokens]
+    token_map = session.cluster.metadata.token_map
+    token_map.ring = ring
+    token_map.get_replicas.side_effect = lambda ks, token: [Mock(address=a) for a in owners[token.value]]
+    return session
+
+
+class TestReplicaTokenRanges(TestCase):
+
+    def test_ranges_of_replica(self):
+        session = _session_with_ring([-100, 0, 100], {-100: ['127.0.0.1'], 0: ['127.0.0.2'], 100: ['127.0.0.1']})
+        assert replica_token_ranges(session, 'ks', '127.0.0.1') == [(100, None), (None, -100), (0, 100)]
+        assert replica_token_ranges(session, 'ks', '127.0.0.2') == [(-100, 0)]
+        assert replica_token_ranges(session, 'ks', '127.0.0.3') == []
+
+    def test_single_token_owns_whole_ring(self):
+        session = _session_with_ring([0], {0: ['127.0.0.1']})
+        assert replica_token_ranges(session, 'ks', '127.0.0.1') == [(None, None)]
+
+
+class TestDifferingRanges(TestCase):
+
+    def test_only_shared_ranges_compared(self):
+        first, second = RowDigest(), RowDigest()
+        first.consume((None, 0), [(1, 'a')])
+        first.consume((0, 10), [(2, 'b')])
+        second.consume((0, 10), [(2, 'c')])
+        second.consume((10, None), [(3, 'c')])
+        assert differing_ranges(first, second) == [(0, 10)]
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from unittest import TestCase
+
+from tools.result_compare import (RowDifference, compare_ordered, compare_rows,
+                                  compare_unordered)
+
+
+class TestCompareOrdered(TestCase):
+
+    def test_equal(self):
+        result = compare_ordered(iter([[1, 'a'], [2, 'b']]), ((k, v) for k, v in [(1, 'a'), (2, 'b')]))
+        assert result.equal
+        assert (result.actual_count, result.expected_count) == (2, 2)
+
+    def test_mismatch_missing_and_unexpected(self):
+        result = compare_ordered([[1], [2]], [[1], [3], [4]])
+        assert result.differences == [RowDifference('mismatch', 1, expected=[3], actual=[2]),
+                                      RowDifference('missing', 2, expected=[4])]
+        result = compare_ordered([[1], [2]], [[1]])
+        assert result.differences == [RowDifference('unexpected', 1, actual=[2])]
+
+    def test_stops_after_max_differences(self):
+        consumed = []
+
+        def actual():
+            for i in range(1000000):
+                consumed.append(i)
+                yield [i]
+
+        result = compare_ordered(actual(), ([-i] for i in range(1, 1000000)), max_differences=5)
+        assert len(result.differences) == 5
+        assert result.truncated
+        assert len(consumed) < 10
+
+
+class TestCompareUnordered(TestCase):
+
+    def test_equal_in_any_order(self):
+        assert compare_unordered(reversed([[i, i] for i in range(100)]), [[i, i] for i in range(100)]).equal
+
+    def test_maps_compare_equal_to_flattened_lists(self):
+        assert compare_unordered([[0, OrderedDict([(10, 11)])]], [[0, {10: 11}]]).equal
+
+    def test_duplicates_are_counted(self):
+        result = compare_unordered([[1], [1]], [[1], [2]])
+        assert result.differences == [RowDifference('unexpected', 1, actual=[1]),
+                                      RowDifference('missing', 1, expected=[2])]
+
+    def test_every_missing_duplicate_is_reported(self):
+        result = compare_unordered([[1], [2]], [[1], [2], [1], [1], [2]])
+        assert result.differences == [RowDifference('missing', 2, expected=[1]), RowDifference('missing', 3, expected=[1]),
+                                      RowDifference('missing', 4, expected=[2])]
+        assert not result.truncated
+
+    def test_missing_without_indexable_expected(self):
+        result = compare_unordered([], ([i] for i in range(3)), max_differences=2)
+        assert result.differences == [RowDifference('missing', 0), RowDifference('missing', 1)]
+        assert result.truncated
+
+    def test_describe(self):
+        result = compare_rows([[1], [5]], [[1], [2]], ignore_order=True)
+        message = result.describe('SELECT * FROM t')
+        assert message.startswith('Expected 2 rows from SELECT * FROM t, but got 2; 2 difference(s):')
+        assert 'row 1: unexpected [5]' in message
+        assert 'row 1: missing expected [2]' in message
@@ -0,0 +1,135 @@
+from unittest import TestCase
+
+from mock import MagicMock
+from tools.datagen import DataGenerator
+from tools.scanner import (BYTE_ORDERED_PARTITIONER, MURMUR3_MAX_TOKEN,
+                           MURMUR3_MIN_TOKEN, MURMUR3_PARTITIONER,
+                           RANDOM_PARTITIONER, GeneratedRowsComparer,
+                           RowCounter, RowDigest, TokenRangeScanner,
+                           split_token_ring)
+
+
+class TestSplitTokenRing(TestCase):
+
+    def _assert_contiguous(self, ranges, splits):
+        assert len(ranges) == splits
+        assert ranges[0][0] is None
+        assert ranges[-1][1] is None
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start
+
+    def test_murmur3(self):
+        ranges = split_token_ring(MURMUR3_PARTITIONER, 8)
+        self._assert_contiguous(ranges, 8)
+        boundaries = [end for _, end in ranges[:-1]]
+        assert all(MURMUR3_MIN_TOKEN < b < MURMUR3_MAX_TOKEN for b in boundaries)
+        assert boundaries == sorted(boundaries)
+        assert abs(ranges[4][0]) <= 1
+
+    def test_random(self):
+        ranges = split_token_ring(RANDOM_PARTITIONER, 4)
+        self._assert_contiguous(ranges, 4)
+        assert [end for _, end in ranges[:-1]] == [2 ** 125, 2 ** 126, 3 * 2 ** 125]
+
+    def test_byte_ordered(self):
+        ranges = split_token_ring(BYTE_ORDERED_PARTITIONER, 4)
+        self._assert_contiguous(ranges, 4)
+        assert [end for _, end in ranges[:-1]] == [b'\x40\x00', b'\x80\x00', b'\xc0\x00']
+
+    def test_unknown_partitioner_single_range(self):
+        assert split_token_ring('org.apache.cassandra.dht.OrderPreservingPartitioner', 16) == [(None, None)]
+
+    def test_single_split(self):
+        assert split_token_ring(MURMUR3_PARTITIONER, 1) == [(None, None)]
+
+    def test_invalid_splits(self):
+        with self.assertRaises(ValueError):
+            split_token_ring(MURMUR3_PARTITIONER, 0)
+
+
+class TestConsumers(TestCase):
+
+    def test_digest_is_order_independent(self):
+        rows = [(i, 'value{}'.format(i)) for i in range(100)]
+        forward, backward = RowDigest(), RowDigest()
+        forward.consume((None, 0), rows[:50])
+        forward.consume((0, None), rows[50:])
+        backward.consume((0, None), list(reversed(rows[50:])))
+        backward.consume((None, 0), list(reversed(rows[:50])))
+        assert forward.digest == backward.digest
+        assert forward.differing_ranges(backward) == []
+
+    def test_digest_reports_differing_ranges(self):
+        expected, actual = RowDigest(), RowDigest()
+        expected.consume((None, 0), [(1, 'a')])
+        expected.consume((0, None), [(2, 'b')])
+        actual.consume((None, 0), [(1, 'a')])
+        actual.consume((0, None), [(2, 'c')])
+        assert expected.differing_ranges(actual) == [(0, None)]
+
+    def test_counter(self):
+        counter = RowCounter()
+        counter.consume((None, 0), [1, 2, 3])
+        counter.consume((None, 0), [4])
+        counter.consume((0, None), [5])
+        assert counter.count == 5
+        assert counter.per_range == {(None, 0): 4, (0, None): 1}
+
+
+class TestTokenRangeScanner(TestCase):
+
+    def _scanner(self, splits, pages=1, table='ks.cf', **kwargs):
+        session = MagicMock(name='session')
+        session.cluster.metadata.partitioner = MURMUR3_PARTITIONER
+        key = MagicMock()
+        key.name = 'key'
+        session.cluster.metadata.keyspaces['ks'].tables['cf'].partition_key = [key]
+        session.timeouts = []
+        session.queries = []
+
+        def execute(statement, params, timeout=None, trace=False, paging_state=None):
+            session.timeouts.append(timeout)
+            session.queries.append(statement.query_string)
+            page = paging_state or 0
+            result = MagicMock(name='result')
+            result.current_rows = [tuple(params) + (page,)]
+            result.has_more_pages = page + 1 < pages
+            result.paging_state = page + 1
+            return result
+
+        session.execute.side_effect = execute
+        return TokenRangeScanner(session, table, splits=splits, **kwargs)
+
+    def test_range_queries(self):
+        scanner = self._scanner(splits=2)
+        assert scanner.range_query((None, 0)) == ('SELECT * FROM ks.cf WHERE token(key) <= %s', [0])
+        assert scanner.range_query((0, None)) == ('SELECT * FROM ks.cf WHERE token(key) > %s', [0])
+        assert scanner.range_query((None, None)) == ('SELECT * FROM ks.cf', [])
+
+    def test_range_query_quotes_names(self):
+        scanner = self._scanner(splits=1, table='Ks.Events')
+        assert scanner.range_query((None, None)) == ('SELECT * FROM "Ks"."Events"', [])
+
+    def test_scan_visits_every_range(self):
+        scanner = self._scanner(splits=16)
+        counter = scanner.scan(RowCounter())
+        assert counter.count == 16
+        assert set(counter.per_range) == set(scanner.token_ranges)
+
+    def test_every_page_gets_the_timeout(self):
+        scanner = self._scanner(splits=2, pages=3, timeout=7)
+        counter = scanner.scan(RowCounter())
+        assert counter.count == 6 and set(counter.per_range.values()) == {3}
+        assert scanner.session.timeouts == [7] * 6
+
+    def test_comparer_selects_generator_columns(self):
+        verifier = MagicMock(generator=DataGenerator([('key', 'int'), ('val', 'text'), ('Count', 'bigint')]))
+        scanner = self._scanner(splits=2)
+        scanner.scan(GeneratedRowsComparer(verifier))
+        assert verifier.check_rows.call_count == 2
+        assert {query.split(' FROM ')[0] for query in scanner.session.queries} == {'SELECT key, val, "Count"'}
+
+    def test_explicit_columns_override_comparer(self):
+        scanner = self._scanner(splits=2, columns=['val', 'key'])
+        scanner.scan(GeneratedRowsComparer(MagicMock(generator=DataGenerator([('key', 'int'), ('val', 'text')]))))
+        assert {query.split(' FROM ')[0] for query in scanner.session.queries} == {'SELECT val, key'}
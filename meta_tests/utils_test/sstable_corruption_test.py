@@ -0,0 +1,149 @@
+import os
+import random
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+
+import pytest
+
+from tools.sstable_corruption import CRC, DATA, DIGEST, STATISTICS, IndexedPartition, SSTableCorruptor
+
+SSTABLES = os.path.join(os.path.dirname(__file__), '..', '..', 'sstables', 'ttl_test')
+
+
+def _vint(value):
+    """Encodes a small unsigned vint as VIntCoding writes it"""
+    return bytes([value]) if value < 0x80 else bytes([0x80 | value >> 8, value & 0xff])
+
+
+class TestSSTableCorruptor(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _contents(self):
+        contents = {}
+        for name in os.listdir(self.dir):
+            with open(os.path.join(self.dir, name), 'rb') as f:
+                contents[name] = f.read()
+        return contents
+
+    def _write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _uncompressed_sstable(self, version='na'):
+        """An uncompressed sstable of three partitions in 100 bytes, checksummed every 32 bytes"""
+        keys = [b'\x00\x00\x00\x01', b'\x00\x00\x00\x02', b'\x00\x00\x00\x03']
+        if version >= 'ma':
+            index = [_vint(0) + _vint(0), _vint(20) + _vint(3) + b'abc', _vint(130) + _vint(0)]
+        else:
+            index = [struct.pack('>qi', 0, 0), struct.pack('>qi', 20, 3) + b'abc', struct.pack('>qi', 130, 0)]
+        index = b''.join(struct.pack('>H', len(key)) + key + entry for key, entry in zip(keys, index))
+        prefix = '{}-5-big'.format(version) if version >= 'ma' else 'ks-cf-{}-5'.format(version)
+        self._write(prefix + '-Index.db', index)
+        self._write(prefix + '-CRC.db', struct.pack('>iiiii', 32, 1, 2, 3, 4))
+        self._write(prefix + '-Digest.crc32', b'3686576784')
+        return self._write(prefix + '-Data.db', bytes(range(1, 201)))
+
+    def test_compressed_sstables(self):
+        for version, data_length, size in (('3.11', 30, 36), ('2.1', 80, 67)):
+            directory = os.path.join(SSTABLES, version)
+            for name in os.listdir(directory):
+                if '-1-' in name:
+                    shutil.copy(os.path.join(directory, name), self.dir)
+            original = self._contents()
+            data_path = [os.path.join(self.dir, name) for name in original if name.endswith('-Data.db')][0]
+
+            corruptor = SSTableCorruptor(data_path)
+            assert corruptor.compressed
+            assert corruptor.compression_info().compressor == 'LZ4Compressor'
+            assert corruptor.partitions() == [IndexedPartition(b'\x00\x00\x00\x01', 0, data_length)]
+            chunk = corruptor.chunk_of(b'\x00\x00\x00\x01')
+            assert (chunk.offset, chunk.length, chunk.crc_offset) == (0, size - 4, size - 4)
+
+            mutation = corruptor.corrupt_partition(0)
+            assert (mutation.component, mutation.offset, mutation.description) == (DATA, (size - 4) // 2, 'chunk 0')
+            assert bytes(a ^ b for a, b in zip(mutation.original, mutation.corrupted)) == b'\xff'
+            assert corruptor.corrupt_crc(0).offset == size - 4
+            assert corruptor.corrupt_digest().component == DIGEST
+            corruptor.zero_range(STATISTICS, 10, 20)
+            assert self._contents() != original
+
+            assert len(corruptor.undo()) == 4
+            assert self._contents() == original and corruptor.mutations == []
+            for name in original:
+                os.remove(os.path.join(self.dir, name))
+
+    def test_uncompressed_sstables(self):
+        for version in ('na', 'ka'):
+            corruptor = SSTableCorruptor(self._uncompressed_sstable(version))
+            assert not corruptor.compressed and corruptor.version == version
+            assert [(p.position, p.end) for p in corruptor.partitions()] == [(0, 20), (20, 130), (130, 200)]
+            assert [(chunk.offset, chunk.length, chunk.crc_offset) for chunk in corruptor.chunks()] == \
+                [(0, 32, 4), (32, 32, 8), (64, 32, 12), (96, 32, 16), (128, 32, 20), (160, 32, 24), (192, 8, 28)]
+            with pytest.raises(ValueError, match="isn't compressed"):
+                corruptor.chunk_of(0)
+
+            original = self._contents()
+            assert corruptor.corrupt_partition(b'\x00\x00\x00\x02').offset == 20
+            zeroed = corruptor.corrupt_partition(2, zero=True)
+            assert (zeroed.offset, zeroed.corrupted) == (130, bytes(70))
+            assert corruptor.corrupt_crc(2) == (CRC, corruptor.component_path(CRC), 12, b'\x00\x00\x00\x03',
+                                                b'\xff\xff\xff\xfc', 'checksum of chunk 2')
+            with pytest.raises(ValueError, match='No partition with key'):
+                corruptor.corrupt_partition(b'nope')
+
+            assert corruptor.undo_last().component == CRC
+            with open(corruptor.data_path, 'rb') as f:
+                assert f.read()[130:] == bytes(70)
+            corruptor.undo()
+            assert self._contents() == original
+            for name in original:
+                os.remove(os.path.join(self.dir, name))
+
+    def test_random_corruptions(self):
+        data_path = self._uncompressed_sstable()
+        with SSTableCorruptor(data_path) as corruptor:
+            mutations = corruptor.corrupt_random(50, rng=random.Random(7), start=100)
+            offsets = [mutation.offset for mutation in mutations]
+            assert len(set(offsets)) == 50 and min(offsets) >= 100
+            assert all(bin(a ^ b).count('1') == 1 for m in mutations for a, b in zip(m.original, m.corrupted))
+        with open(data_path, 'rb') as f:
+            assert f.read() == bytes(range(1, 201))
+
+        corruptor = SSTableCorruptor(data_path)
+        assert [m.offset for m in corruptor.corrupt_random(50, rng=random.Random(7), start=100)] == offsets
+
+    def test_undo_of_rewritten_components(self):
+        data_path = self._uncompressed_sstable()
+        corruptor = SSTableCorruptor(data_path)
+        corruptor.flip_bits(DATA, 0, mask=0x0f, length=2)
+        corruptor.write_bytes(CRC, 0, b'\x00\x00\x00\x00')
+        os.remove(corruptor.component_path(CRC))
+        with pytest.raises(ValueError, match='was removed'):
+            corruptor.undo()
+        corruptor.mutations.pop()
+
+        with open(data_path, 'r+b') as f:
+            f.write(b'\x00')
+        with pytest.raises(ValueError, match='was rewritten'):
+            corruptor.undo()
+        assert len(corruptor.mutations) == 1
+
+    def test_invalid_corruptions(self):
+        with pytest.raises(ValueError, match='is not the Data.db file'):
+            SSTableCorruptor(os.path.join(self.dir, 'na-1-big-Index.db'))
+        corruptor = SSTableCorruptor(self._uncompressed_sstable())
+        with pytest.raises(ValueError, match='has no Summary component'):
+            corruptor.flip_bits('Summary', 0)
+        with pytest.raises(ValueError, match="Can't change 10 bytes at offset 195"):
+            corruptor.zero_range(DATA, 195, 10)
+        with pytest.raises(ValueError, match='The mask'):
+            corruptor.flip_bits(DATA, 0, mask=0)
+        with pytest.raises(ValueError, match='no mutation'):
+            corruptor.undo_last()
@@ -0,0 +1,106 @@
+import io
+import json
+from unittest import TestCase
+
+import pytest
+from ccmlib.node import ToolError
+
+from tools.sstable_json import dump_partitions, iter_json_array, iter_partitions, iter_rows
+
+SSTABLEDUMP = json.dumps([
+    {'partition': {'key': ['1'], 'position': 0},
+     'rows': [{'type': 'row', 'position': 18, 'liveness_info': {'tstamp': '2018-01-01T00:00:00.000001Z'},
+               'cells': [{'name': 'val', 'value': 1}]}]},
+    {'partition': {'key': ['2'], 'position': 31,
+                   'deletion_info': {'marked_deleted': '2018-01-01T00:00:00.000001Z',
+                                     'local_delete_time': '2018-01-01T00:00:00Z'}},
+     'rows': [{'type': 'row', 'position': 61, 'cells': [{'name': 'val', 'value': 2}]}]},
+    {'partition': {'key': ['10'], 'position': 80},
+     'rows': [{'type': 'row', 'position': 98, 'cells': [{'name': 'val', 'deletion_info': {'local_delete_time': 'x'}}]},
+              {'type': 'range_tombstone_bound', 'start': {'type': 'inclusive', 'clustering': [1]}},
+              {'type': 'row', 'position': 130, 'cells': [{'name': 'val', 'value': 123456789}]}]},
+], indent=2)
+
+SSTABLE2JSON = '''WARN 10:00:00 Only 1 partitions in the sstable
+[
+{"key": "frodo",
+ "cells": [["", "", 1442880000000000],
+           ["password", "pass@", 1442880000000000]]},
+{"key": "sam",
+ "metadata": {"deletionInfo": {"markedForDeleteAt": 1442880000000001, "localDeletionTime": 1442880000}},
+ "cells": [["password", "55e5b0b0", 1442880000000002, "d"]]}
+]
+[
+{"key": "gandalf",
+ "cells": [["password", "p@$$", 1442880000000000]]}
+]
+'''
+
+
+class TestSSTableJson(TestCase):
+
+    def test_sstabledump_partitions_and_rows(self):
+        for chunk_size in (5, 64, 65536):
+            partitions = [(partition, list(rows)) for partition, rows in
+                          iter_partitions(io.StringIO(SSTABLEDUMP), chunk_size=chunk_size)]
+            assert [partition.key for partition, _ in partitions] == [('1',), ('2',), ('10',)]
+            assert [partition.position for partition, _ in partitions] == [0, 31, 80]
+            assert partitions[1][0].deletion_info['local_delete_time'] == '2018-01-01T00:00:00Z'
+            assert [len(rows) for _, rows in partitions] == [1, 1, 3]
+            assert partitions[2][1][2]['cells'][0]['value'] == 123456789
+
+        rows = list(iter_rows(SSTABLEDUMP.encode('utf-8')))
+        assert [(partition.key, row.get('position')) for partition, row in rows] == \
+            [(('1',), 18), (('2',), 61), (('10',), 98), (('10',), None), (('10',), 130)]
+
+    def test_rows_are_only_available_until_the_next_partition(self):
+        partitions = list(iter_partitions(io.StringIO(SSTABLEDUMP), chunk_size=16))
+        assert [partition.key for partition, _ in partitions] == [('1',), ('2',), ('10',)]
+        assert list(partitions[0][1]) == []
+
+    def test_filters(self):
+        def keys(stream, **filters):
+            return [partition.key for partition, _ in iter_partitions(io.StringIO(stream), **filters)]
+
+        assert keys(SSTABLEDUMP, keys=['2', ('10',)]) == [('2',), ('10',)]
+        # printed keys compare as strings unless converted
+        assert keys(SSTABLEDUMP, key_range=('1', '2')) == [('1',), ('2',), ('10',)]
+        assert keys(SSTABLEDUMP, key_range=(2, None), key_type=int) == [('2',), ('10',)]
+        assert keys(SSTABLEDUMP, key_range=(None, 1), key_type=int) == [('1',)]
+
+        tombstones = [(partition.key, [row.get('type') for row in rows]) for partition, rows in
+                      iter_partitions(io.StringIO(SSTABLEDUMP), tombstones_only=True)]
+        assert tombstones == [(('2',), []), (('10',), ['row', 'range_tombstone_bound'])]
+
+    def test_sstable2json(self):
+        stream = io.StringIO(SSTABLE2JSON)
+        partitions = [(partition, list(rows)) for partition, rows in iter_partitions(stream, chunk_size=7)]
+        assert [partition.key for partition, _ in partitions] == [('frodo',), ('sam',), ('gandalf',)]
+        assert partitions[1][0].deletion_info['markedForDeleteAt'] == 1442880000000001
+        assert [len(rows) for _, rows in partitions] == [2, 1, 1]
+
+        tombstones = list(iter_rows(io.StringIO(SSTABLE2JSON), tombstones_only=True))
+        assert [(partition.key, row[0]) for partition, row in tombstones] == [(('sam',), 'password')]
+
+    def test_enumerated_keys(self):
+        assert list(iter_json_array('[ [ "1" ], [ "2" ] ]\n[ [ "3" ] ]', chunk_size=3)) == [['1'], ['2'], ['3']]
+        assert list(iter_json_array('')) == []
+
+    def test_truncated_output(self):
+        with pytest.raises(ValueError, match='truncated'):
+            list(iter_rows(io.StringIO(SSTABLEDUMP[:-40]), chunk_size=32))
+        with pytest.raises(ValueError, match="Expected ','"):
+            list(iter_json_array('[1 2]'))
+
+    def test_sstable2json_failure(self):
+        class FakeNode(object):
+            def get_cassandra_version(self):
+                return '2.1'
+
+            def run_sstable2json(self, out_file, keyspace, column_families):
+                out_file.write(SSTABLE2JSON[:60].encode('utf-8'))
+                raise ToolError(['sstable2json'], 1, stderr='Unknown keyspace ks')
+
+        with pytest.raises(ToolError, match='Unknown keyspace ks'):
+            for partition, rows in dump_partitions(FakeNode(), 'ks', 'cf'):
+                list(rows)
@@ -0,0 +1,157 @@
+import os
+import shutil
+import struct
+import tempfile
+import uuid
+import zlib
+from unittest import TestCase
+
+import pytest
+
+from tools.sstable_metadata import (HEADER, STATS, VALIDATION, node_sstable_metadata, read_sstable_metadata,
+                                    read_statistics)
+
+SSTABLES = os.path.join(os.path.dirname(__file__), '..', '..', 'sstables', 'ttl_test')
+
+
+def _vint(value):
+    """Encodes an unsigned vint as VIntCoding writes it"""
+    for extra_bytes in range(9):
+        if value < 1 << (7 * (extra_bytes + 1) if extra_bytes < 8 else 64):
+            break
+    encoded = value.to_bytes(extra_bytes + 1, 'big')
+    return bytes([encoded[0] | (0xff << (8 - extra_bytes)) & 0xff]) + encoded[1:]
+
+
+def _string(value):
+    value = value.encode('utf-8')
+    return _vint(len(value)) + value
+
+
+def _statistics_na(repaired_at, level, pending_repair):
+    """The Statistics.db of an 'na' sstable, with checksums, as MetadataSerializer writes it"""
+    partitioner = b'org.apache.cassandra.dht.Murmur3Partitioner'
+    validation = struct.pack('>H', len(partitioner)) + partitioner + struct.pack('>d', 0.01)
+    compaction = struct.pack('>i', 3) + b'hll'
+    stats = b''.join([
+        struct.pack('>i', 1) + struct.pack('>qq', 1, 5),  # estimated partition size
+        struct.pack('>i', 1) + struct.pack('>qq', 1, 5),  # estimated cell count
+        struct.pack('>qi', 7, 100),  # commit log upper bound
+        struct.pack('>qqiiiid', 1000, 2000, 2 ** 31 - 1, 2 ** 31 - 1, 0, 0, 0.5),
+        struct.pack('>ii', 100, 1) + struct.pack('>dq', 12.0, 3),  # tombstone histogram
+        struct.pack('>iq', level, repaired_at),
+        struct.pack('>iH', 1, 2) + b'\x00\x01' + struct.pack('>iH', 1, 2) + b'\x00\x09',  # clustering bounds
+        struct.pack('>?qq', False, 10, 5),
+        struct.pack('>qi', 7, 10),  # commit log lower bound
+        struct.pack('>i', 1) + struct.pack('>qiqi', 7, 10, 7, 100),  # commit log intervals
+        (b'\x01' + pending_repair.bytes) if pending_repair else b'\x00',
+        b'\x00',  # is transient
+    ])
+    header = b''.join([_vint(1000 - 1442880000000000 + 2 ** 64), _vint(2 ** 31 - 1 - 1442880000), _vint(0),
+                       _string('org.apache.cassandra.db.marshal.Int32Type'),
+                       _vint(1), _string('org.apache.cassandra.db.marshal.Int32Type'),
+                       _vint(0), _vint(1), _string('v'), _string('org.apache.cassandra.db.marshal.UTF8Type')])
+
+    components = [validation, compaction, stats, header]
+    count = struct.pack('>i', len(components))
+    toc = b''
+    position = 4 + 8 * len(components) + 8
+    for component_type, component in enumerate(components):
+        toc += struct.pack('>ii', component_type, position)
+        position += len(component) + 4
+    data = count + struct.pack('>I', zlib.crc32(count)) + toc + struct.pack('>I', zlib.crc32(count + toc))
+    for component in components:
+        data += component + struct.pack('>I', zlib.crc32(component))
+    return data
+
+
+class FakeNode(object):
+
+    def __init__(self, directories):
+        self.directories = directories
+
+    def data_directories(self):
+        return self.directories
+
+
+class TestSSTableMetadata(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _write(self, relative_path, data):
+        path = os.path.join(self.dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_reads_mc(self):
+        metadata = read_statistics(os.path.join(SSTABLES, '3.0', 'mc-1-big-Statistics.db'))
+        assert (metadata.version, metadata.generation, metadata.format) == ('mc', '1', 'big')
+        assert metadata.validation.partitioner == 'org.apache.cassandra.dht.Murmur3Partitioner'
+        assert metadata.repaired_at == 0 and not metadata.is_repaired
+        assert metadata.level == 0
+        assert metadata.pending_repair is None
+        assert metadata.stats.total_rows == 1
+        assert metadata.stats.max_ttl == 630720000
+        # the overflowed local deletion time the ttl test is about
+        assert metadata.stats.max_local_deletion_time == -2146724090
+        assert metadata.header.min_local_deletion_time == -2146724090
+        assert metadata.stats.commit_log_intervals == [(metadata.stats.commit_log_lower_bound,
+                                                        metadata.stats.commit_log_upper_bound)]
+        assert metadata.header.regular_columns == {'col1': 'org.apache.cassandra.db.marshal.Int32Type'}
+
+    def test_reads_na_with_pending_repair(self):
+        session = uuid.uuid4()
+        path = self._write('na-3-big-Statistics.db', _statistics_na(repaired_at=0, level=2, pending_repair=session))
+        metadata = read_statistics(path, verify_checksums=True)
+        assert metadata.pending_repair == session
+        assert metadata.level == 2
+        assert metadata.stats.is_transient is False
+        assert metadata.stats.min_clustering_values == [b'\x00\x01']
+        assert metadata.stats.estimated_tombstone_drop_time == [(12.0, 3)]
+        assert metadata.compaction.cardinality_estimator == b'hll'
+        assert metadata.header.min_timestamp == 1000
+        assert metadata.header.min_local_deletion_time == 2 ** 31 - 1
+        assert metadata.header.clustering_types == ['org.apache.cassandra.db.marshal.Int32Type']
+        assert metadata.header.regular_columns == {'v': 'org.apache.cassandra.db.marshal.UTF8Type'}
+
+        only_stats = read_statistics(path, components=(STATS,))
+        assert only_stats.stats == metadata.stats
+        assert only_stats.validation is None and only_stats.header is None
+
+    def test_detects_corruption(self):
+        data = bytearray(_statistics_na(repaired_at=5, level=0, pending_repair=None))
+        data[-10] ^= 0xff
+        path = self._write('na-1-big-Statistics.db', bytes(data))
+        with pytest.raises(ValueError, match='Checksum mismatch'):
+            read_statistics(path, verify_checksums=True)
+
+        truncated = self._write('na-2-big-Statistics.db', bytes(data[:-30]))
+        with pytest.raises(ValueError):
+            read_statistics(truncated, components=(VALIDATION, STATS, HEADER))
+
+    def test_rejects_old_versions(self):
+        with pytest.raises(ValueError, match='only ma and later'):
+            read_statistics(self._write('la-1-big-Statistics.db', b'\x00'))
+        with pytest.raises(ValueError, match='not the Statistics.db'):
+            read_statistics(os.path.join(SSTABLES, '2.1', 'ks-ttl_table-ka-1-Statistics.db'))
+
+    def test_reads_data_directories(self):
+        for relative_path, repaired_at in (('ks/cf-1234/na-1-big-Statistics.db', 10),
+                                           ('ks/cf-1234/na-2-big-Statistics.db', 0),
+                                           ('ks/cf-1234/snapshots/s/na-1-big-Statistics.db', 0),
+                                           ('ks/cf-1234/.cf_idx/na-1-big-Statistics.db', 0),
+                                           ('ks/other-5678/na-1-big-Statistics.db', 0),
+                                           ('ks2/cf-9999/na-1-big-Statistics.db', 0)):
+            self._write(os.path.join('data0', relative_path), _statistics_na(repaired_at, 0, None))
+
+        data0 = os.path.join(self.dir, 'data0')
+        sstables = read_sstable_metadata(data0, 'ks', 'cf')
+        assert [(os.path.relpath(sstable.data_path, data0), sstable.repaired_at) for sstable in sstables] == \
+            [('ks/cf-1234/na-1-big-Data.db', 10), ('ks/cf-1234/na-2-big-Data.db', 0)]
+        assert len(read_sstable_metadata(data0, 'ks')) == 3
+        assert len(read_sstable_metadata(data0)) == 4
+        assert len(node_sstable_metadata(FakeNode([data0, os.path.join(self.dir, 'data1')]), 'ks2')) == 1
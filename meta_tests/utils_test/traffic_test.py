@@ -0,0 +1,140 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from unittest import TestCase
+
+import pytest
+
+from meta_tests.utils_test.fake_session import FakeSession
+from tools.latency import LatencyRecorder
+from tools.traffic import AsyncRequests, SharedRingBuffer, TrafficCounters, TrafficMeter
+
+
+def _produce(ring, counters, count):
+    for start in range(0, count, 100):
+        ring.put_many([(uuid.UUID(int=i).bytes, i) for i in range(start, min(start + 100, count))])
+        counters.add(ops=min(100, count - start))
+
+
+class TestSharedRingBuffer(TestCase):
+
+    def test_round_trip_with_wrap_around(self):
+        ring = SharedRingBuffer('16sq', 5)
+        assert ring.put_many([(b'a' * 16, 1), (b'b' * 16, 2), (b'c' * 16, 3)]) == 3
+        assert ring.get_many(2) == [(b'a' * 16, 1), (b'b' * 16, 2)]
+        assert ring.put_many([(b'd' * 16, 4), (b'e' * 16, 5), (b'f' * 16, 6)]) == 3
+        assert ring.qsize() == 4
+        assert [count for _, count in ring.get_many(10)] == [3, 4, 5, 6]
+        assert len(ring) == 0
+
+    def test_full_and_empty_without_waiting(self):
+        ring = SharedRingBuffer('q', 3)
+        assert ring.put_many([(i,) for i in range(5)], timeout=0) == 3
+        assert ring.get_many(10) == [(0,), (1,), (2,)]
+        start = time.time()
+        assert ring.get_many(10, timeout=0.2) == []
+        assert time.time() - start >= 0.2
+
+    def test_blocked_producer_resumes(self):
+        ring = SharedRingBuffer('q', 10)
+        received = []
+
+        def consume():
+            while len(received) < 1000:
+                received.extend(value for (value,) in ring.get_many(7, timeout=1))
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        assert ring.put_many([(i,) for i in range(1000)]) == 1000
+        consumer.join(10)
+        assert received == list(range(1000))
+
+    def test_across_processes(self):
+        ring = SharedRingBuffer('16sq', 64)
+        counters = TrafficCounters()
+        producer = multiprocessing.Process(target=_produce, args=(ring, counters, 2000))
+        producer.start()
+        received = []
+        deadline = time.time() + 30
+        while len(received) < 2000 and time.time() < deadline:
+            received.extend(ring.get_many(50, timeout=1))
+        producer.join(10)
+        assert producer.exitcode == 0
+        assert [uuid.UUID(bytes=key).int for key, _ in received] == list(range(2000))
+        assert [value for _, value in received] == list(range(2000))
+        assert counters.snapshot() == (2000, 0)
+
+
+class TestAsyncRequests(TestCase):
+
+    def test_bounds_requests_in_flight(self):
+        session = FakeSession()
+        results = []
+        requests = AsyncRequests(session, max_in_flight=8)
+        for i in range(300):
+            requests.submit('statement', (i,), callback=results.append)
+        requests.drain(timeout=10)
+        assert session.max_in_flight <= 8
+        assert sorted(rows[0] for rows in results) == [(i,) for i in range(300)]
+        assert requests.counters.snapshot() == (300, 0)
+
+    def test_tolerates_max_errors(self):
+        requests = AsyncRequests(FakeSession(failing={(3,), (7,)}), max_in_flight=4, max_errors=2)
+        for i in range(50):
+            requests.submit('statement', (i,))
+        requests.drain(timeout=10)
+        assert requests.counters.snapshot() == (48, 2)
+
+    def test_raises_once_errors_exceed_max(self):
+        requests = AsyncRequests(FakeSession(failing={(3,)}), max_in_flight=4)
+        with pytest.raises(RuntimeError, match=r'failed \(3,\)'):
+            for i in range(50):
+                requests.submit('statement', (i,))
+            requests.drain(timeout=10)
+
+    def test_raises_callback_failure(self):
+        def check(rows):
+            assert rows[0] != (5,), "unexpected value"
+        requests = AsyncRequests(FakeSession(), max_in_flight=4)
+        with pytest.raises(AssertionError, match='unexpected value'):
+            for i in range(10):
+                requests.submit('statement', (i,), callback=check)
+            requests.drain(timeout=10)
+
+    def test_records_latency(self):
+        latency = LatencyRecorder()
+        requests = AsyncRequests(FakeSession(failing={(3,)}), max_in_flight=4, max_errors=1, latency=latency)
+        for i in range(20):
+            requests.submit('statement', (i,))
+        requests.drain(timeout=10)
+        counts, stats = latency.snapshot()
+        assert sum(counts) == 19
+        assert stats[2] == 1  # the RuntimeError is neither a timeout nor unavailable
+
+
+class TestTrafficMeter(TestCase):
+
+    def test_reports_deltas_per_step(self):
+        writer, verifier = TrafficCounters(), TrafficCounters()
+        meter = TrafficMeter({'writer': writer, 'verifier': verifier})
+        writer.add(ops=100, errors=1)
+        verifier.add(ops=40)
+        first = meter.report('step 1')
+        writer.add(ops=10)
+        second = meter.report('step 2')
+
+        assert first['writer']['ops'] == 100
+        assert first['writer']['errors'] == 1
+        assert first['verifier']['ops'] == 40
+        assert first['writer']['ops_per_second'] > 0
+        assert second['writer']['ops'] == 10
+        assert second['writer']['errors'] == 0
+        assert second['verifier']['ops'] == 0
+        assert [step['step'] for step in meter.steps] == ['step 1', 'step 2']
+        assert 'writer: ' in TrafficMeter.format({'writer': second['writer']})
+
+    def test_start_and_stop(self):
+        meter = TrafficMeter({'writer': TrafficCounters()}).start(interval=0.01)
+        time.sleep(0.05)
+        meter.stop()
+        assert meter._thread is None
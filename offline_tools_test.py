@@ -1,4 +1,3 @@
-import json
 import os
 import random
 import re
@@ -10,6 +9,9 @@ from ccmlib import common
 from ccmlib.node import ToolError
 
 from dtest import Tester, create_ks
+from tools.offline_tools import OfflineToolRunner
+from tools.sstable_corruption import SSTableCorruptor
+from tools.sstable_json import dump_partitions, iter_json_array
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -79,11 +81,10 @@ class TestOfflineTools(Tester):
         self.wait_for_compactions(node1)
         cluster.stop()
 
-        initial_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
-        _, error, rc = node1.run_sstablelevelreset("keyspace1", "standard1")
-        final_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
-        self._check_stderr_error(error)
-        assert rc == 0, str(rc)
+        initial_levels, result, final_levels = self.run_between_level_checks(
+            node1, 'sstablelevelreset', ['--really-reset', 'keyspace1', 'standard1'])
+        self._check_stderr_error(result.stderr)
+        assert result.rc == 0, str(result.rc)
 
         logger.debug(initial_levels)
         logger.debug(final_levels)
@@ -95,8 +96,19 @@ class TestOfflineTools(Tester):
         assert max(final_levels) == 0
 
     def get_levels(self, data):
-        (out, err, rc) = data
-        return list(map(int, re.findall("SSTable Level: ([0-9])", out)))
+        return list(map(int, re.findall("SSTable Level: ([0-9])", data.stdout)))
+
+    def run_between_level_checks(self, node, tool, args):
+        """
+        Runs sstablemetadata on keyspace1.standard1 of node, tool with args, then
+        sstablemetadata again, in a single JVM, see tools.offline_tools.
+        @return the levels before, the ToolResult of tool and the levels after
+        @raise ToolError if one of the tools exits with a non-zero status
+        """
+        metadata = ('sstablemetadata', node.get_sstablespath(keyspace='keyspace1', tables=['standard1']))
+        with OfflineToolRunner(node) as runner:
+            before, result, after = [r.check() for r in runner.run_all([metadata, (tool, args), metadata])]
+        return self.get_levels(before), result, self.get_levels(after)
 
     def wait_for_compactions(self, node):
         pattern = re.compile("pending tasks: 0")
@@ -177,15 +189,12 @@ class TestOfflineTools(Tester):
         logger.debug("Done stopping node")
 
         # Let's reset all sstables to L0
-        logger.debug("Getting initial levels")
-        initial_levels = list(self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"])))
+        logger.debug("Running sstablelevelreset between getting the initial and final levels")
+        initial_levels, _, final_levels = self.run_between_level_checks(
+            node1, 'sstablelevelreset', ['--really-reset', 'keyspace1', 'standard1'])
         assert [] != initial_levels
         logger.debug('initial_levels:')
         logger.debug(initial_levels)
-        logger.debug("Running sstablelevelreset")
-        node1.run_sstablelevelreset("keyspace1", "standard1")
-        logger.debug("Getting final levels")
-        final_levels = list(self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"])))
         assert [] != final_levels
         logger.debug('final levels:')
         logger.debug(final_levels)
@@ -196,15 +205,12 @@ class TestOfflineTools(Tester):
         assert max(final_levels) == 0
 
         # time to relevel sstables
-        logger.debug("Getting initial levels")
-        initial_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
-        logger.debug("Running sstableofflinerelevel")
-        output, error, _ = node1.run_sstableofflinerelevel("keyspace1", "standard1")
-        logger.debug("Getting final levels")
-        final_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
-
-        logger.debug(output)
-        logger.debug(error)
+        logger.debug("Running sstableofflinerelevel between getting the initial and final levels")
+        initial_levels, result, final_levels = self.run_between_level_checks(
+            node1, 'sstableofflinerelevel', ['keyspace1', 'standard1'])
+
+        logger.debug(result.stdout)
+        logger.debug(result.stderr)
 
         logger.debug(initial_levels)
         logger.debug(final_levels)
@@ -276,24 +282,30 @@ class TestOfflineTools(Tester):
             logger.debug(sstable)
             assert verified and hashcomputed
 
-        # now try intentionally corrupting an sstable to see if hash computed is different and error recognized
+        # now try intentionally corrupting an sstable in a few ways to see if hash computed is different
+        # and error recognized, restoring it after each one
         sstable1 = sstables[1]
-        with open(sstable1, 'rb') as f:
-            sstabledata = bytearray(f.read())
-        with open(sstable1, 'wb') as out:
-            position = random.randrange(0, len(sstabledata))
-            sstabledata[position] = (sstabledata[position] + 1) % 256
-            out.write(sstabledata)
-
-        # use verbose to get some coverage on it
-        try:
-            (out, error, rc) = node1.run_sstableverify("keyspace1", "standard1", options=['-v'])
-        except ToolError as e:
-            # Process sstableverify output to normalize paths in string to Python casing as above
-            error = re.sub("(?<=Corrupted: ).*", lambda match: os.path.normcase(match.group(0)), str(e))
+        corruptor = SSTableCorruptor(sstable1)
+        rng = random.Random()
+        corruptions = [lambda: corruptor.corrupt_random(1, rng=rng),
+                       lambda: corruptor.corrupt_partition(rng.randrange(len(corruptor.partitions()))),
+                       lambda: corruptor.corrupt_crc(rng.randrange(len(corruptor.chunks())))]
+        for corrupt in corruptions:
+            corrupt()
+            logger.debug('Corrupted {}'.format(', '.join(str(mutation) for mutation in corruptor.mutations)))
+            # use verbose to get some coverage on it
+            try:
+                (out, error, rc) = node1.run_sstableverify("keyspace1", "standard1", options=['-v'])
+            except ToolError as e:
+                # Process sstableverify output to normalize paths in string to Python casing as above
+                error = re.sub("(?<=Corrupted: ).*", lambda match: os.path.normcase(match.group(0)), str(e))
+
+                assert re.search("Corrupted: " + sstable1, error)
+                assert e.exit_status == 1, str(e.exit_status)
+            corruptor.undo()
 
-            assert re.search("Corrupted: " + sstable1, error)
-            assert e.exit_status == 1, str(e.exit_status)
+        (out, error, rc) = node1.run_sstableverify("keyspace1", "standard1")
+        assert rc == 0, str(rc)
 
     def test_sstableexpiredblockers(self):
         cluster = self.cluster
@@ -414,30 +426,25 @@ class TestOfflineTools(Tester):
 
         node1.flush()
         cluster.stop()
-        [(out, error, rc)] = node1.run_sstabledump(keyspace='ks', column_families=['cf'])
-        logger.debug(out)
-        logger.debug(error)
-
-        # Load the json output and check that it contains the inserted key=1
-        s = json.loads(out)
-        logger.debug(s)
-        assert len(s) == 2
+        # Stream the json output and check that it contains the inserted key=1
+        partitions = [(partition, list(rows)) for partition, rows in dump_partitions(node1, 'ks', 'cf')]
+        logger.debug(partitions)
+        assert len(partitions) == 2
 
-        # order the rows so that we have key=1 first, then key=2
-        row0, row1 = s
-        (row0, row1) = (row0, row1) if row0['partition']['key'] == ['1'] else (row1, row0)
+        # order the partitions so that we have key=1 first, then key=2
+        (partition0, rows0), (partition1, rows1) = sorted(partitions, key=lambda partition: partition[0].key)
 
-        assert row0['partition']['key'] == ['1']
+        assert partition0.key == ('1',)
 
-        assert row1['partition']['key'] == ['2']
-        assert row1['partition'].get('deletion_info') is not None
-        assert row1.get('rows') is not None
+        assert partition1.key == ('2',)
+        assert partition1.deletion_info is not None
+        assert rows1
 
         # Check that we only get the key back using the enumerate option
         [(out, error, rc)] = node1.run_sstabledump(keyspace='ks', column_families=['cf'], enumerate_keys=True)
         logger.debug(out)
         logger.debug(error)
-        s = json.loads(out)
+        s = list(iter_json_array(out))
         logger.debug(s)
         assert len(s) == 2
         dumped_keys = set(row[0] for row in s)
@@ -18,7 +18,7 @@ from tools.assertions import (assert_all, assert_invalid, assert_length_equal,
                               assert_one, assert_lists_equal_ignoring_order)
 from tools.data import rows_to_list
 from tools.datahelp import create_rows, flatten_into_set, parse_data_into_dicts
-from tools.paging import PageAssertionMixin, PageFetcher
+from tools.paging import PageAssertionMixin, PageFetcher, rows_digest
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -450,6 +450,43 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
         assert pf.num_results_all(), [3000, 3000, 3000, 1000]
         assert_lists_equal_ignoring_order(expected_data, pf.all_data(), sort_key="value")
 
+    def test_paging_a_single_wide_row_streaming(self):
+        """
+        Stream the pages of a wide row to a consumer instead of retaining them, and check
+        each page continues the clustering order and the rows match by digest.
+        """
+        session = self.prepare()
+        create_ks(session, 'test_paging_size', 2)
+        session.execute("CREATE TABLE paging_test ( id int, value text, PRIMARY KEY (id, value) )")
+
+        def random_txt(text):
+            return str(uuid.uuid4())
+
+        data = """
+              | id | value                  |
+              +----+------------------------+
+        *10000| 1  | [replaced with random] |
+            """
+        expected_data = create_rows(data, session, 'paging_test', cl=CL.ALL, format_funcs={'id': int, 'value': random_txt})
+
+        future = session.execute_async(
+            SimpleStatement("select * from paging_test where id = 1", fetch_size=3000, consistency_level=CL.ALL)
+        )
+        values = []
+
+        def consume(page_num, rows):
+            page_values = [row['value'] for row in rows]
+            assert page_values == sorted(page_values)
+            assert not values or values[-1] < page_values[0], "Page {} is out of clustering order".format(page_num)
+            values.append(page_values[-1])
+
+        pf = PageFetcher(future, consumer=consume).request_all()
+
+        assert pf.pagecount() == 4
+        assert pf.num_results_all() == [3000, 3000, 3000, 1000]
+        assert pf.pages == [] and pf.row_count == 10000
+        assert pf.digest == rows_digest(expected_data)
+
     def test_paging_across_multi_wide_rows(self):
         session = self.prepare()
         create_ks(session, 'test_paging_size', 2)
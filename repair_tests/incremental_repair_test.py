@@ -18,6 +18,7 @@ from dtest import Tester, create_ks, create_cf
 from tools.assertions import assert_almost_equal, assert_one
 from tools.data import insert_c1c2
 from tools.misc import new_node, ImmutableMapping
+from tools.sstable_metadata import STATS, node_sstable_metadata
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -47,6 +48,11 @@ class TestIncRepair(Tester):
         _pending_repair = compile('Pending repair: (\-\-|null|[a-f0-9\-]+)')
         _sstable_data = namedtuple('_sstabledata', ('name', 'repaired', 'pending_id'))
 
+        if node.get_cassandra_version() >= '3.0':
+            sstables = node_sstable_metadata(node, keyspace, components=(STATS,))
+            assert sstables
+            return [_sstable_data(sstable.name, sstable.repaired_at, sstable.pending_repair) for sstable in sstables]
+
         out = node.run_sstablemetadata(keyspace=keyspace).stdout
 
         def matches(pattern):
@@ -0,0 +1,152 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from dtest import Tester
+from tools.benchmark import format_scaling_curve, record_benchmark, scaling_curve
+from tools.jmxutils import JolokiaAgent, make_mbean, remove_perf_disable_shared_mem
+
+since = pytest.mark.since
+logger = logging.getLogger(__name__)
+
+REPAIR_BENCHMARK_TYPES = ('full', 'incremental', 'subrange', 'preview')
+REPAIR_BENCHMARK_ROWS = (10000, 100000, 1000000, 10000000)
+REPAIR_BENCHMARK_MISMATCH = (0.0, 0.01, 0.1)
+REPAIR_BENCHMARK_METRICS = ('wall_seconds', 'validation_seconds', 'anticompaction_seconds', 'bytes_streamed')
+# a repair type whose wall time grows faster than rows ** SUPERLINEAR_EXPONENT is reported as superlinear
+SUPERLINEAR_EXPONENT = 1.2
+SUBRANGES = 8
+
+
+def repair_benchmark_commands(repair_type, keyspace, table, subranges=SUBRANGES):
+    """
+    Returns the list of nodetool repair option lists that make up one repair of the given
+    type: a single full, incremental or preview repair, or a full repair of the Murmur3
+    ring split into `subranges` equal token ranges, one after the other.
+    """
+    if repair_type == 'subrange':
+        step = 2 ** 64 // subranges
+        bounds = [-2 ** 63 + i * step for i in range(subranges)] + [2 ** 63 - 1]
+        return [['-full', '-st', str(start), '-et', str(end), keyspace, table] for start, end in zip(bounds, bounds[1:])]
+    options = {'full': ['-full'], 'incremental': [], 'preview': ['--preview', '-full']}[repair_type]
+    return [options + [keyspace, table]]
+
+
+def read_repair_metrics(agents, keyspace, table):
+    """
+    Reads the repair related metrics of every node through its JolokiaAgent and returns
+    their sums: the total time spent in validation and anticompaction of the table, from
+    the Count and Mean of its ValidationTime and AnticompactionTime timers, and the bytes
+    received by streaming. A metric the nodes don't have is None.
+    """
+    def timer_seconds(agent, name):
+        mbean = make_mbean('metrics', type='Table', keyspace=keyspace, scope=table, name=name)
+        if not agent.has_mbean(mbean, verbose=False):
+            return None
+        # Cassandra's timers are in microseconds
+        return agent.read_attribute(mbean, 'Count') * agent.read_attribute(mbean, 'Mean') / 1000000.0
+
+    def total(values):
+        values = [value for value in values if value is not None]
+        return sum(values) if values else None
+
+    streamed = make_mbean('metrics', type='Streaming', name='TotalIncomingBytes')
+    return {'validation_seconds': total(timer_seconds(agent, 'ValidationTime') for agent in agents),
+            'anticompaction_seconds': total(timer_seconds(agent, 'AnticompactionTime') for agent in agents),
+            'bytes_streamed': total(agent.read_attribute(streamed, 'Count') for agent in agents)}
+
+
+@since('4.0')
+@pytest.mark.benchmark
+@pytest.mark.resource_intensive
+class TestRepairBenchmark(Tester):
+    """
+    Measures how full, incremental, subrange and preview repair scale with the amount of
+    data to repair. Each test sweeps the data size for one repair type and mismatch rate,
+    on a fresh 3 node cluster per size, and records every run with record_benchmark; the
+    fitted scaling curve is logged and attached to the junit report.
+    """
+    ROWS = REPAIR_BENCHMARK_ROWS
+
+    @pytest.fixture(autouse=True)
+    def fixture_record_junit_property(self, record_property):
+        self.record_junit_property = record_property
+
+    def _load(self, rows, mismatch):
+        """
+        Writes `rows` rows with cassandra-stress at RF 3 to all nodes, then overwrites the
+        first `mismatch` fraction of them while node3 is down, so node3 misses them.
+        """
+        node1, node2, node3 = self.cluster.nodelist()
+        stress_options = ['no-warmup', '-schema', 'replication(factor=3)', '-rate', 'threads=50']
+        node1.stress(['write', 'n={}'.format(rows), 'cl=ALL', '-pop', 'seq=1..{}'.format(rows)] + stress_options)
+        mismatched = int(rows * mismatch)
+        if mismatched:
+            node3.flush()
+            node3.stop(wait_other_notice=True)
+            node1.stress(['write', 'n={}'.format(mismatched), 'cl=TWO',
+                          '-pop', 'seq=1..{}'.format(mismatched)] + stress_options)
+            node3.start(wait_for_binary_proto=True, wait_other_notice=True)
+        self.cluster.flush()
+
+    def _measure_repair(self, repair_type, rows, mismatch):
+        cluster = self.cluster
+        cluster.set_configuration_options(values={'hinted_handoff_enabled': False})
+        cluster.populate(3)
+        for node in cluster.nodelist():
+            remove_perf_disable_shared_mem(node)
+        cluster.start(wait_for_binary_proto=True)
+        node1 = cluster.nodelist()[0]
+
+        logger.debug("Loading {} rows, {:.0%} of them mismatched".format(rows, mismatch))
+        self._load(rows, mismatch)
+
+        with ExitStack() as stack:
+            agents = [stack.enter_context(JolokiaAgent(node)) for node in cluster.nodelist()]
+            before = read_repair_metrics(agents, 'keyspace1', 'standard1')
+            start = time.time()
+            for options in repair_benchmark_commands(repair_type, 'keyspace1', 'standard1'):
+                node1.repair(options)
+            wall_seconds = time.time() - start
+            after = read_repair_metrics(agents, 'keyspace1', 'standard1')
+
+        metrics = {'wall_seconds': wall_seconds}
+        for metric, value in after.items():
+            metrics[metric] = value - before[metric] if value is not None and before[metric] is not None else None
+        logger.debug("{} repair of {} rows: {}".format(repair_type, rows, metrics))
+        return metrics
+
+    @pytest.mark.parametrize('mismatch', REPAIR_BENCHMARK_MISMATCH)
+    @pytest.mark.parametrize('repair_type', REPAIR_BENCHMARK_TYPES)
+    def test_repair_scaling(self, repair_type, mismatch):
+        """
+        Sweep the data size for one repair type and mismatch rate and fit the scaling curve
+        of wall time, validation time, anticompaction time and bytes streamed against rows.
+        The test fails if any run is worse than its --benchmark-baseline measurement; a
+        superlinear curve is only reported.
+        """
+        measurements = []
+        regressions = []
+        for i, rows in enumerate(self.ROWS):
+            if i > 0:
+                self.fixture_dtest_setup.cleanup_and_replace_cluster()
+            metrics = self._measure_repair(repair_type, rows, mismatch)
+            params = {'type': repair_type, 'rows': rows, 'mismatch': mismatch, 'nodes': 3,
+                      'vnodes': self.dtest_config.use_vnodes}
+            measurements.append((params, metrics))
+            regressions.extend('{} rows: {}'.format(rows, regression) for regression in record_benchmark(
+                self.dtest_config, 'repair', params, metrics, version=self.cluster.version(),
+                lower_is_better=REPAIR_BENCHMARK_METRICS))
+
+        curve = scaling_curve(measurements, 'rows', REPAIR_BENCHMARK_METRICS)
+        logger.info(format_scaling_curve('{} repair, {:.0%} mismatched'.format(repair_type, mismatch), curve, 'rows'))
+        self.record_junit_property('repair_scaling_curve', json.dumps(curve, sort_keys=True))
+        exponent = curve['exponents']['wall_seconds']
+        if exponent is not None and exponent > SUPERLINEAR_EXPONENT:
+            logger.warning("{} repair time grows superlinearly with the data size: rows ** {:.2f}"
+                           .format(repair_type, exponent))
+
+        assert not regressions, 'Repair benchmark regressed against baseline:\n' + '\n'.join(regressions)
@@ -15,6 +15,9 @@ from ccmlib.node import ToolError
 
 from dtest import CASSANDRA_VERSION_FROM_BUILD, FlakyRetryPolicy, Tester, create_ks, create_cf
 from tools.data import insert_c1c2, query_c1c2
+from tools.replica_digest import differing_ranges, replica_digests
+from tools.scanner import count_rows
+from tools.sstable_metadata import STATS, node_sstable_metadata
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -59,6 +62,9 @@ class BaseRepairTest(Tester):
         @param found A list of partition keys that we expect to be on the node
         @param missings A list of partition keys we expect NOT to be on the node
         @param restart Whether or not we should restart the nodes we shut down to perform the assertions. Should only be False if the call to check_rows_on_node is the last line in the test.
+
+        To compare what replicas hold without stopping any node, see tools.replica_digest,
+        as used by _repair_and_verify.
         """
         if found is None:
             found = []
@@ -72,8 +78,8 @@ class BaseRepairTest(Tester):
                 node.stop(wait_other_notice=True)
 
         session = self.patient_exclusive_cql_connection(node_to_check, 'ks')
-        result = list(session.execute("SELECT * FROM cf LIMIT {}".format(rows * 2), timeout=10))
-        assert len(result) == rows
+        count = count_rows(session, 'cf', consistency_level=ConsistencyLevel.ONE, timeout=10)
+        assert count == rows
 
         for k in found:
             query_c1c2(session, k, ConsistencyLevel.ONE)
@@ -117,17 +123,14 @@ class BaseRepairTest(Tester):
         cluster = self.cluster
         node1, node2, node3 = cluster.nodelist()
 
-        # Verify that node3 has only 2000 keys
-        logger.debug("Checking data on node3...")
-        self.check_rows_on_node(node3, 2000, missings=[1000])
-
-        # Verify that node1 has 2001 keys
-        logger.debug("Checking data on node1...")
-        self.check_rows_on_node(node1, 2001, found=[1000])
-
-        # Verify that node2 has 2001 keys
-        logger.debug("Checking data on node2...")
-        self.check_rows_on_node(node2, 2001, found=[1000])
+        # Verify that node1 and node2 have 2001 keys and that node3 only misses
+        # key 1000, i.e. differs from them in a single range
+        logger.debug("Comparing the data on the replicas...")
+        digests = replica_digests(self, [node1, node2, node3], 'ks', 'cf')
+        assert [digests[node].count for node in (node1, node2, node3)] == [2001, 2001, 2000]
+        assert differing_ranges(digests[node1], digests[node2]) == []
+        assert len(differing_ranges(digests[node1], digests[node3])) == 1
+        assert len(differing_ranges(digests[node2], digests[node3])) == 1
 
         time.sleep(10)  # see CASSANDRA-4373
         # Run repair
@@ -151,7 +154,9 @@ class BaseRepairTest(Tester):
             assert out_of_sync_nodes, valid_out_of_sync_pairs in str(out_of_sync_nodes)
 
         # Check node3 now has the key
-        self.check_rows_on_node(node3, 2001, found=[1000], restart=False)
+        digests = replica_digests(self, [node1, node3], 'ks', 'cf')
+        assert digests[node3].count == 2001
+        assert differing_ranges(digests[node1], digests[node3]) == []
 
 
 class TestRepair(BaseRepairTest):
@@ -163,8 +168,7 @@ class TestRepair(BaseRepairTest):
         * Start a -local repair on node1 in dc1
         * Assert that the dc1 nodes see repair messages
         * Assert that the dc2 nodes do not see repair messages
-        * Assert no nodes anticompact
-        # TODO: Verify the anticompaction with sstablemetadata, not just logs
+        * Assert no nodes anticompact, and no sstable is marked repaired
         @jira_ticket CASSANDRA-10422
         """
         cluster = self.cluster
@@ -183,6 +187,7 @@ class TestRepair(BaseRepairTest):
         # and no nodes should do anticompaction:
         for node in cluster.nodelist():
             assert not node.grep_log("Starting anticompaction")
+        self._assert_no_repaired_sstables('keyspace1')
 
     @pytest.mark.skipif(CASSANDRA_VERSION_FROM_BUILD == '3.9', reason="Test doesn't run on 3.9")
     def test_nonexistent_table_repair(self):
@@ -231,8 +236,7 @@ class TestRepair(BaseRepairTest):
         * Launch a four node, two DC cluster
         * Start a repair on all nodes, by enumerating with -hosts
         * Assert all nodes see a repair messages
-        * Assert no nodes anticompact
-        # TODO: Verify the anticompaction with sstablemetadata, not just logs
+        * Assert no nodes anticompact, and no sstable is marked repaired
         @jira_ticket CASSANDRA-10422
         """
         cluster = self.cluster
@@ -245,6 +249,7 @@ class TestRepair(BaseRepairTest):
             assert node.grep_log("Not a global repair")
         for node in cluster.nodelist():
             assert not node.grep_log("Starting anticompaction")
+        self._assert_no_repaired_sstables('keyspace1')
 
     @since('2.2.4', max_version='4')
     def test_no_anticompaction_after_subrange_repair(self):
@@ -252,8 +257,7 @@ class TestRepair(BaseRepairTest):
         * Launch a three node, two DC cluster
         * Start a repair on a token range
         * Assert all nodes see repair messages
-        * Assert no nodes anticompact
-        # TODO: Verify the anticompaction with sstablemetadata, not just logs
+        * Assert no nodes anticompact, and no sstable is marked repaired
         @jira_ticket CASSANDRA-10422
         """
         cluster = self.cluster
@@ -266,6 +270,13 @@ class TestRepair(BaseRepairTest):
             assert node.grep_log("Not a global repair")
         for node in cluster.nodelist():
             assert not node.grep_log("Starting anticompaction")
+        self._assert_no_repaired_sstables('keyspace1')
+
+    def _assert_no_repaired_sstables(self, keyspace):
+        self.cluster.flush()
+        for node in self.cluster.nodelist():
+            repaired = [sstable.name for sstable in self._get_repaired_data(node, keyspace) if sstable.repaired != 0]
+            assert not repaired, "{} has sstables marked repaired: {}".format(node.name, repaired)
 
     def _get_repaired_data(self, node, keyspace):
         """
@@ -275,6 +286,11 @@ class TestRepair(BaseRepairTest):
         _repaired_at = re.compile('Repaired at: (\d+)')
         _sstable_data = namedtuple('_sstabledata', ('name', 'repaired'))
 
+        if node.get_cassandra_version() >= '3.0':
+            sstables = node_sstable_metadata(node, keyspace, components=(STATS,))
+            assert sstables
+            return [_sstable_data(sstable.name, sstable.repaired_at) for sstable in sstables]
+
         out = node.run_sstablemetadata(keyspace=keyspace).stdout
 
         def matches(pattern):
@@ -3,7 +3,8 @@
 usage: run_dtests.py [-h] [--use-vnodes] [--use-off-heap-memtables] [--num-tokens NUM_TOKENS] [--data-dir-count-per-instance DATA_DIR_COUNT_PER_INSTANCE] [--force-resource-intensive-tests]
                      [--skip-resource-intensive-tests] [--cassandra-dir CASSANDRA_DIR] [--cassandra-version CASSANDRA_VERSION] [--delete-logs] [--execute-upgrade-tests] [--disable-active-log-watching]
                      [--keep-test-dir] [--enable-jacoco-code-coverage] [--dtest-enable-debug-logging] [--dtest-print-tests-only] [--dtest-print-tests-output DTEST_PRINT_TESTS_OUTPUT]
-                     [--pytest-options PYTEST_OPTIONS] [--dtest-tests DTEST_TESTS]
+                     [--pytest-options PYTEST_OPTIONS] [--dtest-tests DTEST_TESTS] [--upgrade-artifact-cache UPGRADE_ARTIFACT_CACHE]
+                     [--dtest-prebuild-upgrade-versions] [--dtest-prebuild-jobs DTEST_PREBUILD_JOBS] [--dtest-git-mirror-dir DTEST_GIT_MIRROR_DIR] [--dtest-prebuild-fetch]
 
 optional arguments:
   -h, --help                                                 show this help message and exit
@@ -26,6 +27,13 @@ optional arguments:
   --dtest-print-tests-output DTEST_PRINT_TESTS_OUTPUT        Path to file where the output of --dtest-print-tests-only should be written to (default: False)
   --pytest-options PYTEST_OPTIONS                            Additional command line arguments to proxy directly thru when invoking pytest. (default: None)
   --dtest-tests DTEST_TESTS                                  Comma separated list of test files, test classes, or test methods to execute. (default: None)
+  --upgrade-artifact-cache UPGRADE_ARTIFACT_CACHE            Directory of prebuilt C* versions (see run_dtests.py --dtest-prebuild-upgrade-versions). Upgrade tests install
+                                                             versions from it only, instead of having ccm fetch and build them (default: None)
+  --dtest-prebuild-upgrade-versions                          Build every C* version of the upgrade manifest into --upgrade-artifact-cache and exit, instead of running tests.
+                                                             (default: False)
+  --dtest-prebuild-jobs DTEST_PREBUILD_JOBS                  Number of versions to build at the same time, the number of cores if not given (default: None)
+  --dtest-git-mirror-dir DTEST_GIT_MIRROR_DIR                Directory of the git mirrors to build versions from (default: ~/.ccm/repository)
+  --dtest-prebuild-fetch                                     Fetch the git mirrors before building. Without it, prebuilding works offline. (default: False)
 """
 import subprocess
 import sys
@@ -41,6 +49,7 @@ from _pytest.config import Parser
 import argparse
 
 from conftest import pytest_addoption
+from tools.artifact_cache import ArtifactCache, default_mirror_dir
 
 logger = logging.getLogger(__name__)
 
@@ -82,18 +91,30 @@ class RunDTests():
                             help="Additional command line arguments to proxy directly thru when invoking pytest.")
         parser.add_argument("--dtest-tests", action="store", default=None,
                             help="Comma separated list of test files, test classes, or test methods to execute.")
+        parser.add_argument("--dtest-prebuild-upgrade-versions", action="store_true", default=False,
+                            help="Build every C* version of the upgrade manifest into --upgrade-artifact-cache "
+                                 "and exit, instead of running tests.")
+        parser.add_argument("--dtest-prebuild-jobs", action="store", type=int, default=None,
+                            help="Number of versions to build at the same time, the number of cores if not given")
+        parser.add_argument("--dtest-git-mirror-dir", action="store", default=default_mirror_dir(),
+                            help="Directory of the git mirrors to build versions from")
+        parser.add_argument("--dtest-prebuild-fetch", action="store_true", default=False,
+                            help="Fetch the git mirrors before building. Without it, prebuilding works offline.")
 
         args = parser.parse_args()
 
+        if args.dtest_enable_debug_logging:
+            logging.root.setLevel(logging.DEBUG)
+            logger.setLevel(logging.DEBUG)
+
+        if args.dtest_prebuild_upgrade_versions:
+            exit(self.prebuild_upgrade_versions(args))
+
         if not args.dtest_print_tests_only and args.cassandra_dir is None:
             if args.cassandra_version is None:
                 raise Exception("Required dtest arguments were missing! You must provide either --cassandra-dir "
                                 "or --cassandra-version. Refer to the documentation or invoke the help with --help.")
 
-        if args.dtest_enable_debug_logging:
-            logging.root.setLevel(logging.DEBUG)
-            logger.setLevel(logging.DEBUG)
-
         # Get dictionaries corresponding to each point in the configuration matrix
         # we want to run, then generate a config object for each of them.
         logger.debug('Generating configurations from the following matrix:\n\t{}'.format(args))
@@ -180,6 +201,23 @@ class RunDTests():
 
         exit(sp.returncode)
 
+    def prebuild_upgrade_versions(self, args):
+        """
+        Builds every version referenced by the upgrade manifest into the artifact cache.
+        Returns the exit code: 0 if all of them are in the cache afterwards, 1 otherwise.
+        """
+        if not args.upgrade_artifact_cache:
+            raise Exception("--dtest-prebuild-upgrade-versions requires --upgrade-artifact-cache")
+        logging.basicConfig(level=logging.DEBUG if args.dtest_enable_debug_logging else logging.INFO)
+
+        from upgrade_tests.upgrade_manifest import manifest_versions
+        versions = manifest_versions()
+        logger.info("Prebuilding {} upgrade versions into {}".format(len(versions), args.upgrade_artifact_cache))
+        failures = ArtifactCache(args.upgrade_artifact_cache).prebuild(versions, mirror_dir=args.dtest_git_mirror_dir,
+                                                                       jobs=args.dtest_prebuild_jobs,
+                                                                       fetch=args.dtest_prebuild_fetch)
+        return 1 if failures else 0
+
 
 def collect_test_modules(stdout):
     """
@@ -1,5 +1,6 @@
 import glob
 import os
+import random
 import re
 import subprocess
 import time
@@ -8,10 +9,13 @@ import pytest
 import parse
 import logging
 
+from cassandra.concurrent import execute_concurrent_with_args
 from ccmlib import common
 
 from dtest import Tester, create_ks, create_cf
 from tools.assertions import assert_length_equal, assert_stderr_clean
+from tools.benchmark import record_benchmark
+from tools.sstable_corruption import SSTableCorruptor
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -110,9 +114,9 @@ class TestHelper(Tester):
         if not common.is_win():  # nodetool always prints out on windows
             assert_length_equal(response, 0)  # nodetool does not print anything unless there is an error
 
-    def launch_standalone_scrub(self, ks, cf, reinsert_overflowed_ttl=False, no_validate=False):
+    def launch_standalone_scrub(self, ks, cf, reinsert_overflowed_ttl=False, no_validate=False, check_stderr=True):
         """
-        Launch the standalone scrub
+        Launch the standalone scrub, and return its stdout and stderr
         """
         node1 = self.cluster.nodelist()[0]
         env = common.make_cassandra_env(node1.get_install_cassandra_root(), node1.get_node_cassandra_root())
@@ -127,11 +131,14 @@ class TestHelper(Tester):
         args += [ks, cf] if reinsert_overflowed_ttl else [ks, cf]
         p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         out, err = p.communicate()
-        logger.debug(out.decode("utf-8"))
+        out, err = out.decode("utf-8"), err.decode("utf-8")
+        logger.debug(out)
         # if we have less than 64G free space, we get this warning - ignore it
-        if err and "Consider adding more capacity" not in err.decode("utf-8"):
-            logger.debug(err.decode("utf-8"))
-            assert_stderr_clean(err.decode("utf-8"))
+        if err and "Consider adding more capacity" not in err:
+            logger.debug(err)
+            if check_stderr:
+                assert_stderr_clean(err)
+        return out, err
 
     def perform_node_tool_cmd(self, cmd, table, indexes):
         """
@@ -471,3 +478,47 @@ class TestScrub(TestHelper):
         time.sleep(2)
         match = node1.grep_log("org.apache.cassandra.serializers.MarshalException: Not enough bytes to read a set")
         assert len(match) == 0
+
+    @since('3.0')
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('corrupted_partitions', [0, 10, 100, 1000])
+    def test_standalone_scrub_corruption_density_benchmark(self, corrupted_partitions):
+        """
+        Measure the throughput of sstablescrub through an uncompressed sstable of 10000
+        partitions, corrupted_partitions of which have an unreadable key, and how many
+        partitions it recovers.
+        """
+        cluster = self.cluster
+        cluster.populate(1).start()
+        node1 = cluster.nodelist()[0]
+
+        session = self.patient_cql_connection(node1)
+        create_ks(session, KEYSPACE, 1)
+        session.execute("CREATE TABLE scrubbed (key int PRIMARY KEY, val text) WITH compression = {'enabled': 'false'}")
+        insert = session.prepare("INSERT INTO scrubbed (key, val) VALUES (?, ?)")
+        execute_concurrent_with_args(session, insert, [(key, 'x' * 100) for key in range(10000)])
+        node1.flush()
+        cluster.stop()
+
+        [sstable] = node1.get_sstables(KEYSPACE, 'scrubbed')
+        corruptor = SSTableCorruptor(sstable)
+        partitions = len(corruptor.partitions())
+        for partition in random.Random(0).sample(range(partitions), corrupted_partitions):
+            corruptor.corrupt_partition(partition)
+
+        start = time.time()
+        out, _ = self.launch_standalone_scrub(KEYSPACE, 'scrubbed', check_stderr=False)
+        seconds = time.time() - start
+        match = re.search(r'(\d+) (?:rows|partitions) in new sstable', out)
+        recovered = int(match.group(1)) if match else 0
+        logger.info('Scrubbed {p} partitions with {c} corrupted in {s:.2f}s, recovering {r}'.format(
+            p=partitions, c=corrupted_partitions, s=seconds, r=recovered))
+
+        metrics = {'seconds': seconds,
+                   'partitions_per_second': partitions / seconds,
+                   'recovered_partitions': recovered}
+        regressions = record_benchmark(self.dtest_config, 'standalone_scrub_corruption_density',
+                                       {'partitions': partitions, 'corrupted_partitions': corrupted_partitions},
+                                       metrics, version=cluster.version(),
+                                       higher_is_better=('partitions_per_second', 'recovered_partitions'))
+        assert not regressions, 'Scrub benchmark regressed against baseline:\n' + '\n'.join(regressions)
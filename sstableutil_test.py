@@ -1,15 +1,14 @@
 import glob
 import os
-import subprocess
 import time
 import pytest
 import logging
 
-from ccmlib import common
 from ccmlib.node import ToolError
 
 from dtest import Tester
 from tools.intervention import InterruptCompaction
+from tools.offline_tools import OfflineToolRunner
 
 since = pytest.mark.since
 logger = logging.getLogger(__name__)
@@ -119,11 +118,10 @@ class TestSSTableUtil(Tester):
 
     def _check_files(self, node, ks, table, expected_finalfiles=None, expected_tmpfiles=None):
         sstablefiles = _normcase_all(self._get_sstable_files(node, ks, table))
-        allfiles = _normcase_all(self._invoke_sstableutil(ks, table, type='all'))
-        finalfiles = _normcase_all(self._invoke_sstableutil(ks, table, type='final'))
-        tmpfiles = _normcase_all(self._invoke_sstableutil(ks, table, type='tmp'))
+        allfiles, finalfiles, tmpfiles, tmpfiles_with_oplogs = [
+            _normcase_all(files) for files in self._invoke_sstableutil_batch(ks, table, [
+                {'type': 'all'}, {'type': 'final'}, {'type': 'tmp'}, {'type': 'tmp', 'oplogs': True}])]
         expected_oplogs = _normcase_all(self._get_sstable_transaction_logs(node, ks, table))
-        tmpfiles_with_oplogs = _normcase_all(self._invoke_sstableutil(ks, table, type='tmp', oplogs=True))
         oplogs = _normcase_all(sorted(list(set(tmpfiles_with_oplogs) - set(tmpfiles))))
 
         if expected_finalfiles is None:
@@ -154,32 +152,38 @@ class TestSSTableUtil(Tester):
         """
         Invoke sstableutil and return the list of files, if any
         """
-        logger.debug("About to invoke sstableutil with type {}...".format(type))
-        node1 = self.cluster.nodelist()[0]
-        env = common.make_cassandra_env(node1.get_install_cassandra_root(), node1.get_node_cassandra_root())
-        tool_bin = node1.get_tool('sstableutil')
-
-        args = [tool_bin, '--type', type]
-
-        if oplogs:
-            args.extend(['--oplog'])
-        if cleanup:
-            args.extend(['--cleanup'])
-
-        args.extend([ks, table])
-
-        p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        (stdout, stderr) = p.communicate()
+        [files] = self._invoke_sstableutil_batch(ks, table, [{'type': type, 'oplogs': oplogs, 'cleanup': cleanup}])
+        return files
 
-        assert p.returncode == 0, "Error invoking sstableutil; returned {code}".format(code=p.returncode)
-
-        if stdout:
-            logger.debug(stdout.decode("utf-8"))
+    def _invoke_sstableutil_batch(self, ks, table, invocations):
+        """
+        Invoke sstableutil once per dict of _invoke_sstableutil options in invocations,
+        in a single JVM, and return the list of files of each invocation
+        """
+        node1 = self.cluster.nodelist()[0]
+        queue = []
+        for options in invocations:
+            logger.debug("About to invoke sstableutil with type {}...".format(options.get('type', 'all')))
+            args = ['--type', options.get('type', 'all')]
+            if options.get('oplogs'):
+                args.extend(['--oplog'])
+            if options.get('cleanup'):
+                args.extend(['--cleanup'])
+            queue.append(('sstableutil', args + [ks, table]))
+
+        with OfflineToolRunner(node1) as runner:
+            results = runner.run_all(queue)
 
+        ret = []
         match = ks + os.sep + table + '-'
-        ret = sorted([s for s in stdout.decode("utf-8").splitlines() if match in s])
-        logger.debug("Got {} files of type {}".format(len(ret), type))
+        for result in results:
+            assert result.rc == 0, "Error invoking sstableutil; returned {code}: {err}".format(code=result.rc,
+                                                                                               err=result.stderr)
+            if result.stdout:
+                logger.debug(result.stdout)
+            files = sorted([s for s in result.stdout.splitlines() if match in s])
+            logger.debug("Got {} files of type {}".format(len(files), result.args[1]))
+            ret.append(files)
         return ret
 
     def _get_sstable_files(self, node, ks, table):
@@ -0,0 +1,238 @@
+"""
+Prebuilt Cassandra versions for upgrade tests.
+
+Upgrade tests name the versions they install the way ccm does ('3.0.12',
+'github:apache/cassandra-3.11', 'git:trunk', ...), and ccm fetches and builds each one
+the first time a test asks for it. ArtifactCache instead builds every version of the
+upgrade manifest ahead of time, from local git mirrors and concurrently, into a
+directory keyed by git sha:
+
+    <root>/builds/<sha>/    a built Cassandra tree, never modified once in place
+    <root>/logs/<sha>.log   the output of its build
+    <root>/versions.json    version name -> sha, repository and ref it was resolved from
+
+    ./run_dtests.py --upgrade-artifact-cache ~/.dtest-artifacts --dtest-prebuild-upgrade-versions
+
+Tests run with --upgrade-artifact-cache then only read from the cache (see
+install_dir_kwargs) and fail fast for a version that was not prebuilt, so upgrade runs
+need neither network access nor a build while they run.
+
+The mirrors are those ccm keeps in its repository directory (_git_cache_apache for
+'git:' and 'github:apache/' versions and releases, _git_cache_<user> for
+'github:<user>/' versions); 'local:' versions are built from the repository they name.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SHA_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+RELEASE_PATTERN = re.compile(r'^\d+\.\d+(\.\d+)?(-\w+)?$')
+BUILD_COMMAND = ('ant', 'jar')
+
+
+def default_mirror_dir():
+    """ccm's repository directory, where it keeps its git mirrors"""
+    return os.path.join(os.path.expanduser('~'), '.ccm', 'repository')
+
+
+def repository_and_ref(version, mirror_dir):
+    """
+    Returns the git repository and the ref to build `version` from, following the
+    naming ccm uses for its mirrors and versions.
+
+    @raise ValueError for versions that don't come from git, e.g. 'alias:' versions
+    """
+    if version.startswith('github:'):
+        user, branch = version.split(':', 1)[1].split('/', 1)
+        return os.path.join(mirror_dir, '_git_cache_' + user), branch
+    if version.startswith('git:'):
+        return os.path.join(mirror_dir, '_git_cache_apache'), version.split(':', 1)[1]
+    if version.startswith('local:'):
+        try:
+            _, path, branch = version.split(':')
+        except ValueError:
+            raise ValueError("local version ({}) appears to be invalid, expected local:/some/path/:somebranch".format(version))
+        return path, branch
+    if version.startswith(('binary:', 'source:')):
+        version = version.split(':', 1)[1]
+    if RELEASE_PATTERN.match(version):
+        return os.path.join(mirror_dir, '_git_cache_apache'), 'cassandra-' + version
+    raise ValueError("Cannot build version {} from a git mirror".format(version))
+
+
+def resolve_sha(repository, ref):
+    """Returns the sha of the commit `ref` (a branch, tag or sha) points to in repository"""
+    for candidate in ('refs/heads/' + ref, 'refs/tags/' + ref, 'refs/remotes/origin/' + ref, ref):
+        try:
+            output = subprocess.check_output(['git', 'rev-parse', '--verify', '-q', candidate + '^{commit}'],
+                                             cwd=repository, stderr=subprocess.DEVNULL)
+        except subprocess.CalledProcessError:
+            continue
+        return output.decode('utf-8').strip()
+    raise RuntimeError("Could not find {} in {}".format(ref, repository))
+
+
+def build_env(java_version=None):
+    """
+    The environment to build a version requiring java_version with: JAVA_HOME is set
+    to JAVA<java_version>_HOME if defined, as switch_jdks does for the tests.
+    """
+    env = os.environ.copy()
+    if java_version is not None and 'JAVA{}_HOME'.format(java_version) in env:
+        env['JAVA_HOME'] = env['JAVA{}_HOME'.format(java_version)]
+    return env
+
+
+class ArtifactCache(object):
+    """
+    A directory of Cassandra builds keyed by git sha, see the module documentation.
+
+    @param root The cache directory, created if it doesn't exist
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.builds_dir = os.path.join(self.root, 'builds')
+        self.logs_dir = os.path.join(self.root, 'logs')
+        self.index_path = os.path.join(self.root, 'versions.json')
+        for directory in (self.builds_dir, self.logs_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def build_dir(self, sha):
+        return os.path.join(self.builds_dir, sha)
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def record(self, entries):
+        """Adds version entries to the index, safely with respect to other processes doing the same"""
+        import fcntl  # upgrade tests don't run on Windows
+        with open(self.index_path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self.load_index()
+            index.update(entries)
+            temporary = self.index_path + '.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+            os.replace(temporary, self.index_path)
+
+    def install_dir(self, version):
+        """
+        Returns the directory of the prebuilt `version`, which is either a version name
+        from the index or a sha.
+
+        @raise RuntimeError if the version was not prebuilt
+        """
+        sha = version if SHA_PATTERN.match(version) else self.load_index().get(version, {}).get('sha')
+        if sha is None or not os.path.isdir(self.build_dir(sha)):
+            raise RuntimeError("Cassandra version {} is not in the artifact cache at {}; prebuild it with "
+                               "run_dtests.py --upgrade-artifact-cache {} --dtest-prebuild-upgrade-versions"
+                               .format(version, self.root, self.root))
+        return self.build_dir(sha)
+
+    def build(self, sha, repository, env=None, build_command=BUILD_COMMAND):
+        """
+        Builds commit `sha` of repository into the cache, unless it's there already, and
+        returns its directory. The build happens in a temporary directory next to its
+        final place and is moved there once complete, so a concurrent build of the same
+        sha by another process is harmless and an interrupted one leaves nothing behind.
+        """
+        target = self.build_dir(sha)
+        if os.path.isdir(target):
+            return target
+        work = tempfile.mkdtemp(prefix=sha + '.', dir=self.builds_dir)
+        log_path = os.path.join(self.logs_dir, sha + '.log')
+        start = time.time()
+        try:
+            with open(log_path, 'w') as log:
+                subprocess.check_call(['git', 'clone', '-q', '--shared', '--no-checkout', repository, work],
+                                      stdout=log, stderr=subprocess.STDOUT, env=env)
+                subprocess.check_call(['git', 'checkout', '-q', '--detach', sha],
+                                      cwd=work, stdout=log, stderr=subprocess.STDOUT, env=env)
+                subprocess.check_call(list(build_command), cwd=work, stdout=log, stderr=subprocess.STDOUT, env=env)
+            # the clone borrows the mirror's objects, which may be pruned later; the build doesn't need them
+            shutil.rmtree(os.path.join(work, '.git'))
+            try:
+                os.rename(work, target)
+            except OSError:
+                if not os.path.isdir(target):
+                    raise
+                logger.debug("{} was built concurrently by another process".format(sha))
+                shutil.rmtree(work)
+        except (OSError, subprocess.CalledProcessError) as e:
+            shutil.rmtree(work, ignore_errors=True)
+            raise RuntimeError("Building {} from {} failed: {}. See {}".format(sha, repository, e, log_path))
+        logger.info("Built {} from {} in {:.0f}s".format(sha, repository, time.time() - start))
+        return target
+
+    def prebuild(self, versions, mirror_dir=None, jobs=None, fetch=False, build_command=BUILD_COMMAND):
+        """
+        Builds every version that isn't in the cache yet, at most `jobs` (the number of
+        cores by default) at a time, and records all of them in the index. A sha shared
+        by several version names is built once.
+
+        @param versions Dict of version name to the java version it requires (or None)
+        @param mirror_dir Directory of the git mirrors, ccm's repository directory by default
+        @param fetch Whether to fetch the mirrors first; without it, nothing needs the network
+        @return Dict of version name to the error that prevented building it, empty if all succeeded
+        """
+        mirror_dir = mirror_dir or default_mirror_dir()
+        failures = {}
+        resolved = {}
+        fetched = set()
+        for version in sorted(versions):
+            try:
+                repository, ref = repository_and_ref(version, mirror_dir)
+                if fetch and repository not in fetched and os.path.exists(os.path.join(repository, 'HEAD')):
+                    # same refspec ccm uses to update its mirrors
+                    subprocess.check_call(['git', 'fetch', '-q', '-fup', 'origin', '+refs/*:refs/*'], cwd=repository)
+                    fetched.add(repository)
+                resolved[version] = (repository, ref, resolve_sha(repository, ref))
+            except (ValueError, RuntimeError, OSError, subprocess.CalledProcessError) as e:
+                failures[version] = e
+
+        builds = {}
+        for version, (repository, _, sha) in resolved.items():
+            builds.setdefault(sha, (repository, versions[version]))
+        pending = {sha: build for sha, build in builds.items() if not os.path.isdir(self.build_dir(sha))}
+        logger.info("{} versions resolve to {} commits, {} of which need to be built"
+                    .format(len(resolved), len(builds), len(pending)))
+
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+            futures = {sha: executor.submit(self.build, sha, repository, build_env(java_version), build_command)
+                       for sha, (repository, java_version) in pending.items()}
+            for sha, future in futures.items():
+                try:
+                    future.result()
+                except RuntimeError as e:
+                    for version, (_, _, version_sha) in resolved.items():
+                        if version_sha == sha:
+                            failures[version] = e
+
+        self.record({version: {'sha': sha, 'repository': repository, 'ref': ref}
+                     for version, (repository, ref, sha) in resolved.items() if version not in failures})
+        for version, error in sorted(failures.items()):
+            logger.error("Could not prebuild {}: {}".format(version, error))
+        return failures
+
+
+def install_dir_kwargs(cache_root, version):
+    """
+    Returns the keyword arguments for Cluster.set_install_dir or Node.set_install_dir
+    that install `version`: the prebuilt directory from the cache at cache_root, or the
+    version itself, for ccm to fetch and build, if there is no cache.
+    """
+    if not cache_root:
+        return {'version': version}
+    return {'install_dir': ArtifactCache(cache_root).install_dir(version)}
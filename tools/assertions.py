@@ -1,6 +1,7 @@
 import re
 from time import sleep
 from tools.misc import list_to_hashed_dict
+from tools.result_compare import compare_rows
 
 from cassandra import (InvalidRequest, ReadFailure, ReadTimeout, Unauthorized,
                        Unavailable, WriteFailure, WriteTimeout)
@@ -172,6 +173,31 @@ def assert_all(session, query, expected, cl=None, ignore_order=False, timeout=No
     assert list_res == expected, "Expected {} from {}, but got {}".format(expected, query, list_res)
 
 
+def assert_all_paged(session, query, expected, cl=None, ignore_order=False, timeout=None, fetch_size=5000,
+                     max_differences=10):
+    """
+    Assert query returns all expected items, like assert_all, but for large results.
+    The result is consumed page by page instead of being turned into a list, and on
+    failure only the first max_differences differences are reported, with their row positions.
+    @param session Session in use
+    @param query Query to run
+    @param expected Expected results from query; any iterable of rows, e.g. a generator
+    @param cl Optional Consistency Level setting. Default ONE
+    @param ignore_order Optional boolean flag determining whether response is ordered
+    @param timeout Optional query timeout, in seconds
+    @param fetch_size Optional page size
+    @param max_differences Optional number of differences after which the comparison stops. Default 10
+
+    Examples:
+    assert_all_paged(session, "SELECT * FROM wide_rows WHERE k = 0", ([0, i, i] for i in range(100000)))
+    assert_all_paged(session, "SELECT * FROM test", expected_rows, ignore_order=True, fetch_size=1000)
+    """
+    simple_query = SimpleStatement(query, consistency_level=cl, fetch_size=fetch_size)
+    res = session.execute(simple_query) if timeout is None else session.execute(simple_query, timeout=timeout)
+    result = compare_rows(res, expected, ignore_order=ignore_order, max_differences=max_differences)
+    assert result.equal, result.describe(query)
+
+
 def assert_almost_equal(*args, **kwargs):
     """
     Assert variable number of arguments all fall within a margin of error.
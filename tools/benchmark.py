@@ -0,0 +1,218 @@
+"""
+Recording benchmark results and flagging regressions against a baseline.
+
+Benchmark tests (marked with @pytest.mark.benchmark, see --execute-benchmarks)
+append one JSON object per measurement to the file given with --benchmark-results:
+
+    {"name": "cqlsh_copy_from", "params": {...}, "metrics": {...}, "version": "4.0", "time": ...}
+
+A results file from an earlier run, e.g. against the previous Cassandra release, can
+be passed back with --benchmark-baseline; record_benchmark() then compares every new
+measurement with the baseline measurement of the same name and params and returns
+the metrics that got worse by more than --benchmark-tolerance.
+
+Benchmarks that sweep a size (rows, partitions, ...) can fit a scaling curve to their
+measurements with scaling_curve(): the exponent k of metric ~ size ** k tells linear
+(k close to 1) from superlinear behavior.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessTreeSampler(object):
+    """
+    Context manager sampling, from a background thread, the total resident memory of
+    the descendants of a process (the current one by default) while the block runs.
+    Only processes whose command line contains `match` are counted, if given.
+
+        with ProcessTreeSampler(match='cqlsh') as sampler:
+            self.run_cqlsh(cmds=...)
+        logger.info(sampler.peak_rss)
+    """
+
+    def __init__(self, pid=None, match=None, interval=0.1):
+        self.process = psutil.Process(pid if pid is not None else os.getpid())
+        self.match = match
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_processes = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _matching_processes(self):
+        for process in self.process.children(recursive=True):
+            try:
+                if self.match is None or self.match in ' '.join(process.cmdline()):
+                    yield process
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+    def sample(self):
+        rss, processes = 0, 0
+        for process in self._matching_processes():
+            try:
+                rss += process.memory_info().rss
+                processes += 1
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_processes = max(self.peak_processes, processes)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='process-tree-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        self._thread.join()
+        return False
+
+
+def params_key(name, params):
+    return name, json.dumps(params, sort_keys=True, default=str)
+
+
+def load_results(path):
+    """
+    Reads a results file and returns a dict of (name, params) key to metrics. If a
+    measurement was recorded more than once, the last one wins.
+    """
+    results = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                results[params_key(entry['name'], entry['params'])] = entry['metrics']
+    return results
+
+
+def find_regressions(baseline, metrics, higher_is_better=(), lower_is_better=(), tolerance=0.2, floors=None):
+    """
+    Compares metrics with their baseline values and returns a description of every
+    metric that got worse by more than `tolerance` (a fraction of the baseline value).
+    Metrics missing on either side are ignored.
+
+    A lower-is-better metric is never a regression while it is at or under its floor,
+    e.g. a floor of 5 for retries tolerates a handful of them. A fraction of a baseline
+    of 0 is 0, so such a metric (often a counter of errors or retries) is only compared
+    with its floor, and not at all if it has none.
+
+    @param floors Dict of lower-is-better metric to the absolute value it may always reach
+    """
+    floors = floors or {}
+    regressions = []
+    for metric in higher_is_better:
+        if baseline.get(metric) and metrics.get(metric) is not None and \
+                metrics[metric] < baseline[metric] * (1 - tolerance):
+            regressions.append('{} dropped from {:.2f} to {:.2f}'.format(metric, baseline[metric], metrics[metric]))
+    for metric in lower_is_better:
+        if baseline.get(metric) is None or metrics.get(metric) is None:
+            continue
+        if baseline[metric] == 0 and metric not in floors:
+            logger.debug("Not comparing {} with a baseline of 0 and no floor".format(metric))
+            continue
+        if metrics[metric] > max(baseline[metric] * (1 + tolerance), floors.get(metric, 0)):
+            regressions.append('{} rose from {:.2f} to {:.2f}'.format(metric, baseline[metric], metrics[metric]))
+    return regressions
+
+
+def record_benchmark(dtest_config, name, params, metrics, version=None, higher_is_better=(), lower_is_better=(),
+                     floors=None):
+    """
+    Appends a measurement to the configured results file and returns the list of
+    regressions against the configured baseline (empty if there is no baseline, or no
+    baseline measurement with the same name and params).
+
+    @param dtest_config The test's dtest_config, holding the --benchmark-* options
+    @param name Name of the benchmark, e.g. 'cqlsh_copy_from'
+    @param params JSON-serializable dict of the parameters the measurement was taken with
+    @param metrics Dict of metric name to number
+    @param version Cassandra version the measurement was taken against
+    @param higher_is_better Metrics for which a drop is a regression, e.g. throughput
+    @param lower_is_better Metrics for which a rise is a regression, e.g. memory or errors
+    @param floors Dict of lower-is-better metric to the value it may always reach, see find_regressions()
+    """
+    logger.info("Benchmark {} {}: {}".format(name, params, metrics))
+    if dtest_config.benchmark_results:
+        entry = {'name': name, 'params': params, 'metrics': metrics,
+                 'version': str(version) if version is not None else None, 'time': time.time()}
+        directory = os.path.dirname(dtest_config.benchmark_results)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(dtest_config.benchmark_results, 'a') as f:
+            f.write(json.dumps(entry, sort_keys=True, default=str) + '\n')
+
+    if not dtest_config.benchmark_baseline:
+        return []
+    baseline = load_results(dtest_config.benchmark_baseline).get(params_key(name, params))
+    if baseline is None:
+        logger.info("No baseline for benchmark {} {}".format(name, params))
+        return []
+    return find_regressions(baseline, metrics, higher_is_better=higher_is_better,
+                            lower_is_better=lower_is_better, tolerance=dtest_config.benchmark_tolerance,
+                            floors=floors)
+
+
+def scaling_exponent(points):
+    """
+    Returns the exponent k of the power law value ~ size ** k fitted to points, a list of
+    (size, value) tuples, by least squares on their logarithms. Points with a size or value
+    that isn't positive are ignored; None if fewer than two points remain.
+    """
+    logs = [(math.log(size), math.log(value)) for size, value in points
+            if size and value and size > 0 and value > 0]
+    if len({x for x, _ in logs}) < 2:
+        return None
+    mean_x = sum(x for x, _ in logs) / len(logs)
+    mean_y = sum(y for _, y in logs) / len(logs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in logs) / sum((x - mean_x) ** 2 for x, _ in logs)
+
+
+def scaling_curve(measurements, size, metrics):
+    """
+    Returns the scaling curve of a size sweep: {'points': [...], 'exponents': {...}} where
+    points are the measurements' size and metrics ordered by size, and exponents the
+    scaling_exponent() of every metric against size.
+
+    @param measurements List of (params, metrics) dicts
+    @param size The param that was swept, e.g. 'rows'
+    @param metrics Names of the metrics to fit
+    """
+    measurements = sorted(measurements, key=lambda measurement: measurement[0][size])
+    points = [dict({size: params[size]}, **{metric: values.get(metric) for metric in metrics})
+              for params, values in measurements]
+    exponents = {metric: scaling_exponent([(point[size], point[metric]) for point in points])
+                 for metric in metrics}
+    return {'points': points, 'exponents': exponents}
+
+
+def format_scaling_curve(label, curve, size):
+    """Formats a curve as returned by scaling_curve() as a table, with the fitted exponents last"""
+    metrics = sorted(curve['exponents'])
+    header = ' '.join(['{:>12}'.format(size)] + ['{:>22}'.format(metric) for metric in metrics])
+    lines = [label, header, '-' * len(header)]
+
+    def number(value):
+        return '-' if value is None else '{:.3f}'.format(value)
+
+    def row(first, values):
+        return ' '.join(['{:>12}'.format(first)] + ['{:>22}'.format(number(value)) for value in values])
+
+    for point in curve['points']:
+        lines.append(row(point[size], [point[metric] for metric in metrics]))
+    lines.append(row('exponent', [curve['exponents'][metric] for metric in metrics]))
+    return '\n'.join(lines)
@@ -0,0 +1,454 @@
+"""
+Following a node's cdc_raw directory while it is written to, the way a CDC consumer does.
+
+Since 4.0, a CDC enabled commitlog segment is hard linked into cdc_raw when it is
+created, next to a CommitLog-<version>-<id>_cdc.idx file that Cassandra rewrites on
+every sync with the offset up to which the segment is durable, followed by a
+COMPLETED line once the segment is full. A consumer reads each segment up to that
+offset and deletes the segment and its index once it is completed and fully read,
+which frees CDC space; while it lags behind, cdc_raw fills up to cdc_total_space_in_mb
+and Cassandra rejects writes to CDC tables. Before 4.0 there are no index files, and
+segments are moved into cdc_raw whole when they are discarded.
+
+CDCFollower watches cdc_raw with inotify (polling it on platforms without inotify),
+tracks the offset and completed state of every segment as they change and reads the
+new bytes as they become available, optionally at a limited rate, recording a CDCEvent
+for every change with the consumption rate and the consumer's lag:
+
+    with CDCFollower(os.path.join(node.get_path(), 'cdc_raw'), delete_consumed=True) as follower:
+        ... write to CDC tables ...
+        follower.wait_until_consumed(timeout=30)
+    logger.info(follower.format_stats())
+
+With delete_consumed=True it acts as a simulated CDC consumer, so the back-pressure of
+cdc_total_space_in_mb can be tested and benchmarked under sustained write load.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import re
+import select
+import struct
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+from tools.commitlog import SEGMENT_PATTERN
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '_cdc.idx'
+INDEX_PATTERN = re.compile(r'^(?P<segment>CommitLog-\d+-\d+)_cdc\.idx$')
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class CDCIndex(namedtuple('CDCIndex', ('name', 'offset', 'completed'))):
+    """
+    The contents of a _cdc.idx file: the offset up to which its segment is synced, and
+    whether the segment is completed. segment is the name of the segment's .log file.
+    """
+    __slots__ = ()
+
+    @property
+    def segment(self):
+        return self.name[:-len(INDEX_SUFFIX)] + '.log'
+
+
+def read_cdc_index(path):
+    """
+    Reads a _cdc.idx file.
+
+    @param path The path of the index file
+    @return a CDCIndex, or None if the file is missing or is being rewritten
+    """
+    try:
+        with open(path, 'r') as f:
+            lines = [line.strip() for line in f.read().splitlines()]
+    except (IOError, OSError):
+        return None
+    if not lines or not lines[0].isdigit():
+        return None
+    return CDCIndex(name=os.path.basename(path), offset=int(lines[0]),
+                    completed=len(lines) > 1 and lines[1] == 'COMPLETED')
+
+
+class CDCEvent(namedtuple('CDCEvent', ('time', 'kind', 'segment', 'offset', 'completed', 'consumed',
+                                       'bytes_per_second', 'lag_bytes', 'lag_seconds'))):
+    """
+    A change seen by a CDCFollower. kind is one of:
+
+     - 'synced': the segment's offset or completed state changed
+     - 'consumed': the follower read the segment from its previous consumed position to
+       consumed, at bytes_per_second since its previous step
+     - 'deleted': the segment was deleted, by the follower or by someone else
+
+    lag_bytes is the number of synced bytes, over all segments, that the follower has yet
+    to read, and lag_seconds the age of the oldest of them.
+    """
+    __slots__ = ()
+
+
+class _SegmentState(object):
+
+    def __init__(self, name, now):
+        self.name = name
+        self.offset = 0
+        self.completed = False
+        self.consumed = 0
+        self.deleted = False
+        self.first_seen = now
+        # (time, offset) of the syncs not fully consumed yet, oldest first
+        self.pending = deque()
+
+    @property
+    def id(self):
+        match = SEGMENT_PATTERN.match(self.name)
+        return int(match.group('id')) if match else 0
+
+    def unconsumed(self):
+        return self.offset - self.consumed if not self.deleted else 0
+
+
+def _libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, 'inotify_init1') else None
+
+
+class _Inotify(object):
+    """
+    The names of the files changed in a directory, from the inotify(7) syscalls of libc.
+
+    @raise OSError if inotify isn't available
+    """
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, directory):
+        libc = _libc()
+        if libc is None:
+            raise OSError("inotify is not available on {}".format(sys.platform))
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO
+        mask |= self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed for {}".format(directory))
+
+    def changes(self, timeout):
+        """
+        Waits up to timeout seconds for changes.
+
+        @return the names of the changed files, or None if the kernel dropped events and
+                the whole directory has to be rescanned
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        names = set()
+        if not readable:
+            return names
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name:
+                    names.add(os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Polling(object):
+    """The _Inotify interface for platforms without it: every wait ends in a full rescan"""
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class CDCFollower(object):
+    """
+    Follows the segments of a cdc_raw directory from a background thread, reading every
+    synced byte of them, and records a CDCEvent for every change. Use it as a context
+    manager, or call start() and stop().
+
+    @param directory The cdc_raw directory of a node; it must exist
+    @param indexed Whether the node writes _cdc.idx files (4.0+). Without them, a segment
+                   is completed, with all its bytes synced, as soon as it is in directory.
+    @param consume_rate The number of bytes per second the follower reads at most, to
+                        simulate a slow consumer; None to read everything as soon as it
+                        is synced
+    @param delete_consumed Whether to delete completed segments and their index once
+                           they are fully read, as a CDC consumer does
+    @param interval The longest time, in seconds, between two consumption steps
+    @param on_event Optional callable invoked with every CDCEvent, from the follower's thread
+    """
+
+    def __init__(self, directory, indexed=True, consume_rate=None, delete_consumed=False, interval=0.1,
+                 on_event=None):
+        if not os.path.isdir(directory):
+            raise ValueError("{} is not a directory".format(directory))
+        if consume_rate is not None and consume_rate <= 0:
+            raise ValueError("consume_rate must be greater than 0; got {}".format(consume_rate))
+        self.directory = directory
+        self.indexed = indexed
+        self.consume_rate = consume_rate
+        self.delete_consumed = delete_consumed
+        self.interval = interval
+        self.on_event = on_event
+        self.events = []
+        self.segments = {}
+        self._lock = threading.Condition()
+        self._budget = 0.0
+        self._last_step = None
+        self._started = None
+        self._stopped = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+        self._max_lag_bytes = 0
+        self._max_lag_seconds = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        try:
+            watcher = _Inotify(self.directory)
+        except OSError as e:
+            logger.debug("Polling {} for CDC changes: {}".format(self.directory, e))
+            watcher = _Polling()
+        self._started = self._last_step = time.time()
+        with self._lock:
+            self._refresh(None, self._started)
+        self._thread = threading.Thread(target=self._follow, args=(watcher,), name='cdc-follower', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops following, after a last consumption step, and re-raises an error of the thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._stopped = time.time()
+        if self._error is not None:
+            raise self._error
+
+    def _follow(self, watcher):
+        try:
+            while True:
+                stopping = self._stop.is_set()
+                changes = watcher.changes(0 if stopping else self.interval)
+                now = time.time()
+                with self._lock:
+                    self._refresh(changes, now)
+                    self._consume(now)
+                    self._lock.notify_all()
+                if stopping:
+                    return
+        except Exception as e:
+            logger.exception("CDC follower of {} failed".format(self.directory))
+            self._error = e
+        finally:
+            watcher.close()
+            with self._lock:
+                self._lock.notify_all()
+
+    def _segment_names(self, changes):
+        if changes is not None:
+            names = set()
+            for name in changes:
+                match = INDEX_PATTERN.match(name)
+                if match:
+                    names.add(match.group('segment') + '.log')
+                elif SEGMENT_PATTERN.match(name):
+                    names.add(name)
+            return names
+        names = {name for name in os.listdir(self.directory) if SEGMENT_PATTERN.match(name)}
+        # segments deleted while inotify events were lost
+        return names | {name for name, segment in self.segments.items() if not segment.deleted}
+
+    def _refresh(self, changes, now):
+        """Updates the state of the changed segments, or of all of them if changes is None"""
+        for name in sorted(self._segment_names(changes)):
+            segment = self.segments.get(name)
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                if segment is not None and not segment.deleted:
+                    self._mark_deleted(segment, now)
+                continue
+            if segment is None:
+                if self.indexed and not os.path.exists(path[:-len('.log')] + INDEX_SUFFIX):
+                    # the index is written after the hard link; wait for it
+                    continue
+                segment = self.segments[name] = _SegmentState(name, now)
+            if self.indexed:
+                index = read_cdc_index(path[:-len('.log')] + INDEX_SUFFIX)
+                if index is None:
+                    continue
+                offset, completed = index.offset, index.completed
+            else:
+                offset, completed = os.path.getsize(path), True
+            if offset > segment.offset or completed != segment.completed:
+                segment.offset = max(offset, segment.offset)
+                segment.completed = completed
+                segment.pending.append((now, segment.offset))
+                self._record(now, 'synced', segment)
+
+    def _consume(self, now):
+        """Reads the synced bytes of the segments, oldest first, within the rate budget of this step"""
+        elapsed = max(now - self._last_step, 1e-6)
+        self._last_step = now
+        if self.consume_rate is not None:
+            # unspent budget carries over for at most one second
+            self._budget = min(self._budget + self.consume_rate * elapsed, max(self.consume_rate, 1.0))
+        for segment in sorted(self.segments.values(), key=lambda segment: segment.id):
+            if segment.deleted:
+                continue
+            wanted = segment.unconsumed()
+            if self.consume_rate is not None:
+                wanted = min(wanted, int(self._budget))
+            if wanted > 0:
+                read = self._read(segment, wanted)
+                if self.consume_rate is not None:
+                    self._budget -= read
+                segment.consumed += read
+                while segment.pending and segment.pending[0][1] <= segment.consumed:
+                    segment.pending.popleft()
+                self._record(now, 'consumed', segment, bytes_per_second=read / elapsed)
+            if segment.completed and segment.unconsumed() == 0 and self.delete_consumed:
+                self._delete(segment, now)
+
+    def _read(self, segment, length):
+        """Reads length bytes of segment from its consumed position, like a consumer would"""
+        read = 0
+        try:
+            with open(os.path.join(self.directory, segment.name), 'rb') as f:
+                f.seek(segment.consumed)
+                while read < length:
+                    data = f.read(min(READ_CHUNK_SIZE, length - read))
+                    if not data:
+                        break
+                    read += len(data)
+        except (IOError, OSError) as e:
+            logger.debug("Could not read {}: {}".format(segment.name, e))
+        return read
+
+    def _delete(self, segment, now):
+        path = os.path.join(self.directory, segment.name)
+        for doomed in (path, path[:-len('.log')] + INDEX_SUFFIX):
+            try:
+                os.remove(doomed)
+            except FileNotFoundError:
+                pass
+        self._mark_deleted(segment, now)
+
+    def _mark_deleted(self, segment, now):
+        segment.deleted = True
+        segment.pending.clear()
+        self._record(now, 'deleted', segment)
+
+    def _lag(self, now):
+        lag_bytes = sum(segment.unconsumed() for segment in self.segments.values())
+        pending = [segment.pending[0][0] for segment in self.segments.values() if segment.pending]
+        return lag_bytes, now - min(pending) if pending else 0.0
+
+    def _record(self, now, kind, segment, bytes_per_second=None):
+        lag_bytes, lag_seconds = self._lag(now)
+        self._max_lag_bytes = max(self._max_lag_bytes, lag_bytes)
+        self._max_lag_seconds = max(self._max_lag_seconds, lag_seconds)
+        event = CDCEvent(time=now, kind=kind, segment=segment.name, offset=segment.offset,
+                         completed=segment.completed, consumed=segment.consumed,
+                         bytes_per_second=bytes_per_second, lag_bytes=lag_bytes, lag_seconds=lag_seconds)
+        self.events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def wait_until_consumed(self, timeout, completed_only=False):
+        """
+        Waits until the follower has read every synced byte, and, with delete_consumed,
+        deleted every completed segment.
+
+        @param timeout The number of seconds to wait at most
+        @param completed_only Whether to only wait for the completed segments
+        @raise RuntimeError if that didn't happen within timeout
+        """
+        def caught_up(segment):
+            if segment.deleted or (completed_only and not segment.completed):
+                return True
+            return segment.unconsumed() == 0 and not (segment.completed and self.delete_consumed)
+
+        deadline = time.time() + timeout
+        with self._lock:
+            while not all(caught_up(segment) for segment in self.segments.values()):
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._thread is None or self._error is not None:
+                    raise RuntimeError("CDC follower of {} still lags {} bytes behind after {}s"
+                                       .format(self.directory, self._lag(time.time())[0], timeout))
+                self._lock.wait(remaining)
+
+    def stats(self):
+        """
+        @return a dict of the bytes synced and read, and their rates over the time followed,
+                the largest lag seen, and the number of segments seen, completed and deleted
+        """
+        with self._lock:
+            now = self._stopped or time.time()
+            elapsed = max(now - self._started, 1e-6) if self._started is not None else 0.0
+            segments = list(self.segments.values())
+            synced = sum(segment.offset for segment in segments)
+            consumed = sum(segment.consumed for segment in segments)
+            lag_bytes, lag_seconds = self._lag(now)
+            return {'seconds': elapsed,
+                    'synced_bytes': synced,
+                    'consumed_bytes': consumed,
+                    'synced_bytes_per_second': synced / elapsed if elapsed else 0.0,
+                    'consumed_bytes_per_second': consumed / elapsed if elapsed else 0.0,
+                    'lag_bytes': lag_bytes,
+                    'lag_seconds': lag_seconds,
+                    'max_lag_bytes': self._max_lag_bytes,
+                    'max_lag_seconds': self._max_lag_seconds,
+                    'segments': len(segments),
+                    'completed_segments': sum(1 for segment in segments if segment.completed),
+                    'deleted_segments': sum(1 for segment in segments if segment.deleted)}
+
+    def format_stats(self):
+        stats = self.stats()
+        return ("cdc_raw followed for {seconds:.1f}s: {segments} segments ({completed_segments} completed, "
+                "{deleted_segments} deleted), {synced_bytes} bytes synced at {synced_bytes_per_second:.0f} B/s, "
+                "{consumed_bytes} consumed at {consumed_bytes_per_second:.0f} B/s, "
+                "max lag {max_lag_bytes} bytes / {max_lag_seconds:.2f}s").format(**stats)
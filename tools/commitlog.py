@@ -0,0 +1,340 @@
+"""
+Reading commitlog segments in process, without replaying them.
+
+A segment (CommitLog-<version>-<id>.log, and its hard link in cdc_raw) starts with a
+descriptor header:
+
+    int version | long id | [version >= 5] short params length, JSON params | int crc
+
+followed by sync sections, each starting with a sync marker (int position of the next
+marker, int crc of the segment id and the marker's own position). In uncompressed
+segments the section holds the mutation entries themselves:
+
+    int size | int crc of size | mutation | int crc of size and mutation
+
+while in compressed and encrypted segments the marker is followed by the uncompressed
+length of the section and its compressed (or encrypted) contents, which hold the same
+entries once decoded.
+
+CommitLogSegment memory maps a segment and iterates its sections and entries lazily,
+checking their CRCs and reporting their byte ranges without deserializing mutations:
+
+    with CommitLogSegment(path) as segment:
+        assert segment.descriptor.crc_valid
+        summary = segment.summary()  # counts of sections, entries, invalid CRCs, bytes
+
+Entries of compressed segments are decoded with zlib for DeflateCompressor and with the
+lz4 package, if installed, for LZ4Compressor. Entries of encrypted segments, or of
+segments compressed with anything else, aren't available; their sections still are.
+
+A segment opened with writable=True can be patched in place, e.g. to corrupt its
+header crc or to change its header params for a test.
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+from collections import namedtuple
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+SEGMENT_PATTERN = re.compile(r'^CommitLog-(?P<version>\d+)-(?P<id>\d+)\.log$')
+SYNC_MARKER_SIZE = 8
+ENTRY_OVERHEAD_SIZE = 12
+# the smallest mutation Cassandra considers valid when replaying
+MIN_MUTATION_SIZE = 10
+
+
+def _crc_ints(values, crc=0):
+    """The CRC32 Cassandra computes with updateChecksumInt over a sequence of ints"""
+    return zlib.crc32(struct.pack('>{}i'.format(len(values)), *values), crc) & 0xffffffff
+
+
+def _split_id(segment_id):
+    """The least and most significant halves of a segment id, as signed ints, in the order CRCs take them"""
+    low, high = segment_id & 0xffffffff, (segment_id >> 32) & 0xffffffff
+    return [value - (1 << 32) if value >= 1 << 31 else value for value in (low, high)]
+
+
+def header_crc(version, segment_id, params=b''):
+    """The crc of a descriptor header with the given version, segment id and encoded params"""
+    values = [version] + _split_id(segment_id)
+    if version >= 5:
+        values.append(len(params))
+    return zlib.crc32(params, _crc_ints(values)) & 0xffffffff
+
+
+class CommitLogDescriptor(namedtuple('CommitLogDescriptor', ('version', 'id', 'params', 'params_offset',
+                                                             'params_length', 'crc_offset', 'crc', 'computed_crc'))):
+    """
+    The header of a segment. params is the decoded JSON dict of the header parameters
+    (empty before version 5), params_offset and params_length the byte range of their
+    encoding, and crc_offset the position of the header crc.
+    """
+
+    @property
+    def header_size(self):
+        return self.crc_offset + 4
+
+    @property
+    def crc_valid(self):
+        return self.crc == self.computed_crc
+
+    @property
+    def compression(self):
+        """The class name of the compressor of the segment, or None"""
+        return self.params.get('compressionClass')
+
+    @property
+    def encryption(self):
+        """The encryption parameters of the segment, or None if it isn't encrypted"""
+        encryption = {name: value for name, value in self.params.items() if name.startswith('enc')}
+        return encryption or None
+
+
+class SyncSection(namedtuple('SyncSection', ('offset', 'end', 'crc_valid', 'data_offset', 'uncompressed_length'))):
+    """
+    The section of a segment between the sync marker at offset and the next one at end.
+    Its data (entries, or their compressed or encrypted form) starts at data_offset;
+    uncompressed_length is the length of the decoded data of compressed and encrypted
+    segments, None for uncompressed ones.
+    """
+
+    @property
+    def data_length(self):
+        return self.end - self.data_offset
+
+
+class CommitLogEntry(namedtuple('CommitLogEntry', ('section', 'offset', 'size', 'size_crc_valid', 'crc_valid'))):
+    """
+    A mutation entry of the section starting at `section`. offset is the position of the
+    entry in the segment for uncompressed segments, and within the decoded section data
+    for compressed ones. The serialized mutation is the `size` bytes at offset + 8.
+    """
+
+    @property
+    def mutation_offset(self):
+        return self.offset + 8
+
+    @property
+    def valid(self):
+        return self.size_crc_valid and self.crc_valid
+
+
+def read_descriptor(buffer):
+    """
+    Reads the descriptor header at the start of buffer
+
+    @raise ValueError if the header is truncated or its params aren't JSON
+    """
+    try:
+        version, segment_id = struct.unpack_from('>iq', buffer, 0)
+        offset = 12
+        params, params_bytes = {}, b''
+        if version >= 5:
+            params_length, = struct.unpack_from('>H', buffer, offset)
+            offset += 2
+            params_bytes = bytes(buffer[offset:offset + params_length])
+            if len(params_bytes) != params_length:
+                raise ValueError("Truncated commitlog header params")
+            params = json.loads(params_bytes.decode('utf-8')) if params_bytes else {}
+            offset += params_length
+        crc, = struct.unpack_from('>I', buffer, offset)
+    except struct.error as e:
+        raise ValueError("Truncated commitlog header: {}".format(e))
+    return CommitLogDescriptor(version=version, id=segment_id, params=params,
+                               params_offset=14 if version >= 5 else offset, params_length=len(params_bytes),
+                               crc_offset=offset, crc=crc, computed_crc=header_crc(version, segment_id, params_bytes))
+
+
+def _decompressor(compression):
+    """A function decompressing a section compressed with the named compressor, or None if unsupported"""
+    name = (compression or '').rsplit('.', 1)[-1]
+    if name == 'DeflateCompressor':
+        return lambda data, length: zlib.decompress(data)
+    if name == 'LZ4Compressor' and lz4 is not None:
+        # Cassandra's LZ4Compressor prefixes the block with its little-endian uncompressed length
+        return lambda data, length: lz4.block.decompress(bytes(data[4:]), uncompressed_size=length)
+    return None
+
+
+class CommitLogSegment(object):
+    """
+    A memory mapped commitlog segment, see the module documentation. Use it as a context
+    manager, or close() it.
+
+    @param path Path of the segment
+    @param writable Whether the segment may be patched in place
+    @raise ValueError if the segment is empty or its header can't be read
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self._file = open(path, 'r+b' if writable else 'rb')
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            if self.size == 0:
+                raise ValueError("Commitlog segment {} is empty".format(path))
+            self._buffer = mmap.mmap(self._file.fileno(), 0,
+                                     access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            self.descriptor = read_descriptor(self._buffer)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if getattr(self, '_buffer', None) is not None:
+            self._buffer.close()
+            self._buffer = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    @property
+    def encoded(self):
+        """Whether the sections of the segment are compressed or encrypted"""
+        return self.descriptor.compression is not None or self.descriptor.encryption is not None
+
+    @property
+    def can_decode(self):
+        """Whether the entries of the segment can be read"""
+        if self.descriptor.encryption is not None:
+            return False
+        return self.descriptor.compression is None or _decompressor(self.descriptor.compression) is not None
+
+    def sections(self):
+        """
+        Yields the SyncSections of the segment, in order, up to the first marker that was
+        never written. A section whose marker crc doesn't match, or points backwards or past
+        the end of the segment, is yielded with crc_valid False and ends the iteration.
+        """
+        offset = self.descriptor.header_size
+        segment_id = _split_id(self.descriptor.id)
+        while offset + SYNC_MARKER_SIZE <= self.size:
+            end, crc = struct.unpack_from('>iI', self._buffer, offset)
+            if crc != _crc_ints(segment_id + [offset]):
+                if end != 0 or crc != 0:
+                    yield SyncSection(offset, end, False, offset + SYNC_MARKER_SIZE, None)
+                return
+            if end <= offset or end > self.size:
+                yield SyncSection(offset, end, False, offset + SYNC_MARKER_SIZE, None)
+                return
+            data_offset, uncompressed_length = offset + SYNC_MARKER_SIZE, None
+            if self.encoded:
+                uncompressed_length, = struct.unpack_from('>i', self._buffer, data_offset)
+                data_offset += 4
+            yield SyncSection(offset, end, True, data_offset, uncompressed_length)
+            offset = end
+
+    def _section_data(self, section):
+        """
+        Returns (buffer, start, end) of the entries of section: the segment itself for
+        uncompressed segments, the decompressed data for compressed ones.
+
+        @raise ValueError if the section can't be decoded
+        """
+        if not self.encoded:
+            return self._buffer, section.data_offset, section.end
+        decompress = _decompressor(self.descriptor.compression) if self.descriptor.encryption is None else None
+        if decompress is None:
+            raise ValueError("Cannot decode the sections of {}: compression {}, encryption {}"
+                             .format(self.path, self.descriptor.compression, self.descriptor.encryption))
+        try:
+            data = decompress(self._buffer[section.data_offset:section.end], section.uncompressed_length)
+        except Exception as e:
+            raise ValueError("Cannot decompress the section at {} of {}: {}".format(section.offset, self.path, e))
+        return data, 0, len(data)
+
+    def entries(self, section=None):
+        """
+        Yields the CommitLogEntries of a section, or of every valid section of the segment
+        if None, checking the CRCs of their sizes and mutations. An entry that doesn't fit
+        in its section is yielded invalid and ends the section.
+
+        @raise ValueError if the segment can't be decoded, see can_decode
+        """
+        if section is None:
+            for section in self.sections():
+                if section.crc_valid:
+                    for entry in self.entries(section):
+                        yield entry
+            return
+
+        data, position, end = self._section_data(section)
+        while position + 4 <= end:
+            size, = struct.unpack_from('>i', data, position)
+            if size == 0:
+                return
+            if size < MIN_MUTATION_SIZE or position + ENTRY_OVERHEAD_SIZE + size > end:
+                yield CommitLogEntry(section.offset, position, size, False, False)
+                return
+            size_crc, = struct.unpack_from('>I', data, position + 4)
+            computed = _crc_ints([size])
+            mutation_end = position + 8 + size
+            crc, = struct.unpack_from('>I', data, mutation_end)
+            with memoryview(data) as view:
+                mutation_crc = zlib.crc32(view[position + 8:mutation_end], computed) & 0xffffffff
+            yield CommitLogEntry(section.offset, position, size, size_crc == computed, crc == mutation_crc)
+            position = mutation_end + 4
+
+    def summary(self):
+        """
+        Returns the counts and sizes describing the segment: its version, id, compression
+        and encryption, whether the header crc is valid, the number of sections and entries,
+        how many of them are invalid, the bytes of the segment used by sections and the
+        total size of the mutations (None if the entries can't be decoded).
+        """
+        sections = list(self.sections())
+        summary = {'version': self.descriptor.version, 'id': self.descriptor.id,
+                   'compression': self.descriptor.compression,
+                   'encrypted': self.descriptor.encryption is not None,
+                   'header_crc_valid': self.descriptor.crc_valid,
+                   'sections': len(sections),
+                   'invalid_sections': len([section for section in sections if not section.crc_valid]),
+                   'used_bytes': sections[-1].end if sections and sections[-1].crc_valid else
+                   (sections[-1].offset if sections else self.descriptor.header_size),
+                   'size': self.size,
+                   'entries': None, 'invalid_entries': None, 'mutation_bytes': None}
+        if self.can_decode:
+            entries = [entry for section in sections if section.crc_valid for entry in self.entries(section)]
+            summary['entries'] = len(entries)
+            summary['invalid_entries'] = len([entry for entry in entries if not entry.valid])
+            summary['mutation_bytes'] = sum(entry.size for entry in entries)
+        return summary
+
+    def write_header_crc(self, crc):
+        """Overwrites the header crc, e.g. with a wrong one"""
+        struct.pack_into('>I', self._buffer, self.descriptor.crc_offset, crc & 0xffffffff)
+        self._buffer.flush()
+        self.descriptor = read_descriptor(self._buffer)
+
+    def replace_header_params(self, params):
+        """
+        Replaces the encoded header params with `params` (bytes of the same length, so the
+        rest of the segment stays in place) and updates the header crc to match.
+        """
+        descriptor = self.descriptor
+        if descriptor.version < 5 or len(params) != descriptor.params_length:
+            raise ValueError("Header params can only be replaced by params of the same length ({} bytes)"
+                             .format(descriptor.params_length))
+        self._buffer[descriptor.params_offset:descriptor.params_offset + len(params)] = params
+        self.write_header_crc(header_crc(descriptor.version, descriptor.id, params))
+
+
+def segment_files(directory):
+    """The paths of the commitlog segments in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    segments = [(int(match.group('id')), name) for match, name in
+                ((SEGMENT_PATTERN.match(name), name) for name in os.listdir(directory)) if match]
+    return [os.path.join(directory, name) for _, name in sorted(segments)]
@@ -0,0 +1,305 @@
+"""
+Reading the compaction log of a node, to measure how efficiently tables were compacted.
+
+Since 3.10, the tables with the compaction option 'log_all': 'true' log every change of
+their sstables to logs/compaction.log, one JSON object per line:
+
+    {"type": "enable", "keyspace": "ks", "table": "cf", "time": 1500000000000,
+     "strategies": [{"strategyId": "0", "type": "LeveledCompactionStrategy", "tables": [...], ...}]}
+    {"type": "flush", "keyspace": "ks", "table": "cf", "time": ..., "tables": [...]}
+    {"type": "compaction", "keyspace": "ks", "table": "cf", "time": ..., "start": "<ms>", "end": "<ms>",
+     "input": [...], "output": [...]}
+    {"type": "pending", "keyspace": "ks", "table": "cf", "time": ..., "strategyId": "0", "pending": 3}
+    {"type": "disable", ...}
+
+where each sstable is {"strategyId": "0", "table": {"generation": 1, "version": "mc",
+"size": <bytes on disk>, "details": {"level": 0, ...}}}, the details depending on the
+strategy. Older logs are renamed to compaction-<n>.log when the node restarts.
+
+CompactionLogAnalyzer follows these events, one at a time so a log of any size can be
+streamed through it, and keeps per table and strategy the bytes flushed, compacted and
+written by compactions, their throughput, the write amplification, the number of live
+sstables over time and, for LCS, their levels:
+
+    analyzer = analyze_node_compaction_log(node)
+    stats = analyzer.table('keyspace1', 'standard1')
+    assert stats.write_amplification < 3
+
+summarize_cluster_compaction_logs() is attached to the junit report of every test that
+wrote a compaction log.
+"""
+import glob
+import json
+import logging
+import os
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+
+class LiveSSTable(namedtuple('LiveSSTable', ('generation', 'strategy', 'size', 'level'))):
+    """A live sstable of a table: its strategy type, size on disk and, for LCS, level"""
+    __slots__ = ()
+
+
+def iter_compaction_log(stream):
+    """
+    Iterates the events of a compaction log, skipping lines that aren't complete JSON
+    objects, like the last one of a log being written.
+
+    @param stream A file-like object, or the path of a log
+    @return An iterator of dicts
+    """
+    if isinstance(stream, str):
+        with open(stream) as f:
+            for event in iter_compaction_log(f):
+                yield event
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            logger.debug("Skipping partial compaction log line: {}".format(line[:100]))
+            continue
+        if isinstance(event, dict) and 'type' in event:
+            yield event
+
+
+class StrategyStats(object):
+    """The compaction counters of one compaction strategy type of a table"""
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.flushes = 0
+        self.flushed_bytes = 0
+        self.compactions = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.input_sstables = 0
+        self.output_sstables = 0
+        self.compaction_seconds = 0.0
+
+    @property
+    def throughput(self):
+        """The bytes per second read by compactions, while they ran"""
+        return self.input_bytes / self.compaction_seconds if self.compaction_seconds > 0 else None
+
+    @property
+    def write_amplification(self):
+        """The bytes written by flushes and compactions for every byte flushed"""
+        return (self.flushed_bytes + self.output_bytes) / self.flushed_bytes if self.flushed_bytes else None
+
+    def as_dict(self):
+        return {'flushes': self.flushes, 'flushed_bytes': self.flushed_bytes, 'compactions': self.compactions,
+                'input_bytes': self.input_bytes, 'output_bytes': self.output_bytes,
+                'input_sstables': self.input_sstables, 'output_sstables': self.output_sstables,
+                'compaction_seconds': self.compaction_seconds, 'throughput': self.throughput,
+                'write_amplification': self.write_amplification}
+
+
+class TableStats(StrategyStats):
+    """
+    The compaction counters of a table over all its strategies, see StrategyStats, and its
+    live sstables.
+
+    @ivar strategies dict of strategy type, e.g. LeveledCompactionStrategy, to StrategyStats
+    @ivar sstables dict of generation to LiveSSTable
+    @ivar sstable_counts list of (time in seconds, number of live sstables) after every change
+    @ivar max_pending The highest number of pending compactions logged
+    """
+
+    def __init__(self, keyspace, table):
+        super(TableStats, self).__init__(None)
+        self.keyspace = keyspace
+        self.table = table
+        self.strategies = {}
+        self.strategy_types = {}
+        self.sstables = {}
+        self.sstable_counts = []
+        self.max_pending = 0
+
+    @property
+    def name(self):
+        return '{}.{}'.format(self.keyspace, self.table)
+
+    @property
+    def max_sstables(self):
+        return max(count for _, count in self.sstable_counts) if self.sstable_counts else len(self.sstables)
+
+    def level_distribution(self):
+        """
+        @return dict of level to the number of live sstables in it, for the sstables whose
+                strategy logs levels (LCS)
+        """
+        levels = {}
+        for sstable in self.sstables.values():
+            if sstable.level is not None:
+                levels[sstable.level] = levels.get(sstable.level, 0) + 1
+        return levels
+
+    def level_bytes(self):
+        """@return dict of level to the bytes of the live sstables in it, see level_distribution()"""
+        levels = {}
+        for sstable in self.sstables.values():
+            if sstable.level is not None:
+                levels[sstable.level] = levels.get(sstable.level, 0) + sstable.size
+        return levels
+
+    def _strategy(self, strategy_id):
+        strategy = self.strategy_types.get(strategy_id, 'unknown')
+        if strategy not in self.strategies:
+            self.strategies[strategy] = StrategyStats(strategy)
+        return self.strategies[strategy]
+
+    def _sstable(self, entry):
+        sstable = entry.get('table') or {}
+        details = sstable.get('details') or {}
+        return LiveSSTable(generation=sstable.get('generation'),
+                           strategy=self.strategy_types.get(entry.get('strategyId'), 'unknown'),
+                           size=int(sstable.get('size', 0)), level=details.get('level'))
+
+    def _count(self, time):
+        self.sstable_counts.append((time, len(self.sstables)))
+
+    def enable(self, event, time):
+        for strategy in event.get('strategies', []):
+            self.strategy_types[strategy.get('strategyId')] = strategy.get('type', 'unknown')
+        # the sstables of the strategies, which are all there are when compaction is (re)enabled
+        sstables = [self._sstable(entry) for strategy in event.get('strategies', [])
+                    for entry in strategy.get('tables', [])]
+        if sstables:
+            self.sstables = {sstable.generation: sstable for sstable in sstables}
+        self._count(time)
+
+    def flush(self, event, time):
+        for entry in event.get('tables', []):
+            sstable = self._sstable(entry)
+            stats = self._strategy(entry.get('strategyId'))
+            for counters in (self, stats):
+                counters.flushes += 1
+                counters.flushed_bytes += sstable.size
+            self.sstables[sstable.generation] = sstable
+        self._count(time)
+
+    def compaction(self, event, time):
+        inputs = [self._sstable(entry) for entry in event.get('input', [])]
+        outputs = [self._sstable(entry) for entry in event.get('output', [])]
+        strategy_ids = [entry.get('strategyId') for entry in event.get('output', []) or event.get('input', [])]
+        stats = self._strategy(strategy_ids[0] if strategy_ids else None)
+        seconds = max(int(event.get('end', 0)) - int(event.get('start', 0)), 0) / 1000.0
+        for counters in (self, stats):
+            counters.compactions += 1
+            counters.input_bytes += sum(sstable.size for sstable in inputs)
+            counters.output_bytes += sum(sstable.size for sstable in outputs)
+            counters.input_sstables += len(inputs)
+            counters.output_sstables += len(outputs)
+            counters.compaction_seconds += seconds
+        for sstable in inputs:
+            self.sstables.pop(sstable.generation, None)
+        for sstable in outputs:
+            self.sstables[sstable.generation] = sstable
+        self._count(time)
+
+    def pending(self, event, time):
+        self.max_pending = max(self.max_pending, int(event.get('pending', 0)))
+
+    def as_dict(self):
+        summary = super(TableStats, self).as_dict()
+        summary.update({'strategies': {strategy: stats.as_dict() for strategy, stats in self.strategies.items()},
+                        'sstables': len(self.sstables), 'max_sstables': self.max_sstables,
+                        'max_pending': self.max_pending})
+        levels = self.level_distribution()
+        if levels:
+            summary['levels'] = {str(level): count for level, count in sorted(levels.items())}
+        return summary
+
+
+_HANDLERS = {'enable': TableStats.enable, 'flush': TableStats.flush, 'compaction': TableStats.compaction,
+             'pending': TableStats.pending}
+
+
+class CompactionLogAnalyzer(object):
+    """
+    Accumulates the events of compaction logs into a TableStats per table. Events are
+    added in the order they were logged, with add() or add_log().
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.events = 0
+
+    def table(self, keyspace, table):
+        """@return The TableStats of a table, empty if none of its events were added"""
+        key = (keyspace, table)
+        if key not in self.tables:
+            self.tables[key] = TableStats(keyspace, table)
+        return self.tables[key]
+
+    def add(self, event):
+        handler = _HANDLERS.get(event.get('type'))
+        if handler is None:
+            return
+        self.events += 1
+        stats = self.table(event.get('keyspace'), event.get('table'))
+        handler(stats, event, int(event.get('time', 0)) / 1000.0)
+
+    def add_log(self, stream):
+        """Adds the events of a compaction log, see iter_compaction_log(). @return self"""
+        for event in iter_compaction_log(stream):
+            self.add(event)
+        return self
+
+    def summary(self):
+        """@return dict of <keyspace>.<table> to the dict of its TableStats, JSON serializable"""
+        return {stats.name: stats.as_dict() for stats in self.tables.values() if stats.sstable_counts}
+
+    def format_summary(self):
+        lines = []
+        for name, stats in sorted(self.summary().items()):
+            line = '{}: {} flushes of {} bytes, {} compactions of {} into {} bytes'.format(
+                name, stats['flushes'], stats['flushed_bytes'], stats['compactions'], stats['input_bytes'],
+                stats['output_bytes'])
+            if stats['write_amplification'] is not None:
+                line += ', write amplification {:.2f}'.format(stats['write_amplification'])
+            if stats['throughput'] is not None:
+                line += ', {:.0f} bytes/s'.format(stats['throughput'])
+            if 'levels' in stats:
+                line += ', levels {}'.format(stats['levels'])
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def node_compaction_logs(node):
+    """@return The paths of the compaction logs of a ccm node, oldest first"""
+    current = node.compactionlogfilename()
+    rotated = glob.glob(os.path.join(os.path.dirname(current), 'compaction-*.log'))
+
+    def rotation(path):
+        suffix = os.path.basename(path)[len('compaction-'):-len('.log')]
+        return int(suffix) if suffix.isdigit() else 0
+
+    return sorted(rotated, key=rotation) + ([current] if os.path.exists(current) else [])
+
+
+def analyze_node_compaction_log(node):
+    """@return A CompactionLogAnalyzer of all the compaction logs of a ccm node"""
+    analyzer = CompactionLogAnalyzer()
+    for path in node_compaction_logs(node):
+        analyzer.add_log(path)
+    return analyzer
+
+
+def summarize_cluster_compaction_logs(cluster):
+    """
+    @return dict of node name to the summary of its compaction logs, for the nodes that
+            logged compaction events
+    """
+    summaries = {}
+    for node in cluster.nodelist():
+        summary = analyze_node_compaction_log(node).summary()
+        if summary:
+            summaries[node.name] = summary
+    return summaries
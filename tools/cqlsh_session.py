@@ -0,0 +1,251 @@
+"""
+Long-lived cqlsh processes.
+
+Node.run_cqlsh starts a new cqlsh process for every call, which imports the driver,
+connects and reads cqlshrc again each time. CqlshSession instead keeps one cqlsh
+process running in interactive mode, with stdout on a pseudo-terminal, and runs
+statements through it, detecting the end of each one by the prompt cqlsh prints:
+
+    session = CqlshSession(node)
+    out, err = session.run('DESCRIBE KEYSPACES; SELECT * FROM ks.cf')
+    session.close()
+
+CqlshSessionPool keeps one session per (node, cqlsh options) for the duration of a
+test; DTestSetup.cqlsh_sessions is such a pool, closed when the test finishes.
+
+Because the process is interactive, errors are not prefixed with "<stdin>:<line>:"
+as they are when cqlsh reads a pipe, and paging is turned off when the session
+starts, as it is by default for piped input.
+"""
+import logging
+import os
+import re
+import select
+import subprocess
+import time
+
+try:
+    import pty
+    import termios
+except ImportError:  # Windows
+    pty = termios = None
+
+logger = logging.getLogger(__name__)
+
+# prompts are not always at the start of a line: statements without output leave them side by side
+PROMPT = re.compile(r'(?:[\w.-]+@)?cqlsh(?::[^>\s]*)?> ')
+CONTINUATION_PROMPT = re.compile(r'(?:^|(?<=> )|(?<=\.\.\. )) {3}\.\.\. ', re.MULTILINE)
+FINAL_PROMPT = re.compile(r'(?:[\w.-]+@)?cqlsh(?::[^>\s]*)?> $')
+
+# cqlsh commands whose effect outlives the statement; a pool restarts a session after them
+STATEFUL_COMMAND = re.compile(r'^\s*(USE|TRACING|PAGING|EXPAND|CONSISTENCY|SERIAL\s+CONSISTENCY|CAPTURE|LOGIN|DEBUG)\b',
+                              re.IGNORECASE)
+
+
+BEGIN_BATCH = re.compile(r'^\s*BEGIN\s+(?:(?:UNLOGGED|COUNTER)\s+)?BATCH\b', re.IGNORECASE)
+APPLY_BATCH = re.compile(r'\bAPPLY\s+BATCH\s*$', re.IGNORECASE)
+
+
+def split_statements(cmds):
+    """
+    Splits cmds on ';' the way Node.run_cqlsh does, dropping empty statements, except that
+    the parts of a BEGIN BATCH ... APPLY BATCH block are kept together, ';'-joined one per
+    line, since cqlsh runs the whole block as a single statement.
+    """
+    statements, batch = [], None
+    for cmd in cmds.split(';'):
+        cmd = cmd.strip()
+        if not cmd:
+            continue
+        if batch is None and BEGIN_BATCH.match(cmd):
+            batch = []
+        if batch is None:
+            statements.append(cmd)
+            continue
+        batch.append(cmd)
+        if APPLY_BATCH.search(cmd):
+            statements.append(';\n'.join(batch))
+            batch = None
+    if batch:
+        # an unterminated batch, which cqlsh keeps waiting for
+        statements.append(';\n'.join(batch))
+    return statements
+
+
+class CqlshSession(object):
+    """
+    A cqlsh process connected to `node`, running statements one run() at a time.
+
+    @param node The node to connect to
+    @param cqlsh_options Extra command line options, e.g. ['--debug'] or ['-u', 'cassandra', '-p', 'cassandra']
+    @param env_vars Extra environment variables for the cqlsh process
+    @param timeout Default number of seconds to wait for cqlsh to start or finish a run()
+    """
+
+    def __init__(self, node, cqlsh_options=None, env_vars=None, timeout=60):
+        self.node = node
+        self.cqlsh_options = list(cqlsh_options or [])
+        self.timeout = timeout
+        self.stateful = False
+        self.node_pid = node.pid
+        self.process = None
+        self._master = None
+        self._pending_err = ''
+        self._start(env_vars or {})
+
+    def _start(self, env_vars):
+        env = self.node.get_env()
+        env.update({'PYTHONUNBUFFERED': '1', 'TERM': 'dumb'})
+        env.update(env_vars)
+        host, port = self.node.network_interfaces['binary']
+        args = [self.node.get_tool('cqlsh'), '--tty', '--no-color'] + self.cqlsh_options + [host, str(port)]
+
+        self._master, slave = pty.openpty()
+        # no '\n' to '\r\n' translation on the terminal side
+        attributes = termios.tcgetattr(slave)
+        attributes[1] &= ~termios.OPOST
+        termios.tcsetattr(slave, termios.TCSANOW, attributes)
+        try:
+            self.process = subprocess.Popen(args, env=env, stdin=subprocess.PIPE, stdout=slave,
+                                            stderr=subprocess.PIPE, close_fds=True)
+        finally:
+            os.close(slave)
+
+        startup_out, startup_err = self._read_until_prompt(1, 0, self.timeout)
+        logger.debug("Started cqlsh (pid {}) on {}: {}".format(self.process.pid, self.node.name, startup_out.strip()))
+        _, paging_err = self._execute(['PAGING OFF'], self.timeout)
+        # what a fresh cqlsh process would have reported on stderr, e.g. with --debug, goes to the first run()
+        self._pending_err = startup_err + paging_err
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def node_restarted(self):
+        """Whether the node was stopped or restarted since the session started"""
+        return self.node.pid != self.node_pid
+
+    def _read_until_prompt(self, prompts, continuation_prompts, timeout):
+        """
+        Reads stdout until it ends with a prompt after at least `prompts` prompts and
+        `continuation_prompts` continuation prompts, then whatever is pending on
+        stderr. Returns (stdout, stderr) with the prompts removed.
+        """
+        deadline = time.time() + timeout
+        out, err = b'', b''
+        stderr_fd = self.process.stderr.fileno()
+        while True:
+            text = out.decode('utf-8', 'replace')
+            if FINAL_PROMPT.search(text) and len(PROMPT.findall(text)) >= prompts and \
+                    len(CONTINUATION_PROMPT.findall(text)) >= continuation_prompts:
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.close()
+                raise RuntimeError("cqlsh did not finish within {} seconds. Output so far:\n{}\nErrors:\n{}".format(
+                    timeout, text, err.decode('utf-8', 'replace')))
+            readable, _, _ = select.select([self._master, stderr_fd], [], [], min(remaining, 1))
+            if self._master in readable:
+                chunk = self._read(self._master)
+                if not chunk:
+                    self._raise_exited(out, err)
+                out += chunk
+            if stderr_fd in readable:
+                err += self._read(stderr_fd)
+
+        # cqlsh writes errors before printing the next prompt, so they are already in the pipe
+        while select.select([stderr_fd], [], [], 0)[0]:
+            chunk = self._read(stderr_fd)
+            if not chunk:
+                break
+            err += chunk
+
+        text = CONTINUATION_PROMPT.sub('', PROMPT.sub('', out.decode('utf-8', 'replace')))
+        return text, err.decode('utf-8', 'replace')
+
+    @staticmethod
+    def _read(fd):
+        try:
+            return os.read(fd, 65536)
+        except OSError:
+            # reading the pty master fails with EIO once the child closed the terminal
+            return b''
+
+    def _raise_exited(self, out, err):
+        self.process.wait()
+        err += self.process.stderr.read()
+        self.close()
+        raise RuntimeError("cqlsh exited with status {}. Output:\n{}\nErrors:\n{}".format(
+            self.process.returncode, out.decode('utf-8', 'replace'), err.decode('utf-8', 'replace')))
+
+    def run(self, cmds, timeout=None):
+        """
+        Runs the ';'-separated statements in cmds and returns (stdout, stderr) of all
+        of them, like the first two elements returned by Node.run_cqlsh.
+        """
+        if not self.alive:
+            raise RuntimeError("cqlsh session on {} is closed".format(self.node.name))
+        statements = split_statements(cmds)
+        if not statements:
+            return '', ''
+        self.stateful = self.stateful or any(STATEFUL_COMMAND.match(statement) for statement in statements)
+        out, err = self._execute(statements, timeout or self.timeout)
+        err, self._pending_err = self._pending_err + err, ''
+        return out, err
+
+    def _execute(self, statements, timeout):
+        text = ''.join(statement + ';\n' for statement in statements)
+        self.process.stdin.write(text.encode('utf-8'))
+        self.process.stdin.flush()
+        return self._read_until_prompt(len(statements), text.count('\n') - len(statements), timeout)
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.process.stdin.write(b'quit;\n')
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        if self._master is not None:
+            os.close(self._master)
+            self._master = None
+
+
+class CqlshSessionPool(object):
+    """
+    One CqlshSession per (node, cqlsh options), started on first use. A session that
+    ran a stateful command (USE, TRACING, CONSISTENCY, ...) is replaced before its next
+    run, so every run() starts from the same state as a fresh cqlsh process would, and
+    so is a session whose cqlsh exited or whose node was restarted since it connected.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+
+    def get(self, node, cqlsh_options=None):
+        key = (node.name, tuple(cqlsh_options or []))
+        session = self.sessions.get(key)
+        if session is not None and (session.stateful or not session.alive or session.node_restarted):
+            session.close()
+            session = None
+        if session is None:
+            session = CqlshSession(node, cqlsh_options)
+            self.sessions[key] = session
+        return session
+
+    def run(self, node, cmds, cqlsh_options=None, timeout=None):
+        """Runs cmds with the pooled session for (node, cqlsh_options), returns (stdout, stderr)"""
+        return self.get(node, cqlsh_options).run(cmds, timeout=timeout)
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions = {}
+
+
+def supports_cqlsh_sessions():
+    """Pseudo-terminals, and hence CqlshSession, are not available on Windows"""
+    return pty is not None
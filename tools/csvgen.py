@@ -0,0 +1,285 @@
+"""
+Synthetic CSV files for COPY FROM.
+
+Bulk COPY FROM tests used to populate a table with cassandra-stress and export it with
+COPY TO before they could import anything. CsvGenerator instead writes CSV files for
+any table directly from its metadata, formatting every CQL type (including UDTs,
+tuples, durations and nested frozen collections) the way cqlsh COPY TO does, so the
+files are valid COPY FROM input:
+
+    generator = CsvGenerator.from_table(session, 'ks', 'testdatatype', seed=42)
+    filenames = generator.write(os.path.join(tmpdir, 'testdatatype'), num_rows=1000000, shards=8)
+    node.run_cqlsh("COPY ks.testdatatype FROM '{}'".format(','.join(filenames)))
+
+Shards are written by a pool of worker processes. The primary key columns of row i
+are derived from i alone, so rows are unique (as far as the key types allow) and
+can be looked up again, and all other values come from a random generator seeded
+with (seed, first row of the shard), so the same seed, row count and number of
+shards always produce the same files.
+"""
+import csv
+import datetime
+import logging
+import multiprocessing
+import random
+import string
+import uuid
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+TEXT_ALPHABET = string.ascii_letters + string.digits + " ,'" + 'éノ'
+
+# types written with single quotes inside collections, tuples and UDTs, as cqlsh does
+QUOTED_TYPES = {'ascii', 'text', 'varchar', 'inet', 'timestamp', 'date', 'time'}
+INTEGER_RANGES = {'tinyint': 7, 'smallint': 15, 'int': 31, 'bigint': 63, 'counter': 63, 'varint': 100}
+
+
+def _split_type_args(args):
+    """Splits 'text, frozen<list<int>>' on the top-level commas only"""
+    parts, depth, current = [], 0, ''
+    for char in args:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        if char in '<(':
+            depth += 1
+        elif char in '>)':
+            depth -= 1
+        current += char
+    parts.append(current.strip())
+    return parts
+
+
+def parse_type(cql_type, user_types=None):
+    """
+    Parses a CQL type string as found in the driver's table metadata into a type tree
+    of tuples: ('scalar', name), ('list', element), ('set', element),
+    ('map', key, value), ('tuple', [elements]) or ('udt', name, [(field, type)]).
+
+    @param user_types Dict of user type name to a list of (field name, type string)
+    """
+    user_types = user_types or {}
+    cql_type = cql_type.strip()
+    if cql_type.startswith('frozen<'):
+        return parse_type(cql_type[len('frozen<'):-1], user_types)
+    if '<' in cql_type:
+        name, args = cql_type.split('<', 1)
+        name = name.strip().lower()
+        args = [parse_type(arg, user_types) for arg in _split_type_args(args[:-1])]
+        if name in ('list', 'set') and len(args) == 1:
+            return (name, args[0])
+        if name == 'map' and len(args) == 2:
+            return ('map', args[0], args[1])
+        if name == 'tuple':
+            return ('tuple', args)
+        raise ValueError("Unsupported type: {}".format(cql_type))
+    udt_name = cql_type.strip('"')
+    if udt_name in user_types:
+        return ('udt', udt_name, [(field, parse_type(field_type, user_types))
+                                  for field, field_type in user_types[udt_name]])
+    name = cql_type.lower()
+    if name not in QUOTED_TYPES and name not in INTEGER_RANGES and \
+            name not in ('blob', 'boolean', 'decimal', 'float', 'double', 'uuid', 'timeuuid', 'duration'):
+        raise ValueError("Unsupported type: {}".format(cql_type))
+    return ('scalar', name)
+
+
+def _quote(value):
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + '+0000'
+
+
+def _time_of_day(nanoseconds):
+    seconds, nanoseconds = divmod(nanoseconds % (86400 * 10 ** 9), 10 ** 9)
+    return '{:02d}:{:02d}:{:02d}.{:09d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60, nanoseconds)
+
+
+class CsvGenerator(object):
+    """
+    Generates CSV rows for a table, see the module documentation.
+
+    @param columns List of (name, type string) in table order
+    @param key_columns Names of the primary key columns
+    @param user_types Dict of user type name to a list of (field name, type string)
+    @param seed Seed of the random values
+    @param text_length Maximum length of generated text, ascii and blob values
+    @param collection_size Maximum number of elements of generated collections
+    @param null_fraction Fraction of non-key values left empty, i.e. null
+    """
+
+    def __init__(self, columns, key_columns, user_types=None, seed=0, text_length=16, collection_size=3,
+                 null_fraction=0.0):
+        self.column_names = [name for name, _ in columns]
+        self.types = [parse_type(cql_type, user_types) for _, cql_type in columns]
+        self.key_positions = [self.column_names.index(name) for name in key_columns]
+        self.seed = seed
+        self.text_length = text_length
+        self.collection_size = collection_size
+        self.null_fraction = null_fraction
+
+    @classmethod
+    def from_table(cls, session, keyspace, table, **kwargs):
+        """Creates a CsvGenerator for an existing table, see the constructor for kwargs"""
+        keyspace_metadata = session.cluster.metadata.keyspaces[keyspace]
+        table_metadata = keyspace_metadata.tables[table]
+        columns = [(name, column.cql_type) for name, column in table_metadata.columns.items()]
+        key_columns = [column.name for column in table_metadata.primary_key]
+        user_types = {name: list(zip(user_type.field_names, user_type.field_types))
+                      for name, user_type in keyspace_metadata.user_types.items()}
+        return cls(columns, key_columns, user_types=user_types, **kwargs)
+
+    def key_value(self, cql_type, index):
+        """Returns the CSV value of a primary key column of row `index`"""
+        if cql_type[0] != 'scalar':
+            return self.value(cql_type, random.Random(index))
+        name = cql_type[1]
+        if name in INTEGER_RANGES or name in ('decimal', 'float', 'double'):
+            return str(index)
+        if name in ('ascii', 'text', 'varchar'):
+            return 'k{}'.format(index)
+        if name in ('uuid', 'timeuuid'):
+            return str(uuid.UUID(int=index, version=1 if name == 'timeuuid' else 4))
+        if name == 'blob':
+            return '0x{:016x}'.format(index)
+        if name == 'inet':
+            return '.'.join(str((index >> shift) & 0xff) for shift in (24, 16, 8, 0))
+        if name == 'timestamp':
+            return _timestamp(EPOCH + datetime.timedelta(milliseconds=index))
+        if name == 'date':
+            return (EPOCH + datetime.timedelta(days=index)).strftime('%Y-%m-%d')
+        if name == 'time':
+            return _time_of_day(index)
+        return self.value(cql_type, random.Random(index))
+
+    def _text(self, rng, alphabet):
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, self.text_length)))
+
+    def _scalar(self, name, rng):
+        if name in INTEGER_RANGES:
+            bits = INTEGER_RANGES[name]
+            return str(rng.randint(-2 ** bits, 2 ** bits - 1))
+        if name == 'ascii':
+            return self._text(rng, string.ascii_letters + string.digits + ' ,')
+        if name in ('text', 'varchar'):
+            return self._text(rng, TEXT_ALPHABET)
+        if name == 'blob':
+            return '0x' + ''.join('{:02x}'.format(rng.getrandbits(8)) for _ in range(rng.randint(1, self.text_length)))
+        if name == 'boolean':
+            return 'True' if rng.getrandbits(1) else 'False'
+        if name == 'decimal':
+            return str(Decimal(rng.randint(-10 ** 12, 10 ** 12)).scaleb(-rng.randint(0, 6)))
+        if name in ('float', 'double'):
+            return '{:.3f}'.format(rng.uniform(-10 ** 5, 10 ** 5))
+        if name == 'inet':
+            return '.'.join(str(rng.randint(1, 254)) for _ in range(4))
+        if name in ('uuid', 'timeuuid'):
+            return str(uuid.UUID(int=rng.getrandbits(128), version=1 if name == 'timeuuid' else 4))
+        if name == 'timestamp':
+            return _timestamp(EPOCH + datetime.timedelta(milliseconds=rng.randint(0, 2 ** 41)))
+        if name == 'date':
+            return (EPOCH + datetime.timedelta(days=rng.randint(0, 50000))).strftime('%Y-%m-%d')
+        if name == 'time':
+            return _time_of_day(rng.randint(0, 86400 * 10 ** 9 - 1))
+        if name == 'duration':
+            return '{}mo{}d{}h{}m{}s'.format(rng.randint(0, 24), rng.randint(0, 30), rng.randint(0, 23),
+                                             rng.randint(0, 59), rng.randint(0, 59))
+        raise ValueError("Unsupported type: {}".format(name))
+
+    def value(self, cql_type, rng, nested=False):
+        """
+        Returns a random CSV value of the given type tree. Nested values (elements of
+        collections, tuples and UDTs) are formatted as CQL literals.
+        """
+        kind = cql_type[0]
+        if kind == 'scalar':
+            text = self._scalar(cql_type[1], rng)
+            return _quote(text) if nested and cql_type[1] in QUOTED_TYPES else text
+        size = rng.randint(0, self.collection_size)
+        if kind == 'list':
+            return '[{}]'.format(', '.join(self.value(cql_type[1], rng, True) for _ in range(size)))
+        if kind == 'set':
+            elements = sorted({self.value(cql_type[1], rng, True) for _ in range(size)})
+            return '{{{}}}'.format(', '.join(elements))
+        if kind == 'map':
+            entries = {self.value(cql_type[1], rng, True): self.value(cql_type[2], rng, True) for _ in range(size)}
+            return '{{{}}}'.format(', '.join('{}: {}'.format(k, v) for k, v in sorted(entries.items())))
+        if kind == 'tuple':
+            return '({})'.format(', '.join(self.value(element, rng, True) for element in cql_type[1]))
+        if kind == 'udt':
+            return '{{{}}}'.format(', '.join('{}: {}'.format(field, self.value(field_type, rng, True))
+                                             for field, field_type in cql_type[2]))
+        raise ValueError("Unsupported type: {}".format(cql_type))
+
+    def row(self, index, rng):
+        """Returns the CSV fields of row `index`, drawing non-key values from rng"""
+        fields = []
+        for position, cql_type in enumerate(self.types):
+            if position in self.key_positions:
+                fields.append(self.key_value(cql_type, index))
+            elif self.null_fraction and rng.random() < self.null_fraction:
+                fields.append('')
+            else:
+                fields.append(self.value(cql_type, rng))
+        return fields
+
+    def check_key_range(self, num_rows):
+        """
+        Checks that num_rows rows have distinct keys, i.e. that the key index of the last
+        row fits in every integer (or inet) key column, rather than wrapping around.
+
+        @raise ValueError if a key column is too narrow
+        """
+        for position in self.key_positions:
+            cql_type = self.types[position]
+            if cql_type[0] != 'scalar':
+                continue
+            bits = 32 if cql_type[1] == 'inet' else INTEGER_RANGES.get(cql_type[1])
+            if bits is not None and num_rows > 2 ** bits:
+                raise ValueError("{} rows don't fit in the {} key column {}".format(
+                    num_rows, cql_type[1], self.column_names[position]))
+
+    def rows(self, start, stop):
+        """Yields rows start to stop (exclusive) as written to a shard starting at `start`"""
+        self.check_key_range(stop)
+        rng = random.Random('{}:{}'.format(self.seed, start))
+        for index in range(start, stop):
+            yield self.row(index, rng)
+
+    def write_shard(self, filename, start, stop, header=False, delimiter=','):
+        """Writes rows start to stop (exclusive) to filename, returns filename"""
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile, delimiter=delimiter)
+            if header:
+                writer.writerow(self.column_names)
+            writer.writerows(self.rows(start, stop))
+        return filename
+
+    def write(self, prefix, num_rows, shards=None, processes=None, header=False, delimiter=','):
+        """
+        Writes num_rows rows into `shards` CSV files named <prefix>_<shard>.csv, one per
+        worker process by default, and returns their names. COPY FROM accepts them as a
+        comma-separated list.
+
+        @param processes Number of worker processes, at most `shards`; the number of cores by default
+        """
+        self.check_key_range(num_rows)
+        processes = processes or multiprocessing.cpu_count()
+        shards = shards or processes
+        boundaries = [num_rows * shard // shards for shard in range(shards + 1)]
+        jobs = [('{}_{}.csv'.format(prefix, shard), boundaries[shard], boundaries[shard + 1], header, delimiter)
+                for shard in range(shards)]
+        logger.debug("Writing {} rows to {} CSV shards with {} processes".format(num_rows, shards, processes))
+        if min(processes, shards) == 1:
+            return [self.write_shard(*job) for job in jobs]
+        pool = multiprocessing.Pool(min(processes, shards))
+        try:
+            return pool.starmap(self.write_shard, jobs)
+        finally:
+            pool.close()
+            pool.join()
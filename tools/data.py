@@ -1,8 +1,11 @@
 import time
 import logging
+import threading
+from collections import defaultdict
+from itertools import islice
 
 from cassandra import ConsistencyLevel
-from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.policies import TokenAwarePolicy
 from cassandra.query import SimpleStatement
 
 from . import assertions
@@ -21,12 +24,170 @@ def insert_c1c2(session, keys=None, n=None, consistency=ConsistencyLevel.QUORUM)
         raise ValueError("Expected exactly one of 'keys' or 'n' arguments to not be None; "
                          "got keys={keys}, n={n}".format(keys=keys, n=n))
     if n:
-        keys = list(range(n))
+        keys = range(n)
 
     statement = session.prepare("INSERT INTO cf (key, c1, c2) VALUES (?, 'value1', 'value2')")
     statement.consistency_level = consistency
 
-    execute_concurrent_with_args(session, statement, [['k{}'.format(k)] for k in keys])
+    bulk_load(session, statement, (('k{}'.format(k),) for k in keys))
+
+
+class LoadStats(object):
+    """
+    Counters describing a single ConcurrentLoader.load() run.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.errors = 0
+        self.first_error = None
+        self.start_time = time.time()
+        self.end_time = None
+
+    @property
+    def elapsed(self):
+        end_time = self.end_time if self.end_time is not None else time.time()
+        return end_time - self.start_time
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return '{cls}(rows={rows}, errors={errors}, elapsed={elapsed:.2f}s, rows/s={rate:.1f})'.format(
+            cls=self.__class__.__name__, rows=self.rows, errors=self.errors,
+            elapsed=self.elapsed, rate=self.rows_per_second)
+
+
+class ConcurrentLoader(object):
+    """
+    Executes a statement once for every parameter tuple produced by an iterable,
+    keeping at most `concurrency` requests in flight at any time.
+
+    Unlike execute_concurrent_with_args, the parameters are consumed lazily, so
+    the full data set is never held in memory: once `concurrency` requests are
+    outstanding, the loader blocks until one of them completes before pulling
+    the next item from the iterable.
+
+    When the session's default load balancing policy is token aware, parameters
+    are read in windows of `window_size` items and submitted grouped by their
+    primary replica, so that consecutive requests go to the same coordinator.
+
+    Progress (rows/s and error count) is logged at debug level every
+    `report_interval` seconds.
+    """
+
+    def __init__(self, session, statement, concurrency=100, raise_on_first_error=True,
+                 group_by_replica=None, window_size=None, report_interval=5):
+        if concurrency <= 0:
+            raise ValueError("concurrency must be greater than 0; got {}".format(concurrency))
+        self.session = session
+        self.statement = statement
+        self.concurrency = concurrency
+        self.raise_on_first_error = raise_on_first_error
+        if group_by_replica is None:
+            group_by_replica = self._uses_token_aware_policy()
+        self.group_by_replica = group_by_replica
+        self.window_size = window_size if window_size is not None else concurrency * 4
+        self.rate_limited_report = get_rate_limited_function(self._report, report_interval)
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._stats = None
+
+    def _uses_token_aware_policy(self):
+        try:
+            policy = self.session.cluster.profile_manager.default.load_balancing_policy
+        except AttributeError:
+            return False
+        return isinstance(policy, TokenAwarePolicy)
+
+    def _report(self):
+        logger.debug('bulk load progress: {}'.format(self._stats))
+
+    def _bound_statements(self, parameters):
+        if not self.group_by_replica:
+            for params in parameters:
+                yield self.statement.bind(params)
+            return
+
+        metadata = self.session.cluster.metadata
+        parameters = iter(parameters)
+        while True:
+            window = list(islice(parameters, self.window_size))
+            if not window:
+                return
+            by_replica = defaultdict(list)
+            for params in window:
+                bound = self.statement.bind(params)
+                replicas = metadata.get_replicas(bound.keyspace, bound.routing_key) if bound.routing_key is not None else None
+                by_replica[replicas[0] if replicas else None].append(bound)
+            for statements in by_replica.values():
+                for bound in statements:
+                    yield bound
+
+    def _on_success(self, _):
+        with self._condition:
+            self._stats.rows += 1
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _on_error(self, exc):
+        with self._condition:
+            self._stats.errors += 1
+            if self._stats.first_error is None:
+                self._stats.first_error = exc
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _should_stop(self):
+        return self.raise_on_first_error and self._stats.first_error is not None
+
+    def load(self, parameters):
+        """
+        Executes the statement for every item of `parameters` and blocks until
+        all requests have completed.
+
+        @param parameters An iterable of parameter tuples (or lists); it may be a generator
+        @return A LoadStats describing the run
+        @raise The first request error if raise_on_first_error is set
+        """
+        self._stats = stats = LoadStats()
+        try:
+            for bound in self._bound_statements(parameters):
+                with self._condition:
+                    while self._in_flight >= self.concurrency and not self._should_stop():
+                        self._condition.wait()
+                    if self._should_stop():
+                        break
+                    self._in_flight += 1
+                future = self.session.execute_async(bound)
+                future.add_callbacks(callback=self._on_success, errback=self._on_error)
+                self.rate_limited_report()
+        finally:
+            with self._condition:
+                while self._in_flight > 0:
+                    self._condition.wait()
+            stats.end_time = time.time()
+            self._report()
+
+        if self.raise_on_first_error and stats.first_error is not None:
+            raise stats.first_error
+        return stats
+
+
+def bulk_load(session, statement, parameters, concurrency=100, raise_on_first_error=True, **kwargs):
+    """
+    Convenience wrapper around ConcurrentLoader: streams `parameters` into `statement`
+    with bounded concurrency and returns the resulting LoadStats.
+
+    Examples:
+    bulk_load(session, insert, ((i, 'value{}'.format(i)) for i in range(10000000)))
+    """
+    loader = ConcurrentLoader(session, statement, concurrency=concurrency,
+                              raise_on_first_error=raise_on_first_error, **kwargs)
+    return loader.load(parameters)
 
 
 def query_c1c2(session, key, consistency=ConsistencyLevel.QUORUM, tolerate_missing=False, must_be_missing=False):
@@ -0,0 +1,441 @@
+"""
+Deterministic, vectorized row generation.
+
+Every value produced by a DataGenerator is a pure function of (seed, column, key index),
+so a test never needs to remember what it wrote: the expected row for any key can be
+recomputed on demand. Values are produced a batch at a time with NumPy, which keeps the
+per-row Python overhead down to converting the final values into driver-friendly types.
+
+For example, to write ten million rows and verify them afterwards:
+
+    gen = DataGenerator([('key', 'int'), ('val', 'text'), ('tags', 'set<text>')], seed=42)
+    session.execute(gen.create_table_query('ks.cf'))
+    bulk_load(session, session.prepare(gen.insert_query('ks.cf')), gen.rows(0, 10000000))
+    ...
+    verifier = DataVerifier(gen, key_range=(0, 10000000))
+    verifier.check_rows(session.execute(gen.select_query('ks.cf')))
+    verifier.assert_ok()
+
+The first column is always the key column. Its value is derived from the key index itself
+(the index for integer types, 'k<index>' for text types) so that a row read back from the
+database can be mapped to the index it was generated from.
+"""
+import uuid
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_SLOT = np.uint64(0xD1B54A32D192ED03)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_TEXT_ALPHABET = np.array(list('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'))
+
+
+def _mix(x):
+    """splitmix64 finalizer over a uint64 array"""
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * _MIX1
+        x = (x ^ (x >> np.uint64(27))) * _MIX2
+        return x ^ (x >> np.uint64(31))
+
+
+def _salt(*parts):
+    """Stable (not PYTHONHASHSEED dependent) 64-bit salt for the given parts"""
+    value = np.uint64(0)
+    for part in parts:
+        crc = zlib.crc32(str(part).encode('utf-8'))
+        value = _mix(np.array([value ^ np.uint64(crc)], dtype=np.uint64))[0]
+    return value
+
+
+def hash_indices(salt, indices, slot=0):
+    """
+    Returns one pseudo-random uint64 per key index; the same (salt, index, slot)
+    always produces the same value.
+    """
+    indices = np.asarray(indices, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        return _mix(indices * _GOLDEN + salt + np.uint64(slot) * _SLOT)
+
+
+def _split_type_args(args):
+    """Splits 'text, list<int>' on the top-level commas only"""
+    parts, depth, current = [], 0, ''
+    for char in args:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        if char == '<':
+            depth += 1
+        elif char == '>':
+            depth -= 1
+        current += char
+    parts.append(current.strip())
+    return parts
+
+
+def column_type(cql_type, text_length=16, blob_length=16, collection_size=5):
+    """
+    Returns the ColumnType able to generate values for the given CQL type string,
+    e.g. 'int', 'text', 'list<uuid>' or 'map<text, frozen<list<int>>>'.
+    """
+    cql_type = cql_type.strip().lower()
+    sizes = dict(text_length=text_length, blob_length=blob_length, collection_size=collection_size)
+    if cql_type.startswith('frozen<'):
+        return column_type(cql_type[len('frozen<'):-1], **sizes)
+    if '<' in cql_type:
+        name, args = cql_type.split('<', 1)
+        args = [column_type(arg, **sizes) for arg in _split_type_args(args[:-1])]
+        name = name.strip()
+        if name in ('list', 'set') and len(args) == 1:
+            return CollectionType(name, args, collection_size)
+        if name == 'map' and len(args) == 2:
+            return CollectionType(name, args, collection_size)
+        raise ValueError("Unsupported collection type: {}".format(cql_type))
+    if cql_type in _INTEGER_TYPES:
+        return IntegerType(cql_type)
+    if cql_type in ('text', 'varchar', 'ascii'):
+        return TextType(cql_type, text_length)
+    if cql_type in ('float', 'double'):
+        return FloatType(cql_type)
+    if cql_type == 'boolean':
+        return BooleanType(cql_type)
+    if cql_type == 'uuid':
+        return UUIDType(cql_type)
+    if cql_type == 'blob':
+        return BlobType(cql_type, blob_length)
+    raise ValueError("Unsupported type for generated data: {}".format(cql_type))
+
+
+class ColumnType(object):
+    """
+    Base class for the per-type value generators.
+
+    generate() returns a NumPy array with one value per key index; to_python()
+    turns such an array into the values the driver binds and returns.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def generate(self, salt, indices):
+        raise NotImplementedError()
+
+    def to_python(self, values):
+        return values.tolist()
+
+    def normalize(self, value):
+        """Converts a value read through the driver into the form returned by to_python"""
+        return value
+
+    def equal(self, expected, actual):
+        return expected == self.normalize(actual)
+
+    def __repr__(self):
+        return '{cls}({name})'.format(cls=self.__class__.__name__, name=self.name)
+
+
+_INTEGER_TYPES = OrderedDict([('tinyint', np.int8), ('smallint', np.int16), ('int', np.int32),
+                              ('bigint', np.int64), ('varint', np.int64)])
+
+
+class IntegerType(ColumnType):
+
+    def generate(self, salt, indices):
+        return hash_indices(salt, indices).view(np.int64).astype(_INTEGER_TYPES[self.name])
+
+    def key_values(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        dtype = _INTEGER_TYPES[self.name]
+        # a key index past the range of the type would wrap around onto the key of another row
+        if len(indices) and indices.max() > np.iinfo(dtype).max:
+            raise ValueError("Key index {} is out of range for a {} key column".format(indices.max(), self.name))
+        return indices.astype(dtype)
+
+    def key_index(self, value):
+        return int(value)
+
+
+class FloatType(ColumnType):
+
+    def generate(self, salt, indices):
+        # 53 random bits scaled into [0, 1), times a spread of magnitudes
+        hashed = hash_indices(salt, indices)
+        values = (hashed >> np.uint64(11)).astype(np.float64) * (2.0 ** -53)
+        values *= 10.0 ** ((hashed & np.uint64(0xF)).astype(np.float64) - 4)
+        return values.astype(np.float32) if self.name == 'float' else values
+
+
+class BooleanType(ColumnType):
+
+    def generate(self, salt, indices):
+        return (hash_indices(salt, indices) & np.uint64(1)).astype(bool)
+
+
+class TextType(ColumnType):
+
+    def __init__(self, name, length):
+        super(TextType, self).__init__(name)
+        self.length = length
+
+    def generate(self, salt, indices):
+        indices = np.asarray(indices, dtype=np.uint64)
+        chars = np.empty((len(indices), self.length), dtype='<U1')
+        for slot in range(self.length):
+            chars[:, slot] = _TEXT_ALPHABET[hash_indices(salt, indices, slot) % np.uint64(len(_TEXT_ALPHABET))]
+        return chars.view('<U{}'.format(self.length)).reshape(len(indices))
+
+    def key_values(self, indices):
+        return np.char.add('k', np.asarray(indices, dtype=np.int64).astype(str))
+
+    def key_index(self, value):
+        if not value.startswith('k'):
+            raise ValueError("Not a generated key: {!r}".format(value))
+        return int(value[1:])
+
+
+class BlobType(ColumnType):
+
+    def __init__(self, name, length):
+        super(BlobType, self).__init__(name)
+        self.length = length
+
+    def generate(self, salt, indices):
+        indices = np.asarray(indices, dtype=np.uint64)
+        words = -(-self.length // 8)
+        data = np.empty((len(indices), words), dtype=np.uint64)
+        for slot in range(words):
+            data[:, slot] = hash_indices(salt, indices, slot)
+        return data.view(np.uint8)[:, :self.length]
+
+    def to_python(self, values):
+        return [row.tobytes() for row in values]
+
+
+class UUIDType(ColumnType):
+
+    def generate(self, salt, indices):
+        indices = np.asarray(indices, dtype=np.uint64)
+        data = np.empty((len(indices), 2), dtype=np.uint64)
+        data[:, 0] = hash_indices(salt, indices, 0)
+        data[:, 1] = hash_indices(salt, indices, 1)
+        data = data.view(np.uint8).copy()
+        # stamp the RFC 4122 version 4 and variant bits
+        data[:, 6] = (data[:, 6] & 0x0F) | 0x40
+        data[:, 8] = (data[:, 8] & 0x3F) | 0x80
+        return data
+
+    def to_python(self, values):
+        return [uuid.UUID(bytes=row.tobytes()) for row in values]
+
+
+class CollectionType(ColumnType):
+    """
+    list, set and map columns. Each row gets between 0 and `size` elements;
+    element values are generated by the element types over a widened index
+    space (row index * size + position), so they stay vectorized too.
+    """
+
+    def __init__(self, name, element_types, size):
+        super(CollectionType, self).__init__(name)
+        self.element_types = element_types
+        self.size = size
+
+    def generate(self, salt, indices):
+        indices = np.asarray(indices, dtype=np.uint64)
+        lengths = (hash_indices(salt, indices) % np.uint64(self.size + 1)).astype(np.int64)
+        with np.errstate(over='ignore'):
+            positions = np.arange(self.size, dtype=np.uint64)
+            element_indices = (indices[:, None] * np.uint64(self.size) + positions[None, :]).reshape(-1)
+            element_salts = [salt + np.uint64(position + 1) for position in range(len(self.element_types))]
+        elements = [element_type.to_python(element_type.generate(element_salt, element_indices))
+                    for element_salt, element_type in zip(element_salts, self.element_types)]
+
+        values = np.empty(len(indices), dtype=object)
+        for row, length in enumerate(lengths):
+            start = row * self.size
+            items = [element[start:start + length] for element in elements]
+            if self.name == 'list':
+                values[row] = items[0]
+            elif self.name == 'set':
+                values[row] = set(items[0])
+            else:
+                values[row] = dict(zip(items[0], items[1]))
+        return values
+
+    def normalize(self, value):
+        # the database does not distinguish between an empty collection and null
+        if value is None:
+            value = []
+        if self.name == 'list':
+            return list(value)
+        if self.name == 'set':
+            return set(value)
+        return dict(value.items()) if hasattr(value, 'items') else dict(value)
+
+    def to_python(self, values):
+        return list(values)
+
+
+class DataGenerator(object):
+    """
+    Generates rows for a fixed list of (column name, CQL type) pairs.
+
+    Rows are identified by a non-negative integer key index; the first column is the
+    key column. Values depend only on (seed, column name, key index), so generating
+    the same index twice - in this process or another one - yields the same row.
+    """
+
+    def __init__(self, columns, seed=0, text_length=16, blob_length=16, collection_size=5):
+        columns = OrderedDict(columns)
+        if not columns:
+            raise ValueError("At least one column is required")
+        self.seed = seed
+        self.cql_types = columns
+        self.types = OrderedDict((name, column_type(cql_type, text_length=text_length, blob_length=blob_length,
+                                                    collection_size=collection_size))
+                                 for name, cql_type in columns.items())
+        self.key_column = list(columns.keys())[0]
+        key_type = self.types[self.key_column]
+        if not hasattr(key_type, 'key_values'):
+            raise ValueError("Key column {} must be an integer or text type, got {}".format(
+                self.key_column, columns[self.key_column]))
+        self._salts = OrderedDict((name, _salt(seed, name)) for name in columns)
+
+    @property
+    def column_names(self):
+        return list(self.types.keys())
+
+    def create_table_query(self, table):
+        columns = ', '.join('{} {}'.format(name, cql_type) for name, cql_type in self.cql_types.items())
+        return 'CREATE TABLE {table} ({columns}, PRIMARY KEY ({key}))'.format(
+            table=table, columns=columns, key=self.key_column)
+
+    def insert_query(self, table):
+        return 'INSERT INTO {table} ({columns}) VALUES ({markers})'.format(
+            table=table, columns=', '.join(self.column_names), markers=', '.join('?' for _ in self.types))
+
+    def select_query(self, table):
+        return 'SELECT {columns} FROM {table}'.format(columns=', '.join(self.column_names), table=table)
+
+    def batch(self, indices):
+        """
+        Returns an OrderedDict of column name to NumPy array holding the generated
+        values for every key index in `indices`.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) and indices.min() < 0:
+            raise ValueError("Key indices must not be negative")
+        result = OrderedDict()
+        for name, column in self.types.items():
+            if name == self.key_column:
+                result[name] = column.key_values(indices)
+            else:
+                result[name] = column.generate(self._salts[name], indices)
+        return result
+
+    def batch_rows(self, indices):
+        """Returns the rows for `indices` as a list of tuples of driver-friendly values"""
+        columns = [self.types[name].to_python(values) for name, values in self.batch(indices).items()]
+        return list(zip(*columns))
+
+    def rows(self, start, stop, batch_size=10000):
+        """
+        Yields the rows for key indices [start, stop) one at a time, generating them
+        batch_size at a time. Suitable for feeding tools.data.bulk_load.
+        """
+        for batch_start in range(start, stop, batch_size):
+            for row in self.batch_rows(np.arange(batch_start, min(batch_start + batch_size, stop))):
+                yield row
+
+    def row(self, index):
+        return self.batch_rows([index])[0]
+
+    def key_index(self, key):
+        """Returns the key index a key column value was generated from"""
+        return self.types[self.key_column].key_index(key)
+
+
+class DataVerifier(object):
+    """
+    Checks rows read back from the database against a DataGenerator by regenerating
+    the expected values, so nothing but counters (and an optional bitmap of seen keys)
+    is kept in memory.
+
+    Rows must contain the generator's columns in order; use DataGenerator.select_query.
+    If key_range=(start, stop) is given, rows outside it are reported as unexpected and
+    keys in it that were never seen are reported as missing.
+    """
+
+    def __init__(self, generator, key_range=None, max_mismatches=10):
+        self.generator = generator
+        self.key_range = key_range
+        self.max_mismatches = max_mismatches
+        self.checked = 0
+        self.mismatch_count = 0
+        self.mismatches = []
+        self.unexpected = 0
+        self._seen = np.zeros(key_range[1] - key_range[0], dtype=bool) if key_range is not None else None
+
+    def _record(self, index, column, expected, actual):
+        self.mismatch_count += 1
+        if len(self.mismatches) < self.max_mismatches:
+            self.mismatches.append((index, column, expected, actual))
+
+    def check_rows(self, rows, batch_size=10000):
+        """
+        Verifies every row of the iterable `rows`, batch_size rows at a time.
+        Returns the number of rows checked so far.
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self._check_batch(batch)
+                batch = []
+        if batch:
+            self._check_batch(batch)
+        return self.checked
+
+    def _check_batch(self, rows):
+        generator = self.generator
+        indices = np.array([generator.key_index(row[0]) for row in rows], dtype=np.int64)
+        if self.key_range is not None:
+            start, stop = self.key_range
+            in_range = (indices >= start) & (indices < stop)
+            self.unexpected += int((~in_range).sum())
+            self._seen[indices[in_range] - start] = True
+        expected = generator.batch(indices)
+        for position, (name, values) in enumerate(expected.items()):
+            if position == 0:
+                continue
+            column = generator.types[name]
+            actual = [row[position] for row in rows]
+            if isinstance(column, (IntegerType, BooleanType, FloatType, TextType)) and None not in actual:
+                differs = np.flatnonzero(np.asarray(actual) != values)
+                for row in differs:
+                    self._record(int(indices[row]), name, values[row].item(), actual[row])
+            else:
+                for row, (want, got) in enumerate(zip(column.to_python(values), actual)):
+                    if not column.equal(want, got):
+                        self._record(int(indices[row]), name, want, got)
+        self.checked += len(rows)
+
+    @property
+    def missing(self):
+        return int((~self._seen).sum()) if self._seen is not None else 0
+
+    def assert_ok(self):
+        problems = []
+        if self.mismatch_count:
+            problems.append("{} mismatched values, first {}: {}".format(
+                self.mismatch_count, len(self.mismatches),
+                '; '.join('key index {}, column {}: expected {!r} but got {!r}'.format(*m) for m in self.mismatches)))
+        if self.missing:
+            problems.append("{} keys in range {} were never read".format(self.missing, self.key_range))
+        if self.unexpected:
+            problems.append("{} rows were outside of key range {}".format(self.unexpected, self.key_range))
+        assert not problems, "Verification of {} rows failed: {}".format(self.checked, ' / '.join(problems))
@@ -23,7 +23,7 @@ For more examples reference paging_test.py
 """
 import re
 
-from cassandra.concurrent import execute_concurrent_with_args
+from tools.data import bulk_load
 
 
 def strip(val):
@@ -155,11 +155,8 @@ def create_rows(data, session, table_name, cl=None, format_funcs=None, prefix=''
     if cl is not None:
         prepared.consistency_level = cl
 
-    query_results = execute_concurrent_with_args(session, prepared, [list(d.values()) for d in dicts])
-
-    for i, (status, result_or_exc) in enumerate(query_results):
-        # should maybe check status here before appening to expected values
-        values.append(dicts[i])
+    bulk_load(session, prepared, (list(d.values()) for d in dicts))
+    values.extend(dicts)
 
     return values
 
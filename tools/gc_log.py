@@ -0,0 +1,323 @@
+"""
+Reading the GC log of a node, to measure the pauses and the allocation pressure of a test.
+
+ccm turns GC logging on for every node, to logs/gc.log. JDK 8 writes its -Xloggc format,
+one record per collection, which may span several lines with -XX:+PrintGCDetails and
+-XX:+PrintTenuringDistribution:
+
+    2018-06-01T10:00:00.123+0000: 12.345: [GC (Allocation Failure) 2018-06-01T10:00:00.123+0000: 12.345: [ParNew
+    Desired survivor size 41943040 bytes, new threshold 1 (max 1)
+    : 335744K->20934K(377472K), 0.0291254 secs] 335744K->20934K(2055168K), 0.0292370 secs] [Times: ...]
+    2018-06-01T10:00:00.153+0000: 12.375: Total time for which application threads were stopped: 0.0295 seconds, ...
+
+and JDK 11+ writes the unified -Xlog format, a line per message prefixed by its decorations,
+the uptime among them:
+
+    [2019-02-05T14:47:34.229+0000][3.145s][1234][5678][info ] GC(3) Pause Young (Normal) (G1 Evacuation Pause) 24M->4M(256M) 7.654ms
+
+Both formats are parsed into GCPause tuples, which GCLogStats accumulates into the number,
+total and longest of the pauses, the allocation rate (the growth of the heap between
+collections, over time) and, when the log has the sizes of the young generation, the
+promotion rate (what left the young generation without being freed):
+
+    stats = analyze_node_gc_logs(node)
+    assert stats.max_pause < 0.5
+
+summarize_cluster_gc_logs() is attached to the junit report of every test.
+"""
+import glob
+import logging
+import os
+import re
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+_UNITS = {'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+_SIZE = r'([\d.]+)([BKMG])'
+_HEAP_CHANGE = re.compile(r'{0}->{0}\({0}\)'.format(_SIZE))
+_PERM_GEN = re.compile(r'\[(?:Metaspace|PSPermGen|CMS Perm ?|Perm ?): [^\]]*\]')
+
+# JDK 8
+_RECORD = re.compile(r'^(?:\d{4}-\d\d-\d\dT[\d:.]+[+-]\d{4}: )?(\d+\.\d+): (.*)$')
+_STOPPED = re.compile(r'Total time for which application threads were stopped: ([\d.]+) seconds')
+_CAUSE = re.compile(r'^\[(Full GC|GC)(?: pause)?\s*(?:\((.*?)\)(?=[ ,\]]|$))?')
+_DURATION = re.compile(r', ([\d.]+) secs\]')
+_YOUNG_GEN = re.compile(r'\[(?:ParNew|DefNew|PSYoungGen|ASParNew)(?: \([^)]*\))?: ' + _HEAP_CHANGE.pattern)
+_G1_HEAP = re.compile(r'\[Eden: {0}\([^)]*\)->{0}\([^)]*\) Survivors: {0}->{0} Heap: {0}\([^)]*\)->{0}\({0}\)\]'
+                      .format(_SIZE))
+
+# JDK 11+ unified logging
+_DECORATIONS = re.compile(r'^((?:\[[^\[\]]*\])+)\s*(.*)$')
+_UPTIME = re.compile(r'\[(\d+(?:\.\d+)?)(s|ms)\]')
+_UNIFIED_PAUSE = re.compile(r'^GC\((\d+)\) Pause (.*?)(?: ' + _HEAP_CHANGE.pattern + r')? ([\d.]+)ms$')
+_UNIFIED_YOUNG_GEN = re.compile(r'^GC\((\d+)\) (?:ParNew|DefNew|PSYoungGen): ' + _HEAP_CHANGE.pattern)
+_UNIFIED_REGIONS = re.compile(r'^GC\((\d+)\) (Eden|Survivor) regions: (\d+)->(\d+)')
+_REGION_SIZE = re.compile(r'Heap [Rr]egion [Ss]ize: ' + _SIZE)
+_SAFEPOINT_TOTAL = re.compile(r'^Safepoint ".*", .*Total: (\d+) ns')
+_UNIFIED_CAUSES = re.compile(r'\((.*?)\)(?= |$)')
+
+
+def _bytes(value, unit):
+    return int(float(value) * _UNITS[unit])
+
+
+class GCPause(namedtuple('GCPause', ('uptime', 'kind', 'cause', 'seconds', 'heap_before', 'heap_after',
+                                     'heap_capacity', 'young_before', 'young_after'))):
+    """
+    A stop the world collection. kind is 'young', 'full' or 'other' (e.g. a remark), the
+    sizes are in bytes and None when the log doesn't have them, and uptime is None when
+    the log has no timestamps.
+    """
+    __slots__ = ()
+
+    @property
+    def promoted(self):
+        """@return The bytes promoted to the old generation by a young collection, or None"""
+        if self.kind != 'young' or None in (self.young_before, self.young_after, self.heap_before, self.heap_after):
+            return None
+        return max((self.young_before - self.young_after) - (self.heap_before - self.heap_after), 0)
+
+
+class GCLogStats(object):
+    """
+    The pauses and allocation of the GC logs added to it. Every log added with add_log()
+    is a separate run of a JVM, so the heap isn't followed from one log to the next.
+    """
+
+    def __init__(self):
+        self.logs = 0
+        self.pauses = 0
+        self.young_pauses = 0
+        self.full_pauses = 0
+        self.pause_seconds = 0.0
+        self.max_pause = 0.0
+        self.stopped_seconds = 0.0
+        self.allocated_bytes = 0
+        self.promoted_bytes = 0
+        self.elapsed = 0.0
+        self._last = None
+
+    def add(self, pause):
+        self.pauses += 1
+        if pause.kind == 'young':
+            self.young_pauses += 1
+        elif pause.kind == 'full':
+            self.full_pauses += 1
+        self.pause_seconds += pause.seconds
+        self.max_pause = max(self.max_pause, pause.seconds)
+        if pause.uptime is None or pause.heap_before is None:
+            return
+        # a JVM restarting with the same log starts its uptime over
+        if self._last is not None and pause.uptime >= self._last[0]:
+            self.allocated_bytes += max(pause.heap_before - self._last[1], 0)
+            self.elapsed += pause.uptime - self._last[0]
+            self.promoted_bytes += pause.promoted or 0
+        self._last = (pause.uptime, pause.heap_after)
+
+    def add_stopped(self, seconds):
+        """Adds a safepoint, during which the application threads were stopped, for GC or not"""
+        self.stopped_seconds += seconds
+
+    def add_log(self, stream):
+        """Adds the pauses and safepoints of a GC log, see parse_gc_log(). @return self"""
+        self.logs += 1
+        self._last = None
+        for event in parse_gc_log(stream, self.add_stopped):
+            self.add(event)
+        return self
+
+    @property
+    def allocation_rate(self):
+        """The bytes per second allocated in the heap, between the first and last collections"""
+        return self.allocated_bytes / self.elapsed if self.elapsed > 0 else None
+
+    @property
+    def promotion_rate(self):
+        """The bytes per second promoted to the old generation, over the same period"""
+        return self.promoted_bytes / self.elapsed if self.elapsed > 0 else None
+
+    def as_dict(self):
+        return {'pauses': self.pauses, 'young_pauses': self.young_pauses, 'full_pauses': self.full_pauses,
+                'total_pause_ms': self.pause_seconds * 1000, 'max_pause_ms': self.max_pause * 1000,
+                'stopped_ms': self.stopped_seconds * 1000, 'allocated_bytes': self.allocated_bytes,
+                'promoted_bytes': self.promoted_bytes, 'allocation_rate': self.allocation_rate,
+                'promotion_rate': self.promotion_rate}
+
+    def format_summary(self):
+        line = '{} pauses ({} young, {} full), {:.1f}ms in total, longest {:.1f}ms'.format(
+            self.pauses, self.young_pauses, self.full_pauses, self.pause_seconds * 1000, self.max_pause * 1000)
+        if self.allocation_rate is not None:
+            line += ', allocating {:.0f} bytes/s, promoting {:.0f} bytes/s'.format(
+                self.allocation_rate, self.promotion_rate)
+        return line
+
+
+def _jdk8_pause(uptime, record):
+    """@return The GCPause of a JDK 8 record, or None if it isn't a pause (e.g. a concurrent phase)"""
+    cause = _CAUSE.match(record)
+    if cause is None or record.startswith('[GC concurrent'):
+        return None
+    record = _PERM_GEN.sub('', record.split('[Times:')[0])
+    durations = _DURATION.findall(record)
+    if not durations:
+        return None
+    heap_before = heap_after = heap_capacity = young_before = young_after = None
+    g1 = _G1_HEAP.search(record)
+    changes = _HEAP_CHANGE.findall(record)
+    if g1:
+        sizes = [_bytes(value, unit) for value, unit in zip(g1.groups()[::2], g1.groups()[1::2])]
+        young_before, young_after = sizes[0] + sizes[2], sizes[1] + sizes[3]
+        heap_before, heap_after, heap_capacity = sizes[4:]
+    elif changes:
+        heap_before, heap_after, heap_capacity = [_bytes(value, unit) for value, unit in
+                                                  zip(changes[-1][::2], changes[-1][1::2])]
+    young = _YOUNG_GEN.search(record)
+    if young:
+        young_before, young_after = _bytes(*young.groups()[0:2]), _bytes(*young.groups()[2:4])
+    if cause.group(1) == 'Full GC':
+        kind = 'full'
+    elif young_before is not None or '(young)' in record:
+        kind = 'young'
+    else:
+        kind = 'other'
+    return GCPause(uptime=uptime, kind=kind, cause=cause.group(2), seconds=float(durations[-1]),
+                   heap_before=heap_before, heap_after=heap_after, heap_capacity=heap_capacity,
+                   young_before=young_before, young_after=young_after)
+
+
+def _parse_jdk8(lines, on_stopped):
+    def flush(uptime, record):
+        if record is None:
+            return None
+        record = ''.join(record)
+        stopped = _STOPPED.search(record)
+        if stopped:
+            on_stopped(float(stopped.group(1)))
+            return None
+        return _jdk8_pause(uptime, record)
+
+    uptime, record = None, None
+    for line in lines:
+        line = line.rstrip('\n')
+        match = _RECORD.match(line)
+        # without -XX:+PrintGCTimeStamps the records start with the collection
+        if match or _CAUSE.match(line):
+            pause = flush(uptime, record)
+            if pause:
+                yield pause
+            uptime, record = (float(match.group(1)), [match.group(2)]) if match else (None, [line])
+        elif record is not None and not line.startswith(('Desired survivor size', '- age')):
+            record.append(line)
+    pause = flush(uptime, record)
+    if pause:
+        yield pause
+
+
+def _parse_unified(lines, on_stopped):
+    region_size = None
+    young = {}
+    for line in lines:
+        match = _DECORATIONS.match(line.rstrip('\n'))
+        if match is None:
+            continue
+        decorations, message = match.groups()
+        uptime = _UPTIME.search(decorations)
+        if uptime:
+            uptime = float(uptime.group(1)) / (1000 if uptime.group(2) == 'ms' else 1)
+        stopped = _STOPPED.search(message)
+        if stopped:
+            on_stopped(float(stopped.group(1)))
+            continue
+        stopped = _SAFEPOINT_TOTAL.match(message)
+        if stopped:
+            on_stopped(int(stopped.group(1)) / 1e9)
+            continue
+        size = _REGION_SIZE.search(message)
+        if size:
+            region_size = _bytes(*size.groups())
+            continue
+        generation = _UNIFIED_YOUNG_GEN.match(message)
+        if generation:
+            gc_id = generation.group(1)
+            young[gc_id] = (_bytes(*generation.groups()[1:3]), _bytes(*generation.groups()[3:5]))
+            continue
+        regions = _UNIFIED_REGIONS.match(message)
+        if regions and region_size:
+            gc_id = regions.group(1)
+            before, after = young.get(gc_id, (0, 0))
+            young[gc_id] = (before + int(regions.group(3)) * region_size, after + int(regions.group(4)) * region_size)
+            continue
+        pause = _UNIFIED_PAUSE.match(message)
+        if pause:
+            gc_id, cause = pause.group(1), pause.group(2)
+            heap = [_bytes(value, unit) for value, unit in zip(pause.groups()[2:8:2], pause.groups()[3:8:2])
+                    if value is not None]
+            young_before, young_after = young.pop(gc_id, (None, None))
+            if cause.startswith('Full'):
+                kind = 'full'
+            elif cause.startswith('Young'):
+                kind = 'young'
+            else:
+                kind = 'other'
+            causes = _UNIFIED_CAUSES.findall(cause)
+            yield GCPause(uptime=uptime, kind=kind, cause=causes[-1] if causes else cause,
+                          seconds=float(pause.group(9)) / 1000, heap_before=heap[0] if heap else None,
+                          heap_after=heap[1] if heap else None, heap_capacity=heap[2] if heap else None,
+                          young_before=young_before, young_after=young_after)
+
+
+def parse_gc_log(stream, on_stopped=None):
+    """
+    Iterates the pauses of a GC log of either JDK 8 or unified (JDK 11+) format, which is
+    told from its first line.
+
+    @param stream A file-like object, or the path of a log
+    @param on_stopped Optional function called with the seconds of every safepoint logged
+    @return An iterator of GCPause
+    """
+    if isinstance(stream, str):
+        with open(stream) as f:
+            for pause in parse_gc_log(f, on_stopped):
+                yield pause
+        return
+    on_stopped = on_stopped or (lambda seconds: None)
+    lines = iter(stream)
+    for first in lines:
+        if first.strip():
+            break
+    else:
+        return
+
+    def all_lines():
+        yield first
+        for line in lines:
+            yield line
+
+    parse = _parse_unified if _DECORATIONS.match(first) and not _CAUSE.match(first) else _parse_jdk8
+    for pause in parse(all_lines(), on_stopped):
+        yield pause
+
+
+def node_gc_logs(node):
+    """@return The paths of the GC logs of a ccm node, including the rotated ones"""
+    return sorted(glob.glob(os.path.join(os.path.dirname(node.gclogfilename()), 'gc.log*')))
+
+
+def analyze_node_gc_logs(node):
+    """@return The GCLogStats of all the GC logs of a ccm node"""
+    stats = GCLogStats()
+    for path in node_gc_logs(node):
+        stats.add_log(path)
+    return stats
+
+
+def summarize_cluster_gc_logs(cluster):
+    """@return dict of node name to the dict of its GCLogStats, for the nodes that logged pauses"""
+    summaries = {}
+    for node in cluster.nodelist():
+        stats = analyze_node_gc_logs(node)
+        if stats.pauses:
+            summaries[node.name] = stats.as_dict()
+    return summaries
@@ -6,8 +6,7 @@ import os
 import time
 import logging
 
-from cassandra.concurrent import execute_concurrent
-
+from tools.data import bulk_load
 from tools.funcutils import get_rate_limited_function
 
 logger = logging.getLogger(__name__)
@@ -53,17 +52,18 @@ def advance_to_next_cl_segment(session, commitlog_dir,
     rate_limited_debug_logger = get_rate_limited_function(logger.debug, 5)
     logger.debug('attempting to write until we start writing to new CL segments: {}'.format(initial_cl_files))
 
-    while _files_in(commitlog_dir) <= initial_cl_files:
-        elapsed = time.time() - start
-        rate_limited_debug_logger('  commitlog-advancing load step has lasted {s:.2f}s'.format(s=elapsed))
-        assert (
-            time.time() <= stop_time), "It's been over a {s}s and we haven't written a new " + \
-            "commitlog segment. Something is wrong.".format(s=timeout)
-        execute_concurrent(
-            session,
-            ((prepared_insert, ()) for _ in range(1000)),
-            concurrency=500,
-            raise_on_first_error=True,
-        )
+    def parameters():
+        # keep the loader fed until a new segment shows up; checking the
+        # directory every 1000 rows keeps the listdir cost negligible
+        while _files_in(commitlog_dir) <= initial_cl_files:
+            elapsed = time.time() - start
+            rate_limited_debug_logger('  commitlog-advancing load step has lasted {s:.2f}s'.format(s=elapsed))
+            assert (
+                time.time() <= stop_time), "It's been over a {s}s and we haven't written a new " + \
+                "commitlog segment. Something is wrong.".format(s=timeout)
+            for _ in range(1000):
+                yield ()
+
+    bulk_load(session, prepared_insert, parameters(), concurrency=500, group_by_replica=False)
 
     logger.debug('present commitlog segments: {}'.format(_files_in(commitlog_dir)))
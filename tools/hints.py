@@ -0,0 +1,485 @@
+"""
+Reading a node's hints directory in process, and following it as hints accumulate and drain.
+
+Since 3.0, the hints for each target host are appended to <host id>-<timestamp>-<version>.hints
+files, one or more per host, in the hints_directory (<node>/hints with ccm). A file
+starts with a descriptor:
+
+    int version | long timestamp | long, long host id | int params length | int crc
+    | JSON params | int crc
+
+followed, in uncompressed files, by the hints:
+
+    int size | int crc of size | long creation time | vint gc grace seconds, mutation
+    | int crc of size and hint
+
+When a file is closed, a <host id>-<timestamp>-<version>.crc32 file next to it gets the
+CRC32 of its whole contents. Files are deleted once all their hints are delivered. Files
+compressed or encrypted with hints_compression or transparent data encryption hold the
+same hints in blocks, which aren't decoded here; their descriptors still are.
+
+HintsFile memory maps a file and iterates its hints lazily, checking their CRCs without
+deserializing mutations, and read_hints_directory() summarizes a directory per file:
+
+    for summary in read_hints_directory(os.path.join(node.get_path(), 'hints')):
+        assert summary.invalid_hints == 0 and summary.checksum_valid is not False
+
+HintsMonitor samples a directory from a background thread, only reading the bytes
+appended since its previous sample, and reports how fast hints were written and
+delivered, optionally next to the node's hint metrics:
+
+    with HintsMonitor(os.path.join(node1.get_path(), 'hints')) as monitor:
+        ... write while node2 is down ...
+        node2.start()
+        monitor.wait_until_drained(timeout=600)
+    logger.info(monitor.format_stats())
+"""
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import namedtuple
+
+from tools.jmxutils import make_mbean
+
+logger = logging.getLogger(__name__)
+
+HINTS_PATTERN = re.compile(r'^(?P<host_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})'
+                           r'-(?P<timestamp>\d+)-(?P<version>\d+)\.hints$')
+_HEADER = struct.Struct('>iqqqi')
+# the header as HintsDescriptor checksums it, each long as its low int then its high int
+_CHECKSUMMED_HEADER = struct.Struct('>i6Ii')
+_INT = struct.Struct('>i')
+_UINT = struct.Struct('>I')
+
+
+class HintsDescriptor(namedtuple('HintsDescriptor', ('version', 'timestamp', 'host_id', 'params', 'length',
+                                                     'crc_valid'))):
+    """The descriptor at the start of a hints file; length is its size in bytes"""
+    __slots__ = ()
+
+    @property
+    def compression(self):
+        return self.params.get('compression')
+
+    @property
+    def encryption(self):
+        return self.params.get('encryption')
+
+    @property
+    def entries_readable(self):
+        return not self.compression and not self.encryption
+
+
+class HintEntry(namedtuple('HintEntry', ('offset', 'size', 'creation_time', 'gc_grace_seconds', 'crc_valid'))):
+    """A hint of an uncompressed hints file; size is the size of the hint, without its framing"""
+    __slots__ = ()
+
+
+class HintsFileSummary(namedtuple('HintsFileSummary', ('path', 'host_id', 'timestamp', 'version', 'bytes', 'hints',
+                                                       'hint_bytes', 'invalid_hints', 'checksum_valid'))):
+    """
+    The counts of a hints file. hints, hint_bytes and invalid_hints are None if its hints
+    aren't readable; checksum_valid is None if the file has no .crc32 file yet.
+    """
+    __slots__ = ()
+
+
+def _split_long(value):
+    """The low and high ints of a long, in the order HintsDescriptor.updateChecksumLong takes them"""
+    return value & 0xffffffff, (value >> 32) & 0xffffffff
+
+
+def _unsigned_vint_length(first_byte):
+    return 9 - (~first_byte & 0xff).bit_length()
+
+
+def read_hints_descriptor(buffer):
+    """
+    Reads the descriptor at the start of a hints file.
+
+    @param buffer The contents of the file, or a prefix of them
+    @return HintsDescriptor
+    @raise ValueError if the buffer is too short to hold the descriptor
+    """
+    if len(buffer) < _HEADER.size + 4:
+        raise ValueError("Truncated hints descriptor: {} bytes".format(len(buffer)))
+    version, timestamp, msb, lsb, params_length = _HEADER.unpack_from(buffer, 0)
+    longs = _split_long(timestamp) + _split_long(msb) + _split_long(lsb)
+    header_crc = zlib.crc32(_CHECKSUMMED_HEADER.pack(version, *longs, params_length))
+    params_start = _HEADER.size + 4
+    params_end = params_start + params_length
+    if params_length < 0 or len(buffer) < params_end + 4:
+        raise ValueError("Truncated hints descriptor: {} bytes of params".format(params_length))
+    params_bytes = bytes(buffer[params_start:params_end])
+    stored_crcs = (_UINT.unpack_from(buffer, _HEADER.size)[0], _UINT.unpack_from(buffer, params_end)[0])
+    crc_valid = stored_crcs == (header_crc, zlib.crc32(params_bytes, header_crc))
+    try:
+        params = json.loads(params_bytes.decode('utf-8')) if params_bytes else {}
+    except ValueError:
+        params = {}
+        crc_valid = False
+    host_id = uuid.UUID(int=((msb & (2 ** 64 - 1)) << 64) | (lsb & (2 ** 64 - 1)))
+    return HintsDescriptor(version=version, timestamp=timestamp, host_id=host_id, params=params,
+                           length=params_end + 4, crc_valid=crc_valid)
+
+
+def read_hint_entries(buffer, offset):
+    """
+    Iterates the hints of an uncompressed hints file from offset, the end of its descriptor
+    or of a hint read before, up to the last complete hint; a file being written may end
+    with a partial one. It stops at a hint whose size has an invalid CRC, as the following
+    hints can't be found.
+
+    @return An iterator of HintEntry
+    """
+    end = len(buffer)
+    while offset + 8 <= end:
+        size, = _INT.unpack_from(buffer, offset)
+        size_crc = zlib.crc32(buffer[offset:offset + 4])
+        if _UINT.unpack_from(buffer, offset + 4)[0] != size_crc or size < 9:
+            yield HintEntry(offset=offset, size=size, creation_time=None, gc_grace_seconds=None, crc_valid=False)
+            return
+        hint_start = offset + 8
+        hint_end = hint_start + size
+        if hint_end + 4 > end:
+            return
+        creation_time, = struct.unpack_from('>q', buffer, hint_start)
+        first = buffer[hint_start + 8]
+        extra_bytes = _unsigned_vint_length(first) - 1
+        gc_grace_seconds = first & (0xff >> extra_bytes)
+        for byte in buffer[hint_start + 9:hint_start + 9 + extra_bytes]:
+            gc_grace_seconds = (gc_grace_seconds << 8) | byte
+        crc_valid = _UINT.unpack_from(buffer, hint_end)[0] == zlib.crc32(buffer[hint_start:hint_end], size_crc)
+        yield HintEntry(offset=offset, size=size, creation_time=creation_time,
+                        gc_grace_seconds=gc_grace_seconds, crc_valid=crc_valid)
+        offset = hint_end + 4
+
+
+class HintsFile(object):
+    """
+    A memory mapped hints file. Use it as a context manager, or call close().
+
+    @raise ValueError if the file name doesn't match HINTS_PATTERN, or its descriptor is truncated
+    """
+
+    def __init__(self, path):
+        match = HINTS_PATTERN.match(os.path.basename(path))
+        if match is None:
+            raise ValueError("{} is not a hints file".format(path))
+        self.path = path
+        self.host_id = uuid.UUID(match.group('host_id'))
+        self._file = open(path, 'rb')
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            if self.size == 0:
+                raise ValueError("{} is empty".format(path))
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        try:
+            self.descriptor = read_hints_descriptor(self._buffer)
+        except ValueError:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._buffer.close()
+        self._file.close()
+
+    @property
+    def checksum_path(self):
+        return self.path[:-len('.hints')] + '.crc32'
+
+    def entries(self):
+        """
+        @return An iterator of the HintEntry of every hint of the file
+        @raise ValueError if the file is compressed or encrypted
+        """
+        if not self.descriptor.entries_readable:
+            raise ValueError("The hints of {} are compressed or encrypted".format(self.path))
+        return read_hint_entries(self._buffer, self.descriptor.length)
+
+    def checksum_valid(self):
+        """@return Whether the CRC32 of the file matches its .crc32 file, or None if it has none yet"""
+        try:
+            with open(self.checksum_path) as f:
+                expected = int(f.read().strip())
+        except (IOError, OSError, ValueError):
+            return None
+        return zlib.crc32(self._buffer) == expected
+
+    def summary(self):
+        """@return HintsFileSummary"""
+        hints = hint_bytes = invalid = None
+        if self.descriptor.entries_readable:
+            hints = hint_bytes = invalid = 0
+            for entry in self.entries():
+                hints += 1
+                hint_bytes += entry.size if entry.crc_valid else 0
+                invalid += 0 if entry.crc_valid else 1
+        return HintsFileSummary(path=self.path, host_id=self.host_id, timestamp=self.descriptor.timestamp,
+                                version=self.descriptor.version, bytes=self.size, hints=hints,
+                                hint_bytes=hint_bytes, invalid_hints=invalid, checksum_valid=self.checksum_valid())
+
+    def __repr__(self):
+        return 'HintsFile({})'.format(self.path)
+
+
+def hints_files(directory):
+    """@return The paths of the .hints files of a directory, ordered by host and timestamp"""
+    if not os.path.isdir(directory):
+        return []
+    matches = [HINTS_PATTERN.match(name) for name in os.listdir(directory)]
+    matches = sorted((match for match in matches if match), key=lambda m: (m.group('host_id'), int(m.group('timestamp'))))
+    return [os.path.join(directory, match.group(0)) for match in matches]
+
+
+def read_hints_directory(directory):
+    """
+    @return The HintsFileSummary of every hints file of a directory, ordered by host and
+            timestamp. Empty files, of which the descriptor isn't written yet, are left out.
+    """
+    summaries = []
+    for path in hints_files(directory):
+        try:
+            with HintsFile(path) as hints_file:
+                summaries.append(hints_file.summary())
+        except (FileNotFoundError, ValueError) as e:
+            logger.debug("Skipping hints file {}: {}".format(path, e))
+    return summaries
+
+
+def hints_per_host(summaries):
+    """
+    @param summaries HintsFileSummary list, e.g. from read_hints_directory()
+    @return dict of host id to a dict of its number of files, bytes and hints
+    """
+    hosts = {}
+    for summary in summaries:
+        host = hosts.setdefault(summary.host_id, {'files': 0, 'bytes': 0, 'hints': 0})
+        host['files'] += 1
+        host['bytes'] += summary.bytes
+        host['hints'] += summary.hints or 0
+    return hosts
+
+
+def read_hint_metrics(agent):
+    """
+    Reads the hint metrics of a node through its JolokiaAgent: the hints it wrote, and
+    those it delivered, failed or timed out delivering. A metric the node doesn't have is None.
+    """
+    mbeans = {'written': make_mbean('metrics', type='Storage', name='TotalHints'),
+              'in_progress': make_mbean('metrics', type='Storage', name='TotalHintsInProgress'),
+              'succeeded': make_mbean('metrics', type='HintsService', name='HintsSucceeded'),
+              'failed': make_mbean('metrics', type='HintsService', name='HintsFailed'),
+              'timed_out': make_mbean('metrics', type='HintsService', name='HintsTimedOut')}
+    return {metric: agent.read_attribute(mbean, 'Count') if agent.has_mbean(mbean, verbose=False) else None
+            for metric, mbean in mbeans.items()}
+
+
+class HintsSample(namedtuple('HintsSample', ('time', 'files', 'bytes', 'hints', 'written', 'delivered',
+                                             'metrics'))):
+    """
+    A sample of a HintsMonitor: the files, bytes and readable hints in the directory, the
+    hints seen so far in total (written) and in deleted files (delivered), and the node's
+    metrics if the monitor reads them.
+    """
+    __slots__ = ()
+
+
+class _FileState(object):
+
+    def __init__(self):
+        self.size = 0
+        self.offset = None  # where to read the next hint from, None until the descriptor is read
+        self.readable = True
+        self.hints = 0
+        self.hint_bytes = 0
+        self.invalid = 0
+
+
+class HintsMonitor(object):
+    """
+    Samples a hints directory from a background thread. Use it as a context manager, or
+    call start() and stop().
+
+    @param directory The hints directory of a node; it needn't exist yet
+    @param interval The number of seconds between two samples
+    @param metrics Optional callable returning a dict of the node's metrics for every sample,
+                   e.g. lambda: read_hint_metrics(agent)
+    """
+
+    def __init__(self, directory, interval=1.0, metrics=None):
+        self.directory = directory
+        self.interval = interval
+        self.metrics = metrics
+        self.samples = []
+        self.files = {}
+        self.written = 0
+        self.delivered = 0
+        self.hint_bytes = 0
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._monitor, name='hints-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops sampling, after a last sample, and re-raises an error of the thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            raise self._error
+        self.sample()
+
+    def _monitor(self):
+        try:
+            while not self._stop.wait(self.interval):
+                self.sample()
+        except Exception as e:
+            logger.exception("Hints monitor of {} failed".format(self.directory))
+            self._error = e
+        finally:
+            with self._lock:
+                self._lock.notify_all()
+
+    def _read(self, path, state):
+        """Reads the hints appended to a file since it was last read"""
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == state.size or size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                if state.offset is None:
+                    try:
+                        descriptor = read_hints_descriptor(buffer)
+                    except ValueError:
+                        return
+                    state.offset = descriptor.length
+                    state.readable = descriptor.entries_readable
+                state.size = size
+                if not state.readable:
+                    return
+                for entry in read_hint_entries(buffer, state.offset):
+                    if not entry.crc_valid:
+                        state.invalid += 1
+                        state.readable = False
+                        break
+                    state.hints += 1
+                    state.hint_bytes += entry.size
+                    self.written += 1
+                    self.hint_bytes += entry.size
+                    state.offset = entry.offset + entry.size + 12
+
+    def sample(self):
+        """Reads the changes of the directory, and records and returns a HintsSample"""
+        paths = {os.path.basename(path): path for path in hints_files(self.directory)}
+        metrics = self.metrics() if self.metrics is not None else None
+        with self._lock:
+            for name in list(self.files):
+                if name not in paths:
+                    self.delivered += self.files.pop(name).hints
+            for name, path in paths.items():
+                state = self.files.setdefault(name, _FileState())
+                try:
+                    self._read(path, state)
+                except FileNotFoundError:
+                    pass
+            files = [self.files[name] for name in paths]
+            sample = HintsSample(time=time.time(), files=len(files), bytes=sum(state.size for state in files),
+                                 hints=sum(state.hints for state in files), written=self.written,
+                                 delivered=self.delivered, metrics=metrics)
+            self.samples.append(sample)
+            self._lock.notify_all()
+        return sample
+
+    def _wait(self, predicate, timeout, description):
+        deadline = time.time() + timeout
+        with self._lock:
+            while not predicate(self.samples[-1]):
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._thread is None or self._error is not None:
+                    raise RuntimeError("Hints in {} {} within {}s: {}".format(
+                        self.directory, description, timeout, self.samples[-1]))
+                self._lock.wait(remaining)
+
+    def wait_for_hints(self, count, timeout):
+        """
+        Waits until count hints were written to the directory in total.
+
+        @raise RuntimeError if that didn't happen within timeout seconds
+        """
+        self._wait(lambda sample: sample.written >= count, timeout, "didn't reach {}".format(count))
+
+    def wait_until_drained(self, timeout):
+        """
+        Waits until all the hints files were delivered and deleted.
+
+        @raise RuntimeError if that didn't happen within timeout seconds
+        """
+        self._wait(lambda sample: sample.files == 0, timeout, "weren't delivered")
+
+    def stats(self):
+        """
+        @return dict of: the peak hints and bytes on disk; the average size of a hint; the
+                rate at which hints were written, from the first sample to the one where
+                the last were seen, and delivered, from the last sample before the first
+                file was deleted to the one where the last was; and the seconds that took.
+        """
+        samples = self.samples
+        stats = {'peak_hints': max(sample.hints for sample in samples) if samples else 0,
+                 'peak_bytes': max(sample.bytes for sample in samples) if samples else 0,
+                 'bytes_per_hint': self.hint_bytes / self.written if self.written else None,
+                 'written_hints': self.written, 'delivered_hints': self.delivered,
+                 'written_per_second': None, 'write_seconds': None,
+                 'delivered_per_second': None, 'delivery_seconds': None}
+        if not samples:
+            return stats
+
+        def rate(first, last, field):
+            seconds = last.time - first.time
+            return (getattr(last, field) - getattr(first, field)) / seconds if seconds > 0 else None, seconds
+
+        last_written = next(sample for sample in samples if sample.written == self.written)
+        if self.written > samples[0].written:
+            stats['written_per_second'], stats['write_seconds'] = rate(samples[0], last_written, 'written')
+        if self.delivered > samples[0].delivered:
+            started = max(i for i, sample in enumerate(samples) if sample.delivered == samples[0].delivered)
+            last_delivered = next(sample for sample in samples if sample.delivered == self.delivered)
+            stats['delivered_per_second'], stats['delivery_seconds'] = rate(samples[started], last_delivered,
+                                                                            'delivered')
+        return stats
+
+    def format_stats(self):
+        stats = self.stats()
+        return ', '.join('{}={}'.format(key, '{:.2f}'.format(value) if isinstance(value, float) else value)
+                         for key, value in sorted(stats.items()))
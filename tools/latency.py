@@ -0,0 +1,234 @@
+"""
+Client-side latency and availability as seen by traffic workers, per test phase.
+
+LatencyRecorder is handed to worker processes together with their TrafficCounters
+(see tools.traffic) and records the latency of every successful request into an
+HdrHistogram-style histogram in shared memory, along with the number of timeouts,
+unavailable errors and other errors. LatencyPhases, in the test process, snapshots the
+recorders at every phase boundary of the test (e.g. 'before', 'node1 down',
+'node1 upgraded') and reports the latency percentiles and error counts of each phase:
+
+    phases = LatencyPhases({'writer': writer_latency, 'verifier': verifier_latency})
+    phases.enter('before')
+    ...
+    phases.enter('node1 down')
+    ...
+    report = phases.finish()
+    logger.info(format_phase_report(report))
+
+Workers accumulate measurements locally and merge them into shared memory with
+flush(), so a phase boundary is as sharp as the workers' flush interval.
+"""
+import ctypes
+import logging
+import multiprocessing
+import threading
+import time
+
+from cassandra import OperationTimedOut, ReadTimeout, Timeout, Unavailable, WriteTimeout
+from cassandra.cluster import NoHostAvailable
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_ERRORS = (OperationTimedOut, Timeout, ReadTimeout, WriteTimeout)
+UNAVAILABLE_ERRORS = (Unavailable, NoHostAvailable)
+
+# positions of the error counters and the exact maximum in LatencyRecorder's shared stats
+TIMEOUTS, UNAVAILABLES, ERRORS, MAX_LATENCY = range(4)
+
+
+class HistogramBuckets(object):
+    """
+    The bucket layout of an HdrHistogram: values (integer microseconds here) below
+    2 ** precision_bits each have their own bucket; above that, every power of two is
+    split into 2 ** (precision_bits - 1) buckets of equal width, so any value is known to
+    within 1 / 2 ** (precision_bits - 1) of itself. Values above max_value are counted in
+    the last bucket.
+    """
+
+    def __init__(self, max_value, precision_bits=7):
+        self.precision_bits = precision_bits
+        self.sub_bucket_count = 2 ** precision_bits
+        self.half_count = self.sub_bucket_count // 2
+        self.max_value = max_value
+        self.size = self.index(max_value) + 1
+
+    def index(self, value):
+        value = min(max(int(value), 0), self.max_value)
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return self.sub_bucket_count + (shift - 1) * self.half_count + ((value >> shift) - self.half_count)
+
+    def highest_value(self, index):
+        """The highest value counted in bucket `index`"""
+        if index < self.sub_bucket_count:
+            return index
+        shift, offset = divmod(index - self.sub_bucket_count, self.half_count)
+        shift += 1
+        return ((offset + self.half_count + 1) << shift) - 1
+
+    def percentile(self, counts, fraction):
+        """The highest value of the bucket holding the given fraction of the values in counts, None if empty"""
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = max(1, int(round(fraction * total)))
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return self.highest_value(index)
+        return self.highest_value(len(counts) - 1)
+
+
+def classify_error(exc):
+    """Returns 'timeouts', 'unavailables' or 'errors' for a request error"""
+    if isinstance(exc, TIMEOUT_ERRORS):
+        return 'timeouts'
+    if isinstance(exc, UNAVAILABLE_ERRORS):
+        return 'unavailables'
+    return 'errors'
+
+
+class LatencyRecorder(object):
+    """
+    Latencies of successful requests and counts of failed ones, shared between the
+    process that creates the recorder and the worker processes it is passed to.
+
+    record() and record_error() may be called from any thread of a worker; they only
+    update local state, which flush() merges into shared memory.
+
+    @param max_seconds Highest latency told apart; slower requests count as this long
+    @param precision_bits Bucket precision, see HistogramBuckets
+    @param ctx The multiprocessing context the recorder is shared in, the default one if None
+    """
+
+    def __init__(self, max_seconds=60, precision_bits=7, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self.buckets = HistogramBuckets(int(max_seconds * 1000000), precision_bits)
+        self._counts = ctx.RawArray(ctypes.c_longlong, self.buckets.size)
+        self._stats = ctx.RawArray(ctypes.c_longlong, 4)
+        self._lock = ctx.Lock()
+        self._reset_local()
+
+    def _reset_local(self):
+        self._local_lock = threading.Lock()
+        self._local_counts = {}
+        self._local_stats = [0, 0, 0, 0]
+
+    def __getstate__(self):
+        # only the shared parts go to a spawned worker
+        state = self.__dict__.copy()
+        for name in ('_local_lock', '_local_counts', '_local_stats'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_local()
+
+    def record(self, seconds):
+        microseconds = int(seconds * 1000000)
+        index = self.buckets.index(microseconds)
+        with self._local_lock:
+            self._local_counts[index] = self._local_counts.get(index, 0) + 1
+            self._local_stats[MAX_LATENCY] = max(self._local_stats[MAX_LATENCY], microseconds)
+
+    def record_error(self, exc):
+        position = {'timeouts': TIMEOUTS, 'unavailables': UNAVAILABLES, 'errors': ERRORS}[classify_error(exc)]
+        with self._local_lock:
+            self._local_stats[position] += 1
+
+    def flush(self):
+        """Merges what this process recorded since the last flush into shared memory"""
+        with self._local_lock:
+            counts, stats = self._local_counts, self._local_stats
+            self._local_counts, self._local_stats = {}, [0, 0, 0, 0]
+        with self._lock:
+            for index, count in counts.items():
+                self._counts[index] += count
+            for position in (TIMEOUTS, UNAVAILABLES, ERRORS):
+                self._stats[position] += stats[position]
+            self._stats[MAX_LATENCY] = max(self._stats[MAX_LATENCY], stats[MAX_LATENCY])
+
+    def snapshot(self):
+        """Returns (bucket counts, [timeouts, unavailables, errors, max latency in microseconds]) merged so far"""
+        with self._lock:
+            return list(self._counts), list(self._stats)
+
+
+class LatencyPhases(object):
+    """
+    Splits the measurements of a set of LatencyRecorders into consecutive named phases,
+    see the module documentation.
+
+    @param recorders Dict of worker name to LatencyRecorder
+    """
+
+    def __init__(self, recorders):
+        self.recorders = recorders
+        self.phases = []
+        self._current = None
+
+    def _snapshot(self):
+        return time.time(), {name: recorder.snapshot() for name, recorder in self.recorders.items()}
+
+    def enter(self, phase):
+        """Ends the current phase, if any, and starts `phase`"""
+        now = self._snapshot()
+        if self._current is not None:
+            self._close(now)
+        self._current = (phase, now)
+        logger.debug("Entering phase '{}'".format(phase))
+
+    def _close(self, now):
+        phase, (start, start_snapshots) = self._current
+        summary = {'phase': phase, 'seconds': round(now[0] - start, 3)}
+        for name, recorder in self.recorders.items():
+            start_counts, start_stats = start_snapshots[name]
+            end_counts, end_stats = now[1][name]
+            counts = [end - begin for begin, end in zip(start_counts, end_counts)]
+            summary[name] = self._summarize(recorder.buckets, counts,
+                                            [end - begin for begin, end in zip(start_stats, end_stats)])
+        self.phases.append(summary)
+        self._current = None
+
+    @staticmethod
+    def _summarize(buckets, counts, stats):
+        def milliseconds(microseconds):
+            return None if microseconds is None else round(microseconds / 1000.0, 3)
+
+        highest = max((index for index, count in enumerate(counts) if count), default=None)
+        return {'requests': sum(counts),
+                'p50_ms': milliseconds(buckets.percentile(counts, 0.50)),
+                'p99_ms': milliseconds(buckets.percentile(counts, 0.99)),
+                'max_ms': milliseconds(buckets.highest_value(highest) if highest is not None else None),
+                'timeouts': stats[TIMEOUTS],
+                'unavailables': stats[UNAVAILABLES],
+                'errors': stats[ERRORS]}
+
+    def finish(self):
+        """Ends the current phase and returns the list of all phase summaries"""
+        if self._current is not None:
+            self._close(self._snapshot())
+        return self.phases
+
+
+def format_phase_report(phases):
+    """Formats phase summaries as returned by LatencyPhases.finish() as a table"""
+    header = '{:<40} {:<12} {:>6} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8} {:>7}'.format(
+        'phase', 'worker', 'secs', 'requests', 'p50 ms', 'p99 ms', 'max ms', 'timeouts', 'unavail', 'errors')
+    lines = [header, '-' * len(header)]
+
+    def number(value):
+        return '-' if value is None else '{:.1f}'.format(value)
+
+    for phase in phases:
+        for name in sorted(key for key in phase if key not in ('phase', 'seconds')):
+            worker = phase[name]
+            lines.append('{:<40} {:<12} {:>6.0f} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8} {:>7}'.format(
+                phase['phase'][:40], name[:12], phase['seconds'], worker['requests'], number(worker['p50_ms']),
+                number(worker['p99_ms']), number(worker['max_ms']), worker['timeouts'],
+                worker['unavailables'], worker['errors']))
+    return '\n'.join(lines)
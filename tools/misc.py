@@ -74,6 +74,33 @@ def generate_ssl_stores(base_dir, passphrase='cassandra'):
                            '-storepass', passphrase, '-noprompt'])
 
 
+def normalize_row(item_lst):
+    """
+    Converts a row into a plain list, turning any mapping values (e.g. the driver's
+    OrderedMapSerializedKey) into a flat [key, value, key, value, ...] list, so rows
+    from the driver and hand-written expected rows normalize to the same thing.
+    """
+    normalized_list = []
+    for item in item_lst:
+        if hasattr(item, "items"):
+            tmp_list = []
+            for a, b in item.items():
+                tmp_list.append(a)
+                tmp_list.append(b)
+            normalized_list.append(tmp_list)
+        else:
+            normalized_list.append(item)
+    return normalized_list
+
+
+def hash_row(item_lst):
+    """
+    :param item_lst the row to hash
+    :return: the sha256 hex digest of the normalized row, see normalize_row
+    """
+    return hashlib.sha256(str(normalize_row(item_lst)).encode('utf-8', 'ignore')).hexdigest()
+
+
 def list_to_hashed_dict(list):
     """
     takes a list and hashes the contents and puts them into a dict so the contents can be compared
@@ -87,18 +114,7 @@ def list_to_hashed_dict(list):
     """
     hashed_dict = dict()
     for item_lst in list:
-        normalized_list = []
-        for item in item_lst:
-            if hasattr(item, "items"):
-                tmp_list = []
-                for a, b in item.items():
-                    tmp_list.append(a)
-                    tmp_list.append(b)
-                normalized_list.append(tmp_list)
-            else:
-                normalized_list.append(item)
-        list_digest = hashlib.sha256(str(normalized_list).encode('utf-8', 'ignore')).hexdigest()
-        hashed_dict[list_digest] = normalized_list
+        hashed_dict[hash_row(item_lst)] = normalize_row(item_lst)
     return hashed_dict
 
 
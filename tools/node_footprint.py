@@ -0,0 +1,253 @@
+"""
+Sampling the process footprint of the nodes of a cluster while a test runs.
+
+NodeFootprintSampler polls, from a background thread, the JVM of every ccm node of a
+cluster: its resident memory, CPU time, open file descriptors, threads and the bytes it
+read from and wrote to disk. The pid of a node is looked up again at every sample, so a
+node restarted by the test is followed to its new JVM. The samples of each node are
+reduced to peaks and to deltas between the first and last sample, which tell off-heap
+leaks (RSS growing with the data written), fd leaks (e.g. while streaming) and threads
+piling up apart from a test that just uses a lot of them:
+
+    with NodeFootprintSampler(cluster, interval=0.5) as sampler:
+        node1.stress(['write', 'n=100K'])
+    assert sampler.footprint(node1).rss_delta < 100 * 1024 * 1024
+
+The summary of the footprints of the nodes is attached to the junit report of every test,
+see --footprint-interval.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class FootprintSample(namedtuple('FootprintSample', ('time', 'pid', 'rss', 'cpu_seconds', 'fds', 'threads',
+                                                     'read_bytes', 'write_bytes'))):
+    """
+    A sample of a node's JVM. fds is the number of open handles on Windows, and fds, read_bytes
+    and write_bytes are None when the platform or permissions don't give them.
+    """
+    __slots__ = ()
+
+
+def sample_process(process):
+    """
+    @param process A psutil.Process
+    @return A FootprintSample of the process
+    @raise psutil.NoSuchProcess if the process exited
+    """
+    with process.oneshot():
+        cpu = process.cpu_times()
+        try:
+            fds = process.num_fds() if hasattr(process, 'num_fds') else process.num_handles()
+        except psutil.AccessDenied:
+            fds = None
+        try:
+            io = process.io_counters()
+            read_bytes, write_bytes = io.read_bytes, io.write_bytes
+        except (psutil.AccessDenied, AttributeError, NotImplementedError):
+            read_bytes = write_bytes = None
+        return FootprintSample(time=time.time(), pid=process.pid, rss=process.memory_info().rss,
+                               cpu_seconds=cpu.user + cpu.system, fds=fds, threads=process.num_threads(),
+                               read_bytes=read_bytes, write_bytes=write_bytes)
+
+
+def _peak(samples, field):
+    values = [getattr(sample, field) for sample in samples if getattr(sample, field) is not None]
+    return max(values) if values else None
+
+
+def _delta(first, last, field):
+    if getattr(first, field) is None or getattr(last, field) is None:
+        return None
+    return getattr(last, field) - getattr(first, field)
+
+
+class NodeFootprint(object):
+    """
+    The samples of a node, see FootprintSample. The cumulative counters (CPU time and disk
+    bytes) are summed over the JVMs the node ran, while the deltas of the gauges (RSS, fds
+    and threads) are between the first and last samples of the last JVM, so a restart
+    doesn't count as a leak.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+
+    def add(self, sample):
+        self.samples.append(sample)
+
+    @property
+    def pids(self):
+        pids = []
+        for sample in self.samples:
+            if not pids or pids[-1] != sample.pid:
+                pids.append(sample.pid)
+        return pids
+
+    @property
+    def restarts(self):
+        return max(len(self.pids) - 1, 0)
+
+    def _runs(self):
+        """@return list of the (first, last) samples of every JVM the node ran"""
+        runs = []
+        for sample in self.samples:
+            if runs and runs[-1][0].pid == sample.pid:
+                runs[-1][1] = sample
+            else:
+                runs.append([sample, sample])
+        return runs
+
+    def _total(self, field):
+        deltas = [_delta(first, last, field) for first, last in self._runs()]
+        return sum(deltas) if deltas and None not in deltas else None
+
+    def _last_run_delta(self, field):
+        runs = self._runs()
+        return _delta(*runs[-1], field=field) if runs else None
+
+    @property
+    def peak_rss(self):
+        return _peak(self.samples, 'rss')
+
+    @property
+    def rss_delta(self):
+        return self._last_run_delta('rss')
+
+    @property
+    def peak_fds(self):
+        return _peak(self.samples, 'fds')
+
+    @property
+    def fds_delta(self):
+        return self._last_run_delta('fds')
+
+    @property
+    def peak_threads(self):
+        return _peak(self.samples, 'threads')
+
+    @property
+    def threads_delta(self):
+        return self._last_run_delta('threads')
+
+    @property
+    def cpu_seconds(self):
+        return self._total('cpu_seconds')
+
+    @property
+    def read_bytes(self):
+        return self._total('read_bytes')
+
+    @property
+    def write_bytes(self):
+        return self._total('write_bytes')
+
+    def as_dict(self):
+        return {'samples': len(self.samples), 'restarts': self.restarts, 'peak_rss': self.peak_rss,
+                'rss_delta': self.rss_delta, 'peak_fds': self.peak_fds, 'fds_delta': self.fds_delta,
+                'peak_threads': self.peak_threads, 'threads_delta': self.threads_delta,
+                'cpu_seconds': self.cpu_seconds, 'read_bytes': self.read_bytes, 'write_bytes': self.write_bytes}
+
+
+class NodeFootprintSampler(object):
+    """
+    Samples the JVMs of the nodes of a cluster every `interval` seconds from a background
+    thread, once started with start() or as a context manager, and once more when stopped.
+    Nodes added to the cluster after the start are sampled too.
+
+    @param cluster The ccm cluster, or a callable returning the cluster to sample, for a
+                   cluster that may be replaced while sampling; the nodes of the new cluster
+                   then count as restarts of the nodes of the same name
+    """
+
+    def __init__(self, cluster, interval=1.0):
+        self.cluster = cluster
+        self.interval = interval
+        self.footprints = {}
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _process(self, node):
+        pid = node.pid
+        if pid is None:
+            return None
+        process = self._processes.get(node.name)
+        if process is None or process.pid != pid:
+            process = psutil.Process(pid)
+            self._processes[node.name] = process
+        return process
+
+    def sample(self):
+        """Samples every running node once"""
+        cluster = self.cluster() if callable(self.cluster) else self.cluster
+        with self._lock:
+            for node in list(cluster.nodelist()):
+                try:
+                    process = self._process(node)
+                    if process is None:
+                        continue
+                    sample = sample_process(process)
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    # stopped or killed since ccm last saw it
+                    self._processes.pop(node.name, None)
+                    continue
+                except psutil.AccessDenied as e:
+                    logger.debug("Cannot sample {}: {}".format(node.name, e))
+                    continue
+                if node.name not in self.footprints:
+                    self.footprints[node.name] = NodeFootprint(node.name)
+                self.footprints[node.name].add(sample)
+
+    def footprint(self, node):
+        """@return The NodeFootprint of a node, or of a node name, empty if it was never sampled"""
+        name = getattr(node, 'name', node)
+        return self.footprints.get(name, NodeFootprint(name))
+
+    def summary(self):
+        """@return dict of node name to the dict of its NodeFootprint, for the nodes sampled"""
+        return {name: footprint.as_dict() for name, footprint in self.footprints.items() if footprint.samples}
+
+    def format_summary(self):
+        lines = []
+        for name, footprint in sorted(self.summary().items()):
+            lines.append('{}: peak rss {} bytes ({:+d}), peak fds {}, peak threads {}, {} restarts'.format(
+                name, footprint['peak_rss'], footprint['rss_delta'], footprint['peak_fds'],
+                footprint['peak_threads'], footprint['restarts']))
+        return '\n'.join(lines)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning("Error sampling node footprints: {}".format(e))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='node-footprint-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops sampling, after a last sample of the nodes still running. @return self"""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+            self.sample()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
@@ -0,0 +1,482 @@
+"""
+Running Cassandra's offline sstable tools in one JVM instead of one per invocation.
+
+On small test data, starting a JVM and loading Cassandra's classes takes most of the
+time of an sstableutil, sstableverify or sstablescrub run. OfflineToolRunner starts a
+single JVM for a node, with the tool classpath and the node's configuration, and
+executes a queue of tool invocations in it, each with its own arguments and captured
+stdout, stderr and exit status:
+
+    with OfflineToolRunner(node) as runner:
+        results = runner.run_all([('sstableutil', ['--type', 'tmp', 'ks', 'cf']),
+                                  ('sstableverify', ['ks', 'cf'])])
+        assert all(result.rc == 0 for result in results)
+
+Every invocation runs the tool's main class in a fresh class loader, so the static
+state of Cassandra (the loaded schema, the configuration) doesn't leak from one tool to
+the next, while the JVM and the JDK classes stay warm. System.exit() is trapped by a
+security manager and becomes the invocation's exit status, and the MBeans a tool
+registers are unregistered after it.
+
+Tools that aren't known to work in a shared JVM, invocations that ask for a fresh JVM,
+and everything when no javac is available to build the small Java harness, run as
+subprocesses of the tool scripts instead, as ccm does.
+"""
+import base64
+import hashlib
+import logging
+import os
+import re
+import select
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import namedtuple
+
+from ccmlib import common
+from ccmlib.node import ToolError
+
+logger = logging.getLogger(__name__)
+
+# the tools whose main class can run in the shared JVM
+TOOL_CLASSES = {
+    'sstabledump': 'org.apache.cassandra.tools.SSTableExport',
+    'sstableexpiredblockers': 'org.apache.cassandra.tools.SSTableExpiredBlockers',
+    'sstablelevelreset': 'org.apache.cassandra.tools.SSTableLevelResetter',
+    'sstablemetadata': 'org.apache.cassandra.tools.SSTableMetadataViewer',
+    'sstableofflinerelevel': 'org.apache.cassandra.tools.SSTableOfflineRelevel',
+    'sstablescrub': 'org.apache.cassandra.tools.StandaloneScrubber',
+    'sstablesplit': 'org.apache.cassandra.tools.StandaloneSplitter',
+    'sstableupgrade': 'org.apache.cassandra.tools.StandaloneUpgrader',
+    'sstableutil': 'org.apache.cassandra.tools.StandaloneSSTableUtil',
+    'sstableverify': 'org.apache.cassandra.tools.StandaloneVerifier',
+}
+
+HARNESS_CLASS = 'DtestToolBatch'
+HARNESS_SOURCE = r'''
+import java.io.*;
+import java.lang.management.ManagementFactory;
+import java.lang.reflect.InvocationTargetException;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.ArrayList;
+import java.util.Base64;
+import java.util.List;
+import javax.management.MBeanServer;
+import javax.management.ObjectName;
+
+/**
+ * Reads one tool invocation per line of stdin, as the base64 encoded main class and
+ * arguments separated by spaces, runs it in a fresh class loader over the classpath
+ * given as the only argument, and answers on stdout with a line of the exit status,
+ * the base64 encoded stdout and stderr of the tool, and its duration in milliseconds.
+ * An empty line ends the batch.
+ */
+public class DtestToolBatch
+{
+    static class ExitTrapped extends Error
+    {
+        ExitTrapped(int status)
+        {
+            super("System.exit(" + status + ")");
+        }
+    }
+
+    static volatile boolean trapExit = true;
+    static volatile Integer exitStatus;
+
+    public static void main(String[] args) throws Exception
+    {
+        List<URL> urls = new ArrayList<>();
+        for (String entry : args[0].split(File.pathSeparator))
+            if (!entry.isEmpty())
+                urls.add(new File(entry).toURI().toURL());
+
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "US-ASCII");
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.US_ASCII));
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+        System.setSecurityManager(new SecurityManager()
+        {
+            public void checkPermission(Permission permission) {}
+            public void checkPermission(Permission permission, Object context) {}
+            public void checkExit(int status)
+            {
+                if (!trapExit)
+                    return;
+                if (exitStatus == null)
+                    exitStatus = status;
+                throw new ExitTrapped(status);
+            }
+        });
+        protocol.println("READY");
+
+        Base64.Decoder decoder = Base64.getDecoder();
+        Base64.Encoder encoder = Base64.getEncoder();
+        String line;
+        while ((line = requests.readLine()) != null && !line.isEmpty())
+        {
+            String[] fields = line.split(" ", -1);
+            String[] toolArgs = new String[fields.length - 1];
+            for (int i = 1; i < fields.length; i++)
+                toolArgs[i - 1] = new String(decoder.decode(fields[i]), StandardCharsets.UTF_8);
+
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            PrintStream stdout = System.out, stderr = System.err;
+            System.setOut(new PrintStream(out, true));
+            System.setErr(new PrintStream(err, true));
+            long start = System.nanoTime();
+            int status = run(urls.toArray(new URL[0]), new String(decoder.decode(fields[0]), StandardCharsets.UTF_8), toolArgs);
+            System.out.flush();
+            System.err.flush();
+            System.setOut(stdout);
+            System.setErr(stderr);
+            unregisterCassandraMBeans();
+            protocol.println(status + " " + encoder.encodeToString(out.toByteArray()) + " "
+                             + encoder.encodeToString(err.toByteArray()) + " " + (System.nanoTime() - start) / 1000000);
+        }
+        trapExit = false;
+        // tools leave non daemon threads and shutdown hooks behind
+        Runtime.getRuntime().halt(0);
+    }
+
+    static int run(URL[] urls, String className, String[] args)
+    {
+        exitStatus = null;
+        ClassLoader loader = new URLClassLoader(urls, ClassLoader.getSystemClassLoader().getParent());
+        Thread thread = Thread.currentThread();
+        ClassLoader previous = thread.getContextClassLoader();
+        thread.setContextClassLoader(loader);
+        try
+        {
+            Class.forName(className, true, loader).getMethod("main", String[].class).invoke(null, (Object) args);
+            return exitStatus == null ? 0 : exitStatus;
+        }
+        catch (Throwable t)
+        {
+            Throwable cause = t instanceof InvocationTargetException ? t.getCause() : t;
+            if (exitStatus != null)
+                return exitStatus;
+            // as the JVM does for an uncaught exception
+            cause.printStackTrace();
+            return 1;
+        }
+        finally
+        {
+            thread.setContextClassLoader(previous);
+        }
+    }
+
+    static void unregisterCassandraMBeans()
+    {
+        MBeanServer server = ManagementFactory.getPlatformMBeanServer();
+        for (ObjectName name : server.queryNames(null, null))
+        {
+            if (!name.getDomain().startsWith("org.apache.cassandra"))
+                continue;
+            try
+            {
+                server.unregisterMBean(name);
+            }
+            catch (Exception e)
+            {
+                // already gone
+            }
+        }
+    }
+}
+'''
+
+
+class ToolResult(namedtuple('ToolResult', ('tool', 'args', 'stdout', 'stderr', 'rc', 'seconds', 'in_jvm'))):
+    """
+    The outcome of a tool invocation: its decoded stdout and stderr, exit status and
+    duration, and whether it ran in the shared JVM (False for a subprocess).
+    """
+    __slots__ = ()
+
+    def check(self):
+        """
+        @return self
+        @raise ToolError if the tool exited with a non-zero status
+        """
+        if self.rc != 0:
+            raise ToolError([self.tool] + list(self.args), self.rc, self.stdout, self.stderr)
+        return self
+
+
+def _encode(value):
+    return base64.b64encode(value.encode('utf-8')).decode('ascii')
+
+
+def _decode(value):
+    return base64.b64decode(value).decode('utf-8', 'replace')
+
+
+class _ToolJVM(object):
+    """
+    A running harness JVM, talking the line protocol of HARNESS_SOURCE over its stdin and
+    stdout. Its own stderr, e.g. JVM warnings, goes to a temporary file.
+
+    @raise RuntimeError if it doesn't start
+    """
+
+    def __init__(self, command, env, startup_timeout=60):
+        self.command = command
+        self.invocations = 0
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=self._stderr)
+        try:
+            ready = self._readline(startup_timeout)
+        except (subprocess.TimeoutExpired, RuntimeError) as e:
+            ready = e
+        if ready != 'READY':
+            self.kill()
+            message = "Tool JVM failed to start ({}): {}".format(ready, self._stderr_tail())
+            self._stderr.close()
+            raise RuntimeError(message)
+
+    def _stderr_tail(self, length=4096):
+        self._stderr.seek(0, os.SEEK_END)
+        self._stderr.seek(max(0, self._stderr.tell() - length))
+        return self._stderr.read().decode('utf-8', 'replace')
+
+    def _readline(self, timeout):
+        readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not readable:
+            self.kill()
+            raise subprocess.TimeoutExpired(self.command, timeout)
+        line = self.process.stdout.readline()
+        if not line:
+            status = self.process.wait()
+            raise RuntimeError("Tool JVM exited with status {}: {}".format(status, self._stderr_tail()))
+        return line.decode('ascii').rstrip('\n')
+
+    def run(self, class_name, args, timeout):
+        """
+        Runs the main method of class_name with args.
+
+        @return the exit status, stdout, stderr and duration in seconds of the tool
+        @raise subprocess.TimeoutExpired if it took longer than timeout seconds; the JVM is killed
+        @raise RuntimeError if the JVM died
+        """
+        self.invocations += 1
+        request = ' '.join(_encode(field) for field in [class_name] + list(args)) + '\n'
+        try:
+            self.process.stdin.write(request.encode('ascii'))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise RuntimeError("Tool JVM is gone ({}): {}".format(e, self._stderr_tail()))
+        status, stdout, stderr, millis = self._readline(timeout).split(' ')
+        return int(status), _decode(stdout), _decode(stderr), int(millis) / 1000.0
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+    def close(self, timeout=30):
+        """Ends the batch, killing the JVM if it doesn't exit within timeout seconds"""
+        if self.alive():
+            try:
+                self.process.stdin.write(b'\n')
+                self.process.stdin.close()
+                self.process.wait(timeout)
+            except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+                pass
+        self.kill()
+        self._stderr.close()
+
+
+def _java_major_version(java):
+    output = subprocess.check_output([java, '-version'], stderr=subprocess.STDOUT).decode('utf-8', 'replace')
+    match = re.search(r'version "(\d+)(?:\.(\d+))?', output)
+    if not match:
+        raise ValueError("Unknown java version: {}".format(output))
+    major = int(match.group(1))
+    return int(match.group(2)) if major == 1 else major
+
+
+def _compile_harness(java):
+    """
+    Compiles HARNESS_SOURCE with the javac next to java, once per source and JDK, into a
+    temporary directory shared by the tests.
+
+    @return the directory holding the harness class
+    @raise OSError if there is no javac
+    """
+    javac = os.path.join(os.path.dirname(os.path.realpath(java)), 'javac')
+    if not os.path.exists(javac):
+        javac = shutil.which('javac')
+        if javac is None:
+            raise OSError("No javac found next to {} nor on the PATH".format(java))
+    digest = hashlib.sha1((HARNESS_SOURCE + os.path.realpath(javac)).encode('utf-8')).hexdigest()[:12]
+    classes = os.path.join(tempfile.gettempdir(), 'dtest-tool-batch-{}'.format(digest))
+    if os.path.exists(os.path.join(classes, HARNESS_CLASS + '.class')):
+        return classes
+
+    build = tempfile.mkdtemp(prefix='dtest-tool-batch-')
+    try:
+        source = os.path.join(build, HARNESS_CLASS + '.java')
+        with open(source, 'w') as f:
+            f.write(HARNESS_SOURCE)
+        subprocess.check_output([javac, '-nowarn', '-d', build, source], stderr=subprocess.STDOUT)
+        os.remove(source)
+        try:
+            os.rename(build, classes)
+        except OSError:
+            # compiled concurrently by another test process
+            shutil.rmtree(build)
+    except subprocess.CalledProcessError as e:
+        shutil.rmtree(build)
+        raise OSError("Could not compile the tool harness: {}".format(e.output.decode('utf-8', 'replace')))
+    return classes
+
+
+class OfflineToolRunner(object):
+    """
+    Runs the offline tools of a node, in a shared JVM where possible. Use it as a context
+    manager, or call close() to stop the JVM.
+
+    @param node The ccm node whose configuration and install the tools use; it is usually stopped
+    @param max_heap_size The -Xmx of the shared JVM, as the tool scripts use MAX_HEAP_SIZE
+    @param invocations_per_jvm The number of tool invocations after which the shared JVM is
+                               replaced, to bound the memory the class loaders of finished
+                               tools, and the threads they leave behind, hold on to
+    @param timeout The number of seconds after which a tool invocation is killed
+    """
+
+    def __init__(self, node, max_heap_size='256M', invocations_per_jvm=50, timeout=600):
+        self.node = node
+        self.max_heap_size = max_heap_size
+        self.invocations_per_jvm = invocations_per_jvm
+        self.timeout = timeout
+        self.results = []
+        self._env = common.make_cassandra_env(node.get_install_cassandra_root(), node.get_node_cassandra_root())
+        self._jvm = None
+        # why the shared JVM can't be used, once known
+        self._jvm_unavailable = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._jvm is not None:
+            self._jvm.close()
+            self._jvm = None
+
+    def tool_path(self, tool):
+        """The script of tool, in bin or tools/bin of the node's install"""
+        install_dir = self.node.get_install_cassandra_root()
+        for directory in ('bin', os.path.join('tools', 'bin')):
+            path = os.path.join(install_dir, directory, tool)
+            if os.path.exists(path):
+                return path
+        raise ValueError("No {} tool in {}".format(tool, install_dir))
+
+    def _include(self):
+        """CLASSPATH, cassandra_storagedir, JAVA and JVM_OPTS as the tool scripts get them from CASSANDRA_INCLUDE"""
+        script = '. "$CASSANDRA_INCLUDE" >/dev/null 2>&1; ' \
+                 'printf "%s\\n%s\\n%s\\n%s\\n" "$CLASSPATH" "$cassandra_storagedir" "$JAVA" "$JVM_OPTS"'
+        output = subprocess.check_output(['sh', '-c', script], env=self._env).decode('utf-8')
+        classpath, storage_dir, java, jvm_opts = (output.split('\n') + [''] * 4)[:4]
+        if not classpath:
+            raise OSError("CASSANDRA_INCLUDE {} sets no CLASSPATH".format(self._env.get('CASSANDRA_INCLUDE')))
+        return classpath, storage_dir, java or shutil.which('java'), jvm_opts
+
+    def _jvm_command(self):
+        """
+        The command starting the harness JVM, as the tool scripts start a tool
+
+        @raise OSError if there is no JDK to compile and run the harness
+        """
+        classpath, storage_dir, java, jvm_opts = self._include()
+        if java is None:
+            raise OSError("No java found")
+        command = [java, '-ea', '-cp', _compile_harness(java)] + shlex.split(jvm_opts)
+        command += ['-Xmx' + self.max_heap_size,
+                    '-Dcassandra.storagedir=' + storage_dir,
+                    '-Dlogback.configurationFile=logback-tools.xml',
+                    '-Dorg.apache.cassandra.disable_mbean_registration=true']
+        if _java_major_version(java) >= 12:
+            # the security manager trapping System.exit() must be allowed explicitly
+            command.append('-Djava.security.manager=allow')
+        return command + [HARNESS_CLASS, classpath]
+
+    def _shared_jvm(self):
+        """The running harness JVM, started or replaced as needed, or None if unavailable"""
+        if self._jvm is not None and (not self._jvm.alive() or self._jvm.invocations >= self.invocations_per_jvm):
+            self.close()
+        if self._jvm is None and self._jvm_unavailable is None:
+            try:
+                start = time.time()
+                self._jvm = _ToolJVM(self._jvm_command(), self._env)
+                logger.debug("Started shared tool JVM for {} in {:.2f}s".format(self.node.name, time.time() - start))
+            except (OSError, RuntimeError, ValueError, subprocess.CalledProcessError) as e:
+                self._jvm_unavailable = str(e)
+                logger.warning("Running offline tools as subprocesses: {}".format(e))
+        return self._jvm
+
+    def _run_subprocess(self, tool, args):
+        start = time.time()
+        process = subprocess.Popen([self.tool_path(tool)] + list(args), env=self._env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            stdout, stderr = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        return ToolResult(tool=tool, args=list(args), stdout=stdout.decode('utf-8', 'replace'),
+                          stderr=stderr.decode('utf-8', 'replace'), rc=process.returncode,
+                          seconds=time.time() - start, in_jvm=False)
+
+    def run(self, tool, args=(), fresh_jvm=False):
+        """
+        Runs a tool, in the shared JVM unless fresh_jvm, the tool isn't in TOOL_CLASSES or
+        the shared JVM is unavailable.
+
+        @param tool The name of the tool script, e.g. 'sstableutil'
+        @param args The arguments of the tool
+        @param fresh_jvm Whether the tool needs a JVM of its own
+        @return a ToolResult
+        @raise subprocess.TimeoutExpired if the tool ran longer than the runner's timeout
+        """
+        jvm = None if fresh_jvm or tool not in TOOL_CLASSES else self._shared_jvm()
+        if jvm is None:
+            result = self._run_subprocess(tool, args)
+        else:
+            try:
+                rc, stdout, stderr, seconds = jvm.run(TOOL_CLASSES[tool], args, self.timeout)
+                result = ToolResult(tool=tool, args=list(args), stdout=stdout, stderr=stderr, rc=rc,
+                                    seconds=seconds, in_jvm=True)
+            except RuntimeError as e:
+                # the tool took the JVM down with it; give it a JVM of its own
+                logger.warning("Shared tool JVM died running {} {}, retrying as a subprocess: {}"
+                               .format(tool, ' '.join(args), e))
+                self.close()
+                result = self._run_subprocess(tool, args)
+        logger.debug("{} {} exited with {} in {:.2f}s{}".format(
+            tool, ' '.join(args), result.rc, result.seconds, '' if result.in_jvm else ' (subprocess)'))
+        self.results.append(result)
+        return result
+
+    def run_all(self, invocations):
+        """
+        Runs a queue of tool invocations, one after the other.
+
+        @param invocations An iterable of (tool, args) or (tool, args, fresh_jvm) tuples
+        @return the list of their ToolResults, in order
+        """
+        return [self.run(*invocation) for invocation in invocations]
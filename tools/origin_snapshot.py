@@ -0,0 +1,98 @@
+"""
+Origin-version clusters shared by the tests of an upgrade class.
+
+Every test of a generated upgrade class (TestCQL<topology><pair>, the paging upgrade
+classes, ...) starts from the same cluster: UpgradeTester.prepare() populates it on the
+origin version, boots it for the first time and creates the test keyspace. OriginSnapshots
+keeps, per class, the data directories of that cluster once it has been prepared and
+stopped, so later tests of the class restore them into their freshly populated cluster
+instead of initializing a new one:
+
+    snapshots = OriginSnapshots()
+    key = snapshots.key(cluster, nodes=2, rf=1)
+    if snapshots.has(key):
+        snapshots.restore(key, cluster)     # before the nodes are started
+    else:
+        ... start the cluster, create the keyspace, stop the cluster ...
+        snapshots.save(key, cluster)
+
+Only the directories Cassandra writes to are kept; the configuration of the nodes is
+written again by ccm when the cluster is populated, so it points to the new test directory.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# node directories that hold the state of a stopped node, next to its data directories
+STATE_DIRECTORIES = ('commitlogs', 'saved_caches', 'hints', 'cdc_raw')
+
+
+def node_state_directories(node):
+    """The names of the directories under node.get_path() that hold its state"""
+    data_directories = ['data{}'.format(x) for x in range(node.cluster.data_dir_count)]
+    return data_directories + list(STATE_DIRECTORIES)
+
+
+class OriginSnapshots(object):
+    """
+    The stopped data directories of prepared origin-version clusters, see the module
+    documentation.
+
+    @param root The directory to keep snapshots in, a new temporary directory if None
+    """
+
+    def __init__(self, root=None):
+        self.root = root or tempfile.mkdtemp(prefix='dtest-origin-')
+        self._snapshots = {}
+
+    def key(self, cluster, **settings):
+        """
+        Identifies the origin cluster a test prepares: its configuration and partitioner,
+        which tests may change before preparing, and whatever else prepare depends on
+        (node count, replication factor, ...) passed as settings.
+        """
+        description = {'config': cluster._config_options,
+                       'partitioner': cluster.partitioner,
+                       'data_dir_count': cluster.data_dir_count,
+                       'settings': settings}
+        return hashlib.sha1(json.dumps(description, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def has(self, key):
+        return key in self._snapshots
+
+    def save(self, key, cluster):
+        """Copies the state of the stopped nodes of cluster into the snapshot `key`"""
+        path = os.path.join(self.root, key)
+        for node in cluster.nodelist():
+            for name in node_state_directories(node):
+                source = os.path.join(node.get_path(), name)
+                if os.path.isdir(source):
+                    shutil.copytree(source, os.path.join(path, node.name, name), symlinks=True)
+        self._snapshots[key] = path
+        logger.debug("Saved origin cluster snapshot {} of {} nodes to {}".format(key, len(cluster.nodelist()), path))
+
+    def restore(self, key, cluster):
+        """
+        Replaces the state of the stopped nodes of cluster with the snapshot `key`.
+
+        @raise KeyError if there is no such snapshot
+        """
+        path = self._snapshots[key]
+        for node in cluster.nodelist():
+            for name in node_state_directories(node):
+                target = os.path.join(node.get_path(), name)
+                source = os.path.join(path, node.name, name)
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                if os.path.isdir(source):
+                    shutil.copytree(source, target, symlinks=True)
+        logger.debug("Restored origin cluster snapshot {} into {}".format(key, cluster.get_path()))
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._snapshots = {}
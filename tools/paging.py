@@ -1,7 +1,12 @@
+import logging
+import threading
 import time
 
 from tools.datahelp import flatten_into_set
-from tools.misc import list_to_hashed_dict
+from tools.misc import hash_row, list_to_hashed_dict
+
+logger = logging.getLogger(__name__)
+
 
 class Page(object):
     data = None
@@ -13,6 +18,34 @@ class Page(object):
         self.data.append(row)
 
 
+DIGEST_MODULUS = 2 ** 256
+
+
+def rows_digest(rows):
+    """
+    Order-independent digest of rows: the sum, modulo 2 ** 256, of the hash of every row.
+    Rows of the dict_factory are hashed by their items rather than by their keys alone.
+    """
+    return sum(int(hash_row(sorted(row.items()) if isinstance(row, dict) else row), 16)
+               for row in rows) % DIGEST_MODULUS
+
+
+class PageStats(object):
+    """
+    Size and fetch latency of one retrieved page. latency is the time, in seconds,
+    between requesting the page and the driver handing it over.
+    """
+
+    def __init__(self, page_num, rows, latency):
+        self.page_num = page_num
+        self.rows = rows
+        self.latency = latency
+
+    def __repr__(self):
+        return '{cls}(page_num={page_num}, rows={rows}, latency={latency:.4f})'.format(
+            cls=self.__class__.__name__, page_num=self.page_num, rows=self.rows, latency=self.latency)
+
+
 class PageFetcher(object):
     """
     Requests pages, handles their receipt,
@@ -20,16 +53,33 @@ class PageFetcher(object):
 
     The first page is automatically retrieved, so an initial
     call to request_one is actually getting the *second* page!
+
+    If a consumer is given, the fetcher streams instead of storing: every non-empty
+    page is passed to consumer(page_num, rows) as it arrives and only its size,
+    latency and an order-independent digest of its rows are kept, so memory does
+    not grow with the number of pages. page_data and all_data are not available
+    in that mode. The consumer runs on the driver's callback thread; an exception
+    it raises is kept and re-raised by the next wait for pages.
     """
     pages = None
     error = None
+    consumer_error = None
     future = None
+    consumer = None
     requested_pages = None
     retrieved_pages = None
     retrieved_empty_pages = None
+    page_stats = None
+    row_count = None
+    digest = None
 
-    def __init__(self, future):
+    def __init__(self, future, consumer=None):
         self.pages = []
+        self.page_stats = []
+        self.consumer = consumer
+        self.row_count = 0
+        self.digest = 0
+        self._condition = threading.Condition()
 
         # the first page is automagically returned (eventually)
         # so we'll count this as a request, but the retrieved count
@@ -37,6 +87,7 @@ class PageFetcher(object):
         self.requested_pages = 1
         self.retrieved_pages = 0
         self.retrieved_empty_pages = 0
+        self._requested_at = time.time()
 
         self.future = future
         self.future.add_callbacks(
@@ -50,23 +101,55 @@ class PageFetcher(object):
         self.wait(seconds=30)
 
     def handle_page(self, rows):
+        latency = time.time() - self._requested_at
+
         # occasionally get a final blank page that is useless
         if rows == []:
-            self.retrieved_empty_pages += 1
+            with self._condition:
+                self.retrieved_empty_pages += 1
+                self._condition.notify_all()
             return
 
-        page = Page()
-        self.pages.append(page)
-
-        for row in rows:
-            page.add_row(row)
-
-        self.retrieved_pages += 1
+        page_num = self.retrieved_pages + 1
+        if self.consumer is not None:
+            rows = list(rows)
+            try:
+                self.consumer(page_num, rows)
+            except Exception as exc:
+                # raising here would only reach the driver, so hand it to the waiting thread
+                with self._condition:
+                    self.consumer_error = exc
+                    self._condition.notify_all()
+                return
+            page_digest = rows_digest(rows)
+        else:
+            page = Page()
+            for row in rows:
+                page.add_row(row)
+            rows = page.data
+
+        with self._condition:
+            if self.consumer is None:
+                self.pages.append(page)
+            else:
+                self.digest = (self.digest + page_digest) % DIGEST_MODULUS
+            self.page_stats.append(PageStats(page_num, len(rows), latency))
+            self.row_count += len(rows)
+            self.retrieved_pages += 1
+            self._condition.notify_all()
 
     def handle_error(self, exc):
-        self.error = exc
+        with self._condition:
+            self.error = exc
+            self._condition.notify_all()
         raise exc
 
+    def _request_next_page(self):
+        self._requested_at = time.time()
+        with self._condition:
+            self.requested_pages += 1
+        self.future.start_fetching_next_page()
+
     def request_one(self, timeout=None):
         """
         Requests the next page if there is one.
@@ -75,8 +158,7 @@ class PageFetcher(object):
         @param timeout Time, in seconds, to wait for all pages.
         """
         if self.future.has_more_pages:
-            self.future.start_fetching_next_page()
-            self.requested_pages += 1
+            self._request_next_page()
             self.wait(seconds=timeout)
 
         return self
@@ -89,32 +171,39 @@ class PageFetcher(object):
         @param timeout Time, in seconds, to wait for all pages.
         """
         while self.future.has_more_pages:
-            self.future.start_fetching_next_page()
-            self.requested_pages += 1
+            self._request_next_page()
             self.wait(seconds=timeout)
 
+        logger.debug("Retrieved {} rows in {} pages, fetch latency: {}".format(
+            self.row_count, self.retrieved_pages, self.latency_summary()))
         return self
 
+    def _all_requested_pages_retrieved(self):
+        return self.requested_pages == (self.retrieved_pages + self.retrieved_empty_pages)
+
     def wait(self, seconds=None):
         """
         Blocks until all *requested* pages have been returned.
 
         Requests are made by calling request_one and/or request_all.
 
-        Raises RuntimeError if seconds is exceeded.
+        Raises RuntimeError if seconds is exceeded, or the exception the consumer
+        raised on a page if it did.
         """
         seconds = 5 if seconds is None else seconds
-        expiry = time.time() + seconds
 
-        while time.time() < expiry:
-            if self.requested_pages == (self.retrieved_pages + self.retrieved_empty_pages):
+        with self._condition:
+            done = self._condition.wait_for(
+                lambda: self.consumer_error is not None or self._all_requested_pages_retrieved(), timeout=seconds)
+            if self.consumer_error is not None:
+                raise self.consumer_error
+            if done:
                 return self
-            # small wait so we don't need excess cpu to keep checking
-            time.sleep(0.1)
 
-        raise RuntimeError(
-            "Requested pages were not delivered before timeout. " +
-            "Requested: {}; retrieved: {}; empty retrieved: {}".format(self.requested_pages, self.retrieved_pages, self.retrieved_empty_pages))
+            # the error of a failed page, if any, is chained rather than added to the message
+            raise RuntimeError(
+                "Requested pages were not delivered before timeout. Requested: {}; retrieved: {}; empty retrieved: {}"
+                .format(self.requested_pages, self.retrieved_pages, self.retrieved_empty_pages)) from self.error
 
     def pagecount(self):
         """
@@ -122,16 +211,21 @@ class PageFetcher(object):
 
         Pages are retrieved by requesting them with request_one and/or request_all.
         """
-        return len(self.pages)
+        return self.retrieved_pages
 
     def num_results(self, page_num):
         """
         Returns the number of results found at page_num
         """
-        return len(self.pages[page_num - 1].data)
+        return self.page_stats[page_num - 1].rows
 
     def num_results_all(self):
-        return [len(page.data) for page in self.pages]
+        return [stats.rows for stats in self.page_stats]
+
+    def _stored_pages(self):
+        if self.consumer is not None:
+            raise RuntimeError("Page data is not retained when streaming pages to a consumer")
+        return self.pages
 
     def page_data(self, page_num):
         """
@@ -139,7 +233,7 @@ class PageFetcher(object):
 
         The page should have already been requested with request_one and/or request_all.
         """
-        return self.pages[page_num - 1].data
+        return self._stored_pages()[page_num - 1].data
 
     def all_data(self):
         """
@@ -148,11 +242,26 @@ class PageFetcher(object):
         The page(s) should have already been requested with request_one and/or request_all.
         """
         all_pages_combined = []
-        for page in self.pages:
+        for page in self._stored_pages():
             all_pages_combined.extend(page.data[:])
 
         return all_pages_combined
 
+    def latency_summary(self):
+        """
+        Returns a dict with the number of retrieved non-empty pages and the min, mean,
+        p50, p99 and max of their fetch latencies in seconds (None if no pages).
+        """
+        latencies = sorted(stats.latency for stats in self.page_stats)
+        if not latencies:
+            return {'pages': 0, 'min': None, 'mean': None, 'p50': None, 'p99': None, 'max': None}
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {'pages': len(latencies), 'min': latencies[0], 'mean': sum(latencies) / len(latencies),
+                'p50': percentile(0.50), 'p99': percentile(0.99), 'max': latencies[-1]}
+
     @property  # make property to match python driver api
     def has_more_pages(self):
         """
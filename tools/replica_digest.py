@@ -0,0 +1,140 @@
+"""
+Replica-local data verification.
+
+Checking what an individual replica holds used to mean stopping every other node,
+reading through the remaining one, then restarting them all. The helpers here read
+each token range a node replicates through an exclusive connection to that node at
+CL.ONE, with speculative retry and read repair disabled on the table, and compute an
+order-independent RowDigest per range. Comparing the digests of two replicas shows
+which ranges differ, without any node restarts:
+
+    digests = replica_digests(self, [node1, node2, node3], 'ks', 'cf')
+    assert differing_ranges(digests[node1], digests[node3]) == []
+
+By default every range read is traced, and the digest fails with an AssertionError if
+any other replica took part in serving it, so a snitch that prefers a remote replica
+can not silently produce a digest of the wrong node's data.
+"""
+import logging
+from contextlib import contextmanager
+
+from cassandra import ConsistencyLevel
+
+from dtest import get_ip_from_node
+from tools.scanner import RowDigest, TokenRangeScanner
+
+logger = logging.getLogger(__name__)
+
+
+def replica_token_ranges(session, keyspace, address):
+    """
+    Returns the (start, end) token ranges, in TokenRangeScanner form, for which the
+    host at `address` is a replica in `keyspace`. The range wrapping around the end
+    of the ring is returned as its two halves.
+    """
+    cluster_metadata = session.cluster.metadata
+    token_map = cluster_metadata.token_map
+    ring = token_map.ring
+    ranges = []
+    for i, token in enumerate(ring):
+        if address not in {host.address for host in token_map.get_replicas(keyspace, token)}:
+            continue
+        if i == 0:
+            if len(ring) > 1:
+                ranges.append((ring[-1].value, None))
+            ranges.append((None, token.value))
+        else:
+            ranges.append((ring[i - 1].value, token.value))
+    if len(ring) == 1 and ranges:
+        # a single token owns the whole ring
+        ranges = [(None, None)]
+    return ranges
+
+
+def _table_options(session, keyspace, table):
+    session.cluster.refresh_table_metadata(keyspace, table)
+    return session.cluster.metadata.keyspaces[keyspace].tables[table].options
+
+
+@contextmanager
+def replica_local_reads(session, keyspace, table):
+    """
+    Context manager disabling speculative retry and read repair on a table, so that
+    CL.ONE reads are answered by a single replica and never write back to others.
+    The previous settings are restored on exit.
+    """
+    options = _table_options(session, keyspace, table)
+    overrides = {'speculative_retry': "'NONE'"}
+    if 'read_repair' in options:
+        overrides['read_repair'] = "'NONE'"
+    for option in ('read_repair_chance', 'dclocal_read_repair_chance'):
+        if option in options:
+            overrides[option] = '0'
+
+    def quoted(option, value):
+        return "'{}'".format(value) if option in ('speculative_retry', 'read_repair') else value
+
+    previous = {option: quoted(option, options[option]) for option in overrides if option in options}
+
+    def alter(values):
+        session.execute("ALTER TABLE {ks}.{table} WITH {options}".format(
+            ks=keyspace, table=table,
+            options=' AND '.join('{} = {}'.format(option, value) for option, value in sorted(values.items()))))
+        session.cluster.control_connection.wait_for_schema_agreement(wait_time=120)
+
+    alter(overrides)
+    try:
+        yield
+    finally:
+        if previous:
+            alter(previous)
+
+
+def replica_digest(tester, node, keyspace, table, verify_locality=True, **kwargs):
+    """
+    Reads every token range `node` replicates for `keyspace`.`table` from `node` only
+    and returns a RowDigest with per-range counts and digests. Speculative retry and
+    read repair must already be disabled, see replica_local_reads.
+
+    @param tester The dtest.Tester used to create the exclusive connection
+    @param node The replica to read from
+    @param verify_locality Trace every range read and fail if another node served it
+    @param kwargs Passed on to TokenRangeScanner (e.g. columns, concurrency, fetch_size)
+    """
+    address = get_ip_from_node(node)
+    session = tester.patient_exclusive_cql_connection(node)
+    try:
+        token_ranges = replica_token_ranges(session, keyspace, address)
+        scanner = TokenRangeScanner(session, '{}.{}'.format(keyspace, table),
+                                    consistency_level=ConsistencyLevel.ONE,
+                                    token_ranges=token_ranges,
+                                    expected_source=address if verify_locality else None,
+                                    **kwargs)
+        digest = scanner.scan(RowDigest())
+    finally:
+        session.cluster.shutdown()
+    logger.debug("{} holds {} rows of {}.{} over {} ranges".format(
+        node.name, digest.count, keyspace, table, len(token_ranges)))
+    return digest
+
+
+def replica_digests(tester, nodes, keyspace, table, **kwargs):
+    """
+    Returns a dict of node to replica_digest() for each of `nodes`, with speculative
+    retry and read repair disabled on the table for the duration of the reads.
+    """
+    session = tester.patient_exclusive_cql_connection(nodes[0])
+    try:
+        with replica_local_reads(session, keyspace, table):
+            return {node: replica_digest(tester, node, keyspace, table, **kwargs) for node in nodes}
+    finally:
+        session.cluster.shutdown()
+
+
+def differing_ranges(first, second):
+    """
+    Returns the token ranges replicated by both RowDigests whose contents differ.
+    Ranges only one of the replicas holds are ignored.
+    """
+    shared = set(first.per_range) & set(second.per_range)
+    return [token_range for token_range in first.differing_ranges(second) if token_range in shared]
@@ -0,0 +1,163 @@
+"""
+Streaming comparison of query results against expected rows.
+
+assert_all turns the whole result into a list, sorts both sides when order does not
+matter, and puts both lists in the failure message. For results with hundreds of
+thousands of rows that is slow and produces enormous messages. The functions here
+consume the driver's paged result lazily, so memory is bounded by the page size
+(plus one hash per expected row when order is ignored), stop after a configurable
+number of differences, and describe only those differences.
+"""
+from collections import Counter, defaultdict
+
+from tools.misc import hash_row
+
+MAX_ROW_REPR = 200
+
+
+class RowDifference(object):
+    """
+    One difference between actual and expected rows.
+
+    kind is 'mismatch' (both sides have a row at this position but they differ),
+    'missing' (an expected row was not returned) or 'unexpected' (a returned row
+    was not expected). position is the 0-based row position in the result, or in
+    the expected rows for 'missing' rows when order is ignored.
+    """
+
+    def __init__(self, kind, position, expected=None, actual=None):
+        self.kind = kind
+        self.position = position
+        self.expected = expected
+        self.actual = actual
+
+    def __repr__(self):
+        if self.kind == 'mismatch':
+            return 'row {}: expected {} but got {}'.format(
+                self.position, _short_repr(self.expected), _short_repr(self.actual))
+        if self.kind == 'missing':
+            return 'row {}: missing expected {}'.format(self.position, _short_repr(self.expected))
+        return 'row {}: unexpected {}'.format(self.position, _short_repr(self.actual))
+
+    def __eq__(self, other):
+        return isinstance(other, RowDifference) and \
+            (self.kind, self.position, self.expected, self.actual) == \
+            (other.kind, other.position, other.expected, other.actual)
+
+
+def _short_repr(row):
+    text = repr(row)
+    return text if len(text) <= MAX_ROW_REPR else text[:MAX_ROW_REPR] + '...'
+
+
+class ComparisonResult(object):
+    """
+    Outcome of a streaming comparison. If the comparison stopped early because
+    max_differences was reached, truncated is True and the counts are lower bounds.
+    """
+
+    def __init__(self):
+        self.differences = []
+        self.actual_count = 0
+        self.expected_count = 0
+        self.truncated = False
+
+    @property
+    def equal(self):
+        return not self.differences
+
+    def describe(self, query=None):
+        source = ' from {}'.format(query) if query is not None else ''
+        qualifier = 'at least ' if self.truncated else ''
+        lines = ['Expected {q}{e} rows{source}, but got {q}{a}; {n} difference(s){more}:'.format(
+            q=qualifier, e=self.expected_count, a=self.actual_count, source=source,
+            n=len(self.differences), more=' (stopped looking after these)' if self.truncated else '')]
+        lines.extend('  {!r}'.format(difference) for difference in self.differences)
+        return '\n'.join(lines)
+
+
+def _rows_equal(actual, expected):
+    return list(actual) == list(expected)
+
+
+def compare_ordered(actual, expected, max_differences=10):
+    """
+    Compares two iterables of rows position by position, consuming both lazily.
+    """
+    result = ComparisonResult()
+    actual, expected = iter(actual), iter(expected)
+    missing = object()
+    position = 0
+    while True:
+        actual_row = next(actual, missing)
+        expected_row = next(expected, missing)
+        if actual_row is missing and expected_row is missing:
+            return result
+        if actual_row is not missing:
+            result.actual_count += 1
+        if expected_row is not missing:
+            result.expected_count += 1
+
+        if actual_row is missing:
+            result.differences.append(RowDifference('missing', position, expected=list(expected_row)))
+        elif expected_row is missing:
+            result.differences.append(RowDifference('unexpected', position, actual=list(actual_row)))
+        elif not _rows_equal(actual_row, expected_row):
+            result.differences.append(RowDifference('mismatch', position, expected=list(expected_row),
+                                                    actual=list(actual_row)))
+
+        if len(result.differences) >= max_differences:
+            result.truncated = next(actual, missing) is not missing or next(expected, missing) is not missing
+            return result
+        position += 1
+
+
+def compare_unordered(actual, expected, max_differences=10):
+    """
+    Compares two iterables of rows as multisets. Expected rows are reduced to a
+    count per row hash (plus the positions where the row occurs), then the actual
+    rows are streamed against those counts. Every missing occurrence of a duplicate
+    row is reported. If `expected` is a sequence, the missing rows are reported with
+    their values; otherwise only their positions are known.
+    """
+    result = ComparisonResult()
+    remaining = Counter()
+    positions = defaultdict(list)
+    for position, row in enumerate(expected):
+        digest = hash_row(row)
+        remaining[digest] += 1
+        positions[digest].append(position)
+        result.expected_count += 1
+
+    for position, row in enumerate(actual):
+        result.actual_count += 1
+        digest = hash_row(row)
+        if remaining.get(digest, 0) > 0:
+            remaining[digest] -= 1
+            continue
+        result.differences.append(RowDifference('unexpected', position, actual=list(row)))
+        if len(result.differences) >= max_differences:
+            result.truncated = True
+            return result
+
+    indexable = hasattr(expected, '__getitem__')
+    # the last occurrences of a row are the ones reported missing, as the first ones were matched
+    missing = sorted(position for digest, count in remaining.items() if count > 0
+                     for position in positions[digest][-count:])
+    for position in missing:
+        result.differences.append(RowDifference('missing', position,
+                                                expected=list(expected[position]) if indexable else None))
+        if len(result.differences) >= max_differences:
+            result.truncated = len(missing) > max_differences
+            return result
+    return result
+
+
+def compare_rows(actual, expected, ignore_order=False, max_differences=10):
+    """
+    Compares actual rows (e.g. a paged driver ResultSet) against expected rows,
+    without materializing the actual rows. See compare_ordered and compare_unordered.
+    """
+    if ignore_order:
+        return compare_unordered(actual, expected, max_differences=max_differences)
+    return compare_ordered(actual, expected, max_differences=max_differences)
@@ -0,0 +1,248 @@
+"""
+Token-range-parallel table scans.
+
+A single "SELECT * FROM t" or "SELECT COUNT(*) FROM t" at CL.ALL has to be served
+by one coordinator and tends to time out on large tables. TokenRangeScanner instead
+splits the token ring into sub-ranges, queries them concurrently with
+
+    SELECT ... FROM t WHERE token(pk) > ? AND token(pk) <= ?
+
+and streams every page of rows into a consumer. Consumers provided here count rows,
+compute an order-independent digest, or compare against a tools.datagen.DataGenerator:
+
+    counter = TokenRangeScanner(session, 'ks.cf', splits=64).scan(RowCounter())
+    assert counter.count == 1000000
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cassandra import ConsistencyLevel
+from cassandra.metadata import protect_name
+from cassandra.query import SimpleStatement
+
+logger = logging.getLogger(__name__)
+
+MURMUR3_PARTITIONER = 'org.apache.cassandra.dht.Murmur3Partitioner'
+RANDOM_PARTITIONER = 'org.apache.cassandra.dht.RandomPartitioner'
+BYTE_ORDERED_PARTITIONER = 'org.apache.cassandra.dht.ByteOrderedPartitioner'
+
+MURMUR3_MIN_TOKEN = -2 ** 63
+MURMUR3_MAX_TOKEN = 2 ** 63 - 1
+RANDOM_MAX_TOKEN = 2 ** 127
+
+
+def _even_boundaries(lowest, highest, splits):
+    width = highest - lowest
+    return [lowest + (width * i) // splits for i in range(1, splits)]
+
+
+def split_token_ring(partitioner, splits):
+    """
+    Splits the whole token ring of the given partitioner into `splits` contiguous
+    sub-ranges and returns them as a list of (start, end) tuples, where a range
+    covers the tokens start < token <= end. The first range has start None and the
+    last has end None, meaning the range is unbounded on that side; together the
+    ranges cover every token exactly once.
+
+    Partitioners whose tokens cannot be split evenly (e.g. OrderPreservingPartitioner)
+    get a single unbounded range.
+    """
+    if splits < 1:
+        raise ValueError("splits must be at least 1; got {}".format(splits))
+
+    if partitioner.endswith('Murmur3Partitioner'):
+        boundaries = _even_boundaries(MURMUR3_MIN_TOKEN, MURMUR3_MAX_TOKEN, splits)
+    elif partitioner.endswith('RandomPartitioner'):
+        boundaries = _even_boundaries(0, RANDOM_MAX_TOKEN, splits)
+    elif partitioner.endswith('ByteOrderedPartitioner'):
+        # split on the first two bytes of the key, which is as fine as tests need
+        boundaries = [value.to_bytes(2, 'big') for value in _even_boundaries(0, 2 ** 16, min(splits, 2 ** 16))]
+    else:
+        logger.debug("Cannot split token ring of {}, scanning it as a single range".format(partitioner))
+        boundaries = []
+
+    starts = [None] + boundaries
+    ends = boundaries + [None]
+    return list(zip(starts, ends))
+
+
+class RowCounter(object):
+    """Scan consumer counting rows, overall and per token range"""
+
+    def __init__(self):
+        self.count = 0
+        self.per_range = {}
+
+    def consume(self, token_range, rows):
+        self.count += len(rows)
+        self.per_range[token_range] = self.per_range.get(token_range, 0) + len(rows)
+
+
+def row_hash(row):
+    """128-bit hash of a row, as an int"""
+    return int(hashlib.md5(repr(tuple(row)).encode('utf-8')).hexdigest(), 16)
+
+
+class RowDigest(object):
+    """
+    Scan consumer computing an order-independent digest of all rows: the sum,
+    modulo 2**128, of the 128-bit hash of every row. Unlike XOR, the sum does not
+    cancel out when the same row is seen twice. Digests are also kept per range,
+    so two scans with the same splits can be compared range by range.
+    """
+
+    MODULUS = 2 ** 128
+
+    def __init__(self):
+        self.digest = 0
+        self.count = 0
+        self.per_range = {}
+
+    def consume(self, token_range, rows):
+        partial = sum(row_hash(row) for row in rows) % self.MODULUS
+        self.digest = (self.digest + partial) % self.MODULUS
+        self.count += len(rows)
+        count, digest = self.per_range.get(token_range, (0, 0))
+        self.per_range[token_range] = (count + len(rows), (digest + partial) % self.MODULUS)
+
+    def differing_ranges(self, other):
+        """Returns the sorted token ranges whose (count, digest) differ between two RowDigests"""
+        ranges = set(self.per_range) | set(other.per_range)
+        return sorted((r for r in ranges if self.per_range.get(r, (0, 0)) != other.per_range.get(r, (0, 0))),
+                      key=lambda r: (r[0] is not None, r[0]))
+
+
+class GeneratedRowsComparer(object):
+    """
+    Scan consumer checking every row against a tools.datagen.DataVerifier; call
+    assert_ok() on the comparer (or the verifier) once the scan is done.
+    """
+
+    def __init__(self, verifier):
+        self.verifier = verifier
+
+    def consume(self, token_range, rows):
+        self.verifier.check_rows(rows)
+
+    def assert_ok(self):
+        self.verifier.assert_ok()
+
+
+class TokenRangeScanner(object):
+    """
+    Scans a table by token sub-ranges in parallel, feeding every fetched page of rows
+    to consumer.consume(token_range, rows). Pages are handed over one at a time under
+    a lock, so consumers do not need to be thread-safe, and only `concurrency` pages
+    are held in memory at once.
+
+    @param session Session to use
+    @param table Table to scan, as 'keyspace.table' or just 'table' for the session's keyspace
+    @param columns Columns to select, '*' by default; a GeneratedRowsComparer scan then selects
+                   the generator's columns, in the order DataGenerator.select_query uses
+    @param splits Number of token sub-ranges, 4 per node by default
+    @param concurrency Number of sub-ranges queried at the same time, one per split by default (at most 32)
+    @param consistency_level Consistency level of the range queries, ALL by default
+    @param fetch_size Page size for the range queries
+    @param timeout Request timeout of every page, in seconds
+    @param token_ranges Explicit list of (start, end) token ranges to scan instead of splitting the whole ring
+    @param expected_source If set, the first page of every range is traced and an AssertionError is raised
+                           unless all trace events come from this address
+    """
+
+    def __init__(self, session, table, columns='*', splits=None, concurrency=None,
+                 consistency_level=ConsistencyLevel.ALL, fetch_size=5000, timeout=60,
+                 token_ranges=None, expected_source=None):
+        self.session = session
+        if '.' in table:
+            self.keyspace, self.table = table.split('.', 1)
+        else:
+            self.keyspace, self.table = session.keyspace, table
+        self.columns = columns if isinstance(columns, str) else ', '.join(columns)
+        metadata = session.cluster.metadata
+        if token_ranges is None:
+            if splits is None:
+                splits = 4 * max(1, len(metadata.all_hosts()))
+            token_ranges = split_token_ring(metadata.partitioner, splits)
+        self.token_ranges = token_ranges
+        self.concurrency = concurrency if concurrency is not None else max(1, min(len(self.token_ranges), 32))
+        self.consistency_level = consistency_level
+        self.fetch_size = fetch_size
+        self.timeout = timeout
+        self.expected_source = expected_source
+        self.partition_key = [protect_name(column.name)
+                              for column in metadata.keyspaces[self.keyspace].tables[self.table].partition_key]
+        self._lock = threading.Lock()
+
+    def range_query(self, token_range, columns=None):
+        """Returns the CQL query and its parameters for one token range, selecting `columns` if given"""
+        token = 'token({})'.format(', '.join(self.partition_key))
+        conditions, params = [], []
+        start, end = token_range
+        if start is not None:
+            conditions.append('{} > %s'.format(token))
+            params.append(start)
+        if end is not None:
+            conditions.append('{} <= %s'.format(token))
+            params.append(end)
+        query = 'SELECT {columns} FROM {ks}.{table}'.format(columns=columns or self.columns,
+                                                            ks=protect_name(self.keyspace),
+                                                            table=protect_name(self.table))
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return query, params
+
+    def _scan_range(self, token_range, consumer, columns):
+        query, params = self.range_query(token_range, columns)
+        statement = SimpleStatement(query, consistency_level=self.consistency_level, fetch_size=self.fetch_size)
+        trace = self.expected_source is not None
+        paging_state = None
+        while True:
+            # every page is a request of its own, so that each gets the timeout and not the session's default
+            result = self.session.execute(statement, params, timeout=self.timeout, trace=trace,
+                                          paging_state=paging_state)
+            if trace:
+                self._check_trace_sources(token_range, result.get_query_trace())
+                trace = False
+            rows = result.current_rows
+            with self._lock:
+                consumer.consume(token_range, rows)
+            if not result.has_more_pages:
+                return
+            paging_state = result.paging_state
+
+    def _check_trace_sources(self, token_range, trace):
+        sources = {str(event.source) for event in trace.events}
+        unexpected = sources - {self.expected_source}
+        assert not unexpected, "Read of token range {} was expected to be served by {} only, but trace " \
+                               "shows events from {}".format(token_range, self.expected_source, sorted(unexpected))
+
+    def scan(self, consumer):
+        """
+        Scans every token range and returns the consumer. The first error raised by a
+        range query (or the consumer) is re-raised once all ranges have finished.
+        """
+        columns = None
+        if self.columns == '*' and isinstance(consumer, GeneratedRowsComparer):
+            # the verifier expects the generator's columns in order, which '*' does not guarantee
+            columns = ', '.join(protect_name(name) for name in consumer.verifier.generator.column_names)
+        logger.debug("Scanning {}.{} over {} token ranges with concurrency {}".format(
+            self.keyspace, self.table, len(self.token_ranges), self.concurrency))
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._scan_range, token_range, consumer, columns)
+                       for token_range in self.token_ranges]
+        for future in futures:
+            future.result()
+        return consumer
+
+
+def count_rows(session, table, **kwargs):
+    """
+    Counts the rows of `table` with a TokenRangeScanner, see its parameters. Only
+    the partition key columns are selected unless `columns` is given.
+    """
+    scanner = TokenRangeScanner(session, table, **kwargs)
+    if 'columns' not in kwargs:
+        scanner.columns = ', '.join(scanner.partition_key)
+    return scanner.scan(RowCounter()).count
@@ -0,0 +1,338 @@
+"""
+Corrupting the components of an sstable in place, at chosen offsets, and undoing it.
+
+Tests of scrub, verify and of reads of damaged data used to corrupt sstables by
+rewriting a whole file with a random byte changed, or by deleting components, which
+gives one corruption shape per cluster and can't be taken back. SSTableCorruptor
+memory maps one component at a time and flips bits or zeroes ranges at offsets chosen
+from the sstable's own structure, recording the original bytes of every change:
+
+    corruptor = SSTableCorruptor(node.get_sstables('ks', 'cf')[0])
+    corruptor.corrupt_partition(0)           # the first partition (or its compressed chunk)
+    corruptor.corrupt_crc(0)                 # the checksum of the first chunk
+    ... run sstableverify or sstablescrub ...
+    corruptor.undo()                         # the sstable is byte for byte as it was
+
+Partitions are located through Index.db, compressed chunks through CompressionInfo.db
+and the checksums of uncompressed sstables through CRC.db, for the 'big' format from
+version ka (2.1) on. Any component can also be changed at a raw offset with flip_bits(),
+zero_range() and write_bytes(), e.g. the Summary.db or Statistics.db files.
+
+The node should be stopped, or the sstable otherwise not in use, while it is corrupted.
+"""
+import glob
+import mmap
+import os
+import random
+import re
+import struct
+from collections import namedtuple
+
+from tools.sstable_metadata import DataInputReader
+
+DATA_PATTERN = re.compile(r'(?:^|-)(?P<version>[a-z]{2})-(?P<generation>\w+?)(?:-(?P<format>[a-z]+))?-Data\.db$')
+
+DATA, INDEX, SUMMARY, COMPRESSION_INFO, DIGEST, STATISTICS, FILTER, CRC = (
+    'Data', 'Index', 'Summary', 'CompressionInfo', 'Digest', 'Statistics', 'Filter', 'CRC')
+
+CHUNK_CRC_LENGTH = 4
+
+
+class Mutation(namedtuple('Mutation', ('component', 'path', 'offset', 'original', 'corrupted', 'description'))):
+    """One change to a component: the bytes at offset were original and are now corrupted"""
+    __slots__ = ()
+
+    def __str__(self):
+        return '{} at {} of {}: {}'.format(self.description, self.offset, self.component, self.original.hex())
+
+
+class IndexedPartition(namedtuple('IndexedPartition', ('key', 'position', 'end'))):
+    """A partition of Index.db: its serialized key, and where it starts and ends in the uncompressed data"""
+    __slots__ = ()
+
+
+class CompressionInfo(namedtuple('CompressionInfo', ('compressor', 'options', 'chunk_length', 'data_length',
+                                                     'chunk_offsets'))):
+    """The contents of CompressionInfo.db; chunk_offsets are the positions of the chunks in Data.db"""
+    __slots__ = ()
+
+
+class Chunk(namedtuple('Chunk', ('index', 'offset', 'length', 'crc_offset'))):
+    """A chunk of Data.db: the range of its compressed payload, and where its checksum is"""
+    __slots__ = ()
+
+
+class SSTableCorruptor(object):
+    """
+    Corrupts the components of one sstable, named by its Data.db file, and keeps the
+    mutations made so that undo() can restore it.
+
+    @raise ValueError if the path isn't the Data.db file of an sstable
+    """
+
+    def __init__(self, data_path):
+        match = DATA_PATTERN.search(os.path.basename(data_path))
+        if match is None:
+            raise ValueError("{} is not the Data.db file of an sstable".format(data_path))
+        self.data_path = data_path
+        self.prefix = data_path[:-len('-Data.db')]
+        self.version = match.group('version')
+        self.mutations = []
+        self._partitions = None
+        self._compression_info = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.undo()
+
+    def component_path(self, component):
+        """
+        @return The path of a component, e.g. Index, or Digest whatever its checksum type is
+        @raise ValueError if the sstable has no such component
+        """
+        if component == DIGEST:
+            paths = glob.glob(glob.escape(self.prefix) + '-Digest.*')
+            if not paths:
+                raise ValueError("{} has no Digest component".format(self.data_path))
+            return paths[0]
+        path = '{}-{}.{}'.format(self.prefix, component, 'txt' if component == 'TOC' else 'db')
+        if not os.path.exists(path):
+            raise ValueError("{} has no {} component".format(self.data_path, component))
+        return path
+
+    def has_component(self, component):
+        try:
+            self.component_path(component)
+            return True
+        except ValueError:
+            return False
+
+    @property
+    def compressed(self):
+        return self.has_component(COMPRESSION_INFO)
+
+    def _patch(self, component, offset, length, corrupt, description):
+        path = self.component_path(component)
+        with open(path, 'r+b') as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset < 0 or length <= 0 or offset + length > size:
+                raise ValueError("Can't change {} bytes at offset {} of {}, which has {} bytes"
+                                 .format(length, offset, path, size))
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as buffer:
+                original = bytes(buffer[offset:offset + length])
+                corrupted = bytes(corrupt(original))
+                if len(corrupted) != length:
+                    raise ValueError("Corruptions must keep the length of the component")
+                buffer[offset:offset + length] = corrupted
+                buffer.flush()
+        mutation = Mutation(component, path, offset, original, corrupted, description)
+        self.mutations.append(mutation)
+        return mutation
+
+    def flip_bits(self, component, offset, mask=0xff, length=1, description='flipped bits'):
+        """
+        Flips the bits of mask in each of length bytes at offset of a component.
+
+        @return The Mutation made
+        """
+        if not 0 < mask <= 0xff:
+            raise ValueError("The mask must flip at least one bit of a byte, got {}".format(mask))
+        return self._patch(component, offset, length, lambda original: (byte ^ mask for byte in original),
+                           description)
+
+    def zero_range(self, component, offset, length, description='zeroed'):
+        """Zeroes length bytes at offset of a component. @return The Mutation made"""
+        return self._patch(component, offset, length, lambda original: bytes(length), description)
+
+    def write_bytes(self, component, offset, data, description='overwritten'):
+        """Overwrites the bytes at offset of a component with data. @return The Mutation made"""
+        return self._patch(component, offset, len(data), lambda original: data, description)
+
+    def _read_component(self, component):
+        with open(self.component_path(component), 'rb') as f:
+            return f.read()
+
+    def compression_info(self):
+        """
+        @return The CompressionInfo of the sstable, or None if it isn't compressed
+        """
+        if self._compression_info is None and self.compressed:
+            reader = DataInputReader(self._read_component(COMPRESSION_INFO))
+            compressor = reader.utf()
+            options = dict((reader.utf(), reader.utf()) for _ in range(reader.int()))
+            chunk_length = reader.int()
+            if self.version >= 'na':
+                reader.int()  # the maximum compressed length of a chunk
+            data_length = reader.long()
+            chunk_offsets = [reader.long() for _ in range(reader.int())]
+            self._compression_info = CompressionInfo(compressor, options, chunk_length, data_length, chunk_offsets)
+        return self._compression_info
+
+    def data_length(self):
+        """@return The length of the uncompressed data"""
+        info = self.compression_info()
+        return info.data_length if info is not None else os.path.getsize(self.data_path)
+
+    def partitions(self):
+        """
+        @return The IndexedPartition of every partition of Index.db, in order
+        """
+        if self._partitions is None:
+            buffer = self._read_component(INDEX)
+            reader = DataInputReader(buffer)
+            keys_and_positions = []
+            while reader.offset < len(buffer):
+                key = reader.bytes(reader.unsigned_short())
+                if self.version >= 'ma':
+                    position = reader.unsigned_vint()
+                    promoted_index_size = reader.unsigned_vint()
+                else:
+                    position = reader.long()
+                    promoted_index_size = reader.int()
+                reader.offset += promoted_index_size
+                keys_and_positions.append((key, position))
+            ends = [position for _, position in keys_and_positions[1:]] + [self.data_length()]
+            self._partitions = [IndexedPartition(key, position, end)
+                                for (key, position), end in zip(keys_and_positions, ends)]
+        return self._partitions
+
+    def partition(self, partition):
+        """
+        @param partition The index of a partition in Index.db, or its serialized key
+        @return IndexedPartition
+        """
+        partitions = self.partitions()
+        if isinstance(partition, int):
+            return partitions[partition]
+        for indexed in partitions:
+            if indexed.key == partition:
+                return indexed
+        raise ValueError("No partition with key {} in {}".format(partition, self.data_path))
+
+    def chunks(self):
+        """
+        @return The Chunk of every compressed chunk of Data.db, or of every checksummed
+                range of an uncompressed Data.db with a CRC component
+        """
+        info = self.compression_info()
+        if info is not None:
+            ends = info.chunk_offsets[1:] + [os.path.getsize(self.data_path)]
+            return [Chunk(index, offset, end - offset - CHUNK_CRC_LENGTH, end - CHUNK_CRC_LENGTH)
+                    for index, (offset, end) in enumerate(zip(info.chunk_offsets, ends))]
+        crcs = self._read_component(CRC)
+        chunk_length, = struct.unpack_from('>i', crcs)
+        size = os.path.getsize(self.data_path)
+        return [Chunk(index, offset, min(chunk_length, size - offset), 4 + CHUNK_CRC_LENGTH * index)
+                for index, offset in enumerate(range(0, size, chunk_length))]
+
+    def chunk(self, index):
+        return self.chunks()[index]
+
+    def chunk_of(self, partition):
+        """@return The compressed Chunk holding the start of a partition"""
+        info = self.compression_info()
+        if info is None:
+            raise ValueError("{} isn't compressed".format(self.data_path))
+        return self.chunk(self.partition(partition).position // info.chunk_length)
+
+    def corrupt_partition(self, partition, zero=False):
+        """
+        Corrupts a partition so that it can't be read: flips the bits of the first byte of
+        its key length, or zeroes it all. In compressed sstables it's the chunk holding the
+        start of the partition that gets corrupted, see corrupt_chunk().
+
+        @param partition The index of a partition in Index.db, or its serialized key
+        @return The Mutation made
+        """
+        if self.compressed:
+            return self.corrupt_chunk(self.chunk_of(partition).index, zero=zero)
+        indexed = self.partition(partition)
+        description = 'partition {}'.format(indexed.key.hex())
+        if zero:
+            return self.zero_range(DATA, indexed.position, indexed.end - indexed.position, description)
+        return self.flip_bits(DATA, indexed.position, description=description)
+
+    def corrupt_chunk(self, index, zero=False):
+        """
+        Corrupts the payload of a chunk of Data.db: flips the bits of its middle byte, which
+        fails its checksum and decompression, or zeroes it all.
+
+        @return The Mutation made
+        """
+        chunk = self.chunk(index)
+        description = 'chunk {}'.format(index)
+        if zero:
+            return self.zero_range(DATA, chunk.offset, chunk.length, description)
+        return self.flip_bits(DATA, chunk.offset + chunk.length // 2, description=description)
+
+    def corrupt_crc(self, index):
+        """
+        Corrupts the checksum of a chunk: the one following it in compressed sstables, or
+        its entry of CRC.db in uncompressed ones.
+
+        @return The Mutation made
+        """
+        chunk = self.chunk(index)
+        component = DATA if self.compressed else CRC
+        return self.flip_bits(component, chunk.crc_offset, length=CHUNK_CRC_LENGTH,
+                              description='checksum of chunk {}'.format(index))
+
+    def corrupt_digest(self):
+        """
+        Changes the first digit of the Digest component, the checksum of the whole Data.db
+        file that sstableverify checks, keeping it readable.
+
+        @return The Mutation made
+        """
+        return self._patch(DIGEST, 0, 1, lambda original: b'1' if original == b'0' else b'0',
+                           'digest')
+
+    def corrupt_random(self, count, component=DATA, rng=None, start=0, end=None):
+        """
+        Flips one random bit in each of count distinct random bytes of a component, e.g. to
+        measure scrub against the density of corruption.
+
+        @param rng The random.Random to draw offsets from, for reproducible corruptions
+        @param start, end The range of offsets to draw from, the whole component by default
+        @return The list of Mutations made
+        """
+        rng = rng or random.Random()
+        if end is None:
+            end = os.path.getsize(self.component_path(component))
+        return [self.flip_bits(component, offset, mask=1 << rng.randrange(8), description='random bit')
+                for offset in sorted(rng.sample(range(start, end), count))]
+
+    def undo(self, count=None):
+        """
+        Restores the original bytes of the last count mutations, or of all of them, latest first.
+
+        @return The list of Mutations undone
+        @raise ValueError if a corrupted component has since been removed or rewritten,
+               e.g. by compaction or scrub; the mutations before it are kept
+        """
+        undone = []
+        while self.mutations and (count is None or len(undone) < count):
+            mutation = self.mutations[-1]
+            if not os.path.exists(mutation.path):
+                raise ValueError("Can't undo {}: {} was removed".format(mutation, mutation.path))
+            with open(mutation.path, 'r+b') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as buffer:
+                    end = mutation.offset + len(mutation.original)
+                    if bytes(buffer[mutation.offset:end]) != mutation.corrupted:
+                        raise ValueError("Can't undo {}: {} was rewritten".format(mutation, mutation.path))
+                    buffer[mutation.offset:end] = mutation.original
+                    buffer.flush()
+            undone.append(self.mutations.pop())
+        return undone
+
+    def undo_last(self):
+        """Restores the original bytes of the last mutation. @return The Mutation undone"""
+        undone = self.undo(count=1)
+        if not undone:
+            raise ValueError("There is no mutation of {} to undo".format(self.data_path))
+        return undone[0]
+
+    def __repr__(self):
+        return 'SSTableCorruptor({}, {} mutations)'.format(self.data_path, len(self.mutations))
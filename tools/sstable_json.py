@@ -0,0 +1,389 @@
+"""
+Streaming the JSON output of sstabledump (3.0+) and sstable2json (before 3.0).
+
+Both tools print one JSON array per sstable, with an object per partition:
+
+    sstabledump:  {"partition": {"key": ["1"], "position": 0, "deletion_info": {...}},
+                   "rows": [{"type": "row", "position": 18, "cells": [...]}, ...]}
+    sstable2json: {"key": "1", "metadata": {"deletionInfo": {...}},
+                   "cells": [["name", "value", 1442880000000000, "d"], ...]}
+
+Instead of json.loads()-ing the whole output, iter_partitions() and iter_rows() read it
+incrementally from a stream, e.g. the stdout pipe of the tool, decoding one row (or
+sstable2json cell) at a time, so memory use is bounded by the largest row rather than
+by the sstable:
+
+    for partition, rows in dump_partitions(node, 'ks', 'cf', tombstones_only=True):
+        assert partition.deletion_info is not None or any(True for _ in rows)
+
+Partitions can be filtered by key, and tombstones_only keeps the deleted partitions and
+the tombstone rows only. Lines that aren't JSON, like the warnings the tools may print
+before the array, are skipped, as are the arrays of further sstables in the same stream.
+"""
+import codecs
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+
+from ccmlib.node import ToolError
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class DumpedPartition(namedtuple('DumpedPartition', ('key', 'position', 'deletion_info', 'info'))):
+    """
+    A partition of the dump: its key as a tuple of its components as the tool prints
+    them, its position in the data file (None for sstable2json), its deletion info if it
+    is deleted, and the decoded partition header (everything but the rows).
+    """
+    __slots__ = ()
+
+
+class _JSONStream(object):
+    """
+    A JSON text read from a stream chunk by chunk, to walk arrays and objects without
+    decoding them entirely; values are decoded with json.JSONDecoder.raw_decode.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        if isinstance(stream, (bytes, str)):
+            stream = io.BytesIO(stream) if isinstance(stream, bytes) else io.StringIO(stream)
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        # the offset in the stream of the start of _buffer, for error messages
+        self._offset = 0
+        self._eof = False
+
+    def _read(self, size):
+        """Appends at least one more character to the buffer, unless the stream is exhausted"""
+        while not self._eof:
+            data = self._stream.read(size)
+            if isinstance(data, bytes):
+                data = self._text_decoder.decode(data, final=not data)
+            if not data:
+                self._eof = True
+                break
+            if self._pos >= self._chunk_size:
+                self._offset += self._pos
+                self._buffer = self._buffer[self._pos:]
+                self._pos = 0
+            self._buffer += data
+            return True
+        return False
+
+    def _error(self, message):
+        return ValueError("{} at character {}".format(message, self._offset + self._pos))
+
+    def peek(self):
+        """The next character that isn't whitespace, without consuming it; '' at the end"""
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read(self._chunk_size):
+                return ''
+
+    def next(self):
+        char = self.peek()
+        self._pos += len(char)
+        return char
+
+    def expect(self, expected):
+        char = self.next()
+        if char != expected:
+            raise self._error("Expected '{}' but found '{}'".format(expected, char))
+
+    def skip_line(self):
+        while True:
+            end = self._buffer.find('\n', self._pos)
+            if end >= 0:
+                self._pos = end + 1
+                return
+            self._pos = len(self._buffer)
+            if not self._read(self._chunk_size):
+                return
+
+    def value(self):
+        """Decodes the next value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                # the value may continue past the buffer; read as much again as we have of it
+                if not self._read(max(self._chunk_size, len(self._buffer) - self._pos)):
+                    raise self._error("Invalid or truncated JSON value")
+                continue
+            # a number ending the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._read(self._chunk_size):
+                continue
+            self._pos = end
+            return value
+
+    def items(self):
+        """Walks an array: yields once per item, which the caller must consume before resuming"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.next()
+            return
+        while True:
+            yield
+            separator = self.next()
+            if separator == ']':
+                return
+            if separator != ',':
+                raise self._error("Expected ',' or ']' but found '{}'".format(separator))
+
+    def members(self):
+        """Walks an object: yields each key, whose value the caller must consume before resuming"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.next()
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise self._error("Expected an object key")
+            self.expect(':')
+            yield key
+            separator = self.next()
+            if separator == '}':
+                return
+            if separator != ',':
+                raise self._error("Expected ',' or '}}' but found '{}'".format(separator))
+
+    def arrays(self):
+        """Yields once per top level array, skipping the lines before each that aren't JSON"""
+        while True:
+            char = self.peek()
+            if char == '':
+                return
+            if char == '[':
+                yield
+            else:
+                self.skip_line()
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields the items of the top level JSON arrays in stream one at a time, e.g. the keys
+    of an `sstabledump -e`.
+
+    @param stream A text or binary file-like object, or the JSON text itself
+    """
+    json_stream = _JSONStream(stream, chunk_size)
+    for _ in json_stream.arrays():
+        for _ in json_stream.items():
+            yield json_stream.value()
+
+
+def is_tombstone(row):
+    """
+    Whether a row of the dump is, or holds, a tombstone: a range tombstone bound, a
+    deleted row or a row with a deleted cell for sstabledump, and a deleted cell or
+    range tombstone for sstable2json.
+    """
+    if isinstance(row, list):
+        return len(row) > 3 and row[3] in ('d', 't')
+    if row.get('type') == 'range_tombstone_bound' or 'deletion_info' in row:
+        return True
+    return any('deletion_info' in cell for cell in row.get('cells', ()))
+
+
+def _key_filter(keys, key_range, key_type):
+    """A predicate on partition keys, or None if all partitions are wanted"""
+    def normalize(key):
+        key = tuple(key) if isinstance(key, (list, tuple)) else (key,)
+        return tuple(key_type(component) for component in key) if key_type else key
+
+    if keys is None and key_range is None:
+        return None
+    keys = {normalize(key) for key in keys} if keys is not None else None
+    low, high = (None if bound is None else normalize(bound) for bound in (key_range or (None, None)))
+
+    def accept(key):
+        key = normalize(key)
+        if keys is not None and key not in keys:
+            return False
+        return (low is None or key >= low) and (high is None or key <= high)
+    return accept
+
+
+def _events(stream, keys=None, key_range=None, key_type=None, tombstones_only=False, chunk_size=CHUNK_SIZE):
+    """
+    Yields (number, partition, None) when a wanted partition starts and (number, partition,
+    row) for each of its wanted rows, number being the index of the partition in stream.
+    With tombstones_only, a partition that isn't deleted only starts with its first
+    tombstone row.
+    """
+    accept = _key_filter(keys, key_range, key_type)
+    json_stream = _JSONStream(stream, chunk_size)
+    number = itertools.count()
+    for _ in json_stream.arrays():
+        for _ in json_stream.items():
+            current = next(number)
+            partition, started, wanted = None, False, True
+            for member in json_stream.members():
+                if member in ('partition', 'key', 'metadata'):
+                    value = json_stream.value()
+                    if member == 'partition':
+                        partition = DumpedPartition(key=tuple(value.get('key', ())), position=value.get('position'),
+                                                    deletion_info=value.get('deletion_info'), info=value)
+                    elif member == 'key':
+                        partition = DumpedPartition(key=(value,), position=None, deletion_info=None,
+                                                    info={'key': value})
+                    else:
+                        info = dict(partition.info if partition else {}, metadata=value)
+                        partition = DumpedPartition(key=partition.key if partition else (), position=None,
+                                                    deletion_info=value.get('deletionInfo'), info=info)
+                    continue
+                if member not in ('rows', 'cells') or partition is None:
+                    json_stream.value()
+                    continue
+
+                wanted = accept is None or accept(partition.key)
+                if wanted and not started and (not tombstones_only or partition.deletion_info is not None):
+                    started = True
+                    yield current, partition, None
+                for _ in json_stream.items():
+                    row = json_stream.value()
+                    if not wanted or (tombstones_only and not is_tombstone(row)):
+                        continue
+                    if not started:
+                        started = True
+                        yield current, partition, None
+                    yield current, partition, row
+
+            # a partition without rows
+            if partition is not None and not started and (accept is None or accept(partition.key)) and \
+                    (not tombstones_only or partition.deletion_info is not None):
+                yield current, partition, None
+
+
+def iter_partitions(stream, keys=None, key_range=None, key_type=None, tombstones_only=False,
+                    chunk_size=CHUNK_SIZE):
+    """
+    Yields the partitions of an sstabledump or sstable2json output one at a time, as
+    (partition, rows) pairs: a DumpedPartition and an iterator of its rows (sstable2json
+    cells), decoded as they are iterated. As with itertools.groupby, the rows of a
+    partition are only available until the next partition is requested.
+
+    @param stream A text or binary file-like object, e.g. the tool's stdout, or the JSON text
+    @param keys Optional collection of the partition keys to keep. A key is a tuple of its
+                components, or a single value for a single component key.
+    @param key_range Optional (low, high) pair of inclusive partition key bounds to keep,
+                     either of which may be None. Keys are compared component by component,
+                     after applying key_type to each.
+    @param key_type Optional callable converting a printed key component for comparisons,
+                    e.g. int; components are compared as the tool printed them otherwise
+    @param tombstones_only Whether to only keep deleted partitions and tombstone rows
+    @param chunk_size Number of characters read from stream at once
+    """
+    events = _events(stream, keys=keys, key_range=key_range, key_type=key_type,
+                     tombstones_only=tombstones_only, chunk_size=chunk_size)
+    for _, group in itertools.groupby(events, key=lambda event: event[0]):
+        _, partition, _ = next(group)
+        yield partition, (row for _, _, row in group)
+
+
+def iter_rows(stream, **filters):
+    """
+    Yields the rows of an sstabledump or sstable2json output one at a time, as
+    (partition, row) pairs. Takes the filters of iter_partitions.
+    """
+    for _, partition, row in _events(stream, **filters):
+        if row is not None:
+            yield partition, row
+
+
+def _drain(pipe, chunks):
+    for chunk in iter(lambda: pipe.read(CHUNK_SIZE), b''):
+        chunks.append(chunk)
+    pipe.close()
+
+
+def _dump_streams(node, keyspace, table):
+    """
+    Yields the stdout of the JSON dump of every sstable of the table, as a text stream
+    to consume entirely before resuming, with sstabledump on 3.0+ and sstable2json before.
+    An error parsing a stream may be thrown into the generator: if the tool failed, its
+    error is raised instead, as the output it left is likely truncated.
+
+    @raise ToolError if a tool exits with a non-zero status, or whatever else running
+           sstable2json raised
+    """
+    if node.get_cassandra_version() >= '3.0':
+        for process in node.run_sstabledump_process(keyspace=keyspace, column_families=[table]):
+            # the tool can't block on a full stderr pipe while we read its stdout
+            stderr = []
+            drainer = threading.Thread(target=_drain, args=(process.stderr, stderr), daemon=True)
+            drainer.start()
+            with io.TextIOWrapper(process.stdout, encoding='utf-8') as stdout:
+                try:
+                    yield stdout
+                finally:
+                    # let the tool finish writing if the caller stopped early
+                    for _ in iter(lambda: stdout.read(CHUNK_SIZE), ''):
+                        pass
+                    process.wait()
+                    drainer.join()
+                    if process.returncode != 0:
+                        raise ToolError(process.args, process.returncode, stderr=b''.join(stderr))
+    else:
+        # sstable2json writes to a file; make it a pipe
+        read_fd, write_fd = os.pipe()
+        errors = []
+        with os.fdopen(write_fd, 'wb') as writer, io.open(read_fd, 'r', encoding='utf-8') as reader:
+            def dump():
+                try:
+                    node.run_sstable2json(writer, keyspace=keyspace, column_families=[table])
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    writer.close()
+            dumper = threading.Thread(target=dump, daemon=True)
+            dumper.start()
+            try:
+                yield reader
+            finally:
+                for _ in iter(lambda: reader.read(CHUNK_SIZE), ''):
+                    pass
+                dumper.join()
+                if errors:
+                    raise errors[0]
+
+
+def _dump(parse, node, keyspace, table, **filters):
+    streams = _dump_streams(node, keyspace, table)
+    for stream in streams:
+        try:
+            for item in parse(stream, **filters):
+                yield item
+        except ValueError as e:
+            streams.throw(e)
+
+
+def dump_partitions(node, keyspace, table, **filters):
+    """
+    Dumps every sstable of a table of a stopped node with sstabledump (sstable2json
+    before 3.0) and yields their partitions as iter_partitions does, streaming the tool's
+    output. Takes the filters of iter_partitions.
+    """
+    return _dump(iter_partitions, node, keyspace, table, **filters)
+
+
+def dump_rows(node, keyspace, table, **filters):
+    """Like dump_partitions, but yields (partition, row) pairs as iter_rows does"""
+    return _dump(iter_rows, node, keyspace, table, **filters)
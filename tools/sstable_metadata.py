@@ -0,0 +1,361 @@
+"""
+Reading the metadata of sstables from their Statistics.db component, in process.
+
+`sstablemetadata` starts a JVM for every call and its output has to be parsed back
+with regular expressions, which makes checking the repaired state or level of every
+sstable after each step of a test slow. This module reads Statistics.db files of the
+'big' format directly, for versions ma (3.0) and later (mb, mc, md, me, na, nb), and
+returns their validation, compaction, stats and serialization header components as
+typed records:
+
+    for sstable in node_sstable_metadata(node, 'keyspace1', 'standard1'):
+        assert sstable.repaired_at == 0 and sstable.pending_repair is None
+        assert sstable.level == 0
+
+The files are memory mapped and only the components asked for are decoded, so reading
+the metadata of every sstable of a node takes milliseconds.
+"""
+import mmap
+import os
+import re
+import struct
+import uuid
+import zlib
+from collections import namedtuple
+
+STATISTICS_PATTERN = re.compile(r'^(?P<version>[a-z]{2})-(?P<generation>\w+)-(?P<format>[a-z]+)-Statistics\.db$')
+
+VALIDATION, COMPACTION, STATS, HEADER = range(4)
+COMPONENTS = (VALIDATION, COMPACTION, STATS, HEADER)
+
+# the epochs EncodingStats encodes the minimum timestamp, deletion time and ttl of the header against
+TIMESTAMP_EPOCH = 1442880000000000  # 2015-09-22 00:00:00 UTC, in microseconds
+DELETION_TIME_EPOCH = 1442880000
+TTL_EPOCH = 0
+
+ValidationMetadata = namedtuple('ValidationMetadata', ('partitioner', 'bloom_filter_fp_chance'))
+
+# the serialized HyperLogLogPlus estimating the number of partitions
+CompactionMetadata = namedtuple('CompactionMetadata', ('cardinality_estimator',))
+
+StatsMetadata = namedtuple('StatsMetadata', (
+    'estimated_partition_size',  # list of (bucket offset, count)
+    'estimated_cell_count',  # list of (bucket offset, count)
+    'commit_log_upper_bound',  # (segment id, position)
+    'min_timestamp', 'max_timestamp',
+    'min_local_deletion_time', 'max_local_deletion_time',
+    'min_ttl', 'max_ttl',
+    'compression_ratio',
+    'estimated_tombstone_drop_time',  # list of (point, count)
+    'sstable_level',
+    'repaired_at',
+    'min_clustering_values', 'max_clustering_values',  # lists of bytes
+    'has_legacy_counter_shards',
+    'total_columns_set', 'total_rows',
+    'commit_log_lower_bound',  # (segment id, position), None before mb
+    'commit_log_intervals',  # list of ((segment id, position), (segment id, position)), None before mc
+    'pending_repair',  # UUID of the pending repair session, or None
+    'is_transient',  # None before na
+    'originating_host_id',  # UUID, or None
+))
+
+SerializationHeader = namedtuple('SerializationHeader', (
+    'min_timestamp', 'min_local_deletion_time', 'min_ttl',
+    'key_type',
+    'clustering_types',  # list of type names
+    'static_columns',  # dict of column name to type name
+    'regular_columns',  # dict of column name to type name
+))
+
+
+class SSTableVersion(object):
+    """
+    The features of the Statistics.db format of an sstable version, e.g. 'mc'.
+
+    @raise ValueError for versions older than ma, whose metadata this module doesn't read
+    """
+
+    def __init__(self, version):
+        if version < 'ma':
+            raise ValueError("Reading the metadata of sstable version {} isn't supported, only ma and later are"
+                             .format(version))
+        self.version = version
+        self.has_commit_log_lower_bound = version >= 'mb'
+        self.has_commit_log_intervals = version >= 'mc'
+        self.has_pending_repair = version >= 'na'
+        self.has_is_transient = version >= 'na'
+        self.has_metadata_checksum = version >= 'na'
+        self.has_originating_host_id = version >= 'nb' or 'me' <= version < 'n'
+
+
+class DataInputReader(object):
+    """Decodes the big-endian primitives of Cassandra's DataOutput from a buffer, starting at offset"""
+
+    def __init__(self, buffer, offset=0):
+        self.buffer = buffer
+        self.offset = offset
+
+    def _unpack(self, fmt, size):
+        value, = struct.unpack_from(fmt, self.buffer, self.offset)
+        self.offset += size
+        return value
+
+    def byte(self):
+        return self._unpack('>b', 1)
+
+    def boolean(self):
+        return self.byte() != 0
+
+    def unsigned_short(self):
+        return self._unpack('>H', 2)
+
+    def int(self):
+        return self._unpack('>i', 4)
+
+    def long(self):
+        return self._unpack('>q', 8)
+
+    def double(self):
+        return self._unpack('>d', 8)
+
+    def bytes(self, length):
+        value = bytes(self.buffer[self.offset:self.offset + length])
+        if len(value) != length:
+            raise ValueError("Truncated input: expected {} bytes at offset {}".format(length, self.offset))
+        self.offset += length
+        return value
+
+    def utf(self):
+        return self.bytes(self.unsigned_short()).decode('utf-8')
+
+    def unsigned_vint(self):
+        """An unsigned variable length integer as written by VIntCoding"""
+        first = self.buffer[self.offset]
+        self.offset += 1
+        extra_bytes = 8 - (~first & 0xff).bit_length()
+        value = first & (0xff >> extra_bytes)
+        for byte in self.bytes(extra_bytes):
+            value = (value << 8) | byte
+        return value
+
+    def signed_long_vint(self):
+        """An unsigned vint holding a long that may be negative, e.g. a timestamp below its epoch"""
+        value = self.unsigned_vint()
+        return value - (1 << 64) if value >= 1 << 63 else value
+
+    def uuid(self):
+        return uuid.UUID(bytes=self.bytes(16))
+
+    def commit_log_position(self):
+        return self.long(), self.int()
+
+    def histogram(self, key):
+        return [(key(), self.long()) for _ in range(self.int())]
+
+
+def _int32(value):
+    value &= 0xffffffff
+    return value - (1 << 32) if value >= 1 << 31 else value
+
+
+def _read_validation(reader, version):
+    return ValidationMetadata(partitioner=reader.utf(), bloom_filter_fp_chance=reader.double())
+
+
+def _read_compaction(reader, version):
+    return CompactionMetadata(cardinality_estimator=reader.bytes(reader.int()))
+
+
+def _read_stats(reader, version):
+    fields = {'estimated_partition_size': reader.histogram(reader.long),
+              'estimated_cell_count': reader.histogram(reader.long),
+              'commit_log_upper_bound': reader.commit_log_position(),
+              'min_timestamp': reader.long(),
+              'max_timestamp': reader.long(),
+              'min_local_deletion_time': reader.int(),
+              'max_local_deletion_time': reader.int(),
+              'min_ttl': reader.int(),
+              'max_ttl': reader.int(),
+              'compression_ratio': reader.double()}
+    reader.int()  # the maximum number of bins of the tombstone histogram
+    fields['estimated_tombstone_drop_time'] = reader.histogram(reader.double)
+    fields['sstable_level'] = reader.int()
+    fields['repaired_at'] = reader.long()
+    fields['min_clustering_values'] = [reader.bytes(reader.unsigned_short()) for _ in range(reader.int())]
+    fields['max_clustering_values'] = [reader.bytes(reader.unsigned_short()) for _ in range(reader.int())]
+    fields['has_legacy_counter_shards'] = reader.boolean()
+    fields['total_columns_set'] = reader.long()
+    fields['total_rows'] = reader.long()
+    fields['commit_log_lower_bound'] = reader.commit_log_position() if version.has_commit_log_lower_bound else None
+    fields['commit_log_intervals'] = None
+    if version.has_commit_log_intervals:
+        fields['commit_log_intervals'] = [(reader.commit_log_position(), reader.commit_log_position())
+                                          for _ in range(reader.int())]
+    fields['pending_repair'] = None
+    if version.has_pending_repair and reader.byte() != 0:
+        fields['pending_repair'] = reader.uuid()
+    fields['is_transient'] = reader.boolean() if version.has_is_transient else None
+    fields['originating_host_id'] = None
+    if version.has_originating_host_id and reader.byte() != 0:
+        fields['originating_host_id'] = reader.uuid()
+    return StatsMetadata(**fields)
+
+
+def _read_header(reader, version):
+    min_timestamp = reader.signed_long_vint() + TIMESTAMP_EPOCH
+    # Cassandra decodes these two as ints, so they wrap around like ints do
+    min_local_deletion_time = _int32(reader.unsigned_vint() + DELETION_TIME_EPOCH)
+    min_ttl = _int32(reader.unsigned_vint() + TTL_EPOCH)
+
+    def read_type():
+        return reader.bytes(reader.unsigned_vint()).decode('utf-8')
+
+    def read_columns():
+        columns = {}
+        for _ in range(reader.unsigned_vint()):
+            name = reader.bytes(reader.unsigned_vint()).decode('utf-8', 'replace')
+            columns[name] = read_type()
+        return columns
+
+    key_type = read_type()
+    clustering_types = [read_type() for _ in range(reader.unsigned_vint())]
+    return SerializationHeader(min_timestamp=min_timestamp, min_local_deletion_time=min_local_deletion_time,
+                               min_ttl=min_ttl, key_type=key_type, clustering_types=clustering_types,
+                               static_columns=read_columns(), regular_columns=read_columns())
+
+
+_COMPONENT_READERS = {VALIDATION: _read_validation, COMPACTION: _read_compaction,
+                      STATS: _read_stats, HEADER: _read_header}
+
+
+class SSTableMetadata(object):
+    """
+    The metadata components of one sstable, read from its Statistics.db file. Components
+    missing from the file, or not asked for, are None.
+    """
+
+    def __init__(self, path, version, generation, format, validation=None, compaction=None, stats=None, header=None):
+        self.path = path
+        self.version = version
+        self.generation = generation
+        self.format = format
+        self.validation = validation
+        self.compaction = compaction
+        self.stats = stats
+        self.header = header
+
+    @property
+    def name(self):
+        """The path of the sstable without the component, as sstablemetadata prints it"""
+        return self.path[:-len('-Statistics.db')]
+
+    @property
+    def data_path(self):
+        return self.name + '-Data.db'
+
+    @property
+    def repaired_at(self):
+        return self.stats.repaired_at
+
+    @property
+    def is_repaired(self):
+        return self.stats.repaired_at != 0
+
+    @property
+    def pending_repair(self):
+        return self.stats.pending_repair
+
+    @property
+    def level(self):
+        return self.stats.sstable_level
+
+    def __repr__(self):
+        return 'SSTableMetadata({})'.format(self.path)
+
+
+def _verify_checksums(buffer, count, toc):
+    """Checks the CRC32s written after the component count, the table of contents and every component"""
+    def stored_crc(offset):
+        return struct.unpack_from('>I', buffer, offset)[0]
+
+    crc = zlib.crc32(buffer[0:4])
+    if crc != stored_crc(4):
+        raise ValueError("Checksum mismatch of the component count")
+    toc_end = 8 + 8 * count
+    crc = zlib.crc32(buffer[8:toc_end], crc)
+    if crc != stored_crc(toc_end):
+        raise ValueError("Checksum mismatch of the table of contents")
+    offsets = sorted(toc.values()) + [len(buffer)]
+    for start, end in zip(offsets, offsets[1:]):
+        if zlib.crc32(buffer[start:end - 4]) != stored_crc(end - 4):
+            raise ValueError("Checksum mismatch of the metadata component at offset {}".format(start))
+
+
+def read_statistics(path, components=COMPONENTS, verify_checksums=False):
+    """
+    Reads the metadata components of an sstable from its Statistics.db file.
+
+    @param path Path of the Statistics.db file, named <version>-<generation>-<format>-Statistics.db
+    @param components The components to decode, out of VALIDATION, COMPACTION, STATS and HEADER
+    @param verify_checksums Whether to check the checksums of the file, for versions that have them (na and later)
+    @return SSTableMetadata
+    @raise ValueError if the file name or contents can't be read
+    """
+    match = STATISTICS_PATTERN.match(os.path.basename(path))
+    if match is None:
+        raise ValueError("{} is not the Statistics.db file of a 3.0 or later sstable".format(path))
+    version = SSTableVersion(match.group('version'))
+    metadata = SSTableMetadata(path, match.group('version'), match.group('generation'), match.group('format'))
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("{} is empty".format(path))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            reader = DataInputReader(buffer)
+            count = reader.int()
+            if version.has_metadata_checksum:
+                reader.int()
+            toc = {}
+            for _ in range(count):
+                component = reader.int()
+                toc[component] = reader.int()
+            if version.has_metadata_checksum and verify_checksums:
+                _verify_checksums(buffer, count, toc)
+            try:
+                for component in components:
+                    if component in toc:
+                        value = _COMPONENT_READERS[component](DataInputReader(buffer, toc[component]), version)
+                        setattr(metadata, ('validation', 'compaction', 'stats', 'header')[component], value)
+            except (struct.error, IndexError) as e:
+                raise ValueError("Truncated or corrupt metadata in {}: {}".format(path, e))
+    return metadata
+
+
+def read_sstable_metadata(directory, keyspace=None, table=None, components=COMPONENTS):
+    """
+    Returns the SSTableMetadata of every live sstable under a data directory, ordered by
+    path, optionally only those of one keyspace and table. Snapshots, backups and the
+    sstables of secondary indexes are left out, as sstablemetadata leaves them out.
+    """
+    sstables = []
+    for root, directories, files in os.walk(directory):
+        relative = os.path.relpath(root, directory).split(os.sep)
+        directories[:] = [d for d in directories if d not in ('snapshots', 'backups') and not d.startswith('.')]
+        if relative == ['.']:
+            if keyspace is not None:
+                directories[:] = [d for d in directories if d == keyspace]
+            continue
+        if len(relative) == 1 and table is not None:
+            directories[:] = [d for d in directories if d.split('-', 1)[0] == table]
+        for name in files:
+            if name.endswith('-Statistics.db') and STATISTICS_PATTERN.match(name):
+                sstables.append(read_statistics(os.path.join(root, name), components=components))
+    return sorted(sstables, key=lambda sstable: sstable.path)
+
+
+def node_sstable_metadata(node, keyspace=None, table=None, components=COMPONENTS):
+    """Returns the SSTableMetadata of every live sstable of a ccm node, see read_sstable_metadata()"""
+    sstables = []
+    for directory in node.data_directories():
+        sstables.extend(read_sstable_metadata(directory, keyspace, table, components))
+    return sstables
@@ -0,0 +1,336 @@
+"""
+Continuous client traffic spread over several processes.
+
+Upgrade tests keep writing and verifying rows in background processes while nodes
+are restarted on a new version. The pieces here let such workers run at a
+production-like rate:
+
+ - AsyncRequests keeps up to `max_in_flight` asynchronous requests running from a
+   single thread and counts completed requests and errors in a TrafficCounters.
+ - SharedRingBuffer hands fixed-size records (e.g. the key and value of a written
+   row) from one process to another in batches through shared memory, instead of
+   pickling every item through a multiprocessing.Queue.
+ - TrafficCounters live in shared memory, so the test process can read them while
+   the workers run; TrafficMeter turns them into ops/s and error counts per step,
+   and optionally logs them periodically while the test runs.
+"""
+import ctypes
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRingBuffer(object):
+    """
+    A bounded FIFO of fixed-size records in shared memory, for processes created
+    after it (with either the fork or the spawn start method).
+
+    Records are tuples packed with the struct format `record_format`, e.g. '16s16s'
+    for two UUIDs as bytes. put_many() and get_many() move whole batches while holding
+    the lock only for a copy, so a producer and a consumer can exchange hundreds of
+    thousands of records per second.
+
+    @param record_format struct format of one record
+    @param capacity Maximum number of records held
+    @param ctx The multiprocessing context the buffer is shared in, the default one if None
+    """
+
+    def __init__(self, record_format, capacity, ctx=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0; got {}".format(capacity))
+        ctx = ctx or multiprocessing.get_context()
+        self.record_format = record_format
+        self.record_size = struct.calcsize(record_format)
+        self.capacity = capacity
+        self._buffer = ctx.RawArray(ctypes.c_ubyte, self.record_size * capacity)
+        # total number of records ever written and read; their difference is the size
+        self._positions = ctx.RawArray(ctypes.c_longlong, 2)
+        lock = ctx.Lock()
+        self._not_empty = ctx.Condition(lock)
+        self._not_full = ctx.Condition(lock)
+
+    def _size(self):
+        return self._positions[0] - self._positions[1]
+
+    def qsize(self):
+        """Number of records waiting to be read"""
+        with self._not_empty:
+            return self._size()
+
+    def __len__(self):
+        return self.qsize()
+
+    def _copy_in(self, position, data):
+        address = ctypes.addressof(self._buffer)
+        start = (position % self.capacity) * self.record_size
+        first = min(len(data), self.record_size * self.capacity - start)
+        ctypes.memmove(address + start, data, first)
+        ctypes.memmove(address, data[first:], len(data) - first)
+
+    def _copy_out(self, position, count):
+        address = ctypes.addressof(self._buffer)
+        start = (position % self.capacity) * self.record_size
+        length = count * self.record_size
+        first = min(length, self.record_size * self.capacity - start)
+        return ctypes.string_at(address + start, first) + ctypes.string_at(address, length - first)
+
+    def put_many(self, records, timeout=None):
+        """
+        Appends records, waiting for free space if the buffer is full.
+
+        @param records Iterable of tuples matching record_format
+        @param timeout Seconds to wait for space; None waits until everything is written, 0 never waits
+        @return The number of records written, from the start of `records`
+        """
+        packed = [struct.pack(self.record_format, *record) for record in records]
+        deadline = None if timeout is None else time.time() + timeout
+        written = 0
+        with self._not_full:
+            while written < len(packed):
+                free = self.capacity - self._size()
+                if free == 0:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._not_full.wait(remaining)
+                    continue
+                batch = packed[written:written + free]
+                self._copy_in(self._positions[0], b''.join(batch))
+                self._positions[0] += len(batch)
+                written += len(batch)
+                self._not_empty.notify_all()
+        return written
+
+    def get_many(self, max_records, timeout=0):
+        """
+        Removes and returns up to max_records records, oldest first.
+
+        @param timeout Seconds to wait for at least one record; None waits forever, 0 never waits
+        @return A list of tuples, empty if nothing arrived in time
+        """
+        with self._not_empty:
+            if self._size() == 0 and timeout != 0:
+                self._not_empty.wait_for(lambda: self._size() > 0, timeout)
+            count = min(self._size(), max_records)
+            if count == 0:
+                return []
+            data = self._copy_out(self._positions[1], count)
+            self._positions[1] += count
+            self._not_full.notify_all()
+        return list(struct.iter_unpack(self.record_format, data))
+
+
+class TrafficCounters(object):
+    """
+    Completed requests and errors of one worker, in shared memory so that the process
+    that created them can read them while the worker is running.
+    """
+
+    def __init__(self, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self._values = ctx.Array(ctypes.c_longlong, 2)
+
+    def add(self, ops=0, errors=0):
+        with self._values.get_lock():
+            self._values[0] += ops
+            self._values[1] += errors
+
+    def snapshot(self):
+        """Returns (ops, errors)"""
+        with self._values.get_lock():
+            return self._values[0], self._values[1]
+
+    @property
+    def ops(self):
+        return self.snapshot()[0]
+
+    @property
+    def errors(self):
+        return self.snapshot()[1]
+
+
+class AsyncRequests(object):
+    """
+    Runs requests with execute_async, keeping at most `max_in_flight` of them running:
+    submit() blocks until a slot is free.
+
+    Every completed request is counted as an op, every failed one as an error. Once
+    more than `max_errors` requests failed, or a callback raised (e.g. because a read
+    returned an unexpected value), the next call to submit(), drain() or
+    raise_if_failed() raises that exception.
+
+    If a LatencyRecorder (see tools.latency) is given, the latency of every successful
+    request and the kind of every error are recorded in it too, and flushed to shared
+    memory at least every `latency_flush_interval` seconds while submit() or
+    raise_if_failed() are being called.
+
+    @param session The session to run the requests on
+    @param max_in_flight Maximum number of requests running at the same time
+    @param counters TrafficCounters to count ops and errors in, a private one if None
+    @param max_errors Number of failed requests to tolerate
+    @param latency LatencyRecorder to record request latencies and errors in
+    """
+
+    def __init__(self, session, max_in_flight=64, counters=None, max_errors=0, latency=None,
+                 latency_flush_interval=0.1):
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0; got {}".format(max_in_flight))
+        self.session = session
+        self.max_in_flight = max_in_flight
+        self.counters = counters if counters is not None else TrafficCounters()
+        self.max_errors = max_errors
+        self.errors = 0
+        self.failure = None
+        self.latency = latency
+        self.latency_flush_interval = latency_flush_interval
+        self._last_latency_flush = time.time()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def flush_latency(self):
+        if self.latency is not None:
+            self.latency.flush()
+        self._last_latency_flush = time.time()
+
+    def _maybe_flush_latency(self):
+        if self.latency is not None and time.time() - self._last_latency_flush >= self.latency_flush_interval:
+            self.flush_latency()
+
+    def raise_if_failed(self):
+        self._maybe_flush_latency()
+        if self.failure is not None:
+            raise self.failure
+
+    def submit(self, statement, parameters=None, callback=None):
+        """
+        Starts executing statement with parameters. callback, if given, is called with
+        the result rows from a driver thread once the request succeeded.
+        """
+        self._maybe_flush_latency()
+        with self._condition:
+            while self._in_flight >= self.max_in_flight and self.failure is None:
+                self._condition.wait(0.1)
+            if self.failure is not None:
+                raise self.failure
+            self._in_flight += 1
+        start = time.time()
+        future = self.session.execute_async(statement, parameters)
+        future.add_callbacks(callback=self._on_success, callback_args=(callback, start), errback=self._on_error)
+
+    def _on_success(self, rows, callback, start):
+        if self.latency is not None:
+            self.latency.record(time.time() - start)
+        try:
+            if callback is not None:
+                callback(rows)
+        except Exception as e:
+            with self._condition:
+                self.failure = self.failure or e
+        finally:
+            self.counters.add(ops=1)
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def _on_error(self, exc):
+        if self.latency is not None:
+            self.latency.record_error(exc)
+        self.counters.add(errors=1)
+        with self._condition:
+            self.errors += 1
+            if self.errors > self.max_errors and self.failure is None:
+                self.failure = exc
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits for all running requests to complete, then raises the failure if there is one"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight == 0, timeout):
+                raise RuntimeError("{} requests still running after {} seconds".format(self._in_flight, timeout))
+        self.flush_latency()
+        self.raise_if_failed()
+
+
+class TrafficMeter(object):
+    """
+    Reports ops/s and errors of a set of TrafficCounters between successive calls to
+    report(), e.g. once per upgraded node, and keeps every report in `steps`:
+
+        meter = TrafficMeter({'writer': writer_counters, 'verifier': verifier_counters})
+        meter.start(interval=10)  # optional, logs the current rates every 10 seconds
+        ...
+        meter.report('node1 upgraded to 4.0')
+        meter.stop()
+
+    @param counters Dict of worker name to TrafficCounters
+    """
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.steps = []
+        self._last = self._snapshot()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _snapshot(self):
+        return time.time(), {name: counters.snapshot() for name, counters in self.counters.items()}
+
+    @staticmethod
+    def _delta(previous, current):
+        seconds = current[0] - previous[0]
+        stats = {}
+        for name, (ops, errors) in current[1].items():
+            previous_ops, previous_errors = previous[1].get(name, (0, 0))
+            stats[name] = {'ops': ops - previous_ops, 'errors': errors - previous_errors,
+                           'ops_per_second': (ops - previous_ops) / seconds if seconds > 0 else 0.0}
+        return seconds, stats
+
+    @staticmethod
+    def format(stats):
+        return ', '.join('{}: {:.1f} ops/s ({} ops, {} errors)'.format(
+            name, worker['ops_per_second'], worker['ops'], worker['errors']) for name, worker in sorted(stats.items()))
+
+    def report(self, label):
+        """
+        Logs and returns the traffic since the previous report (or since the meter was
+        created) as a dict with the step label, its duration in seconds and, for every
+        worker, its ops, errors and ops_per_second.
+        """
+        current = self._snapshot()
+        seconds, stats = self._delta(self._last, current)
+        self._last = current
+        step = {'step': label, 'seconds': seconds}
+        step.update(stats)
+        self.steps.append(step)
+        logger.info("Traffic during '{}' ({:.0f}s): {}".format(label, seconds, self.format(stats)))
+        return step
+
+    def _log_periodically(self, interval):
+        previous = self._snapshot()
+        while not self._stopped.wait(interval):
+            current = self._snapshot()
+            logger.debug("Traffic: {}".format(self.format(self._delta(previous, current)[1])))
+            previous = current
+
+    def start(self, interval=10):
+        """Starts logging the rates of the last `interval` seconds from a background thread"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._log_periodically, args=(interval,),
+                                        name='traffic-meter', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
@@ -9,8 +9,8 @@ from thrift_bindings.thrift010.Cassandra import (ConsistencyLevel, Deletion,
                                            Mutation, SlicePredicate,
                                            SliceRange)
 from thrift_test import composite, get_thrift_client, i32
-from tools.assertions import (assert_all, assert_length_equal, assert_none,
-                              assert_one)
+from tools.assertions import (assert_all, assert_all_paged, assert_length_equal,
+                              assert_none, assert_one)
 from tools.misc import new_node
 
 since = pytest.mark.since
@@ -143,12 +143,13 @@ class TestStorageEngineUpgrade(Tester):
         session = self._do_upgrade()
 
         for n in range(PARTITIONS):
-            assert_all(session,
-                       "SELECT * FROM t WHERE k = {}".format(n),
-                       [[n, v, v] for v in range(ROWS)])
-            assert_all(session,
-                       "SELECT * FROM t WHERE k = {} ORDER BY t DESC".format(n),
-                       [[n, v, v] for v in range(ROWS - 1, -1, -1)])
+            # read the whole partitions in several pages, so paging goes through the upgraded sstables too
+            assert_all_paged(session,
+                             "SELECT * FROM t WHERE k = {}".format(n),
+                             ([n, v, v] for v in range(ROWS)), fetch_size=100)
+            assert_all_paged(session,
+                             "SELECT * FROM t WHERE k = {} ORDER BY t DESC".format(n),
+                             ([n, v, v] for v in range(ROWS - 1, -1, -1)), fetch_size=100)
 
             # Querying a "large" slice
             start = ROWS / 10
@@ -173,10 +174,11 @@ class TestStorageEngineUpgrade(Tester):
         self.cluster.compact()
 
         for n in range(PARTITIONS):
-            assert_all(session, "SELECT * FROM t WHERE k = {}".format(n), [[n, v, v] for v in range(ROWS)])
-            assert_all(session,
-                       "SELECT * FROM t WHERE k = {} ORDER BY t DESC".format(n),
-                       [[n, v, v] for v in range(ROWS - 1, -1, -1)])
+            assert_all_paged(session, "SELECT * FROM t WHERE k = {}".format(n), ([n, v, v] for v in range(ROWS)),
+                             fetch_size=100)
+            assert_all_paged(session,
+                             "SELECT * FROM t WHERE k = {} ORDER BY t DESC".format(n),
+                             ([n, v, v] for v in range(ROWS - 1, -1, -1)), fetch_size=100)
 
             # Querying a "large" slice
             start = ROWS / 10
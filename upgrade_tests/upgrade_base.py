@@ -7,7 +7,9 @@ import logging
 from abc import ABCMeta
 
 from ccmlib.common import get_version_from_build, is_win
+from tools.artifact_cache import install_dir_kwargs
 from tools.jmxutils import remove_perf_disable_shared_mem
+from tools.origin_snapshot import OriginSnapshots
 
 from dtest import CASSANDRA_VERSION_FROM_BUILD, Tester, create_ks
 
@@ -42,8 +44,23 @@ class UpgradeTester(Tester, metaclass=ABCMeta):
     are testing. When run on 2.1 or 2.2, this will test the upgrade to 3.0.
     When run on 3.0, this will test the upgrade path to trunk. When run on
     versions above 3.0, this will test the upgrade path from 3.0 to HEAD.
+
+    The tests of a class that prepare the same origin cluster share it: the first one
+    prepares it and snapshots its data, the others restore that snapshot instead of
+    initializing the cluster and creating the keyspace again. Set SHARE_ORIGIN_CLUSTER
+    to False on classes whose tests need a freshly initialized cluster.
     """
     NODES, RF, __test__, CL, UPGRADE_PATH = 2, 1, False, None, None
+    SHARE_ORIGIN_CLUSTER = True
+
+    @pytest.fixture(scope='class', autouse=True)
+    def fixture_origin_snapshots(self, request):
+        snapshots = OriginSnapshots() if request.cls.SHARE_ORIGIN_CLUSTER else None
+        request.cls.origin_snapshots = snapshots
+        yield
+        request.cls.origin_snapshots = None
+        if snapshots is not None:
+            snapshots.cleanup()
 
     @pytest.fixture(autouse=True)
     def fixture_add_additional_log_patterns(self, fixture_dtest_setup):
@@ -100,25 +117,47 @@ class UpgradeTester(Tester, metaclass=ABCMeta):
 
         cluster.populate(nodes)
         node1 = cluster.nodelist()[0]
-        cluster.set_install_dir(version=self.UPGRADE_PATH.starting_version)
+        cluster.set_install_dir(**install_dir_kwargs(self.dtest_config.upgrade_artifact_cache,
+                                                     self.UPGRADE_PATH.starting_version))
         self.fixture_dtest_setup.enable_for_jolokia = kwargs.pop('jolokia', False)
         if self.fixture_dtest_setup.enable_for_jolokia:
             remove_perf_disable_shared_mem(node1)
 
+        snapshots = self.origin_snapshots
+        restored = False
+        if snapshots is not None:
+            snapshot_key = snapshots.key(cluster, nodes=nodes, rf=rf, create_keyspace=create_keyspace,
+                                         version=self.UPGRADE_PATH.starting_version,
+                                         jolokia=self.fixture_dtest_setup.enable_for_jolokia)
+            restored = snapshots.has(snapshot_key)
+            if restored:
+                snapshots.restore(snapshot_key, cluster)
+
         cluster.start(wait_for_binary_proto=True)
 
         node1 = cluster.nodelist()[0]
         time.sleep(0.2)
 
-        if cl:
-            session = self.patient_cql_connection(node1, protocol_version=protocol_version, consistency_level=cl, **kwargs)
-        else:
-            session = self.patient_cql_connection(node1, protocol_version=protocol_version, **kwargs)
-        if create_keyspace:
+        session = self._connect_to_origin(node1, protocol_version, cl, **kwargs)
+        if create_keyspace and not restored:
             create_ks(session, 'ks', rf)
 
+        if snapshots is not None and not restored:
+            # first test of the class preparing this cluster: keep it for the others
+            session.cluster.shutdown()
+            cluster.flush()
+            cluster.stop(gently=True)
+            snapshots.save(snapshot_key, cluster)
+            cluster.start(wait_for_binary_proto=True)
+            session = self._connect_to_origin(node1, protocol_version, cl, **kwargs)
+
         return session
 
+    def _connect_to_origin(self, node, protocol_version, cl, **kwargs):
+        if cl:
+            return self.patient_cql_connection(node, protocol_version=protocol_version, consistency_level=cl, **kwargs)
+        return self.patient_cql_connection(node, protocol_version=protocol_version, **kwargs)
+
     def do_upgrade(self, session, use_thrift=False, return_nodes=False, **kwargs):
         """
         Upgrades the first node in the cluster and returns a list of
@@ -147,7 +186,8 @@ class UpgradeTester(Tester, metaclass=ABCMeta):
         logger.debug('upgrading node1 to {}'.format(self.UPGRADE_PATH.upgrade_version))
         switch_jdks(self.UPGRADE_PATH.upgrade_meta.java_version)
 
-        node1.set_install_dir(version=self.UPGRADE_PATH.upgrade_version)
+        node1.set_install_dir(**install_dir_kwargs(self.dtest_config.upgrade_artifact_cache,
+                                                   self.UPGRADE_PATH.upgrade_version))
 
         # this is a bandaid; after refactoring, upgrades should account for protocol version
         new_version_from_build = get_version_from_build(node1.get_install_dir())
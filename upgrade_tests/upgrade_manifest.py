@@ -195,3 +195,15 @@ def build_upgrade_pairs():
             )
 
     return valid_upgrade_pairs
+
+
+def manifest_versions():
+    """
+    Returns a dict of every version referenced by the manifest in use (OVERRIDE_MANIFEST
+    if set, MANIFEST otherwise) to the java version it runs on, e.g. to prebuild them all.
+    """
+    manifest = OVERRIDE_MANIFEST or MANIFEST
+    metas = set(manifest.keys())
+    for destination_metas in manifest.values():
+        metas.update(destination_metas)
+    return {meta.version: meta.java_version for meta in metas if meta is not None}
@@ -1,23 +1,28 @@
+import json
 import operator
 import os
 import pprint
 import random
 import signal
+import threading
 import time
 import uuid
 import logging
 import pytest
 import psutil
 
-from collections import defaultdict, namedtuple
-from multiprocessing import Process, Queue
-from queue import Empty, Full
+from collections import defaultdict, deque, namedtuple
+from functools import partial
+from multiprocessing import Process
 
 from cassandra import ConsistencyLevel, WriteTimeout
 from cassandra.query import SimpleStatement
 
 from dtest import RUN_STATIC_UPGRADE_MATRIX, Tester
+from tools.artifact_cache import install_dir_kwargs
+from tools.latency import LatencyPhases, LatencyRecorder, format_phase_report
 from tools.misc import generate_ssl_stores, new_node
+from tools.traffic import AsyncRequests, SharedRingBuffer, TrafficCounters, TrafficMeter
 from .upgrade_base import switch_jdks
 from .upgrade_manifest import (build_upgrade_pairs, current_2_0_x,
                               current_2_1_x, current_2_2_x, current_3_0_x,
@@ -26,15 +31,55 @@ from .upgrade_manifest import (build_upgrade_pairs, current_2_0_x,
 logger = logging.getLogger(__name__)
 
 
-def data_writer(tester, to_verify_queue, verification_done_queue, rewrite_probability=0):
+# bounds of the continuous traffic generated during rolling upgrades
+TRAFFIC_MAX_IN_FLIGHT = 64  # requests running at once, per worker process
+HANDOFF_BATCH = 256  # records moved through a SharedRingBuffer at a time
+TO_VERIFY_CAPACITY = 2 ** 20  # written rows that can wait for verification
+REWRITABLE_CAPACITY = 500  # verified rows kept as rewrite candidates
+
+# ring buffer records: key and value uuid bytes, key uuid bytes, key uuid bytes and counter value
+WRITE_RECORD = '16s16s'
+KEY_RECORD = '16s'
+COUNTER_RECORD = '16sq'
+
+
+def _stop_on_sigterm():
+    """
+    Returns an Event set on SIGTERM. Workers check it between batches rather than
+    exiting from the signal handler, which could leave a ring buffer's lock held and
+    block the process on the other end forever.
+    """
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    return stopped
+
+
+def _hand_off(ring, records, stopped, block=True):
     """
-    Process for writing/rewriting data continuously.
+    Moves everything in the `records` deque into ring. Waits for space unless block
+    is False, in which case records that don't fit are dropped.
+    """
+    batch = [records.popleft() for _ in range(len(records))]
+    while batch:
+        written = ring.put_many(batch, timeout=0.1 if block else 0)
+        batch = batch[written:]
+        if not block or stopped.is_set():
+            return
+
+
+def data_writer(tester, to_verify_ring, verification_done_ring, rewrite_probability=0, counters=None,
+                max_in_flight=TRAFFIC_MAX_IN_FLIGHT, max_errors=0, latency=None):
+    """
+    Process for writing/rewriting data continuously, with up to max_in_flight asynchronous writes.
 
-    Pushes to a queue to be consumed by data_checker.
+    Hands successfully written (key, value) records to data_checker through to_verify_ring.
 
-    Pulls from a queue of already-verified rows written by data_checker that it can overwrite.
+    Takes keys already verified by data_checker from verification_done_ring when it rewrites a row.
 
-    Intended to be run using multiprocessing.
+    Counts writes and write errors in counters, and records their latencies in latency if given;
+    more than max_errors failed writes end the process.
+
+    Intended to be run using multiprocessing, until terminated.
     """
     # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
     session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
@@ -42,47 +87,58 @@ def data_writer(tester, to_verify_queue, verification_done_queue, rewrite_probab
     prepared = session.prepare("UPDATE cf SET v=? WHERE k=?")
     prepared.consistency_level = ConsistencyLevel.QUORUM
 
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        to_verify_queue.close()
-        exit(0)
-
-    signal.signal(signal.SIGTERM, handle_sigterm)
+    stopped = _stop_on_sigterm()
+    requests = AsyncRequests(session, max_in_flight=max_in_flight, counters=counters, max_errors=max_errors,
+                             latency=latency)
+    # appended to from driver threads, handed off from this one
+    written = deque()
+    rewritable = []
+    last_hand_off = time.time()
 
-    while True:
-        try:
+    try:
+        while not stopped.is_set():
             key = None
 
             if (rewrite_probability > 0) and (random.randint(0, 100) <= rewrite_probability):
-                try:
-                    key = verification_done_queue.get_nowait()
-                except Empty:
-                    # we wanted a re-write but the re-writable queue was empty. oh well.
-                    pass
+                if not rewritable:
+                    rewritable = [uuid.UUID(bytes=k) for (k,) in verification_done_ring.get_many(HANDOFF_BATCH)]
+                # if the re-writable keys ran out we wanted a re-write but there was none. oh well.
+                key = rewritable.pop() if rewritable else None
 
             key = key or uuid.uuid4()
 
             val = uuid.uuid4()
 
-            session.execute(prepared, (val, key))
+            requests.submit(prepared, (val, key),
+                            callback=lambda rows, record=(key.bytes, val.bytes): written.append(record))
+
+            if len(written) >= HANDOFF_BATCH or time.time() - last_hand_off > 0.1:
+                _hand_off(to_verify_ring, written, stopped)
+                last_hand_off = time.time()
 
-            to_verify_queue.put_nowait((key, val,))
-        except Exception:
-            logger.debug("Error in data writer process!")
-            to_verify_queue.close()
-            raise
+        requests.drain(timeout=60)
+    except Exception:
+        logger.debug("Error in data writer process!")
+        raise
+    finally:
+        # rows already written still get verified
+        _hand_off(to_verify_ring, written, stopped)
 
 
-def data_checker(tester, to_verify_queue, verification_done_queue):
+def data_checker(tester, to_verify_ring, verification_done_ring, counters=None,
+                 max_in_flight=TRAFFIC_MAX_IN_FLIGHT, max_errors=0, latency=None):
     """
-    Process for checking data continuously.
+    Process for checking data continuously, with up to max_in_flight asynchronous reads.
 
-    Pulls from a queue written to by data_writer to know what to verify.
+    Takes the (key, value) records to verify from to_verify_ring, written to by data_writer.
 
-    Pushes to a queue to tell data_writer what's been verified and could be a candidate for re-writing.
+    Hands verified keys to verification_done_ring, as candidates for re-writing by data_writer.
 
-    Intended to be run using multiprocessing.
+    Counts reads and read errors in counters, and records their latencies in latency if given;
+    more than max_errors failed reads, or any unexpected value, end the process. On SIGTERM, the reads already started are checked
+    before the process exits.
+
+    Intended to be run using multiprocessing, until terminated.
     """
     # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
     session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
@@ -90,50 +146,45 @@ def data_checker(tester, to_verify_queue, verification_done_queue):
     prepared = session.prepare("SELECT v FROM cf WHERE k=?")
     prepared.consistency_level = ConsistencyLevel.QUORUM
 
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        verification_done_queue.close()
-        exit(0)
+    stopped = _stop_on_sigterm()
+    requests = AsyncRequests(session, max_in_flight=max_in_flight, counters=counters, max_errors=max_errors,
+                             latency=latency)
+    verified = deque()
 
-    signal.signal(signal.SIGTERM, handle_sigterm)
+    def check(rows, key, expected_val):
+        actual_val = rows[0][0]
+        tester.assertEqual(expected_val, actual_val, "Data did not match expected value!")
+        verified.append((key.bytes,))
 
-    while True:
-        try:
-            # here we could block, but if the writer process terminates early with an empty queue
-            # we would end up blocking indefinitely
-            (key, expected_val) = to_verify_queue.get_nowait()
+    try:
+        while not stopped.is_set():
+            # don't block indefinitely, or we would not notice being terminated
+            for key, expected_val in to_verify_ring.get_many(HANDOFF_BATCH, timeout=0.1):
+                key = uuid.UUID(bytes=key)
+                requests.submit(prepared, (key,), callback=partial(check, key=key, expected_val=uuid.UUID(bytes=expected_val)))
 
-            actual_val = session.execute(prepared, (key,))[0][0]
-        except Empty:
-            time.sleep(0.1)  # let's not eat CPU if the queue is empty
-            continue
-        except Exception:
-            logger.debug("Error in data verifier process!")
-            verification_done_queue.close()
-            raise
-        else:
-            try:
-                verification_done_queue.put_nowait(key)
-            except Full:
-                # the rewritable queue is full, not a big deal. drop this one.
-                # we keep the rewritable queue held to a modest max size
-                # and allow dropping some rewritables because we don't want to
-                # rewrite rows in the same sequence as originally written
-                pass
+            # the rewritable ring is kept to a modest size and we drop whatever does not fit,
+            # because we don't want to rewrite rows in the same sequence as originally written
+            _hand_off(verification_done_ring, verified, stopped, block=False)
+            requests.raise_if_failed()
 
-        tester.assertEqual(expected_val, actual_val, "Data did not match expected value!")
+        requests.drain(timeout=60)
+    except Exception:
+        logger.debug("Error in data verifier process!")
+        raise
 
 
-def counter_incrementer(tester, to_verify_queue, verification_done_queue, rewrite_probability=0):
+def counter_incrementer(tester, to_verify_ring, verification_done_ring, rewrite_probability=0, counters=None,
+                        max_in_flight=TRAFFIC_MAX_IN_FLIGHT, max_errors=0, latency=None):
     """
-    Process for incrementing counters continuously.
+    Process for incrementing counters continuously, with up to max_in_flight asynchronous increments.
 
-    Pushes to a queue to be consumed by counter_checker.
+    Hands incremented (key, expected count) records to counter_checker through to_verify_ring.
 
-    Pulls from a queue of already-verified rows written by data_checker that it can increment again.
+    Takes (key, count) records already verified by counter_checker from verification_done_ring
+    when it increments a counter again.
 
-    Intended to be run using multiprocessing.
+    Intended to be run using multiprocessing, until terminated.
     """
     # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
     session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
@@ -141,46 +192,52 @@ def counter_incrementer(tester, to_verify_queue, verification_done_queue, rewrit
     prepared = session.prepare("UPDATE countertable SET c = c + 1 WHERE k1=?")
     prepared.consistency_level = ConsistencyLevel.QUORUM
 
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        to_verify_queue.close()
-        exit(0)
-
-    signal.signal(signal.SIGTERM, handle_sigterm)
+    stopped = _stop_on_sigterm()
+    requests = AsyncRequests(session, max_in_flight=max_in_flight, counters=counters, max_errors=max_errors,
+                             latency=latency)
+    incremented = deque()
+    reincrementable = []
+    last_hand_off = time.time()
 
-    while True:
-        try:
+    try:
+        while not stopped.is_set():
             key = None
             count = 0  # this will get set to actual last known count if we do a re-write
 
             if (rewrite_probability > 0) and (random.randint(0, 100) <= rewrite_probability):
-                try:
-                    key, count = verification_done_queue.get_nowait()
-                except Empty:
-                    # we wanted a re-write but the re-writable queue was empty. oh well.
-                    pass
+                if not reincrementable:
+                    reincrementable = verification_done_ring.get_many(HANDOFF_BATCH)
+                if reincrementable:
+                    key, count = reincrementable.pop()
+                    key = uuid.UUID(bytes=key)
 
             key = key or uuid.uuid4()
 
-            session.execute(prepared, (key))
+            requests.submit(prepared, (key,),
+                            callback=lambda rows, record=(key.bytes, count + 1): incremented.append(record))
 
-            to_verify_queue.put_nowait((key, count + 1,))
-        except Exception:
-            logger.debug("Error in counter incrementer process!")
-            to_verify_queue.close()
-            raise
+            if len(incremented) >= HANDOFF_BATCH or time.time() - last_hand_off > 0.1:
+                _hand_off(to_verify_ring, incremented, stopped)
+                last_hand_off = time.time()
 
+        requests.drain(timeout=60)
+    except Exception:
+        logger.debug("Error in counter incrementer process!")
+        raise
+    finally:
+        _hand_off(to_verify_ring, incremented, stopped)
 
-def counter_checker(tester, to_verify_queue, verification_done_queue):
+
+def counter_checker(tester, to_verify_ring, verification_done_ring, counters=None,
+                    max_in_flight=TRAFFIC_MAX_IN_FLIGHT, max_errors=0, latency=None):
     """
-    Process for checking counters continuously.
+    Process for checking counters continuously, with up to max_in_flight asynchronous reads.
 
-    Pulls from a queue written to by counter_incrementer to know what to verify.
+    Takes the (key, expected count) records to verify from to_verify_ring, written to by counter_incrementer.
 
-    Pushes to a queue to tell counter_incrementer what's been verified and could be a candidate for incrementing again.
+    Hands verified (key, count) records to verification_done_ring, as candidates for incrementing again.
 
-    Intended to be run using multiprocessing.
+    Intended to be run using multiprocessing, until terminated.
     """
     # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
     session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
@@ -188,39 +245,29 @@ def counter_checker(tester, to_verify_queue, verification_done_queue):
     prepared = session.prepare("SELECT c FROM countertable WHERE k1=?")
     prepared.consistency_level = ConsistencyLevel.QUORUM
 
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        verification_done_queue.close()
-        exit(0)
+    stopped = _stop_on_sigterm()
+    requests = AsyncRequests(session, max_in_flight=max_in_flight, counters=counters, max_errors=max_errors,
+                             latency=latency)
+    verified = deque()
 
-    signal.signal(signal.SIGTERM, handle_sigterm)
+    def check(rows, key, expected_count):
+        actual_count = rows[0][0]
+        tester.assertEqual(expected_count, actual_count, "Data did not match expected value!")
+        verified.append((key, actual_count))
 
-    while True:
-        try:
-            # here we could block, but if the writer process terminates early with an empty queue
-            # we would end up blocking indefinitely
-            (key, expected_count) = to_verify_queue.get_nowait()
+    try:
+        while not stopped.is_set():
+            for key, expected_count in to_verify_ring.get_many(HANDOFF_BATCH, timeout=0.1):
+                requests.submit(prepared, (uuid.UUID(bytes=key),),
+                                callback=partial(check, key=key, expected_count=expected_count))
 
-            actual_count = session.execute(prepared, (key,))[0][0]
-        except Empty:
-            time.sleep(0.1)  # let's not eat CPU if the queue is empty
-            continue
-        except Exception:
-            logger.debug("Error in counter verifier process!")
-            verification_done_queue.close()
-            raise
-        else:
-            tester.assertEqual(expected_count, actual_count, "Data did not match expected value!")
+            _hand_off(verification_done_ring, verified, stopped, block=False)
+            requests.raise_if_failed()
 
-            try:
-                verification_done_queue.put_nowait((key, actual_count))
-            except Full:
-                # the rewritable queue is full, not a big deal. drop this one.
-                # we keep the rewritable queue held to a modest max size
-                # and allow dropping some rewritables because we don't want to
-                # rewrite rows in the same sequence as originally written
-                pass
+        requests.drain(timeout=60)
+    except Exception:
+        logger.debug("Error in counter verifier process!")
+        raise
 
 
 @pytest.mark.upgrade_test
@@ -231,6 +278,8 @@ class TestUpgrade(Tester):
     """
     test_version_metas = None  # set on init to know which versions to use
     subprocs = None  # holds any subprocesses, for status checking and cleanup
+    traffic_max_in_flight = TRAFFIC_MAX_IN_FLIGHT  # requests each traffic process keeps running during rolling upgrades
+    traffic_max_errors = 0  # failed requests tolerated per traffic process before it, and the test, fails
     extra_config = None  # holds a non-mutable structure that can be cast as dict()
 
     @pytest.fixture(autouse=True)
@@ -247,6 +296,10 @@ class TestUpgrade(Tester):
             r'Unknown column cdc during deserialization',
         )
 
+    @pytest.fixture(autouse=True)
+    def fixture_record_junit_property(self, record_property):
+        self.record_junit_property = record_property
+
     def setUp(self):
         logger.debug("Upgrade test beginning, setting CASSANDRA_VERSION to {}, and jdk to {}. (Prior values will be restored after test)."
               .format(self.test_version_metas[0].version, self.test_version_metas[0].java_version))
@@ -295,6 +348,10 @@ class TestUpgrade(Tester):
         # Record the rows we write as we go:
         self.row_values = set()
         cluster = self.cluster
+        if populate and self.dtest_config.upgrade_artifact_cache:
+            # the origin version comes from the cache too, not from CASSANDRA_VERSION or --cassandra-dir
+            cluster.set_install_dir(**install_dir_kwargs(self.dtest_config.upgrade_artifact_cache,
+                                                         self.test_version_metas[0].version))
         if cluster.version() >= '3.0':
             cluster.set_configuration_options({'enable_user_defined_functions': 'true',
                                                'enable_scripted_user_defined_functions': 'true'})
@@ -332,32 +389,48 @@ class TestUpgrade(Tester):
 
         if rolling:
             # start up processes to write and verify data
-            write_proc, verify_proc, verification_queue = self._start_continuous_write_and_verify(wait_for_rowcount=5000)
-
-            # upgrade through versions
-            for version_meta in self.test_version_metas[1:]:
-                for num, node in enumerate(self.cluster.nodelist()):
-                    # sleep (sigh) because driver needs extra time to keep up with topo and make quorum possible
-                    # this is ok, because a real world upgrade would proceed much slower than this programmatic one
-                    # additionally this should provide more time for timeouts and other issues to crop up as well, which we could
-                    # possibly "speed past" in an overly fast upgrade test
-                    time.sleep(60)
-
-                    self.upgrade_to_version(version_meta, partial=True, nodes=(node,), internode_ssl=internode_ssl)
-
-                    self._check_on_subprocs(self.fixture_dtest_setup.subprocs)
-                    logger.debug('Successfully upgraded %d of %d nodes to %s' %
-                          (num + 1, len(self.cluster.nodelist()), version_meta.version))
-
-                self.cluster.set_install_dir(version=version_meta.version)
-
-            # Stop write processes
-            write_proc.terminate()
-            # wait for the verification queue's to empty (and check all rows) before continuing
-            self._wait_until_queue_condition('writes pending verification', verification_queue, operator.le, 0, max_wait_s=1200)
-            self._check_on_subprocs([verify_proc])  # make sure the verification processes are running still
+            write_proc, verify_proc, verification_ring, traffic, latency_phases = \
+                self._start_continuous_write_and_verify(wait_for_rowcount=5000)
+            traffic.start(interval=30)
+            latency_phases.enter('before')
 
+            try:
+                # upgrade through versions
+                for version_meta in self.test_version_metas[1:]:
+                    for num, node in enumerate(self.cluster.nodelist()):
+                        # sleep (sigh) because driver needs extra time to keep up with topo and make quorum possible
+                        # this is ok, because a real world upgrade would proceed much slower than this programmatic one
+                        # additionally this should provide more time for timeouts and other issues to crop up as well, which we could
+                        # possibly "speed past" in an overly fast upgrade test
+                        time.sleep(60)
+
+                        self.upgrade_to_version(version_meta, partial=True, nodes=(node,), internode_ssl=internode_ssl,
+                                                latency_phases=latency_phases)
+
+                        self._check_on_subprocs(self.fixture_dtest_setup.subprocs)
+                        logger.debug('Successfully upgraded %d of %d nodes to %s' %
+                                     (num + 1, len(self.cluster.nodelist()), version_meta.version))
+                        traffic.report('upgrade of {} to {}'.format(node.name, version_meta.version))
+
+                    self.cluster.set_install_dir(**install_dir_kwargs(self.dtest_config.upgrade_artifact_cache, version_meta.version))
+
+                latency_phases.enter('after')
+                # Stop write processes, they hand off the writes they already made before exiting
+                write_proc.terminate()
+                write_proc.join(120)
+                # wait for the verification ring to empty (and check all rows) before continuing
+                self._wait_until_queue_condition('writes pending verification', verification_ring, operator.le, 0, max_wait_s=1200)
+                self._check_on_subprocs([verify_proc])  # make sure the verification processes are running still
+                # the verifier checks the reads it already started before exiting
+                verify_proc.terminate()
+                verify_proc.join(120)
+                traffic.stop()
+                traffic.report('verification of remaining writes')
+            finally:
+                # what clients experienced matters most when the upgrade went wrong
+                self._report_latency_phases(latency_phases)
             self._terminate_subprocs()
+            assert verify_proc.exitcode == 0, "Verifier process failed (exit code {})".format(verify_proc.exitcode)
         # not a rolling upgrade, do everything in parallel:
         else:
             # upgrade through versions
@@ -366,7 +439,7 @@ class TestUpgrade(Tester):
                 self._increment_counters()
 
                 self.upgrade_to_version(version_meta, internode_ssl=internode_ssl)
-                self.cluster.set_install_dir(version=version_meta.version)
+                self.cluster.set_install_dir(**install_dir_kwargs(self.dtest_config.upgrade_artifact_cache, version_meta.version))
 
                 self._check_values()
                 self._check_counters()
@@ -411,11 +484,14 @@ class TestUpgrade(Tester):
                     logger.debug("Error terminating subprocess. There could be a lingering process.")
                     pass
 
-    def upgrade_to_version(self, version_meta, partial=False, nodes=None, internode_ssl=False):
+    def upgrade_to_version(self, version_meta, partial=False, nodes=None, internode_ssl=False, latency_phases=None):
         """
         Upgrade Nodes - if *partial* is True, only upgrade those nodes
         that are specified by *nodes*, otherwise ignore *nodes* specified
         and upgrade all nodes.
+
+        If *latency_phases* is given, a phase is entered when the nodes are
+        down and another once they are back up on the new version.
         """
         logger.debug('Upgrading {nodes} to {version}'.format(nodes=[n.name for n in nodes] if nodes is not None else 'all nodes', version=version_meta.version))
         switch_jdks(version_meta.java_version)
@@ -423,6 +499,11 @@ class TestUpgrade(Tester):
         if not partial:
             nodes = self.cluster.nodelist()
 
+        # clients see the nodes go away from the start of the drain
+        node_names = ', '.join(node.name for node in nodes)
+        if latency_phases is not None:
+            latency_phases.enter('{} down'.format(node_names))
+
         for node in nodes:
             logger.debug('Shutting down node: ' + node.name)
             node.drain()
@@ -430,7 +511,7 @@ class TestUpgrade(Tester):
             node.stop(wait_other_notice=False)
 
         for node in nodes:
-            node.set_install_dir(version=version_meta.version)
+            node.set_install_dir(**install_dir_kwargs(self.dtest_config.upgrade_artifact_cache, version_meta.version))
             logger.debug("Set new cassandra dir for %s: %s" % (node.name, node.get_install_dir()))
             if internode_ssl and version_meta.version >= '4.0':
                 node.set_configuration_options({'server_encryption_options': {'enabled': True, 'enable_legacy_ssl_storage_port': True}})
@@ -448,6 +529,9 @@ class TestUpgrade(Tester):
             node.start(wait_other_notice=240, wait_for_binary_proto=True)
             node.nodetool('upgradesstables -a')
 
+        if latency_phases is not None:
+            latency_phases.enter('{} upgraded to {}'.format(node_names, version_meta.version))
+
     def _log_current_ver(self, current_version_meta):
         """
         Logs where we currently are in the upgrade path, surrounding the current branch/tag, like ***sometag***
@@ -545,63 +629,67 @@ class TestUpgrade(Tester):
 
     def _start_continuous_write_and_verify(self, wait_for_rowcount=0, max_wait_s=600):
         """
-        Starts a writer process, a verifier process, a queue to track writes,
-        and a queue to track successful verifications (which are rewrite candidates).
+        Starts a writer process, a verifier process, a ring buffer to track writes,
+        and a ring buffer to track successful verifications (which are rewrite candidates).
 
         wait_for_rowcount provides a number of rows to write before unblocking and continuing.
 
-        Returns the writer process, verifier process, and the to_verify_queue.
+        Returns the writer process, verifier process, the to_verify ring buffer, a
+        TrafficMeter over the counters of both processes and LatencyPhases over their latencies.
         """
-        # queue of writes to be verified
-        to_verify_queue = Queue()
-        # queue of verified writes, which are update candidates
-        verification_done_queue = Queue(maxsize=500)
+        return self._start_continuous_traffic(data_writer, data_checker, WRITE_RECORD, KEY_RECORD,
+                                              'rows written (but not verified)', wait_for_rowcount, max_wait_s)
 
-        writer = Process(target=data_writer, args=(self, to_verify_queue, verification_done_queue, 25))
+    def _start_continuous_counter_increment_and_verify(self, wait_for_rowcount=0, max_wait_s=600):
+        """
+        Starts a counter incrementer process, a verifier process, a ring buffer to track writes,
+        and a ring buffer to track successful verifications (which are re-increment candidates).
+
+        Returns the incrementer process, verifier process, the to_verify ring buffer, a
+        TrafficMeter over the counters of both processes and LatencyPhases over their latencies.
+        """
+        return self._start_continuous_traffic(counter_incrementer, counter_checker, COUNTER_RECORD, COUNTER_RECORD,
+                                              'counters incremented (but not verified)', wait_for_rowcount, max_wait_s)
+
+    def _start_continuous_traffic(self, writer_target, verifier_target, to_verify_record, done_record,
+                                  label, wait_for_rowcount, max_wait_s):
+        # ring of writes to be verified
+        to_verify_ring = SharedRingBuffer(to_verify_record, TO_VERIFY_CAPACITY)
+        # ring of verified writes, which are update candidates
+        verification_done_ring = SharedRingBuffer(done_record, REWRITABLE_CAPACITY)
+        writer_counters, verifier_counters = TrafficCounters(), TrafficCounters()
+        writer_latency, verifier_latency = LatencyRecorder(), LatencyRecorder()
+        limits = {'max_in_flight': self.traffic_max_in_flight, 'max_errors': self.traffic_max_errors}
+
+        writer = Process(target=writer_target, args=(self, to_verify_ring, verification_done_ring, 25, writer_counters),
+                         kwargs=dict(limits, latency=writer_latency))
         # daemon subprocesses are killed automagically when the parent process exits
         writer.daemon = True
         self.fixture_dtest_setup.subprocs.append(writer)
         writer.start()
 
         if wait_for_rowcount > 0:
-            self._wait_until_queue_condition('rows written (but not verified)', to_verify_queue, operator.ge, wait_for_rowcount, max_wait_s=max_wait_s)
+            self._wait_until_queue_condition(label, to_verify_ring, operator.ge, wait_for_rowcount, max_wait_s=max_wait_s)
 
-        verifier = Process(target=data_checker, args=(self, to_verify_queue, verification_done_queue))
+        verifier = Process(target=verifier_target, args=(self, to_verify_ring, verification_done_ring, verifier_counters),
+                           kwargs=dict(limits, latency=verifier_latency))
         # daemon subprocesses are killed automagically when the parent process exits
         verifier.daemon = True
         self.fixture_dtest_setup.subprocs.append(verifier)
         verifier.start()
 
-        return writer, verifier, to_verify_queue
+        meter = TrafficMeter({writer.name: writer_counters, verifier.name: verifier_counters})
+        latency_phases = LatencyPhases({'writes': writer_latency, 'reads': verifier_latency})
+        return writer, verifier, to_verify_ring, meter, latency_phases
 
-    def _start_continuous_counter_increment_and_verify(self, wait_for_rowcount=0, max_wait_s=600):
+    def _report_latency_phases(self, latency_phases):
         """
-        Starts a counter incrementer process, a verifier process, a queue to track writes,
-        and a queue to track successful verifications (which are re-increment candidates).
-
-        Returns the writer process, verifier process, and the to_verify_queue.
+        Logs the latency and availability clients saw in every phase of a rolling upgrade,
+        and attaches the report to the junit results as the 'rolling_upgrade_slo' property.
         """
-        # queue of writes to be verified
-        to_verify_queue = Queue()
-        # queue of verified writes, which are update candidates
-        verification_done_queue = Queue(maxsize=500)
-
-        incrementer = Process(target=data_writer, args=(self, to_verify_queue, verification_done_queue, 25))
-        # daemon subprocesses are killed automagically when the parent process exits
-        incrementer.daemon = True
-        self.fixture_dtest_setup.subprocs.append(incrementer)
-        incrementer.start()
-
-        if wait_for_rowcount > 0:
-            self._wait_until_queue_condition('counters incremented (but not verified)', to_verify_queue, operator.ge, wait_for_rowcount, max_wait_s=max_wait_s)
-
-        count_verifier = Process(target=data_checker, args=(self, to_verify_queue, verification_done_queue))
-        # daemon subprocesses are killed automagically when the parent process exits
-        count_verifier.daemon = True
-        self.fixture_dtest_setup.subprocs.append(count_verifier)
-        count_verifier.start()
-
-        return incrementer, count_verifier, to_verify_queue
+        phases = latency_phases.finish()
+        logger.info("Client latency and availability per upgrade phase:\n{}".format(format_phase_report(phases)))
+        self.record_junit_property('rolling_upgrade_slo', json.dumps(phases, sort_keys=True))
 
     def _increment_counters(self, opcount=25000):
         logger.debug("performing {opcount} counter increments".format(opcount=opcount))
@@ -1,6 +1,7 @@
 import datetime
 import random
 import logging
+import pytest
 
 from dtest import Tester, create_ks
 from tools.assertions import assert_length_equal
@@ -26,6 +27,7 @@ clients = (
 logger = logging.getLogger(__name__)
 
 
+@pytest.mark.gc_pause_budget
 class TestWideRows(Tester):
     def test_wide_rows(self):
         self.write_wide_rows()